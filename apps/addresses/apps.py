@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AddressesConfig(AppConfig):
     name = 'addresses'
+
+    def ready(self):
+        from addresses import signals  # noqa
+        from addresses import tasks  # noqa
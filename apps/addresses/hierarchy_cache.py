@@ -0,0 +1,211 @@
+"""
+Shared cache of address hierarchy.
+
+Full title and ancestor ids of each address are kept in one redis hash,
+shared by all processes. Whole hash is built from addresses table by one
+query in celery task, that is started on first use, when celery worker
+starts, and periodically by celery beat. Until it is built, requested
+addresses are read from db and cached one by one. Saved or deleted
+address invalidates its whole subtree, because titles of children contain
+its title, and invalidated addresses are computed again on next use.
+
+Generation number is changed on each invalidation, and computed values are
+stored only when generation is the same as before they were read from db.
+So values, that were read before address is changed, do not overwrite
+invalidation.
+"""
+import json
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from django.db import connection
+from redis import RedisError
+
+from djing2.lib.logger import logger
+from djing2.lib.redis import redis_proxy
+from .fias_socrbase import AddressFIASInfo
+
+
+ADDRESS_HIERARCHY_KEY = "address_hierarchy"
+# Exists when whole table is in hash
+ADDRESS_HIERARCHY_READY_KEY = "address_hierarchy_ready"
+ADDRESS_HIERARCHY_GEN_KEY = "address_hierarchy_gen"
+# Whole hash is built again after it, to fix changes that were made bypassing signals
+ADDRESS_HIERARCHY_TTL = 24 * 3600
+# Celery beat builds whole hash before it expires
+ADDRESS_HIERARCHY_WARM_INTERVAL = ADDRESS_HIERARCHY_TTL // 2
+# Only one warming task is started on first use, requests read addresses from db meanwhile
+ADDRESS_HIERARCHY_WARM_LOCK_KEY = "address_hierarchy_warming"
+ADDRESS_HIERARCHY_WARM_LOCK_TIMEOUT = 120
+
+# row: id, parent_addr_id, fias_address_type, title
+AddressRow = tuple[int, Optional[int], int, str]
+
+
+@dataclass
+class AddressHierarchyItem:
+    full_title: str
+    # parent first, up to the root
+    ancestor_ids: list[int]
+
+    def to_json(self) -> str:
+        return json.dumps([self.full_title, self.ancestor_ids], ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw) -> "AddressHierarchyItem":
+        full_title, ancestor_ids = json.loads(raw)
+        return cls(full_title=full_title, ancestor_ids=ancestor_ids)
+
+
+def build_hierarchy(rows: Iterable[AddressRow],
+                    addr_ids: Optional[Iterable[int]] = None) -> dict[int, AddressHierarchyItem]:
+    """
+    :param rows: Addresses with all their ancestors.
+    :param addr_ids: Addresses to build, all of rows by default.
+    """
+    addr_type_map = AddressFIASInfo.get_address_types_map()
+    nodes = {addr_id: (parent_id, addr_type, title) for addr_id, parent_id, addr_type, title in rows}
+    res = {}
+    for addr_id in (nodes if addr_ids is None else addr_ids):
+        chain = []
+        # seen protects from loop in parent_addr
+        seen = set()
+        curr_id = addr_id
+        while curr_id in nodes and curr_id not in seen:
+            seen.add(curr_id)
+            chain.append(curr_id)
+            curr_id = nodes[curr_id][0]
+        titles = []
+        for chain_id in reversed(chain):
+            _, addr_type, title = nodes[chain_id]
+            addr = addr_type_map.get(addr_type)
+            if addr is None:
+                raise ValueError('address type %d does not have a corresponding address object' % addr_type)
+            titles.append('%s %s' % (addr.addr_short_name, title))
+        res[addr_id] = AddressHierarchyItem(full_title=', '.join(titles), ancestor_ids=chain[1:])
+    return res
+
+
+def _fetch_all_rows() -> list[AddressRow]:
+    with connection.cursor() as cur:
+        cur.execute("SELECT id, parent_addr_id, fias_address_type, title FROM addresses")
+        return cur.fetchall()
+
+
+def _fetch_rows(addr_ids: list[int]) -> list[AddressRow]:
+    """Addresses with all their ancestors"""
+    query = (
+        "SELECT DISTINCT a.id, a.parent_addr_id, a.fias_address_type, a.title "
+        "FROM addresses_closure c "
+        "JOIN addresses a ON a.id = c.ancestor_id "
+        "WHERE c.descendant_id = ANY(%s)"
+    )
+    with connection.cursor() as cur:
+        cur.execute(query, (addr_ids,))
+        return cur.fetchall()
+
+
+def fetch_subtree_ids(addr_id: int) -> list[int]:
+    """Address and all its descendants"""
+    with connection.cursor() as cur:
+        cur.execute("SELECT descendant_id FROM addresses_closure WHERE ancestor_id = %s", (addr_id,))
+        return [r[0] for r in cur.fetchall()]
+
+
+def _get_gen() -> int:
+    return int(redis_proxy.get(ADDRESS_HIERARCHY_GEN_KEY) or 0)
+
+
+def _store(items: dict[int, AddressHierarchyItem], gen: int, whole: bool = False) -> bool:
+    """Store items if generation was not changed, whole hash is replaced when whole"""
+    def _fn(pipe) -> bool:
+        if int(pipe.get(ADDRESS_HIERARCHY_GEN_KEY) or 0) != gen:
+            return False
+        pipe.multi()
+        if whole:
+            pipe.delete(ADDRESS_HIERARCHY_KEY)
+        if items:
+            pipe.hset(ADDRESS_HIERARCHY_KEY, mapping={k: v.to_json() for k, v in items.items()})
+        if whole:
+            pipe.set(ADDRESS_HIERARCHY_READY_KEY, 1, ex=ADDRESS_HIERARCHY_TTL)
+        return True
+
+    return redis_proxy.transaction(_fn, ADDRESS_HIERARCHY_GEN_KEY, value_from_callable=True)
+
+
+def warm() -> int:
+    """Build whole hierarchy, returns count of addresses"""
+    gen = _get_gen()
+    items = build_hierarchy(_fetch_all_rows())
+    if not _store(items, gen, whole=True):
+        # Changed while building, next use builds it again
+        return 0
+    return len(items)
+
+
+def warm_finished() -> None:
+    """Allows to start warming by next use, if hash is not ready yet"""
+    redis_proxy.delete(ADDRESS_HIERARCHY_WARM_LOCK_KEY)
+
+
+def _schedule_warm() -> None:
+    # tasks module imports this module
+    from addresses.tasks import warm_address_hierarchy_task
+
+    if redis_proxy.set(ADDRESS_HIERARCHY_WARM_LOCK_KEY, 1, nx=True, ex=ADDRESS_HIERARCHY_WARM_LOCK_TIMEOUT):
+        warm_address_hierarchy_task.delay()
+
+
+def get_hierarchy(addr_ids: Iterable[int]) -> dict[int, AddressHierarchyItem]:
+    addr_ids = list({int(i) for i in addr_ids})
+    if not addr_ids:
+        return {}
+    try:
+        if not redis_proxy.get(ADDRESS_HIERARCHY_READY_KEY):
+            _schedule_warm()
+        gen = _get_gen()
+        cached = redis_proxy.hmget(ADDRESS_HIERARCHY_KEY, addr_ids)
+    except RedisError as err:
+        logger.error("Address hierarchy cache is unavailable: %s" % err)
+        return build_hierarchy(_fetch_rows(addr_ids), addr_ids)
+
+    res = {
+        addr_id: AddressHierarchyItem.from_json(raw)
+        for addr_id, raw in zip(addr_ids, cached) if raw is not None
+    }
+    missed_ids = [addr_id for addr_id in addr_ids if addr_id not in res]
+    if missed_ids:
+        missed = build_hierarchy(_fetch_rows(missed_ids), missed_ids)
+        # Not existing addresses are not cached
+        missed = {addr_id: item for addr_id, item in missed.items() if item.full_title}
+        try:
+            _store(missed, gen)
+        except RedisError as err:
+            logger.error("Address hierarchy cache is unavailable: %s" % err)
+        res.update(missed)
+    return res
+
+
+def get_full_titles(addr_ids: Iterable[int]) -> dict[int, str]:
+    return {addr_id: item.full_title for addr_id, item in get_hierarchy(addr_ids).items()}
+
+
+def get_ancestor_ids(addr_id: int) -> list[int]:
+    item = get_hierarchy((addr_id,)).get(int(addr_id))
+    return item.ancestor_ids if item else []
+
+
+def invalidate(addr_ids: Iterable[int]) -> None:
+    addr_ids = list(addr_ids)
+    if not addr_ids:
+        return
+
+    def _fn(pipe):
+        pipe.multi()
+        pipe.hdel(ADDRESS_HIERARCHY_KEY, *addr_ids)
+        pipe.incr(ADDRESS_HIERARCHY_GEN_KEY)
+
+    try:
+        redis_proxy.transaction(_fn)
+    except RedisError as err:
+        logger.error("Address hierarchy cache is not invalidated: %s" % err)
@@ -0,0 +1,44 @@
+# Generated by Django 3.1.14 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from djing2.lib.for_migrations import read_all_file
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addresses', '0004_update_fias_codes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddressClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='descendant_links',
+                    to='addresses.addressmodel'
+                )),
+                ('descendant', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='ancestor_links',
+                    to='addresses.addressmodel'
+                )),
+            ],
+            options={
+                'db_table': 'addresses_closure',
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunSQL(
+            sql=read_all_file('0005_addressclosure.sql', __file__),
+            reverse_sql="DROP TRIGGER IF EXISTS addresses_closure_insert_trigger ON addresses;"
+                        "DROP TRIGGER IF EXISTS addresses_closure_update_trigger ON addresses;"
+                        "DROP FUNCTION IF EXISTS addresses_closure_insert();"
+                        "DROP FUNCTION IF EXISTS addresses_closure_update();"
+        ),
+    ]
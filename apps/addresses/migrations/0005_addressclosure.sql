@@ -0,0 +1,72 @@
+-- Fill closure table from existing addresses.
+-- Depth limit protects from loops in parent_addr.
+INSERT INTO addresses_closure (ancestor_id, descendant_id, depth)
+SELECT DISTINCT ON (ancestor_id, descendant_id) ancestor_id, descendant_id, depth
+FROM (
+  WITH RECURSIVE chain(ancestor_id, descendant_id, depth) AS (
+    SELECT id, id, 0
+    FROM addresses
+    UNION
+    SELECT a.parent_addr_id, c.descendant_id, c.depth + 1
+    FROM chain c
+    JOIN addresses a ON a.id = c.ancestor_id
+    WHERE a.parent_addr_id IS NOT NULL AND c.depth < 64
+  )
+  SELECT ancestor_id, descendant_id, depth FROM chain
+) t
+ORDER BY ancestor_id, descendant_id, depth;
+
+
+-- New address is linked to itself, and to all ancestors of its parent
+CREATE OR REPLACE FUNCTION addresses_closure_insert()
+  RETURNS TRIGGER
+  LANGUAGE plpgsql
+AS
+$$
+BEGIN
+  INSERT INTO addresses_closure (ancestor_id, descendant_id, depth)
+  SELECT ancestor_id, NEW.id, depth + 1
+  FROM addresses_closure
+  WHERE descendant_id = NEW.parent_addr_id
+  UNION ALL
+  SELECT NEW.id, NEW.id, 0;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER addresses_closure_insert_trigger
+  AFTER INSERT
+  ON addresses
+  FOR EACH ROW
+EXECUTE PROCEDURE addresses_closure_insert();
+
+
+-- Moved address is unlinked with its subtree from old ancestors,
+-- and linked to ancestors of new parent. Moving address into its
+-- own subtree fails by unique constraint.
+CREATE OR REPLACE FUNCTION addresses_closure_update()
+  RETURNS TRIGGER
+  LANGUAGE plpgsql
+AS
+$$
+BEGIN
+  DELETE FROM addresses_closure
+  WHERE descendant_id IN (SELECT descendant_id FROM addresses_closure WHERE ancestor_id = NEW.id)
+    AND ancestor_id IN (SELECT ancestor_id FROM addresses_closure WHERE descendant_id = NEW.id AND ancestor_id <> NEW.id);
+
+  INSERT INTO addresses_closure (ancestor_id, descendant_id, depth)
+  SELECT p.ancestor_id, c.descendant_id, p.depth + c.depth + 1
+  FROM addresses_closure p
+  CROSS JOIN addresses_closure c
+  WHERE p.descendant_id = NEW.parent_addr_id
+    AND c.ancestor_id = NEW.id;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER addresses_closure_update_trigger
+  AFTER UPDATE OF parent_addr_id
+  ON addresses
+  FOR EACH ROW
+  WHEN (OLD.parent_addr_id IS DISTINCT FROM NEW.parent_addr_id)
+EXECUTE PROCEDURE addresses_closure_update();
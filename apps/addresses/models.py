@@ -1,11 +1,11 @@
-from typing import Optional
-from functools import lru_cache
-from django.db import models, connection
+from typing import Iterable, Optional
+from django.db import models
 from django.utils.translation import gettext_lazy as _
 from djing2.exceptions import ModelValidationError
 
 from djing2.lib import safe_int, IntEnumEx
 from djing2.models import BaseAbstractModel
+from . import hierarchy_cache
 from .interfaces import IAddressObject
 from .fias_socrbase import AddressFIASInfo, AddressFIASLevelType
 
@@ -65,21 +65,14 @@ class AddressModelQuerySet(models.QuerySet):
 
 class AddressModelManager(models.Manager):
     @staticmethod
-    def get_address_recursive_ids(addr_id: int, direction_down=True):
-        query = (
-            "WITH RECURSIVE chain(id, parent_addr_id) AS ("
-            "    SELECT id, parent_addr_id "
-            "    FROM addresses "
-            "    WHERE id = %s "
-            "    UNION "
-            "    SELECT a.id, a.parent_addr_id "
-            "    FROM chain c "
-            "    LEFT JOIN addresses a ON "
-            f"   {'a.parent_addr_id = c.id' if direction_down else 'a.id = c.parent_addr_id'}"
-            ")"
-            "SELECT id FROM chain WHERE id IS NOT NULL"
-        )
-        return models.expressions.RawSQL(sql=query, params=[addr_id])
+    def get_address_recursive_ids(addr_id: int, direction_down=True) -> models.QuerySet:
+        """
+        Ids of address and all its descendants, or all its ancestors
+        when not direction_down. From closure table, without recursion.
+        """
+        if direction_down:
+            return AddressClosure.objects.filter(ancestor_id=addr_id).values('descendant_id')
+        return AddressClosure.objects.filter(descendant_id=addr_id).values('ancestor_id')
 
     def get_address_by_type(self, addr_id: int, addr_type: AddressModelTypes):
         ids_tree_query = AddressModelManager.get_address_recursive_ids(
@@ -89,39 +82,21 @@ class AddressModelManager(models.Manager):
         return self.filter(pk__in=ids_tree_query, address_type=addr_type)
 
     @staticmethod
-    @lru_cache(maxsize=1024)
     def get_address_full_title(addr_id: int) -> str:
-        # TODO: move to redis
-        query = (
-            "WITH RECURSIVE chain(id, parent_addr_id) AS ("
-            "    SELECT id, parent_addr_id, fias_address_type, title "
-            "    FROM addresses "
-            "    WHERE id = %s "
-            "    UNION "
-            "    SELECT a.id, a.parent_addr_id, a.fias_address_type, a.title "
-            "    FROM chain c "
-            "    LEFT JOIN addresses a ON a.id = c.parent_addr_id"
-            ")"
-            "SELECT id, fias_address_type, title FROM chain WHERE id IS NOT NULL"
-        )
-        addr_type_map = AddressFIASInfo.get_address_types_map()
-
-        def _accumulate_addrs_hierarchy():
-            with connection.cursor() as cur:
-                cur.execute(query, (addr_id,))
-                r = cur.fetchone()
-                while r is not None:
-                    r_addr_id, addr_type, title = r
-                    addr = addr_type_map.get(addr_type)
-                    if addr is None:
-                        raise ValueError('address type %d does not have a corresponding address object' % addr_type)
-                    type_code_short_title = addr.addr_short_name
-                    yield r_addr_id, type_code_short_title, title
-                    r = cur.fetchone()
-
-        title_hierarchy = list(_accumulate_addrs_hierarchy())
-        title_hierarchy.reverse()
-        return ', '.join('%s %s' % (short_title, title) for _, short_title, title in title_hierarchy)
+        return hierarchy_cache.get_full_titles((addr_id,)).get(int(addr_id), '')
+
+    @staticmethod
+    def get_addresses_full_titles(addr_ids: Iterable[int]) -> dict[int, str]:
+        """Full titles of several addresses, same as get_address_full_title for each of them"""
+        return hierarchy_cache.get_full_titles(addr_ids)
+
+    @staticmethod
+    def prefetch_full_titles(addresses: Iterable['AddressModel']) -> None:
+        """Fill full titles of addresses, so full_title() does not query them one by one"""
+        addresses = [a for a in addresses if a is not None]
+        titles = AddressModelManager.get_addresses_full_titles(a.pk for a in addresses)
+        for addr in addresses:
+            addr._full_title = titles.get(addr.pk)
 
 
 class AddressModel(IAddressObject, BaseAbstractModel):
@@ -163,18 +138,17 @@ class AddressModel(IAddressObject, BaseAbstractModel):
         И возвращаем строковую интерпретацию этого полного адреса.
         """
 
+        prefetched_title = getattr(self, '_full_title', None)
+        if prefetched_title is not None:
+            return prefetched_title
         addr_id = int(self.pk)
         return AddressModelManager.get_address_full_title(
             addr_id=addr_id
         )
 
     def get_id_hierarchy_gen(self):
-        ids_tree_query = AddressModelManager.get_address_recursive_ids(
-            addr_id=self.pk,
-            direction_down=False
-        )
-        for addr in AddressModel.objects.filter(pk__in=ids_tree_query):
-            yield addr.pk
+        yield self.pk
+        yield from hierarchy_cache.get_ancestor_ids(addr_id=self.pk)
 
     def get_address_item_by_type(self, addr_type: AddressModelTypes) -> Optional['AddressModel']:
         """
@@ -276,3 +250,21 @@ class AddressModel(IAddressObject, BaseAbstractModel):
     class Meta:
         db_table = 'addresses'
         unique_together = ('parent_addr', 'address_type', 'fias_address_type', 'title')
+
+
+class AddressClosure(models.Model):
+    """
+    Each address linked to itself and to all its ancestors.
+    Rows are maintained by db triggers on addresses table, see migration 0005.
+    """
+    ancestor = models.ForeignKey(AddressModel, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(AddressModel, on_delete=models.CASCADE, related_name='ancestor_links')
+    # 0 for address itself, 1 for its parent, and so on
+    depth = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return "%d -> %d" % (self.ancestor_id, self.descendant_id)
+
+    class Meta:
+        db_table = 'addresses_closure'
+        unique_together = ('ancestor', 'descendant')
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch.dispatcher import receiver
+
+from addresses import hierarchy_cache
+from addresses.models import AddressModel
+
+
+def _invalidate_subtree(addr_id: int) -> None:
+    # Titles of all children contain title of address
+    subtree_ids = hierarchy_cache.fetch_subtree_ids(addr_id)
+    transaction.on_commit(lambda: hierarchy_cache.invalidate(subtree_ids))
+
+
+@receiver(post_save, sender=AddressModel)
+def address_post_save(sender, instance: AddressModel, created=False, **kwargs):
+    if created:
+        # New address has no children, its id may be left in cache from removed address
+        addr_id = instance.pk
+        transaction.on_commit(lambda: hierarchy_cache.invalidate((addr_id,)))
+        return
+    _invalidate_subtree(instance.pk)
+
+
+@receiver(pre_delete, sender=AddressModel)
+def address_pre_delete(sender, instance: AddressModel, **kwargs):
+    # Children are detached from address while it is deleted
+    _invalidate_subtree(instance.pk)
@@ -0,0 +1,26 @@
+from celery.signals import worker_ready
+
+from addresses import hierarchy_cache
+from djing2 import celery_app
+from djing2.lib.logger import logger
+
+
+@celery_app.task
+def warm_address_hierarchy_task() -> None:
+    try:
+        count = hierarchy_cache.warm()
+    finally:
+        hierarchy_cache.warm_finished()
+    logger.info('Address hierarchy cache is warmed, addresses: %d' % count)
+
+
+celery_app.add_periodic_task(
+    hierarchy_cache.ADDRESS_HIERARCHY_WARM_INTERVAL,
+    warm_address_hierarchy_task.s(),
+    name='Warm address hierarchy cache'
+)
+
+
+@worker_ready.connect
+def warm_address_hierarchy_on_start(sender, **kwargs):
+    warm_address_hierarchy_task.delay()
@@ -1,5 +1,6 @@
 from djing2.lib.fastapi.test import DjingTestCase
 from starlette import status
+from addresses import hierarchy_cache
 from addresses.models import AddressModel, AddressModelTypes
 
 
@@ -118,3 +119,77 @@ class AddressesAPITestCase(DjingTestCase):
         self.assertEqual(street['fias_address_level'], 5)
         self.assertEqual(street['fias_address_type'], 529)
         self.assertEqual(street['title'], 'Street12')
+
+    def test_full_title_changed_after_parent_rename(self):
+        self.assertTrue(self.office_addr.full_title().startswith("стр Country, "))
+        country = AddressModel.objects.get(parent_addr=None, title="Country")
+        country.title = "Other country"
+        country.save()
+        office = AddressModel.objects.get(pk=self.office_addr.pk)
+        self.assertTrue(office.full_title().startswith("стр Other country, "))
+
+    def test_full_title_changed_after_move(self):
+        city2 = AddressModel.objects.create(
+            parent_addr=self.region,
+            address_type=AddressModelTypes.LOCALITY,
+            fias_address_level=4,
+            fias_address_type=405,
+            title="Other city"
+        )
+        self.assertIn("Some region city", self.office_addr.full_title())
+        street = AddressModel.objects.get(parent_addr=self.city)
+        street.parent_addr = city2
+        street.save()
+        office = AddressModel.objects.get(pk=self.office_addr.pk)
+        self.assertIn("Other city", office.full_title())
+        self.assertNotIn("Some region city", office.full_title())
+        self.assertIn(city2.pk, list(office.get_id_hierarchy_gen()))
+
+    def test_titles_equal_after_warm(self):
+        titles = AddressModel.objects.get_addresses_full_titles([self.office_addr.pk, self.city.pk])
+        hierarchy_cache.warm()
+        self.assertDictEqual(
+            AddressModel.objects.get_addresses_full_titles([self.office_addr.pk, self.city.pk]),
+            titles
+        )
+
+    def test_build_hierarchy(self):
+        items = hierarchy_cache.build_hierarchy([
+            (1, None, 405, "City"),
+            (2, 1, 529, "Street"),
+            # loop in parents
+            (3, 4, 529, "A"),
+            (4, 3, 529, "B"),
+        ])
+        self.assertEqual(items[2].full_title, "г City, ул Street")
+        self.assertListEqual(items[2].ancestor_ids, [1])
+        self.assertListEqual(items[1].ancestor_ids, [])
+        self.assertEqual(items[3].full_title, "ул B, ул A")
+
+    def test_closure_subtree_after_move(self):
+        def _subtree(addr):
+            return set(AddressModel.objects.filter(
+                pk__in=AddressModel.objects.get_address_recursive_ids(addr.pk)
+            ).values_list('pk', flat=True))
+
+        city2 = AddressModel.objects.create(
+            parent_addr=self.region,
+            address_type=AddressModelTypes.LOCALITY,
+            fias_address_level=4,
+            fias_address_type=405,
+            title="Other city"
+        )
+        street = AddressModel.objects.get(parent_addr=self.city)
+        self.assertIn(self.office_addr.pk, _subtree(self.city))
+        self.assertSetEqual(_subtree(city2), {city2.pk})
+
+        street.parent_addr = city2
+        street.save()
+        self.assertSetEqual(_subtree(self.city), {self.city.pk})
+        self.assertIn(self.office_addr.pk, _subtree(city2))
+        self.assertIn(self.office_addr.pk, _subtree(self.region))
+        ancestors = set(AddressModel.objects.get_address_recursive_ids(
+            self.office_addr.pk, direction_down=False
+        ).values_list('ancestor_id', flat=True))
+        self.assertIn(city2.pk, ancestors)
+        self.assertNotIn(self.city.pk, ancestors)
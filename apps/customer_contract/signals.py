@@ -1,8 +1,10 @@
+from django.db import transaction
 from django.db.models.signals import pre_save
 from django.dispatch.dispatcher import receiver
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import ValidationError
 from customers.models import Customer
+from djing2.lib.fastapi import auth_cache
 from customer_contract.custom_signals import finish_customer_contract_signal
 from customer_contract.models import CustomerContractModel
 
@@ -14,7 +16,10 @@ def customer_profile_disable_after_contract_stop(sender, instance: CustomerContr
         if not instance.is_active:
             raise ValidationError(_('Not allowed to create disabled contract'))
         return
-    Customer.objects.filter(pk=instance.customer.pk).update(is_active=False)
+    customer_id = instance.customer_id
+    Customer.objects.filter(pk=customer_id).update(is_active=False)
+    # update() does not send post_save, which invalidates auth cache
+    transaction.on_commit(lambda: auth_cache.invalidate_user(customer_id))
 
 
 @receiver(pre_save, sender=Customer)
@@ -0,0 +1,266 @@
+"""
+Set-based billing run.
+
+Does the same as CustomerManager.continue_services_if_autoconnect and
+CustomerManager.finish_services_if_expired, but processes expired services
+by chunks, each chunk in its own transaction. Balances changes by one UPDATE
+for each distinct amount, logs are written by bulk_create, and instead of
+per-service signals one customer_services_batch_post_billing signal sends
+for the whole chunk.
+
+Billing run may be split into shards by customer id modulo shards count,
+so shards processes by independent celery tasks.
+"""
+from collections import defaultdict
+import json
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Optional, Iterator, Sequence
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Mod
+from django.utils.translation import gettext as _
+
+from customers import custom_signals
+from customers.models import Customer, CustomerService, CustomerLog
+from djing2.lib.redis import redis_proxy
+from profiles.models import UserProfile
+
+
+BILLING_CHUNK_SIZE = getattr(settings, "BILLING_CHUNK_SIZE", 1000)
+BILLING_SHARDS = getattr(settings, "BILLING_SHARDS", 4)
+BILLING_SHARD_METRICS_KEY = "billing_shard_metrics_%d_%d"
+
+
+@dataclass(frozen=True)
+class BillingShard:
+    index: int
+    count: int
+
+    def filter(self, qs, customer_id_field: str = "pk"):
+        """Leave only customers from this shard"""
+        return qs.annotate(
+            billing_shard=Mod(customer_id_field, Value(self.count))
+        ).filter(billing_shard=self.index)
+
+    @property
+    def lock_name(self) -> str:
+        return "billing_shard_%d_%d" % (self.index, self.count)
+
+
+@dataclass
+class BillingShardMetrics:
+    index: int
+    count: int
+    status: str
+    started: Optional[str] = None
+    finished: Optional[str] = None
+    duration: Optional[float] = None
+    continued: int = 0
+    stopped: int = 0
+    finished_services: int = 0
+    error: Optional[str] = None
+
+    def save(self) -> None:
+        redis_proxy.set(
+            BILLING_SHARD_METRICS_KEY % (self.index, self.count),
+            json.dumps(asdict(self))
+        )
+
+    @classmethod
+    def load_all(cls, count: int = BILLING_SHARDS) -> list['BillingShardMetrics']:
+        """Last known metrics for each shard"""
+        res = []
+        for index in range(count):
+            raw = redis_proxy.get(BILLING_SHARD_METRICS_KEY % (index, count))
+            if raw:
+                res.append(cls(**json.loads(raw)))
+        return res
+
+
+@dataclass
+class BillingRunResult:
+    continued: int = 0
+    stopped: int = 0
+
+    def __iadd__(self, other: 'BillingRunResult'):
+        self.continued += other.continued
+        self.stopped += other.stopped
+        return self
+
+
+def _chunks(ids: Sequence[int], chunk_size: int) -> Iterator[Sequence[int]]:
+    for i in range(0, len(ids), chunk_size):
+        yield ids[i:i + chunk_size]
+
+
+def _change_balances(amounts: dict[int, float]) -> None:
+    """
+    :param amounts: dict of customer ids to amount, that adds to balance.
+    """
+    # Costs are the same for all customers with the same service,
+    # so there are few distinct amounts
+    ids_by_amount = defaultdict(list)
+    for customer_id, amount in amounts.items():
+        if amount:
+            ids_by_amount[amount].append(customer_id)
+    for amount, customer_ids in ids_by_amount.items():
+        Customer._base_manager.filter(pk__in=customer_ids).update(
+            balance=F("balance") + amount
+        )
+
+
+def _expired_services_ids(now: datetime, auto_renewal: bool, customer=None,
+                          shard: Optional[BillingShard] = None) -> list[int]:
+    if auto_renewal:
+        qs = CustomerService.objects.filter(deadline__lte=now)
+    else:
+        qs = CustomerService.objects.filter(deadline__lt=now)
+    qs = qs.filter(customer__auto_renewal_service=auto_renewal)
+    if isinstance(customer, Customer):
+        qs = qs.filter(customer=customer)
+    if shard is not None:
+        qs = shard.filter(qs, customer_id_field="customer__pk")
+    return list(qs.order_by("pk").values_list("pk", flat=True))
+
+
+def _send_batch_signal(continued: list, stopped: list) -> None:
+    if continued or stopped:
+        custom_signals.customer_services_batch_post_billing.send(
+            sender=CustomerService,
+            continued=continued,
+            stopped=stopped
+        )
+
+
+def _continue_services_chunk(service_ids: Sequence[int], now: datetime) -> BillingRunResult:
+    continued = []
+    stopped = []
+    logs = []
+    balance_changes = {}
+    with transaction.atomic():
+        services = CustomerService.objects.filter(
+            pk__in=service_ids,
+            deadline__lte=now,
+            customer__auto_renewal_service=True
+        ).select_related("customer", "service")
+        for customer_service in services:
+            if not hasattr(customer_service, "customer"):
+                continue
+            customer = customer_service.customer
+            service = customer_service.service
+            if customer.balance >= service.cost:
+                # can continue service, as CustomerService.continue_for_customer
+                cost = float(service.cost)
+                old_balance = float(customer.balance)
+                customer_service.start_time = now
+                customer_service.assign_deadline()
+                logs.append(customer_service.make_continue_log(
+                    old_balance=old_balance,
+                    cost=cost
+                ))
+                customer.balance -= cost
+                balance_changes[customer.pk] = -cost
+                continued.append((customer_service, customer))
+            else:
+                # finish service otherwise, as Customer.stop_service with force_cost=0.0,
+                # zero force_cost means that cost to return is calculated.
+                cost_to_return = customer.calc_cost_to_return()
+                comment = _("Service '%(service_name)s' has expired") % {
+                    "service_name": service.title
+                }
+                if cost_to_return > 0.1:
+                    cost = cost_to_return
+                    balance_changes[customer.pk] = cost
+                else:
+                    cost = 0
+                logs.append(customer.make_balance_log(profile=None, cost=cost, comment=comment))
+                customer.balance += cost
+                stopped.append((customer_service, customer))
+
+        CustomerService.objects.bulk_update(
+            [customer_service for customer_service, _customer in continued],
+            fields=["start_time", "deadline"]
+        )
+        _change_balances(balance_changes)
+        CustomerLog.objects.bulk_create(logs)
+        if stopped:
+            CustomerService.objects.filter(
+                pk__in=[customer_service.pk for customer_service, _customer in stopped]
+            ).delete()
+    _send_batch_signal(continued=continued, stopped=stopped)
+    return BillingRunResult(continued=len(continued), stopped=len(stopped))
+
+
+def _finish_services_chunk(service_ids: Sequence[int], now: datetime,
+                           profile: Optional[UserProfile], comment: str) -> BillingRunResult:
+    stopped = []
+    with transaction.atomic():
+        services = CustomerService.objects.filter(
+            pk__in=service_ids,
+            deadline__lt=now,
+            customer__auto_renewal_service=False
+        ).select_related("customer", "service")
+        logs = []
+        for customer_service in services:
+            customer = customer_service.customer
+            logs.append(CustomerLog(
+                customer=customer,
+                cost=0,
+                author=profile if isinstance(profile, UserProfile) else None,
+                comment=comment % {
+                    "customer_name": customer.get_short_name(),
+                    "service_name": customer_service.service.title
+                },
+            ))
+            stopped.append((customer_service, customer))
+        CustomerLog.objects.bulk_create(logs)
+        if stopped:
+            CustomerService.objects.filter(
+                pk__in=[customer_service.pk for customer_service, _customer in stopped]
+            ).delete()
+    _send_batch_signal(continued=[], stopped=stopped)
+    return BillingRunResult(stopped=len(stopped))
+
+
+def continue_services_if_autoconnect(customer=None, now: Optional[datetime] = None,
+                                     chunk_size: int = BILLING_CHUNK_SIZE,
+                                     shard: Optional[BillingShard] = None) -> BillingRunResult:
+    """
+    Set-based CustomerManager.continue_services_if_autoconnect.
+    Continue expired services when customer has enough money,
+    finish them otherwise.
+    """
+    if now is None:
+        now = datetime.now()
+    result = BillingRunResult()
+    ids = _expired_services_ids(now=now, auto_renewal=True, customer=customer, shard=shard)
+    for chunk in _chunks(ids, chunk_size):
+        result += _continue_services_chunk(service_ids=chunk, now=now)
+    return result
+
+
+def finish_services_if_expired(profile: Optional[UserProfile] = None, comment=None,
+                               customer=None, now: Optional[datetime] = None,
+                               chunk_size: int = BILLING_CHUNK_SIZE,
+                               shard: Optional[BillingShard] = None) -> BillingRunResult:
+    """
+    Set-based CustomerManager.finish_services_if_expired.
+    Finish expired services, that has automatic connect disabled.
+    """
+    if comment is None:
+        comment = _("Service for customer %(customer_name)s with name '%(service_name)s' has expired")
+    if now is None:
+        now = datetime.now()
+    result = BillingRunResult()
+    ids = _expired_services_ids(now=now, auto_renewal=False, customer=customer, shard=shard)
+    for chunk in _chunks(ids, chunk_size):
+        result += _finish_services_chunk(
+            service_ids=chunk,
+            now=now,
+            profile=profile,
+            comment=comment
+        )
+    return result
@@ -28,3 +28,12 @@ customer_turns_on = Signal()
 # - sender: customers.Customer class
 # - instance: customers.Customer model instance
 customer_turns_off = Signal()
+
+# Signal raises once for each chunk of customer services, processed
+# by set-based billing run from customers.billing, instead of
+# per-service customer_service_pre_stop/customer_service_post_stop.
+# params:
+# - sender: customers.CustomerService class
+# - continued: list of (CustomerService, Customer) pairs, services that was continued
+# - stopped: list of (CustomerService, Customer) pairs, services that was finished
+customer_services_batch_post_billing = Signal()
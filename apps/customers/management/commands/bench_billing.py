@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, no_translations
+from django.db import connection, transaction
+
+from customers import billing
+from customers.models import Customer, CustomerService, CustomerLog
+from djing2.lib import QueryCounter
+from profiles.models import BaseAccount
+from services.custom_logic import SERVICE_CHOICE_DEFAULT, SERVICE_CHOICE_DP
+from services.models import Service
+
+USERNAME_PREFIX = "billingbench"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-customer and set-based billing runs on synthetic customers. "
+        "Data are created in transaction, that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", help="synthetic customers count", default=100000, type=int)
+        parser.add_argument("--chunk-size", help="set-based billing chunk size",
+                            default=billing.BILLING_CHUNK_SIZE, type=int)
+
+    @staticmethod
+    def _populate(count: int, now: datetime) -> None:
+        services = [
+            Service.objects.create(
+                title="%s%d" % (USERNAME_PREFIX, i), descr="", speed_in=10.0,
+                speed_out=10.0, cost=cost, calc_type=calc_type
+            ) for i, (cost, calc_type) in enumerate((
+                (300.0, SERVICE_CHOICE_DEFAULT),
+                (500.0, SERVICE_CHOICE_DEFAULT),
+                (700.0, SERVICE_CHOICE_DP),
+            ))
+        ]
+        customer_services = CustomerService.objects.bulk_create([
+            CustomerService(
+                service=services[i % len(services)],
+                start_time=now - timedelta(days=60),
+                deadline=now - timedelta(days=1),
+            ) for i in range(count)
+        ], batch_size=5000)
+        accounts = BaseAccount.objects.bulk_create([
+            BaseAccount(
+                username="%s%d" % (USERNAME_PREFIX, i),
+                fio="",
+                telephone="+7%010d" % i,
+                password="!",
+                is_active=True,
+            ) for i in range(count)
+        ], batch_size=5000)
+
+        # Multi-table inherited models can't be created by bulk_create,
+        # so insert only child part of them, parent rows already exists.
+        customers = []
+        for i, (account, customer_service) in enumerate(zip(accounts, customer_services)):
+            # 70% continues, 10% has not enough money, 20% without auto renewal
+            kind = i % 10
+            customers.append(Customer(
+                baseaccount_ptr_id=account.pk,
+                current_service_id=customer_service.pk,
+                balance=0.0 if kind == 7 else 1000.0,
+                auto_renewal_service=kind < 8,
+            ))
+        fields = Customer._meta.local_concrete_fields
+        for i in range(0, len(customers), 5000):
+            Customer._base_manager._insert(customers[i:i + 5000], fields=fields)
+
+    @staticmethod
+    def _snapshot() -> dict:
+        customers = Customer._base_manager.filter(username__startswith=USERNAME_PREFIX)
+        return {
+            "customers": sorted(customers.values_list(
+                "pk", "balance", "current_service__service_id",
+                "current_service__start_time", "current_service__deadline"
+            )),
+            "logs": sorted(CustomerLog.objects.filter(
+                customer__username__startswith=USERNAME_PREFIX
+            ).values_list(
+                "customer_id", "cost", "from_balance", "to_balance", "author_id", "comment"
+            )),
+        }
+
+    @staticmethod
+    def _run_legacy(now: datetime, chunk_size: int):
+        Customer.objects.continue_services_if_autoconnect(now=now)
+        Customer.objects.finish_services_if_expired(now=now)
+
+    @staticmethod
+    def _run_set_based(now: datetime, chunk_size: int):
+        billing.continue_services_if_autoconnect(now=now, chunk_size=chunk_size)
+        billing.finish_services_if_expired(now=now, chunk_size=chunk_size)
+
+    @no_translations
+    def handle(self, count: int, chunk_size: int, *args, **options):
+        now = datetime.now()
+        snapshots = {}
+        with transaction.atomic():
+            self.stdout.write("Creating %d customers..." % count)
+            self._populate(count=count, now=now)
+
+            for name, run in (("per-customer", self._run_legacy), ("set-based", self._run_set_based)):
+                sid = transaction.savepoint()
+                query_counter = QueryCounter()
+                with connection.execute_wrapper(query_counter):
+                    start_time = perf_counter()
+                    run(now=now, chunk_size=chunk_size)
+                    run_time = perf_counter() - start_time
+                snapshots[name] = self._snapshot()
+                transaction.savepoint_rollback(sid)
+                self.stdout.write("%s: %.3f s, %.1f customers/s, %d db queries" % (
+                    name, run_time, count / run_time if run_time else 0, query_counter.count
+                ))
+            transaction.set_rollback(True)
+
+        legacy, set_based = snapshots["per-customer"], snapshots["set-based"]
+        if legacy == set_based:
+            self.stdout.write(self.style.SUCCESS("Results are identical"))
+            return
+        for key in legacy:
+            diff = set(legacy[key]) ^ set(set_based[key])
+            if diff:
+                self.stdout.write(self.style.ERROR("%s differs in %d rows" % (key, len(diff))))
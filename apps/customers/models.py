@@ -208,18 +208,24 @@ class CustomerService(BaseAbstractModel):
             self.save(update_fields=["start_time", "deadline"])
             customer.save(update_fields=["balance"])
             # make log about it
-            uname = customer.get_short_name()
-            CustomerLog.objects.create(
-                customer=customer,
-                cost=-cost,
-                from_balance=old_balance,
-                to_balance=old_balance - cost,
-                comment=_("Automatic connect new service %(service_name)s "
-                          "for %(customer_name)s") % {
-                    "service_name": service.title,
-                    "customer_name": uname
-                }
-            )
+            self.make_continue_log(
+                old_balance=old_balance,
+                cost=cost
+            ).save(force_insert=True)
+
+    def make_continue_log(self, old_balance: float, cost: float) -> 'CustomerLog':
+        """Unsaved log entry about automatic continuation of service"""
+        return CustomerLog(
+            customer=self.customer,
+            cost=-cost,
+            from_balance=old_balance,
+            to_balance=old_balance - cost,
+            comment=_("Automatic connect new service %(service_name)s "
+                      "for %(customer_name)s") % {
+                "service_name": self.service.title,
+                "customer_name": self.customer.get_short_name()
+            }
+        )
 
     def __str__(self):
         return self.service.title
@@ -260,11 +266,17 @@ class CustomerLog(BaseAbstractModel):
 
 
 class CustomerQuerySet(RemoveFilterQuerySetMixin, models.QuerySet):
+    def select_list_related(self):
+        """Related objects of computed fields, that are shown in customers list"""
+        return self.select_related(
+            "current_service", "current_service__service", "group", "address",
+            "device", "last_connected_service", "customerrawpassword"
+        )
+
     def filter_customers_by_address(self, addr_id: int):
-        addr_ids_raw_query = AddressModel.objects.get_address_recursive_ids(addr_id=addr_id)
-        # FIXME: "Cannot filter a query once a slice has been taken."
+        """Customers with address in subtree of addr_id, by join with address closure table"""
         return self.remove_filter('address_id').filter(
-            address_id__in=addr_ids_raw_query
+            address__ancestor_links__ancestor_id=addr_id
         )
 
 
@@ -280,6 +292,14 @@ class CustomerManager(MyUserManager):
     def get_queryset(self):
         return super().get_queryset().filter(is_admin=False)
 
+    @staticmethod
+    def prefetch_list_fields(customers: list['Customer']) -> None:
+        """
+        Computed fields of customers page, that are not covered by
+        select_list_related, fetched for all customers at once.
+        """
+        AddressModel.objects.prefetch_full_titles(c.address for c in customers if c.address_id)
+
     def create_user(self, telephone, username, password=None, *args, **kwargs):
         if not telephone:
             raise ValueError(_("Users must have an telephone number"))
@@ -388,7 +408,8 @@ class CustomerManager(MyUserManager):
 
     @staticmethod
     def finish_services_if_expired(profile: Optional[UserProfile] = None,
-                                   comment=None, customer=None) -> None:
+                                   comment=None, customer=None,
+                                   now: Optional[datetime] = None) -> None:
         # TODO: test it
         """
         If customer service has expired, and automatic connect
@@ -396,11 +417,13 @@ class CustomerManager(MyUserManager):
         :param profile: Instance of profiles.models.UserProfile.
         :param comment: comment for log
         :param customer: This is Customer instance, if doing it for him alone
+        :param now: Current time, datetime.now() by default
         :return: nothing
         """
         if comment is None:
             comment = _("Service for customer %(customer_name)s with name '%(service_name)s' has expired")
-        now = datetime.now()
+        if now is None:
+            now = datetime.now()
         expired_services = CustomerService.objects.filter(
             deadline__lt=now,
             customer__auto_renewal_service=False
@@ -431,16 +454,18 @@ class CustomerManager(MyUserManager):
             expired_services.delete()
 
     @staticmethod
-    def continue_services_if_autoconnect(customer=None) -> None:
+    def continue_services_if_autoconnect(customer=None, now: Optional[datetime] = None) -> None:
         # TODO: test it
         """
         If customer service has expired and automatic connect
         is enabled, then update service start_time, deadline,
         and flush money from customer balance
         :param customer: This is Customer instance, if doing it for him alone
+        :param now: Current time, datetime.now() by default
         :return: nothing
         """
-        now = datetime.now()
+        if now is None:
+            now = datetime.now()
         expired_services = CustomerService.objects.select_related(
             'customer', 'service'
         ).filter(
@@ -609,9 +634,10 @@ class Customer(IAddressContaining, BaseAccount):
     def active_service(self) -> CustomerService:
         return self.current_service
 
-    def add_balance(self, profile: Optional[BaseAccount], cost: float, comment: str) -> None:
+    def make_balance_log(self, profile: Optional[BaseAccount], cost: float, comment: str) -> 'CustomerLog':
+        """Unsaved log entry about adding cost to balance"""
         old_balance = self.balance
-        CustomerLog.objects.create(
+        return CustomerLog(
             customer=self,
             cost=cost,
             from_balance=old_balance,
@@ -619,6 +645,9 @@ class Customer(IAddressContaining, BaseAccount):
             author=profile if isinstance(profile, UserProfile) else None,
             comment=re.sub(r"\W{1,128}", " ", comment)[:128] if comment else '-'
         )
+
+    def add_balance(self, profile: Optional[BaseAccount], cost: float, comment: str) -> None:
+        self.make_balance_log(profile=profile, cost=cost, comment=comment).save(force_insert=True)
         self.balance += cost
 
     def get_address(self):
@@ -374,6 +374,19 @@ class ActivityReportResponseSchema(BaseModel):
     commercial_customers: int
 
 
+class BillingShardMetricsSchema(BaseModel):
+    index: int = Field(title='Shard index')
+    count: int = Field(title='Shards count')
+    status: str
+    started: Optional[datetime] = None
+    finished: Optional[datetime] = None
+    duration: Optional[float] = Field(None, title='Duration in seconds')
+    continued: int = Field(0, title='Continued services count')
+    stopped: int = Field(0, title='Stopped services count')
+    finished_services: int = Field(0, title='Finished services count')
+    error: Optional[str] = None
+
+
 class GetAfkResponseSchema(BaseModel):
     timediff: str
     last_date: datetime
@@ -1,8 +1,12 @@
 from datetime import datetime
+from time import perf_counter
+from typing import Optional
 
+from customers import billing
 from customers.models import Customer, PeriodicPayForId
 from djing2.lib import LogicError
 from djing2.lib.logger import logger
+from djing2.lib.process_lock import process_try_lock_cm
 from djing2 import celery_app
 
 
@@ -43,12 +47,14 @@ def _manage_periodic_pays_run():
         pay.payment_for_service(now=now)
 
 
-def _manage_post_connect_services():
+def _manage_post_connect_services(shard: Optional[billing.BillingShard] = None):
     customers = (
         Customer.objects.filter(is_active=True, current_service=None, auto_renewal_service=True)
         .exclude(last_connected_service=None)
         .select_related("last_connected_service")
     )
+    if shard is not None:
+        customers = shard.filter(customers)
     for customer in customers.iterator():
         try:
             customer.connect_service_if_autoconnect()
@@ -57,14 +63,57 @@ def _manage_post_connect_services():
             pass
 
 
+def _manage_services_shard(shard: billing.BillingShard):
+    metrics = billing.BillingShardMetrics(
+        index=shard.index,
+        count=shard.count,
+        status='running',
+        started=datetime.now().isoformat()
+    )
+    metrics.save()
+    start_time = perf_counter()
+    try:
+        continued = billing.continue_services_if_autoconnect(shard=shard)
+        finished = billing.finish_services_if_expired(shard=shard)
+
+        # Post connect service
+        # connect service when autoconnect is True, and user have enough money
+        _manage_post_connect_services(shard=shard)
+    except Exception as err:
+        metrics.status = 'failed'
+        metrics.error = str(err)
+        raise
+    else:
+        metrics.status = 'done'
+        metrics.continued = continued.continued
+        metrics.stopped = continued.stopped
+        metrics.finished_services = finished.stopped
+    finally:
+        metrics.duration = perf_counter() - start_time
+        metrics.finished = datetime.now().isoformat()
+        metrics.save()
+        logger.info('Billing shard %d/%d %s in %.2f s: continued %d, stopped %d, finished %d' % (
+            shard.index, shard.count, metrics.status, metrics.duration,
+            metrics.continued, metrics.stopped, metrics.finished_services
+        ))
+
+
 @celery_app.task
-def manage_services():
-    Customer.objects.continue_services_if_autoconnect()
-    Customer.objects.finish_services_if_expired()
+def manage_services_shard(index: int, count: int):
+    shard = billing.BillingShard(index=index, count=count)
+    # Shards never overlap, but slow shard doesn't block others
+    with process_try_lock_cm(lock_name=shard.lock_name) as locked:
+        if not locked:
+            logger.warning('Billing shard %d/%d is still running, skip it' % (index, count))
+            return
+        _manage_services_shard(shard=shard)
+
 
-    # Post connect service
-    # connect service when autoconnect is True, and user have enough money
-    _manage_post_connect_services()
+@celery_app.task
+def manage_services():
+    shards_count = max(int(billing.BILLING_SHARDS), 1)
+    for index in range(shards_count):
+        manage_services_shard.delay(index=index, count=shards_count)
 
     _manage_periodic_pays_run()
 
@@ -4,10 +4,13 @@ from .customer import (
     UserTaskAPITestCase,
 )
 from .get_user_credentials_by_ip import GetUserCredentialsByIpTestCase
+from .billing import SetBasedBillingTestCase, ProcessTryLockTestCase
 
 __all__ = (
     "GetUserCredentialsByIpTestCase",
     "CustomerModelAPITestCase",
     "InvoiceForPaymentAPITestCase",
     "UserTaskAPITestCase",
+    "SetBasedBillingTestCase",
+    "ProcessTryLockTestCase",
 )
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.test import SimpleTestCase
+
+from customers import billing, custom_signals
+from customers.models import Customer, CustomerService, CustomerLog
+from djing2.lib import ProcessLocked
+from djing2.lib.process_lock import process_try_lock_cm
+from services.custom_logic import SERVICE_CHOICE_DEFAULT, SERVICE_CHOICE_DP
+from services.models import Service
+from .customer import CustomAPITestCase
+
+
+class SetBasedBillingTestCase(CustomAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = datetime.now()
+        services = [
+            Service.objects.create(
+                title="srv%d" % i, descr="", speed_in=10.0, speed_out=10.0,
+                cost=cost, calc_type=calc_type
+            ) for i, (cost, calc_type) in enumerate((
+                (10.0, SERVICE_CHOICE_DEFAULT),
+                (20.0, SERVICE_CHOICE_DP),
+            ))
+        ]
+        # (balance, auto_renewal_service, deadline delta)
+        variants = (
+            (100.0, True, -1),
+            (15.0, True, -1),
+            (0.0, True, -1),
+            (100.0, False, -1),
+            (0.0, False, -1),
+            (100.0, True, 3),
+            (100.0, False, 3),
+        )
+        self.customer_ids = []
+        for i in range(14):
+            balance, auto_renewal, days = variants[i % len(variants)]
+            customer_service = CustomerService.objects.create(
+                service=services[i % len(services)],
+                start_time=self.now - timedelta(days=60),
+                deadline=self.now + timedelta(days=days),
+            )
+            customer = Customer.objects.create_user(
+                telephone="+7978000%04d" % i,
+                username="billing%d" % i,
+                password="passw",
+                group=self.group,
+                is_active=True,
+                balance=balance,
+                auto_renewal_service=auto_renewal,
+                current_service=customer_service,
+            )
+            self.customer_ids.append(customer.pk)
+
+    def _snapshot(self):
+        return {
+            "customers": sorted(Customer.objects.filter(pk__in=self.customer_ids).values_list(
+                "pk", "balance", "current_service__service_id",
+                "current_service__start_time", "current_service__deadline"
+            )),
+            "logs": sorted(CustomerLog.objects.filter(customer_id__in=self.customer_ids).values_list(
+                "customer_id", "cost", "from_balance", "to_balance", "author_id", "comment"
+            )),
+        }
+
+    def _run_in_savepoint(self, run):
+        with transaction.atomic():
+            sid = transaction.savepoint()
+            run()
+            snapshot = self._snapshot()
+            transaction.savepoint_rollback(sid)
+        return snapshot
+
+    def test_same_results_as_per_customer_run(self):
+        def _legacy():
+            Customer.objects.continue_services_if_autoconnect(now=self.now)
+            Customer.objects.finish_services_if_expired(now=self.now)
+
+        def _set_based():
+            billing.continue_services_if_autoconnect(now=self.now, chunk_size=3)
+            billing.finish_services_if_expired(now=self.now, chunk_size=3)
+
+        legacy = self._run_in_savepoint(_legacy)
+        set_based = self._run_in_savepoint(_set_based)
+        self.assertEqual(legacy, set_based)
+        # something really changed
+        self.assertNotEqual(set_based, self._snapshot())
+
+    def test_counts(self):
+        continued = billing.continue_services_if_autoconnect(now=self.now)
+        finished = billing.finish_services_if_expired(now=self.now)
+        self.assertEqual(continued.continued, 3)
+        self.assertEqual(continued.stopped, 3)
+        self.assertEqual(finished.stopped, 4)
+        self.assertEqual(CustomerService.objects.filter(customer__pk__in=self.customer_ids).count(), 7)
+
+    def test_one_signal_per_chunk(self):
+        calls = []
+
+        def _receiver(sender, continued, stopped, **kwargs):
+            calls.append((len(continued), len(stopped)))
+
+        custom_signals.customer_services_batch_post_billing.connect(_receiver)
+        try:
+            billing.continue_services_if_autoconnect(now=self.now, chunk_size=4)
+        finally:
+            custom_signals.customer_services_batch_post_billing.disconnect(_receiver)
+        # 6 expired auto renewal services by chunks of 4
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(sum(c + s for c, s in calls), 6)
+
+    def test_shards_cover_all_customers_once(self):
+        shards = [billing.BillingShard(index=i, count=3) for i in range(3)]
+        customers = Customer.objects.filter(pk__in=self.customer_ids)
+        shard_ids = [set(shard.filter(customers).values_list("pk", flat=True)) for shard in shards]
+        self.assertEqual(sum(len(ids) for ids in shard_ids), len(self.customer_ids))
+        self.assertEqual(set().union(*shard_ids), set(self.customer_ids))
+
+        result = billing.BillingRunResult()
+        for shard in shards:
+            result += billing.continue_services_if_autoconnect(now=self.now, shard=shard)
+        self.assertEqual(result.continued, 3)
+        self.assertEqual(result.stopped, 3)
+
+
+class ProcessTryLockTestCase(SimpleTestCase):
+    def test_held_lock(self):
+        with process_try_lock_cm(lock_name="test_try_lock") as first:
+            with process_try_lock_cm(lock_name="test_try_lock") as second:
+                self.assertTrue(first)
+                self.assertFalse(second)
+        with process_try_lock_cm(lock_name="test_try_lock") as third:
+            self.assertTrue(third)
+
+    def test_block_error_not_changed(self):
+        with self.assertRaises(ConnectionResetError) as cm:
+            with process_try_lock_cm(lock_name="test_try_lock"):
+                raise ConnectionResetError
+        self.assertNotIsInstance(cm.exception, ProcessLocked)
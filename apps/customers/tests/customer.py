@@ -1,14 +1,22 @@
 from datetime import datetime, timedelta
 
 from django.contrib.sites.models import Site
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
 from django.utils.translation import gettext as _
 from rest_framework.settings import api_settings
 from rest_framework import status
 from customers import models
+from addresses import hierarchy_cache
+from addresses.models import AddressModel, AddressModelTypes
+from devices.models import Device
+from djing2.lib.fastapi.types import Pagination
 from groupapp.models import Group
 from services.models import Service
 from djing2.lib.fastapi.test import DjingTestCase
 from rest_framework.authtoken.models import Token
+from starlette.requests import Request
 
 
 class CustomAPITestCase(DjingTestCase):
@@ -226,3 +234,159 @@ class UserTaskAPITestCase(CustomAPITestCase):
         self.logout()
         r = self.get("/api/tasks/users/task_history/")
         self.assertEqual(r.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CustomerLogCursorPaginationTestCase(CustomAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.logs = [
+            models.CustomerLog.objects.create(
+                customer=self.customer, cost=float(i % 2), comment="log %d" % i
+            ) for i in range(5)
+        ]
+
+    def _get_page(self, url, params=None):
+        r = self.get(url, params)
+        self.assertEqual(r.status_code, status.HTTP_200_OK, msg=r.text)
+        return r.json()
+
+    def _walk(self, params):
+        url = "/api/customers/customer-log/"
+        ids = []
+        page = self._get_page(url, dict(params, customer=self.customer.pk, page_size=2))
+        ids.extend(i["id"] for i in page["results"])
+        while page["next"]:
+            page = self._get_page(page["next"])
+            ids.extend(i["id"] for i in page["results"])
+        return ids, page
+
+    def test_walk_all_pages(self):
+        ids, last_page = self._walk({})
+        self.assertListEqual(ids, sorted((log.pk for log in self.logs), reverse=True))
+        # Log counts only by request
+        self.assertIsNone(last_page["count"])
+        self.assertIsNotNone(last_page["previous"])
+
+    def test_count_on_demand(self):
+        page = self._get_page("/api/customers/customer-log/", {
+            "customer": self.customer.pk, "page_size": 2, "with_count": True
+        })
+        self.assertEqual(page["count"], 5)
+
+    def test_walk_by_ordering_with_equal_values(self):
+        ids, _ = self._walk({"ordering": "cost"})
+        expected = sorted(self.logs, key=lambda log: (log.cost, log.pk))
+        self.assertListEqual(ids, [log.pk for log in expected])
+
+    def test_previous_page(self):
+        url = "/api/customers/customer-log/"
+        first = self._get_page(url, {"customer": self.customer.pk, "page_size": 2})
+        self.assertIsNone(first["previous"])
+        second = self._get_page(first["next"])
+        back = self._get_page(second["previous"])
+        self.assertListEqual(
+            [i["id"] for i in back["results"]],
+            [i["id"] for i in first["results"]]
+        )
+
+    def test_page_number(self):
+        r = self._get_page("/api/customers/customer-log/", {
+            "customer": self.customer.pk, "page_size": 2, "page": 2
+        })
+        expected = sorted((log.pk for log in self.logs), reverse=True)[2:4]
+        self.assertListEqual([i["id"] for i in r["results"]], expected)
+        self.assertIn("page=3", r["next"])
+        self.assertIn("page=1", r["previous"])
+
+    def test_ordering_by_related_field(self):
+        r = self._get_page("/api/customers/customer-log/", {
+            "customer": self.customer.pk, "page_size": 2, "ordering": "author__username"
+        })
+        self.assertEqual(len(r["results"]), 2)
+        self.assertIn("page=2", r["next"])
+
+    def test_bad_cursor(self):
+        r = self.get("/api/customers/customer-log/", {
+            "customer": self.customer.pk,
+            "cursor": "not a cursor"
+        })
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CustomerListComputedFieldsTestCase(CustomAPITestCase):
+    def setUp(self):
+        super().setUp()
+        locality = AddressModel.objects.create(
+            address_type=AddressModelTypes.LOCALITY,
+            fias_address_level=4,
+            fias_address_type=405,
+            title="Some city"
+        )
+        street = AddressModel.objects.create(
+            parent_addr=locality,
+            address_type=AddressModelTypes.STREET,
+            fias_address_level=5,
+            fias_address_type=529,
+            title="Street12"
+        )
+        for i in range(5):
+            house = AddressModel.objects.create(
+                parent_addr=street,
+                address_type=AddressModelTypes.HOUSE,
+                fias_address_level=6,
+                fias_address_type=601,
+                title=str(i)
+            )
+            device = Device.objects.create(
+                mac_addr="12:13:14:15:16:%02x" % i,
+                comment="device %d" % i
+            )
+            customer = models.Customer.objects.create_user(
+                telephone="+7978000000%d" % i, username="listcusto%d" % i, password="passw",
+                group=self.group, address=house, device=device, is_active=True
+            )
+            models.CustomerRawPassword.objects.create(customer=customer, passw_text="passw%d" % i)
+
+    def _get_customers_page(self, page_size: int):
+        from customers.views.admin_side import get_customers
+
+        # Endpoint is called in this thread, so its queries are captured.
+        # Address titles are not cached, as on first request.
+        hierarchy_cache.invalidate(AddressModel.objects.values_list("pk", flat=True))
+        request = Request({
+            "type": "http", "method": "GET", "scheme": "http", "path": "/api/customers/",
+            "query_string": b"", "headers": [], "server": ("example.com", 80),
+        })
+        with CaptureQueriesContext(connection) as queries:
+            r = get_customers(
+                request=request,
+                pagination=Pagination(page_size=page_size),
+                curr_site=self.site,
+                auth=(self.admin, None),
+                filter_fields_q=Q(),
+                search_filter_q=Q(),
+            )
+        return [c.dict() for c in r.results], len(queries)
+
+    def test_computed_fields_queries_count(self):
+        page, queries_count = self._get_customers_page(page_size=6)
+        small_page, small_queries_count = self._get_customers_page(page_size=2)
+        # computed fields of all customers are fetched at once
+        self.assertEqual(queries_count, small_queries_count)
+        self.assertEqual(len(page), 6)
+        self.assertEqual(len(small_page), 2)
+        by_username = {c["username"]: c for c in page}
+        listcusto = by_username["listcusto3"]
+        self.assertEqual(listcusto["address_title"], "г Some city, ул Street12, д. 3")
+        self.assertEqual(listcusto["device_comment"], "device 3")
+        self.assertEqual(listcusto["raw_password"], "passw3")
+        self.assertEqual(listcusto["group_title"], "test group")
+        self.assertEqual(by_username["custo1"]["address_title"], "-")
+
+    def test_batch_titles_equal_single(self):
+        customer = models.Customer.objects.get(username="listcusto1")
+        titles = AddressModel.objects.get_addresses_full_titles([customer.address_id])
+        self.assertEqual(
+            titles[customer.address_id],
+            AddressModel.objects.get_address_full_title(customer.address_id)
+        )
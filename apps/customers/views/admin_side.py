@@ -1,7 +1,8 @@
+from dataclasses import asdict
 from datetime import datetime
 from typing import Optional
 
-from customers import models
+from customers import models, billing
 from customers.views.view_decorators import catch_customers_errs
 from django.contrib.auth.hashers import make_password
 from django.contrib.sites.models import Site
@@ -14,7 +15,7 @@ from djing2.lib.fastapi.general_filter import general_filter_queryset
 from djing2.lib.fastapi.pagination import paginate_qs_path_decorator
 from djing2.lib.fastapi.perms import permission_check_dependency, check_perm, filter_qs_by_rights
 from djing2.lib.fastapi.sites_depend import sites_dependency
-from djing2.lib.fastapi.types import IListResponse, Pagination, NOT_FOUND
+from djing2.lib.fastapi.types import IListResponse, Pagination, NOT_FOUND, CountMode
 from djing2.lib.fastapi.utils import get_object_or_404, AllOptionalMetaclass, create_get_initial_route
 from djing2.lib.filters import filter_qs_by_fields_dependency
 from djing2.lib.filters import search_qs_by_fields_dependency
@@ -44,7 +45,12 @@ router = APIRouter(
 @router.get('/customer-log/', response_model=IListResponse[schemas.CustomerLogModelSchema],
             response_model_exclude_none=True
             )
-@paginate_qs_path_decorator(schema=schemas.CustomerLogModelSchema, db_model=models.CustomerLog)
+@paginate_qs_path_decorator(
+    schema=schemas.CustomerLogModelSchema,
+    db_model=models.CustomerLog,
+    cursor_pagination=True,
+    count_mode=CountMode.ON_DEMAND,
+)
 def get_customer_payment_log(request: Request,
                              customer: int,
                              curr_site: Site = Depends(sites_dependency),
@@ -174,6 +180,13 @@ def get_activity_report():
     return r
 
 
+@router.get('/billing_shards/',
+            response_model=list[schemas.BillingShardMetricsSchema],
+            dependencies=[Depends(is_superuser_auth_dependency)])
+def get_billing_shards_metrics():
+    return [schemas.BillingShardMetricsSchema(**asdict(m)) for m in billing.BillingShardMetrics.load_all()]
+
+
 @router.get('/generate_password/', response_model=str)
 def generate_password_for_customer():
     rp = generate_random_password()
@@ -221,7 +234,11 @@ class CustomerResponseModelSchema(schemas.CustomerModelSchema, metaclass=AllOpti
             response_model_exclude_none=True,
             response_model=IListResponse[CustomerResponseModelSchema]
             )
-@paginate_qs_path_decorator(schema=CustomerResponseModelSchema, db_model=models.Customer)
+@paginate_qs_path_decorator(
+    schema=CustomerResponseModelSchema,
+    db_model=models.Customer,
+    prefetch_rows=models.Customer.objects.prefetch_list_fields
+)
 def get_customers_bums(
     curr_site: Site = Depends(sites_dependency),
     auth: TOKEN_RESULT_TYPE = Depends(is_admin_auth_dependency)
@@ -230,7 +247,7 @@ def get_customers_bums(
 
     curr_user, token = auth
     customers_queryset = general_filter_queryset(
-        qs_or_model=models.Customer,
+        qs_or_model=models.Customer.objects.select_list_related(),
         curr_user=curr_user,
         curr_site=curr_site,
         perm_codename='customers.view_customer'
@@ -1040,7 +1057,13 @@ def create_customer_profile(new_customer_data: schemas.CustomerSchema,
             response_model=IListResponse[CustomerResponseModelSchema],
             response_model_exclude_none=True
             )
-@paginate_qs_path_decorator(schema=CustomerResponseModelSchema, db_model=models.Customer)
+@paginate_qs_path_decorator(
+    schema=CustomerResponseModelSchema,
+    db_model=models.Customer,
+    cursor_pagination=True,
+    count_mode=CountMode.ESTIMATE,
+    prefetch_rows=models.Customer.objects.prefetch_list_fields
+)
 def get_customers(request: Request,
                   street: Optional[int] = None, house: Optional[int] = None,
                   address: Optional[int] = None,
@@ -1060,10 +1083,7 @@ def get_customers(request: Request,
                   ):
     curr_user, token = auth
 
-    _customer_base_query = models.Customer.objects.select_related(
-        "current_service", "current_service__service", "group",
-        "address", "address__parent_addr"
-    )
+    _customer_base_query = models.Customer.objects.select_list_related()
 
     queryset = general_filter_queryset(
         qs_or_model=_customer_base_query,
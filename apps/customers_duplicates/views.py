@@ -28,8 +28,10 @@ def get_all_address_duplicates(minimum_duplications: int = 2):
         customer_count=Count('address'),
         customer_ids=ArrayAgg('pk')
     ).filter(customer_count__gte=minimum_duplications)
-    for c in qs.iterator():
-        addr_title = AddressModel.objects.get_address_full_title(
-            c['address']
-        )
+    duplicates = list(qs.iterator())
+    addr_titles = AddressModel.objects.get_addresses_full_titles(
+        c['address'] for c in duplicates if c['address'] is not None
+    )
+    for c in duplicates:
+        addr_title = addr_titles.get(c['address'], '')
         yield DuplicateResult(**c, address_full_title=addr_title, address_title=c['address__title'])
@@ -1,11 +1,54 @@
+import os
 from abc import ABC, abstractmethod
-from typing import Generator, Optional, Any, Type
+from contextlib import contextmanager
+from typing import Generator, Optional, Any, Type, Iterable
 from easysnmp import Session, EasySNMPConnectionError
 from django.utils.translation import gettext
 from devices.device_config.base import (
     DeviceImplementationError, DeviceConnectionError,
     OptionalScriptCallResult, Vlans
 )
+from devices.device_config.snmp_pool import SNMPSessionPool
+
+
+# How many variables are requested by one GETBULK pdu
+BULK_MAX_REPETITIONS = 50
+
+_SNMP_NO_VALUE_TYPES = ('NOSUCHOBJECT', 'NOSUCHINSTANCE', 'ENDOFMIBVIEW')
+
+
+def snmp_oid_index(column_oid: str, oid: str) -> Optional[str]:
+    """
+    Row index of table cell, i.e. '5' for ifDescr column
+    '.1.3.6.1.2.1.2.2.1.2' and cell oid '.1.3.6.1.2.1.2.2.1.2.5'.
+    :return: None if oid is not from that column.
+    """
+    column_oid = column_oid.strip('.')
+    oid = oid.strip('.')
+    if oid.startswith('iso.'):
+        oid = '1.%s' % oid[4:]
+    if not oid.startswith(column_oid + '.'):
+        return None
+    return oid[len(column_oid) + 1:]
+
+
+def join_snmp_columns(columns: dict[str, Iterable[tuple[str, Any]]],
+                      index_parts: Optional[int] = None) -> dict[str, dict[str, Any]]:
+    """
+    Join table columns by row index.
+
+    :param columns: column name to (row index, value) pairs.
+    :param index_parts: Use only first index parts for joining, when some
+                        columns have longer indexes, i.e. per onu port.
+    :return: row index to dict of column name to value. Missing cells are absent.
+    """
+    rows: dict[str, dict[str, Any]] = {}
+    for name, cells in columns.items():
+        for index, value in cells:
+            if index_parts is not None:
+                index = '.'.join(index.split('.')[:index_parts])
+            rows.setdefault(index, {}).setdefault(name, value)
+    return rows
 
 
 class SNMPWorker(Session):
@@ -21,7 +64,11 @@ class SNMPWorker(Session):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        del self.sess_ptr
+        self.close()
+
+    def close(self) -> None:
+        if hasattr(self, 'sess_ptr'):
+            del self.sess_ptr
 
     def set_int_value(self, oid: str, value: int) -> bool:
         try:
@@ -58,14 +105,59 @@ class SNMPWorker(Session):
         except EasySNMPConnectionError as err:
             raise DeviceConnectionError(err) from err
 
+    def bulk_walk_column(self, oid: str,
+                         max_repetitions: int = BULK_MAX_REPETITIONS) -> Generator[tuple[str, Any], None, None]:
+        """
+        Read whole table column by GETBULK requests, many cells in one pdu.
+        :return: (row index, value) pairs.
+        """
+        # Numeric oids are required to find row index
+        use_numeric = self.use_numeric
+        self.use_numeric = True
+        try:
+            if self.version == 1:
+                # SNMPv1 has no GETBULK
+                variables = self.walk(oid)
+            else:
+                variables = self.bulkwalk(oid, max_repetitions=max_repetitions)
+        except EasySNMPConnectionError as err:
+            raise DeviceConnectionError(err) from err
+        finally:
+            self.use_numeric = use_numeric
+        for v in variables:
+            if v.snmp_type in _SNMP_NO_VALUE_TYPES:
+                continue
+            full_oid = '%s.%s' % (v.oid, v.oid_index) if v.oid_index else v.oid
+            index = snmp_oid_index(oid, full_oid)
+            if index is not None:
+                yield index, v.value
+
+    def get_table(self, columns: dict[str, str], index_parts: Optional[int] = None,
+                  max_repetitions: int = BULK_MAX_REPETITIONS) -> dict[str, dict[str, Any]]:
+        """
+        Read table columns by GETBULK and join them by row index in memory.
+
+        :param columns: column name to column oid.
+        :param index_parts: see join_snmp_columns.
+        :return: row index to dict of column name to value.
+        """
+        return join_snmp_columns({
+            name: self.bulk_walk_column(oid, max_repetitions=max_repetitions)
+            for name, oid in columns.items()
+        }, index_parts=index_parts)
+
+    @staticmethod
+    def item_value(v) -> Any:
+        """Value as returned by get_item"""
+        if isinstance(v, str):
+            if v and v != "NOSUCHINSTANCE":
+                return v.encode()
+            return None
+        return v
+
     def get_item(self, oid) -> Any:
         try:
-            v = self.get(oid).value
-            if isinstance(v, str):
-                if v and v != "NOSUCHINSTANCE":
-                    return v.encode()
-                return None
-            return v
+            return self.item_value(self.get(oid).value)
         except EasySNMPConnectionError as err:
             raise DeviceConnectionError(err) from err
 
@@ -81,6 +173,11 @@ class SNMPWorker(Session):
             raise DeviceConnectionError(err) from err
 
 
+snmp_pool = SNMPSessionPool(create=SNMPWorker)
+# Sessions of parent process must not be used in forked celery workers
+os.register_at_fork(after_in_child=snmp_pool.reset)
+
+
 class DeviceConfigType:
     title: str
     short_code: str
@@ -135,9 +232,25 @@ class BaseDeviceStrategy(ABC):
 
     model_instance = None
 
+    # Extra snmp table columns for devices.poller, column name to oid
+    poll_columns: dict[str, str] = {}
+
     def __init__(self, model_instance):
         self.model_instance = model_instance
 
+    @contextmanager
+    def snmp_session(self, dev=None) -> Generator[SNMPWorker, None, None]:
+        """
+        Pooled snmp session to device, that is model_instance by default.
+        For onu it is parent olt, i.e. self.snmp_session(dev.parent_dev).
+        """
+        if dev is None:
+            dev = self.model_instance
+        if not dev.ip_address:
+            raise DeviceImplementationError(gettext("Hostname required for snmp"))
+        with snmp_pool.session(host=dev.ip_address, community=str(dev.man_passw)) as snmp:
+            yield snmp
+
     @abstractmethod
     def get_device_name(self) -> str:
         """Return device name by snmp"""
@@ -218,8 +331,9 @@ class BaseDeviceStrategyContext(ABC):
         """Can connect device to customer"""
         return self._current_dev_manager.has_attachable_to_customer
 
-    # def get_snmp_worker(self):
-    #     return BaseSNMPWorker(hostname=)
+    def snmp_session(self, dev=None):
+        """Pooled snmp session, see BaseDeviceStrategy.snmp_session"""
+        return self._current_dev_manager.snmp_session(dev)
 
     def get_device_name(self) -> str:
         """Return device name by snmp"""
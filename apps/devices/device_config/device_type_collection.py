@@ -59,3 +59,5 @@ def _check_device_config_types():
 
 
 _check_device_config_types()
+
+DEVICE_SWITCH_TYPE_CODES = [uniq_num for uniq_num, dev_klass in DEVICE_TYPES if dev_klass in DEVICE_SWITCH_TYPES]
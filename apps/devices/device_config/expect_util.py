@@ -1,9 +1,26 @@
+import atexit
+import os
 import sys
-from typing import Union
+import threading
+from contextlib import contextmanager
+from time import monotonic
+from typing import Union, Callable, Generator, Optional
 
+from django.conf import settings
+from pexpect import ExceptionPexpect
 from pexpect.pty_spawn import spawn, TIMEOUT
 
-from devices.device_config.base import DeviceTimeoutError
+from devices.device_config.base import (
+    DeviceTimeoutError, DeviceConnectionError,
+    DeviceConsoleError, DeviceConfigurationError
+)
+from djing2.lib.process_lock import process_lock_cm
+
+
+# Logged in cli session, that is idle longer, is closed
+CLI_SESSION_IDLE_TIMEOUT = getattr(settings, "CLI_SESSION_IDLE_TIMEOUT", 120)
+# Session, that is idle longer, is checked by empty command before reuse
+CLI_SESSION_CHECK_INTERVAL = getattr(settings, "CLI_SESSION_CHECK_INTERVAL", 20)
 
 
 class ExpectValidationError(ValueError):
@@ -35,3 +52,173 @@ class MySpawn(spawn):
 
     def get_lines_before(self):
         return self.before.split("\r\n")
+
+
+# Errors, after that session is still in exec mode and may be reused
+_KEEP_SESSION_ERRORS = (DeviceConsoleError, DeviceConfigurationError, ExpectValidationError)
+
+
+class _CliSession:
+    __slots__ = ("ch", "prompt", "last_used", "lock")
+
+    def __init__(self):
+        self.ch: Optional[MySpawn] = None
+        self.prompt = ""
+        self.last_used = monotonic()
+        self.lock = threading.Lock()
+
+    def close(self) -> None:
+        ch, self.ch = self.ch, None
+        if ch is not None and not ch.closed:
+            try:
+                ch.sendline("exit")
+            except (OSError, ExceptionPexpect):
+                pass
+            ch.close()
+
+
+class CliSessionManager:
+    """
+    Keeps one logged in cli session for each device, i.e. OLT.
+    Commands to one device are serialized by device lock, that is held
+    across processes, commands to different devices are not blocked.
+    Idle sessions are closed by background thread, that runs while any
+    session is open, so they do not hold vty lines of device.
+    """
+
+    def __init__(self, idle_timeout: float = CLI_SESSION_IDLE_TIMEOUT,
+                 check_interval: float = CLI_SESSION_CHECK_INTERVAL):
+        self.idle_timeout = float(idle_timeout)
+        self.check_interval = float(check_interval)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget all sessions without closing them.
+        Called in forked child, telnet processes belongs to parent process.
+        """
+        self._lock = threading.Lock()
+        self._sessions: dict[str, _CliSession] = {}
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _get(self, key: str) -> _CliSession:
+        with self._lock:
+            sess = self._sessions.get(key)
+            if sess is None:
+                sess = self._sessions[key] = _CliSession()
+            return sess
+
+    def close_idle(self) -> None:
+        now = monotonic()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for sess in sessions:
+            if sess.ch is not None and now - sess.last_used > self.idle_timeout:
+                # busy session is not idle
+                if sess.lock.acquire(blocking=False):
+                    try:
+                        sess.close()
+                    finally:
+                        sess.lock.release()
+
+    def _reap(self, stop: threading.Event) -> None:
+        while not stop.wait(self.check_interval):
+            self.close_idle()
+            with self._lock:
+                if self._reaper is not threading.current_thread():
+                    # Sessions were closed, and new reaper is started
+                    return
+                if all(s.ch is None for s in self._sessions.values()):
+                    # Started again with next session
+                    self._reaper = None
+                    return
+
+    def _start_reaper(self) -> None:
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(
+                    target=self._reap, args=(self._stop,), name="cli-sessions-reaper", daemon=True
+                )
+                self._reaper.start()
+
+    def _alive(self, sess: _CliSession) -> bool:
+        ch = sess.ch
+        if ch is None or ch.closed or not ch.isalive():
+            return False
+        idle = monotonic() - sess.last_used
+        if idle > self.idle_timeout:
+            return False
+        if idle < self.check_interval:
+            return True
+        try:
+            ch.sendline("")
+            ch.expect_exact("%s#" % sess.prompt, timeout=5)
+        except (OSError, ExceptionPexpect):
+            return False
+        return True
+
+    @contextmanager
+    def session(self, key: str, login: Callable[[], MySpawn], prompt: str) -> Generator[MySpawn, None, None]:
+        """
+        Logged in session to device in exec mode, it must be left in exec mode.
+        Session is closed when block fails, next call logs in again.
+
+        :param key: Device identity, i.e. ip address.
+        :param login: Makes new logged in session.
+        :param prompt: Device prompt without mode suffix.
+        """
+        sess = self._get(key)
+        with sess.lock, process_lock_cm(lock_name="cli_%s" % key, wait=True):
+            try:
+                if not self._alive(sess):
+                    sess.close()
+                    sess.ch = login()
+                    sess.prompt = prompt
+                yield sess.ch
+            except OSError as err:
+                sess.close()
+                # process_lock_cm would report any OSError as ProcessLocked
+                raise DeviceConnectionError(err) from err
+            except _KEEP_SESSION_ERRORS:
+                # Device answered as expected, but operation is not possible
+                raise
+            except BaseException:
+                sess.close()
+                raise
+            finally:
+                sess.last_used = monotonic()
+        if sess.ch is not None:
+            self._start_reaper()
+
+    def close(self) -> None:
+        """Close all sessions, i.e. on process shutdown"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions = {}
+            self._stop.set()
+            self._stop = threading.Event()
+            self._reaper = None
+        for sess in sessions:
+            with sess.lock:
+                sess.close()
+
+
+cli_sessions = CliSessionManager()
+os.register_at_fork(after_in_child=cli_sessions.reset)
+atexit.register(cli_sessions.close)
+
+
+@contextmanager
+def config_mode(ch: MySpawn, prompt: str) -> Generator[MySpawn, None, None]:
+    """
+    Enter to global config mode, i.e. 'conf t', and exit to exec mode after
+    block. Several operations in one block save enter and exit round trips.
+    """
+    ch.do_cmd("conf t", "%s(config)#" % prompt)
+    try:
+        yield ch
+    except _KEEP_SESSION_ERRORS:
+        ch.do_cmd("end", "%s#" % prompt)
+        raise
+    ch.do_cmd("exit", "%s#" % prompt)
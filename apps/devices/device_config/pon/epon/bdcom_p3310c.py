@@ -4,7 +4,6 @@ from typing import Generator
 from easysnmp import EasySNMPTimeoutError
 from django.utils.translation import gettext_lazy as _
 
-from devices.device_config.base_device_strategy import SNMPWorker
 from djing2.lib import safe_int, RuTimedelta, safe_float, macbin2str
 from ...base import Vlans, Vlan
 from ...pon.pon_device_strategy import PonOltDeviceStrategy, PonOLTDeviceStrategyContext, FiberDataClass
@@ -23,6 +22,17 @@ class ONUdevPort:
 
 _DEVICE_UNIQUE_CODE = 2
 
+# Columns, that are read for scan_onu_list, rows are indexed by onu interface number
+ONU_TABLE_COLUMNS = {
+    "status": ".1.3.6.1.4.1.3320.101.10.1.1.26",
+    "signal": ".1.3.6.1.4.1.3320.101.10.5.1.5",
+    "mac": ".1.3.6.1.4.1.3320.101.10.1.1.3",
+    # ifDescr
+    "name": ".1.3.6.1.2.1.2.2.1.2",
+    # ifLastChange
+    "uptime": ".1.3.6.1.2.1.2.2.1.9",
+}
+
 
 @dataclass
 class BdcomFiberDataClass(FiberDataClass):
@@ -34,6 +44,10 @@ class BDCOM_P3310C(PonOltDeviceStrategy):
     description = "PON OLT"
     is_use_device_port = False
     ports_len = 4
+    poll_columns = {
+        "onu_signal": ONU_TABLE_COLUMNS["signal"],
+        "onu_status": ONU_TABLE_COLUMNS["status"],
+    }
 
     def scan_onu_list(self) -> Generator[ONUdevPort, None, None]:
         """
@@ -41,72 +55,71 @@ class BDCOM_P3310C(PonOltDeviceStrategy):
         If long operation then return the generator of ports count first,
         then max chunk size, and ports in next in generations
         """
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        # numbers
-        # fiber_nums = (safe_int(i) for i in self.get_list('.1.3.6.1.4.1.3320.101.6.1.1.1'))
-        # numbers
-        fiber_onu_counts = snmp.get_list(".1.3.6.1.4.1.3320.101.6.1.1.2")
-
-        # comma separated strings, remember to remove empty elements
-        fiber_onu_id_nums = snmp.get_list_keyval(".1.3.6.1.4.1.3320.101.6.1.1.23")
-
-        # All onu's count
-        yield sum(safe_int(i) for i in fiber_onu_counts)
-
-        # chunk max size
-        yield 200
-
-        try:
-            for fiber_onu_num, fiber_id in fiber_onu_id_nums:
-                for onu_num in fiber_onu_num.split(b","):
-                    if not onu_num:
-                        continue
-                    onu_num = safe_int(onu_num)
-                    if onu_num == 0:
-                        continue
-                    status = safe_int(snmp.get_item(".1.3.6.1.4.1.3320.101.10.1.1.26.%d" % onu_num))
-                    signal = safe_float(snmp.get_item(".1.3.6.1.4.1.3320.101.10.5.1.5.%d" % onu_num))
-                    mac = snmp.get(".1.3.6.1.4.1.3320.101.10.1.1.3.%d" % onu_num)
-                    yield ONUdevPort(
-                        num=onu_num,
-                        name=snmp.get_item(".1.3.6.1.2.1.2.2.1.2.%d" % onu_num),
-                        status=status == 3,
-                        mac=macbin2str(mac.value),
-                        signal=signal / 10 if signal else "—",
-                        uptime=safe_int(snmp.get_item(".1.3.6.1.2.1.2.2.1.9.%d" % onu_num)),
-                        fiberid=safe_int(fiber_id),
-                    )
-        except EasySNMPTimeoutError as e:
-            raise EasySNMPTimeoutError("{} ({})".format(_("wait for a reply from the SNMP Timeout"), e)) from e
+        with self.snmp_session() as snmp:
+            # numbers
+            # fiber_nums = (safe_int(i) for i in self.get_list('.1.3.6.1.4.1.3320.101.6.1.1.1'))
+            # numbers
+            fiber_onu_counts = snmp.get_list(".1.3.6.1.4.1.3320.101.6.1.1.2")
+
+            # comma separated strings, remember to remove empty elements
+            fiber_onu_id_nums = snmp.get_list_keyval(".1.3.6.1.4.1.3320.101.6.1.1.23")
+
+            # All onu's count
+            yield sum(safe_int(i) for i in fiber_onu_counts)
+
+            # chunk max size
+            yield 200
+
+            try:
+                # Whole columns are read by few GETBULK requests,
+                # instead of separate requests for each onu.
+                onu_table = snmp.get_table(ONU_TABLE_COLUMNS)
+                for fiber_onu_num, fiber_id in fiber_onu_id_nums:
+                    for onu_num in fiber_onu_num.split(b","):
+                        if not onu_num:
+                            continue
+                        onu_num = safe_int(onu_num)
+                        if onu_num == 0:
+                            continue
+                        onu = onu_table.get(str(onu_num), {})
+                        status = safe_int(snmp.item_value(onu.get("status")))
+                        signal = safe_float(snmp.item_value(onu.get("signal")))
+                        yield ONUdevPort(
+                            num=onu_num,
+                            name=snmp.item_value(onu.get("name")),
+                            status=status == 3,
+                            mac=macbin2str(onu.get("mac")),
+                            signal=signal / 10 if signal else "—",
+                            uptime=safe_int(snmp.item_value(onu.get("uptime"))),
+                            fiberid=safe_int(fiber_id),
+                        )
+            except EasySNMPTimeoutError as e:
+                raise EasySNMPTimeoutError("{} ({})".format(_("wait for a reply from the SNMP Timeout"), e)) from e
 
     def get_fibers(self) -> tuple[BdcomFiberDataClass]:
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        fibers = tuple(
-            BdcomFiberDataClass(
-                fb_id=int(fiber_id),
-                fb_name="EPON0/%d" % fiber_num,
-                fb_active_onu=safe_int(snmp.get_item(".1.3.6.1.4.1.3320.101.6.1.1.21.%d" % int(fiber_id))),
-                # 'fb_onu_ids': tuple(int(i) for i in self.get_item_plain(
-                #     '.1.3.6.1.4.1.3320.101.6.1.1.23.%d' % int(fiber_id)).split(',') if i
-                # ),
-                fb_onu_num=safe_int(registered_onu_count),
-            )
-            for fiber_num, (registered_onu_count, fiber_id) in enumerate(
-                snmp.get_list_keyval(".1.3.6.1.4.1.3320.101.6.1.1.2"), 1
+        with self.snmp_session() as snmp:
+            fibers = tuple(
+                BdcomFiberDataClass(
+                    fb_id=int(fiber_id),
+                    fb_name="EPON0/%d" % fiber_num,
+                    fb_active_onu=safe_int(snmp.get_item(".1.3.6.1.4.1.3320.101.6.1.1.21.%d" % int(fiber_id))),
+                    # 'fb_onu_ids': tuple(int(i) for i in self.get_item_plain(
+                    #     '.1.3.6.1.4.1.3320.101.6.1.1.23.%d' % int(fiber_id)).split(',') if i
+                    # ),
+                    fb_onu_num=safe_int(registered_onu_count),
+                )
+                for fiber_num, (registered_onu_count, fiber_id) in enumerate(
+                    snmp.get_list_keyval(".1.3.6.1.4.1.3320.101.6.1.1.2"), 1
+                )
             )
-        )
-        return fibers
+            return fibers
 
     def get_device_name(self):
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             return snmp.get_item(".1.3.6.1.2.1.1.5.0")
 
     def get_uptime(self) -> RuTimedelta:
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             up_timestamp = safe_int(snmp.get_item(".1.3.6.1.2.1.1.9.1.4.1"))
             tm = RuTimedelta(seconds=up_timestamp / 100)
             return tm
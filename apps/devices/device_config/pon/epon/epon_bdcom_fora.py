@@ -11,7 +11,6 @@ from devices.device_config.base import (
 from devices.device_config.expect_util import ExpectValidationError
 from .epon_bdcom_expect import remove_from_olt
 from ..pon_device_strategy import PonOnuDeviceStrategy, PonONUDeviceStrategyContext
-from ...base_device_strategy import SNMPWorker
 
 _DEVICE_UNIQUE_CODE = 3
 
@@ -63,51 +62,51 @@ class EPON_BDCOM_FORA(PonOnuDeviceStrategy):
         if not parent:
             return {}
         status_map = {3: "ok", 2: "down"}
-        snmp = SNMPWorker(hostname=parent.ip_address, community=str(parent.man_passw))
-        try:
-            # https://www.zabbix.com/documentation/1.8/ru/manual/advanced_snmp
-            status = safe_int(snmp.get_item(".1.3.6.1.4.1.3320.101.10.1.1.26.%d" % num))
-            signal = safe_float(snmp.get_item(".1.3.6.1.4.1.3320.101.10.5.1.5.%d" % num))
-            # distance = snmp.get_item('.1.3.6.1.4.1.3320.101.10.1.1.27.%d' % num)
-            mac = snmp.get_item_plain(".1.3.6.1.4.1.3320.101.10.1.1.3.%d" % num)
-            uptime = safe_int(snmp.get_item(".1.3.6.1.2.1.2.2.1.9.%d" % num))
-            if uptime > 0:
-                uptime = RuTimedelta(seconds=uptime / 100)
-            # speed = self.get_item('.1.3.6.1.2.1.2.2.1.5.%d' % num)
-            return {
-                "status": status_map.get(status, "unknown"),
-                "signal": signal / 10 if signal else "—",
-                "mac": macbin2str(mac),
-                "info": (
-                    # IF-MIB::ifDescr
-                    (_("name"), snmp.get_item(".1.3.6.1.2.1.2.2.1.2.%d" % num)),
-                    # IF-MIB::ifMtu
-                    (_("mtu"), snmp.get_item(".1.3.6.1.2.1.2.2.1.4.%d" % num)),
-                    # IF-MIB::ifInOctets
-                    (_("in_octets"), bytes2human(safe_float(snmp.get_item(".1.3.6.1.2.1.2.2.1.10.%d" % num)))),
-                    # IF-MIB::ifInUcastPkts
-                    (_("in_ucst_pkts"), snmp.get_item(".1.3.6.1.2.1.2.2.1.11.%d" % num)),
-                    # IF-MIB::ifInNUcastPkts
-                    (_("in_not_ucst_pkts"), snmp.get_item(".1.3.6.1.2.1.2.2.1.12.%d" % num)),
-                    # IF-MIB::ifInDiscards
-                    (_("in_discards"), snmp.get_item(".1.3.6.1.2.1.2.2.1.13.%d" % num)),
-                    # IF-MIB::ifInErrors
-                    (_("in_errors"), snmp.get_item(".1.3.6.1.2.1.2.2.1.14.%d" % num)),
-                    # IF-MIB::ifOutOctets
-                    (_("out_octets"), bytes2human(safe_float(snmp.get_item(".1.3.6.1.2.1.2.2.1.16.%d" % num)))),
-                    # IF-MIB::ifOutUcastPkts
-                    (_("out_ucst_pkts"), snmp.get_item(".1.3.6.1.2.1.2.2.1.17.%d" % num)),
-                    # IF-MIB::ifOutNUcastPkts
-                    (_("out_not_ucst_pkts"), snmp.get_item(".1.3.6.1.2.1.2.2.1.18.%d" % num)),
-                    # IF-MIB::ifOutDiscards
-                    (_("out_discards"), snmp.get_item(".1.3.6.1.2.1.2.2.1.19.%d" % num)),
-                    # IF-MIB::ifOutErrors
-                    (_("out_errors"), snmp.get_item(".1.3.6.1.2.1.2.2.1.20.%d" % num)),
-                    (_("uptime"), str(uptime)),
-                ),
-            }
-        except EasySNMPTimeoutError as e:
-            return {"err": "{}: {}".format(_("ONU not connected"), e)}
+        with self.snmp_session(parent) as snmp:
+            try:
+                # https://www.zabbix.com/documentation/1.8/ru/manual/advanced_snmp
+                status = safe_int(snmp.get_item(".1.3.6.1.4.1.3320.101.10.1.1.26.%d" % num))
+                signal = safe_float(snmp.get_item(".1.3.6.1.4.1.3320.101.10.5.1.5.%d" % num))
+                # distance = snmp.get_item('.1.3.6.1.4.1.3320.101.10.1.1.27.%d' % num)
+                mac = snmp.get_item_plain(".1.3.6.1.4.1.3320.101.10.1.1.3.%d" % num)
+                uptime = safe_int(snmp.get_item(".1.3.6.1.2.1.2.2.1.9.%d" % num))
+                if uptime > 0:
+                    uptime = RuTimedelta(seconds=uptime / 100)
+                # speed = self.get_item('.1.3.6.1.2.1.2.2.1.5.%d' % num)
+                return {
+                    "status": status_map.get(status, "unknown"),
+                    "signal": signal / 10 if signal else "—",
+                    "mac": macbin2str(mac),
+                    "info": (
+                        # IF-MIB::ifDescr
+                        (_("name"), snmp.get_item(".1.3.6.1.2.1.2.2.1.2.%d" % num)),
+                        # IF-MIB::ifMtu
+                        (_("mtu"), snmp.get_item(".1.3.6.1.2.1.2.2.1.4.%d" % num)),
+                        # IF-MIB::ifInOctets
+                        (_("in_octets"), bytes2human(safe_float(snmp.get_item(".1.3.6.1.2.1.2.2.1.10.%d" % num)))),
+                        # IF-MIB::ifInUcastPkts
+                        (_("in_ucst_pkts"), snmp.get_item(".1.3.6.1.2.1.2.2.1.11.%d" % num)),
+                        # IF-MIB::ifInNUcastPkts
+                        (_("in_not_ucst_pkts"), snmp.get_item(".1.3.6.1.2.1.2.2.1.12.%d" % num)),
+                        # IF-MIB::ifInDiscards
+                        (_("in_discards"), snmp.get_item(".1.3.6.1.2.1.2.2.1.13.%d" % num)),
+                        # IF-MIB::ifInErrors
+                        (_("in_errors"), snmp.get_item(".1.3.6.1.2.1.2.2.1.14.%d" % num)),
+                        # IF-MIB::ifOutOctets
+                        (_("out_octets"), bytes2human(safe_float(snmp.get_item(".1.3.6.1.2.1.2.2.1.16.%d" % num)))),
+                        # IF-MIB::ifOutUcastPkts
+                        (_("out_ucst_pkts"), snmp.get_item(".1.3.6.1.2.1.2.2.1.17.%d" % num)),
+                        # IF-MIB::ifOutNUcastPkts
+                        (_("out_not_ucst_pkts"), snmp.get_item(".1.3.6.1.2.1.2.2.1.18.%d" % num)),
+                        # IF-MIB::ifOutDiscards
+                        (_("out_discards"), snmp.get_item(".1.3.6.1.2.1.2.2.1.19.%d" % num)),
+                        # IF-MIB::ifOutErrors
+                        (_("out_errors"), snmp.get_item(".1.3.6.1.2.1.2.2.1.20.%d" % num)),
+                        (_("uptime"), str(uptime)),
+                    ),
+                }
+            except EasySNMPTimeoutError as e:
+                return {"err": "{}: {}".format(_("ONU not connected"), e)}
 
     @staticmethod
     def validate_extra_snmp_info(v: str) -> None:
@@ -130,7 +129,7 @@ class EPON_BDCOM_FORA(PonOnuDeviceStrategy):
         if onu_sn is None:
             raise DeviceConfigurationError(err_text)
         parent = dev.parent_dev
-        with SNMPWorker(hostname=parent.ip_address, community=str(parent.man_passw)) as snmp:
+        with self.snmp_session(parent) as snmp:
             int_name = snmp.get_item(".1.3.6.1.2.1.2.2.1.2.%d" % onu_sn)
         return remove_from_olt(
             ip_addr=str(parent.ip_address),
@@ -154,14 +153,14 @@ class EPON_BDCOM_FORA(PonOnuDeviceStrategy):
         parent = dev.parent_dev
         if parent is not None:
             mac = dev.mac_addr
-            snmp = SNMPWorker(hostname=parent.ip_address, community=str(parent.man_passw))
-            onu_macs = snmp.get_list_keyval(".1.3.6.1.4.1.3320.101.10.1.1.3")
-            for srcmac, snmpnum in onu_macs:
-                # convert bytes mac address to str presentation mac address
-                real_mac = macbin2str(srcmac)
-                if mac == real_mac:
-                    return safe_int(snmpnum), None
-            return None, _('Onu with mac "%(onu_mac)s" not found on OLT') % {"onu_mac": mac}
+            with self.snmp_session(parent) as snmp:
+                onu_macs = snmp.get_list_keyval(".1.3.6.1.4.1.3320.101.10.1.1.3")
+                for srcmac, snmpnum in onu_macs:
+                    # convert bytes mac address to str presentation mac address
+                    real_mac = macbin2str(srcmac)
+                    if mac == real_mac:
+                        return safe_int(snmpnum), None
+                return None, _('Onu with mac "%(onu_mac)s" not found on OLT') % {"onu_mac": mac}
         return None, _("Parent device not found")
 
 
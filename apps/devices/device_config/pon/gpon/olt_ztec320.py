@@ -1,14 +1,27 @@
 from dataclasses import dataclass
 from typing import Iterable, Generator
 
+from easysnmp import EasySNMPTimeoutError
+from django.utils.translation import gettext_lazy as _
+
 from djing2.lib import RuTimedelta, safe_int, macbin2str, process_lock_decorator
 from devices.device_config.base import Vlans, Vlan
 from ..pon_device_strategy import PonOLTDeviceStrategyContext, FiberDataClass
-from ..epon.bdcom_p3310c import BDCOM_P3310C
+from ..epon.bdcom_p3310c import BDCOM_P3310C, ONUdevPort
 from ...base_device_strategy import SNMPWorker
+from .zte_utils import conv_zte_signal, sn_to_mac
 
 _DEVICE_UNIQUE_CODE = 5
 
+# Columns, that are read for scan_onu_list, rows are indexed by "<fiber id>.<onu number>"
+ONU_TABLE_COLUMNS = {
+    "name": ".1.3.6.1.4.1.3902.1012.3.28.1.1.3",
+    "sn": ".1.3.6.1.4.1.3902.1012.3.28.1.1.5",
+    "status": ".1.3.6.1.4.1.3902.1012.3.28.2.1.4",
+    # indexed by "<fiber id>.<onu number>.<onu port>"
+    "signal": ".1.3.6.1.4.1.3902.1012.3.50.12.1.1.10",
+}
+
 
 @dataclass
 class UnregisteredUnitType:
@@ -23,35 +36,67 @@ class UnregisteredUnitType:
 class ZTE_C320(BDCOM_P3310C):
     description = "OLT ZTE C320"
     ports_len = 8
+    poll_columns = {
+        "onu_signal": ONU_TABLE_COLUMNS["signal"],
+        "onu_status": ONU_TABLE_COLUMNS["status"],
+    }
+
+    def scan_onu_list(self) -> Generator[ONUdevPort, None, None]:
+        try:
+            with self.snmp_session() as snmp:
+                onu_table = snmp.get_table(ONU_TABLE_COLUMNS, index_parts=2)
+        except EasySNMPTimeoutError as e:
+            raise EasySNMPTimeoutError("{} ({})".format(_("wait for a reply from the SNMP Timeout"), e)) from e
+
+        # All onu's count
+        yield len(onu_table)
+
+        # chunk max size
+        yield 200
+
+        for index, onu in onu_table.items():
+            fiber_id, onu_num = index.split('.')
+            sn = onu.get("sn")
+            if sn:
+                # Real sn in last 4 octets
+                sn = "ZTEG%s" % "".join("%.2X" % (i if isinstance(i, int) else ord(i)) for i in sn[-4:])
+            signal = safe_int(onu.get("signal"))
+            yield ONUdevPort(
+                num=safe_int(onu_num),
+                name=SNMPWorker.item_value(onu.get("name")),
+                status=safe_int(onu.get("status")) == 3,
+                mac=sn_to_mac(sn),
+                signal=conv_zte_signal(signal) if signal else "—",
+                uptime=0,
+                fiberid=safe_int(fiber_id),
+            )
 
     def get_fibers(self) -> Generator[FiberDataClass, None, None]:
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        fibers = (
-            FiberDataClass(
-                fb_id=int(fiber_id),
-                fb_name=fiber_name,
-                fb_onu_num=safe_int(snmp.get_item(".1.3.6.1.4.1.3902.1012.3.13.1.1.13.%d" % int(fiber_id))),
-                # 'fb_active_onu': -1,
-                # Temperature GPON SFP module
-                # 'fb_temp': safe_float(self.get_item(
-                #     '.1.3.6.1.4.1.3902.1015.3.1.13.1.12.%d' % safe_int(fiber_id)
-                # )) / 1000.0,
-                # Power of laser GPON SFP Module
-                # 'fb_power': safe_float(self.get_item(
-                #     '.1.3.6.1.4.1.3902.1015.3.1.13.1.9.%d' % safe_int(fiber_id)
-                # )) / 1000.0
+        with self.snmp_session() as snmp:
+            yield from (
+                FiberDataClass(
+                    fb_id=int(fiber_id),
+                    fb_name=fiber_name,
+                    fb_onu_num=safe_int(snmp.get_item(".1.3.6.1.4.1.3902.1012.3.13.1.1.13.%d" % int(fiber_id))),
+                    # 'fb_active_onu': -1,
+                    # Temperature GPON SFP module
+                    # 'fb_temp': safe_float(self.get_item(
+                    #     '.1.3.6.1.4.1.3902.1015.3.1.13.1.12.%d' % safe_int(fiber_id)
+                    # )) / 1000.0,
+                    # Power of laser GPON SFP Module
+                    # 'fb_power': safe_float(self.get_item(
+                    #     '.1.3.6.1.4.1.3902.1015.3.1.13.1.9.%d' % safe_int(fiber_id)
+                    # )) / 1000.0
+                )
+                for fiber_name, fiber_id in snmp.get_list_keyval(".1.3.6.1.4.1.3902.1012.3.13.1.1.1")
             )
-            for fiber_name, fiber_id in snmp.get_list_keyval(".1.3.6.1.4.1.3902.1012.3.13.1.1.1")
-        )
-        return fibers
 
     def get_details(self) -> dict:
         dev = self.model_instance
         parent = dev.parent_dev
         if not parent:
             return {}
-        with SNMPWorker(hostname=parent.ip_address, community=str(parent.man_passw)) as snmp:
+        with self.snmp_session(parent) as snmp:
             details = {
                 "disk_total": snmp.get_item(".1.3.6.1.4.1.3902.1015.14.1.1.1.7.1.1.4.0.5.102.108.97.115.104.1"),
                 "disk_free": snmp.get_item(".1.3.6.1.4.1.3902.1015.14.1.1.1.8.1.1.4.0.5.102.108.97.115.104.1"),
@@ -63,16 +108,15 @@ class ZTE_C320(BDCOM_P3310C):
 
     @process_lock_decorator()
     def get_ports_on_fiber(self, fiber_num: int) -> Iterable:
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        onu_types = snmp.get_list_keyval(".1.3.6.1.4.1.3902.1012.3.28.1.1.1.%d" % fiber_num)
-        onu_ports = snmp.get_list(".1.3.6.1.4.1.3902.1012.3.28.1.1.2.%d" % fiber_num)
-        # onu_signals = snmp.get_list(".1.3.6.1.4.1.3902.1012.3.50.12.1.1.10.%d" % fiber_num)
-        onu_states = snmp.get_list(".1.3.6.1.4.1.3902.1012.3.50.12.1.1.1.%d" % fiber_num)
+        with self.snmp_session() as snmp:
+            onu_types = tuple(snmp.get_list_keyval(".1.3.6.1.4.1.3902.1012.3.28.1.1.1.%d" % fiber_num))
+            onu_ports = tuple(snmp.get_list(".1.3.6.1.4.1.3902.1012.3.28.1.1.2.%d" % fiber_num))
+            # onu_signals = snmp.get_list(".1.3.6.1.4.1.3902.1012.3.50.12.1.1.10.%d" % fiber_num)
+            onu_states = tuple(snmp.get_list(".1.3.6.1.4.1.3902.1012.3.50.12.1.1.1.%d" % fiber_num))
 
-        # Real sn in last 3 octets
-        onu_sns = snmp.get_list(".1.3.6.1.4.1.3902.1012.3.28.1.1.5.%d" % fiber_num)
-        onu_prefixs = snmp.get_list(".1.3.6.1.4.1.3902.1012.3.50.11.2.1.1.%d" % fiber_num)
+            # Real sn in last 3 octets
+            onu_sns = tuple(snmp.get_list(".1.3.6.1.4.1.3902.1012.3.28.1.1.5.%d" % fiber_num))
+            onu_prefixs = tuple(snmp.get_list(".1.3.6.1.4.1.3902.1012.3.50.11.2.1.1.%d" % fiber_num))
 
         status_map = {1: "ok", 2: "down"}
 
@@ -94,12 +138,11 @@ class ZTE_C320(BDCOM_P3310C):
 
     def get_units_unregistered(self, fiber: FiberDataClass) -> Generator[UnregisteredUnitType, None, None]:
         fiber_num = fiber.fb_id
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        sn_list = snmp.get_list(".1.3.6.1.4.1.3902.1012.3.13.3.1.2.%d" % fiber_num)
-        firmware_ver = snmp.get_list(".1.3.6.1.4.1.3902.1012.3.13.3.1.11.%d" % fiber_num)
-        loid_passws = snmp.get_list(".1.3.6.1.4.1.3902.1012.3.13.3.1.9.%d" % fiber_num)
-        loids = snmp.get_list(".1.3.6.1.4.1.3902.1012.3.13.3.1.8.%d" % fiber_num)
+        with self.snmp_session() as snmp:
+            sn_list = tuple(snmp.get_list(".1.3.6.1.4.1.3902.1012.3.13.3.1.2.%d" % fiber_num))
+            firmware_ver = tuple(snmp.get_list(".1.3.6.1.4.1.3902.1012.3.13.3.1.11.%d" % fiber_num))
+            loid_passws = tuple(snmp.get_list(".1.3.6.1.4.1.3902.1012.3.13.3.1.9.%d" % fiber_num))
+            loids = tuple(snmp.get_list(".1.3.6.1.4.1.3902.1012.3.13.3.1.8.%d" % fiber_num))
 
         return (
             UnregisteredUnitType(
@@ -114,20 +157,17 @@ class ZTE_C320(BDCOM_P3310C):
         )
 
     def get_uptime(self):
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             up_timestamp = safe_int(snmp.get_item(".1.3.6.1.2.1.1.3.0"))
         tm = RuTimedelta(seconds=up_timestamp / 100)
         return str(tm)
 
     def get_long_description(self):
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             return snmp.get_item(".1.3.6.1.2.1.1.1.0")
 
     def get_hostname(self):
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             return snmp.get_item(".1.3.6.1.2.1.1.5.0")
 
     #############################
@@ -146,8 +186,7 @@ class ZTE_C320(BDCOM_P3310C):
 
     @process_lock_decorator()
     def read_all_vlan_info(self) -> Vlans:
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             for vid, vname in snmp.get_list_keyval(".1.3.6.1.4.1.3902.1015.20.2.1.2"):
                 yield Vlan(vid=int(vid), title=vname)
 
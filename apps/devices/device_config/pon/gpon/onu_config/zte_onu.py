@@ -7,7 +7,7 @@ from django.utils.translation import gettext_lazy as _
 from devices.device_config import expect_util
 from devices.device_config.base import OptionalScriptCallResult, DeviceConfigurationError
 from devices.device_config.base_device_strategy import DeviceConfigType
-from djing2.lib import process_lock_decorator, safe_int
+from djing2.lib import safe_int
 from .. import zte_utils
 from ...utils import get_all_vlans_from_config
 
@@ -52,13 +52,9 @@ class ZteOnuDeviceConfigType(DeviceConfigType):
 
         sn = self.format_sn_from_mac(mac=mac)
 
-        @process_lock_decorator(lock_name="zte_olt")
-        def _locked_register_onu(device_config_type: ZteOnuDeviceConfigType, *largs, **lkwargs):
-            return device_config_type.register_onu(*largs, **lkwargs)
-
         try:
-            onu_snmp = _locked_register_onu(
-                self,
+            # OLT is locked by cli session
+            onu_snmp = self.register_onu(
                 onu_mac=mac,
                 serial=sn.upper(),
                 zte_ip_addr=str(ip),
@@ -109,18 +105,23 @@ class ZteOnuDeviceConfigType(DeviceConfigType):
         ch.do_cmd("terminal length 0", f"{prompt}#")
         return ch
 
-    def register_onu(
-        self,
-        serial: str,
-        config: dict,
-        onu_mac: str,
-        zte_ip_addr: str,
-        telnet_login: str,
-        telnet_password: str,
-        telnet_prompt: str,
-        *args,
-        **kwargs,
-    ) -> Optional[str]:
+    @staticmethod
+    def olt_session(hostname: str, login: str, password: str, prompt: str):
+        """
+        Persistent logged in session to OLT, that is locked for block.
+        See expect_util.CliSessionManager.
+        """
+        return expect_util.cli_sessions.session(
+            key=str(hostname),
+            login=lambda: ZteOnuDeviceConfigType.login_into_olt(str(hostname), login, password, prompt),
+            prompt=prompt,
+        )
+
+    def check_registration(self, serial: str, config: dict, zte_ip_addr: str) -> tuple[int, list]:
+        """
+        Validate registration params before connecting to OLT.
+        :return: onu vlan, and all vlans from config.
+        """
         if not re.match(self.sn_regexp, serial):
             raise expect_util.ExpectValidationError(f"Serial not valid, match: {self.sn_regexp}")
 
@@ -134,73 +135,94 @@ class ZteOnuDeviceConfigType(DeviceConfigType):
 
         if not re.match(expect_util.IP4_ADDR_REGEX, zte_ip_addr):
             raise expect_util.ExpectValidationError("ip address for zte not valid")
+        return onu_vlan, all_vids
 
-        ch = self.login_into_olt(zte_ip_addr, telnet_login, telnet_password, telnet_prompt)
-        self.ch = ch
-
-        stack_num, rack_num, fiber_num = self.find_unregistered_onu(prompt=telnet_prompt, serial=serial)
-
-        free_onu_number = self.get_last_registered_onu_number(
-            stack_num=stack_num, rack_num=rack_num, fiber_num=fiber_num, prompt=telnet_prompt
-        )
-
-        # enter to config
-        ch.do_cmd("conf t", f"{telnet_prompt}(config)#")
+    def register_onu(
+        self,
+        serial: str,
+        config: dict,
+        onu_mac: str,
+        zte_ip_addr: str,
+        telnet_login: str,
+        telnet_password: str,
+        telnet_prompt: str,
+        *args,
+        **kwargs,
+    ) -> Optional[str]:
+        onu_vlan, all_vids = self.check_registration(serial=serial, config=config, zte_ip_addr=zte_ip_addr)
+
+        with self.olt_session(zte_ip_addr, telnet_login, telnet_password, telnet_prompt) as ch:
+            self.ch = ch
+            try:
+                stack_num, rack_num, fiber_num = self.find_unregistered_onu(prompt=telnet_prompt, serial=serial)
+
+                free_onu_number = self.get_last_registered_onu_number(
+                    stack_num=stack_num, rack_num=rack_num, fiber_num=fiber_num, prompt=telnet_prompt
+                )
+
+                with expect_util.config_mode(ch, telnet_prompt):
+                    self.configure_onu(
+                        prompt=telnet_prompt,
+                        int_addr="%d/%d/%d" % (stack_num, rack_num, fiber_num),
+                        free_onu_number=free_onu_number,
+                        serial=serial,
+                        onu_mac=onu_mac,
+                        user_vid=onu_vlan,
+                        all_vids=all_vids,
+                        config=config,
+                    )
+            finally:
+                # session belongs to cli_sessions, it must not be closed in __del__
+                self.ch = None
 
-        int_addr = "%d/%d/%d" % (stack_num, rack_num, fiber_num)
+        return zte_utils.zte_onu_conv_to_num(rack_num=rack_num, fiber_num=fiber_num, port_num=free_onu_number)
 
+    def configure_onu(self, prompt: str, int_addr: str, free_onu_number: int, serial: str,
+                      onu_mac: str, user_vid: int, all_vids: list, config: dict) -> None:
+        """Register onu on olt interface and apply its config, self.ch must be in config mode"""
         self.register_onu_on_olt_interface(
             free_onu_number=free_onu_number,
             serial=serial,
-            prompt=telnet_prompt,
+            prompt=prompt,
             onu_type=self.zte_type,
             int_addr=int_addr,
         )
 
         self.apply_zte_top_conf(
-            prompt=telnet_prompt,
+            prompt=prompt,
             free_onu_number=free_onu_number,
             int_addr=int_addr,
-            user_vid=onu_vlan,
+            user_vid=user_vid,
             onu_mac=onu_mac,
             all_vids=all_vids,
             config=config,
         )
 
         self.apply_zte_bot_conf(
-            prompt=telnet_prompt,
+            prompt=prompt,
             int_addr=int_addr,
             free_onu_number=free_onu_number,
-            user_vid=onu_vlan,
+            user_vid=user_vid,
             all_vids=all_vids,
             config=config,
         )
 
-        ch.do_cmd("exit", "%s#" % telnet_prompt)
-        ch.sendline("exit")
-
-        ch.close()
-        return zte_utils.zte_onu_conv_to_num(rack_num=rack_num, fiber_num=fiber_num, port_num=free_onu_number)
-
     def find_unregistered_onu(self, prompt: str, serial: str) -> tuple[int, int, int]:
         # Find unregistered onu ↓
         ch = self.ch
         choice = ch.do_cmd("show gpon onu uncfg", ["No related information to show", f"{prompt}#"])
         if choice == 0:
-            ch.close()
             raise zte_utils.OnuZteRegisterError(_("unregistered onu not found, sn=%s") % serial)
         if choice == 1:
             # get unregistered onu devices
             unregistered_onu = zte_utils.get_unregistered_onu(lines=ch.get_lines_before(), serial=serial)
             if unregistered_onu is None:
-                ch.close()
                 raise zte_utils.OnuZteRegisterError(_("unregistered onu not found, sn=%s") % serial)
             stack_num = int(unregistered_onu.get("stack_num"))
             rack_num = int(unregistered_onu.get("rack_num"))
             fiber_num = int(unregistered_onu.get("fiber_num"))
             return stack_num, rack_num, fiber_num
         else:
-            ch.close()
             raise zte_utils.ZteOltConsoleError("I don't know what is that choice: %d" % choice)
 
     def get_last_registered_onu_number(self, stack_num: int, rack_num: int, fiber_num: int, prompt: str) -> int:
@@ -208,7 +230,6 @@ class ZteOnuDeviceConfigType(DeviceConfigType):
         self.ch.do_cmd(f"show run int gpon-olt_{stack_num}/{rack_num}/{fiber_num}", f"{prompt}#")
         free_onu_number = zte_utils.get_free_registered_onu_number(self.ch.get_lines_before())
         if free_onu_number > 127:
-            self.ch.close()
             raise zte_utils.ZTEFiberIsFull(_("olt fiber %d is full") % fiber_num)
         return free_onu_number
 
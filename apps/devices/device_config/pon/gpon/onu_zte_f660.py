@@ -3,19 +3,17 @@ from typing import Optional
 
 from django.utils.translation import gettext_lazy as _
 
-from djing2.lib import safe_int, process_lock_decorator
+from djing2.lib import safe_int
 from devices.device_config.base import DeviceConsoleError, Vlan
 from devices.device_config import expect_util
 from .onu_config.zte_onu import ZteOnuDeviceConfigType
 from . import zte_utils
 from ..epon.epon_bdcom_fora import EPON_BDCOM_FORA, DefaultVlanDC
 from ..pon_device_strategy import PonONUDeviceStrategyContext
-from ...base_device_strategy import SNMPWorker
 
 _DEVICE_UNIQUE_CODE = 6
 
 
-@process_lock_decorator(lock_name="zte_olt")
 def _remove_zte_onu_from_olt(zte_ip_addr: str, telnet_login: str, telnet_passw: str,
                              telnet_prompt: str, snmp_info: str, *args, **kwargs):
     if not re.match(expect_util.IP4_ADDR_REGEX, zte_ip_addr):
@@ -25,22 +23,17 @@ def _remove_zte_onu_from_olt(zte_ip_addr: str, telnet_login: str, telnet_passw:
     int_addr = "1/%d/%d" % (rack_num, fiber_num)
 
     # Входим
-    ch = ZteOnuDeviceConfigType.login_into_olt(zte_ip_addr, telnet_login, telnet_passw, telnet_prompt)
+    with ZteOnuDeviceConfigType.olt_session(zte_ip_addr, telnet_login, telnet_passw, telnet_prompt) as ch:
+        # enter to config
+        with expect_util.config_mode(ch, telnet_prompt):
+            # go to olt interface
+            ch.do_cmd("interface gpon-olt_%s" % int_addr, "%s(config-if)#" % telnet_prompt)
 
-    # enter to config
-    ch.do_cmd("conf t", "%s(config)#" % telnet_prompt)
+            # remove onu register from olt fiber
+            ch.do_cmd("no onu %d" % onu_num, "%s(config-if)#" % telnet_prompt)
 
-    # go to olt interface
-    ch.do_cmd("interface gpon-olt_%s" % int_addr, "%s(config-if)#" % telnet_prompt)
-
-    # remove onu register from olt fiber
-    ch.do_cmd("no onu %d" % onu_num, "%s(config-if)#" % telnet_prompt)
-
-    # Exit
-    ch.do_cmd("exit", "%s(config)#" % telnet_prompt)
-    ch.do_cmd("exit", "%s#" % telnet_prompt)
-    ch.sendline("exit")
-    ch.close()
+            # Exit
+            ch.do_cmd("exit", "%s(config)#" % telnet_prompt)
     return True
 
 
@@ -64,46 +57,45 @@ class OnuZTE_F660(EPON_BDCOM_FORA):
         fiber_num, onu_num = zte_utils.split_snmp_extra(snmp_extra)
         fiber_addr = "%d.%d" % (fiber_num, onu_num)
 
-        snmp = SNMPWorker(hostname=parent.ip_address, community=str(parent.man_passw))
-
-        signal_onu_rx = safe_int(snmp.get_item(".1.3.6.1.4.1.3902.1012.3.50.12.1.1.10.%s.1" % fiber_addr))
-        signal_otl_tx = safe_int(snmp.get_item('.1.3.6.1.4.1.3902.1015.1010.11.2.1.2.%s' % fiber_addr))
-        # distance = self.get_item('.1.3.6.1.4.1.3902.1012.3.50.12.1.1.18.%s.1' % fiber_addr)
-
-        sn = snmp.get_item_plain(".1.3.6.1.4.1.3902.1012.3.28.1.1.5.%s" % fiber_addr)
-        if sn is not None:
-            if isinstance(sn, bytes):
-                sn = f"{sn_prefix}%s" % "".join("%.2X" % int(x) for x in sn[-4:])
-            else:
-                sn = f"{sn_prefix}%s" % "".join("%.2X" % ord(x) for x in sn[-4:])
+        with self.snmp_session(parent) as snmp:
+            signal_onu_rx = safe_int(snmp.get_item(".1.3.6.1.4.1.3902.1012.3.50.12.1.1.10.%s.1" % fiber_addr))
+            signal_otl_tx = safe_int(snmp.get_item('.1.3.6.1.4.1.3902.1015.1010.11.2.1.2.%s' % fiber_addr))
+            # distance = self.get_item('.1.3.6.1.4.1.3902.1012.3.50.12.1.1.18.%s.1' % fiber_addr)
 
-        raw_status = snmp.get_item(".1.3.6.1.4.1.3902.1012.3.28.2.1.4.%s" % fiber_addr)
-
-        status_map = {
-            0: "logging",
-            1: "los",
-            2: "syncMib",
-            3: "working",
-            4: "dyinggasp",
-            5: "authFailed",
-            6: "offline"
-        }
-        return {
-            "status": status_map.get(
-                safe_int(raw_status), "unknown"
-            ),
-            "signal": zte_utils.conv_zte_signal(signal_onu_rx),
-            "mac": zte_utils.sn_to_mac(sn, prefix=mac_prefix),
-            "info": (
-                ('OLT RX signal', signal_otl_tx / 1000 if abs(signal_otl_tx) > 0 else 0),
-                (_("name"), snmp.get_item(".1.3.6.1.4.1.3902.1012.3.28.1.1.3.%s" % fiber_addr)),
-                # 'distance': safe_float(distance) / 10,
-                # 'ip_addr': self.get_item('.1.3.6.1.4.1.3902.1012.3.50.16.1.1.10.%s' % fiber_addr),
-                (_("vlans"), snmp.get_item(".1.3.6.1.4.1.3902.1012.3.50.15.100.1.1.7.%s.1.1" % fiber_addr)),
-                (_("serial"), sn),
-                (_("onu_type"), snmp.get_item(".1.3.6.1.4.1.3902.1012.3.28.1.1.1.%s" % fiber_addr)),
-            ),
-        }
+            sn = snmp.get_item_plain(".1.3.6.1.4.1.3902.1012.3.28.1.1.5.%s" % fiber_addr)
+            if sn is not None:
+                if isinstance(sn, bytes):
+                    sn = f"{sn_prefix}%s" % "".join("%.2X" % int(x) for x in sn[-4:])
+                else:
+                    sn = f"{sn_prefix}%s" % "".join("%.2X" % ord(x) for x in sn[-4:])
+
+            raw_status = snmp.get_item(".1.3.6.1.4.1.3902.1012.3.28.2.1.4.%s" % fiber_addr)
+
+            status_map = {
+                0: "logging",
+                1: "los",
+                2: "syncMib",
+                3: "working",
+                4: "dyinggasp",
+                5: "authFailed",
+                6: "offline"
+            }
+            return {
+                "status": status_map.get(
+                    safe_int(raw_status), "unknown"
+                ),
+                "signal": zte_utils.conv_zte_signal(signal_onu_rx),
+                "mac": zte_utils.sn_to_mac(sn, prefix=mac_prefix),
+                "info": (
+                    ('OLT RX signal', signal_otl_tx / 1000 if abs(signal_otl_tx) > 0 else 0),
+                    (_("name"), snmp.get_item(".1.3.6.1.4.1.3902.1012.3.28.1.1.3.%s" % fiber_addr)),
+                    # 'distance': safe_float(distance) / 10,
+                    # 'ip_addr': self.get_item('.1.3.6.1.4.1.3902.1012.3.50.16.1.1.10.%s' % fiber_addr),
+                    (_("vlans"), snmp.get_item(".1.3.6.1.4.1.3902.1012.3.50.15.100.1.1.7.%s.1.1" % fiber_addr)),
+                    (_("serial"), sn),
+                    (_("onu_type"), snmp.get_item(".1.3.6.1.4.1.3902.1012.3.28.1.1.1.%s" % fiber_addr)),
+                ),
+            }
 
     def default_vlan_info(self) -> list[DefaultVlanDC]:
         default_vid = 1
@@ -130,60 +122,59 @@ class OnuZTE_F660(EPON_BDCOM_FORA):
         parent = dev.parent_dev
         if not parent:
             return []
-        snmp = SNMPWorker(hostname=parent.ip_address, community=str(parent.man_passw))
+        with self.snmp_session(parent) as snmp:
+            def _get_access_vlan(port_num: int) -> int:
+                return safe_int(
+                    snmp.get_item(
+                        ".1.3.6.1.4.1.3902.1012.3.50.15.100.1.1.4.%(fiber_num)d.%(onu_num)d.1.%(port_num)d"
+                        % {"port_num": port_num, "fiber_num": fiber_num, "onu_num": onu_num}
+                    )
+                )
 
-        def _get_access_vlan(port_num: int) -> int:
-            return safe_int(
-                snmp.get_item(
-                    ".1.3.6.1.4.1.3902.1012.3.50.15.100.1.1.4.%(fiber_num)d.%(onu_num)d.1.%(port_num)d"
+            def _get_trunk_vlans(port_num: int) -> list[Vlan]:
+                trunk_vlans = snmp.get_item(
+                    ".1.3.6.1.4.1.3902.1012.3.50.15.100.1.1.7.%(fiber_num)d.%(onu_num)d.1.%(port_num)d"
                     % {"port_num": port_num, "fiber_num": fiber_num, "onu_num": onu_num}
                 )
+                if not trunk_vlans:
+                    return []
+
+                def _rng(r):
+                    if not r:
+                        return
+                    if b"-" in r:
+                        a1, a2 = r.split(b"-")
+                        return range(int(a1), int(a2))
+                    else:
+                        return int(r)
+
+                vids = (
+                    tuple(t) if isinstance(t, range) else (t,) for t in map(_rng, filter(bool, trunk_vlans.split(b",")))
+                )
+                return [Vlan(vid=v, native=False) for i in vids for v in i]
+
+            # Result example
+            # [
+            #     {
+            #         'port': 1,
+            #         'vids': [
+            #             {'vid': 143, 'native': True},
+            #             {'vid': 144, 'native': False},
+            #             {'vid': 145, 'native': False},
+            #         ]
+            #     }
+            # ]
+            return tuple(
+                DefaultVlanDC(
+                    port=i,
+                    vids=[Vlan(
+                        vid=_get_access_vlan(port_num=i),
+                        native=True
+                    )] + _get_trunk_vlans(port_num=i),
+                )
+                for i in range(1, self.ports_len+1)
             )
 
-        def _get_trunk_vlans(port_num: int) -> list[Vlan]:
-            trunk_vlans = snmp.get_item(
-                ".1.3.6.1.4.1.3902.1012.3.50.15.100.1.1.7.%(fiber_num)d.%(onu_num)d.1.%(port_num)d"
-                % {"port_num": port_num, "fiber_num": fiber_num, "onu_num": onu_num}
-            )
-            if not trunk_vlans:
-                return []
-
-            def _rng(r):
-                if not r:
-                    return
-                if b"-" in r:
-                    a1, a2 = r.split(b"-")
-                    return range(int(a1), int(a2))
-                else:
-                    return int(r)
-
-            vids = (
-                tuple(t) if isinstance(t, range) else (t,) for t in map(_rng, filter(bool, trunk_vlans.split(b",")))
-            )
-            return [Vlan(vid=v, native=False) for i in vids for v in i]
-
-        # Result example
-        # [
-        #     {
-        #         'port': 1,
-        #         'vids': [
-        #             {'vid': 143, 'native': True},
-        #             {'vid': 144, 'native': False},
-        #             {'vid': 145, 'native': False},
-        #         ]
-        #     }
-        # ]
-        return (
-            DefaultVlanDC(
-                port=i,
-                vids=[Vlan(
-                    vid=_get_access_vlan(port_num=i),
-                    native=True
-                )] + _get_trunk_vlans(port_num=i),
-            )
-            for i in range(1, self.ports_len+1)
-        )
-
     @staticmethod
     def validate_extra_snmp_info(v: str) -> None:
         # for example 268501760.5
@@ -203,7 +194,7 @@ class OnuZTE_F660(EPON_BDCOM_FORA):
 
         fiber_num, onu_num = zte_utils.split_snmp_extra(str(dev.snmp_extra))
         fiber_addr = "%d.%d" % (fiber_num, onu_num)
-        with SNMPWorker(hostname=parent.ip_address, community=str(parent.man_passw)) as snmp:
+        with self.snmp_session(parent) as snmp:
             sn = snmp.get_item_plain(".1.3.6.1.4.1.3902.1012.3.28.1.1.5.%s" % fiber_addr)
         if sn is not None:
             if isinstance(sn, str):
@@ -257,16 +248,16 @@ class OnuZTE_F660(EPON_BDCOM_FORA):
             hostname=parent.ip_address
             prompt = telnet.get("prompt")
             # Enter
-            ch = ZteOnuDeviceConfigType.login_into_olt(
+            with ZteOnuDeviceConfigType.olt_session(
                 hostname=hostname,
                 login=telnet.get("login"),
                 password=telnet.get("password"),
                 prompt=prompt
-            )
-
-            # find onu on olt
-            ch.do_cmd("show gpon onu by sn %s" % serial_num, "%s#" % prompt)
-            for line in ch.get_lines_before():
+            ) as ch:
+                # find onu on olt
+                ch.do_cmd("show gpon onu by sn %s" % serial_num, "%s#" % prompt)
+                lines = ch.get_lines_before()
+            for line in lines:
                 if line.startswith('gpon-onu'):
                     # Found onu
                     onu = zte_utils.parse_onu_name(line)
@@ -275,15 +266,8 @@ class OnuZTE_F660(EPON_BDCOM_FORA):
                         fiber_num=int(onu['fiber_num']),
                         port_num=int(onu['onu_num'])
                     )
-                    # Exit
-                    ch.sendline("exit")
-                    ch.close()
                     return onu_num, None
 
-            # Exit
-            ch.sendline("exit")
-            ch.close()
-
             # Not found onu
             return None, _('Onu with mac "%(onu_mac)s" not found on OLT') % {"onu_mac": mac}
 
@@ -0,0 +1,201 @@
+"""
+Several onu operations on one ZTE OLT by one cli session.
+
+Unregistered onu list, and registered onu on each fiber are read once for
+whole batch, and all removals and registrations are applied in one
+"conf t" block.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from django.utils.translation import gettext as _
+from pexpect import ExceptionPexpect
+
+from devices.device_config import expect_util
+from devices.device_config.base import DeviceImplementationError, DeviceConfigurationError
+from . import zte_utils
+from .onu_config.zte_onu import ZteOnuDeviceConfigType
+
+
+@dataclass
+class ZteOnuOperationResult:
+    device_id: Optional[int]
+    ok: bool = False
+    snmp_extra: Optional[str] = None
+    text: str = ""
+
+
+@dataclass
+class _Registration:
+    result: ZteOnuOperationResult
+    device: object
+    config_type: ZteOnuDeviceConfigType
+    config: dict
+    serial: str
+    onu_mac: str
+    user_vid: int
+    all_vids: list
+    int_addr: Optional[str] = None
+    rack_num: int = 0
+    fiber_num: int = 0
+    onu_num: int = 0
+
+
+@dataclass
+class _Removal:
+    result: ZteOnuOperationResult
+    int_addr: str
+    onu_num: int
+
+
+class ZteOltBatch:
+    def __init__(self, olt):
+        """
+        :param olt: devices.models.Device of OLT, extra_data of it must contain telnet credentials.
+        """
+        if not olt.ip_address:
+            raise DeviceConfigurationError(_("Ip address or parent device with ip address required for ONU device"))
+        telnet = (olt.extra_data or {}).get("telnet")
+        if not telnet:
+            raise DeviceConfigurationError("'telnet' parameter no passed")
+        self.olt = olt
+        self.hostname = str(olt.ip_address)
+        self.login = telnet.get("login")
+        self.password = telnet.get("password")
+        self.prompt = telnet.get("prompt")
+        self._registrations: list[_Registration] = []
+        self._removals: list[_Removal] = []
+        self.results: list[ZteOnuOperationResult] = []
+
+    def _new_result(self, device_id: Optional[int]) -> ZteOnuOperationResult:
+        res = ZteOnuOperationResult(device_id=device_id)
+        self.results.append(res)
+        return res
+
+    def add_registration(self, device, config_type: ZteOnuDeviceConfigType, config: dict) -> ZteOnuOperationResult:
+        """
+        Queue registration of onu device with config from
+        views.apply_device_onu_config_template.
+        """
+        res = self._new_result(device.pk)
+        try:
+            if not device.mac_addr:
+                raise DeviceConfigurationError(_('Devices has not mac address.'))
+            onu_mac = str(device.mac_addr)
+            serial = config_type.format_sn_from_mac(mac=onu_mac).upper()
+            user_vid, all_vids = config_type.check_registration(
+                serial=serial, config=config, zte_ip_addr=self.hostname
+            )
+        except (DeviceImplementationError, ValueError) as err:
+            res.text = str(err)
+            return res
+        self._registrations.append(_Registration(
+            result=res, device=device, config_type=config_type, config=config,
+            serial=serial, onu_mac=onu_mac, user_vid=user_vid, all_vids=all_vids,
+        ))
+        return res
+
+    def add_removal(self, snmp_info: str, device_id: Optional[int] = None) -> ZteOnuOperationResult:
+        res = self._new_result(device_id)
+        try:
+            rack_num, fiber_num, onu_num = zte_utils.zte_onu_conv_from_onu(snmp_info)
+        except DeviceImplementationError as err:
+            res.text = str(err)
+            return res
+        self._removals.append(_Removal(result=res, int_addr="1/%d/%d" % (rack_num, fiber_num), onu_num=onu_num))
+        return res
+
+    def _find_registration_places(self, ch: expect_util.MySpawn) -> list[_Registration]:
+        """Find fiber and free onu number for each registration, in exec mode"""
+        prompt = self.prompt
+        choice = ch.do_cmd("show gpon onu uncfg", ["No related information to show", f"{prompt}#"])
+        lines = ch.get_lines_before() if choice == 1 else []
+        by_fiber: dict[tuple[int, int, int], list[_Registration]] = {}
+        for reg in self._registrations:
+            unregistered_onu = zte_utils.get_unregistered_onu(lines=lines, serial=reg.serial)
+            if unregistered_onu is None:
+                reg.result.text = _("unregistered onu not found, sn=%s") % reg.serial
+                continue
+            fiber = (
+                int(unregistered_onu.get("stack_num")),
+                int(unregistered_onu.get("rack_num")),
+                int(unregistered_onu.get("fiber_num")),
+            )
+            by_fiber.setdefault(fiber, []).append(reg)
+
+        ready = []
+        for (stack_num, rack_num, fiber_num), regs in by_fiber.items():
+            ch.do_cmd(f"show run int gpon-olt_{stack_num}/{rack_num}/{fiber_num}", f"{prompt}#")
+            free_numbers = zte_utils.get_free_registered_onu_numbers(ch.get_lines_before(), count=len(regs))
+            for reg, onu_num in zip(regs, free_numbers):
+                reg.int_addr = "%d/%d/%d" % (stack_num, rack_num, fiber_num)
+                reg.rack_num, reg.fiber_num, reg.onu_num = rack_num, fiber_num, onu_num
+                ready.append(reg)
+            for reg in regs[len(free_numbers):]:
+                reg.result.text = _("olt fiber %d is full") % fiber_num
+        return ready
+
+    def _remove(self, ch: expect_util.MySpawn) -> None:
+        """Remove onu, grouped by olt interface, in config mode"""
+        prompt = self.prompt
+        by_int: dict[str, list[_Removal]] = {}
+        for rm in self._removals:
+            by_int.setdefault(rm.int_addr, []).append(rm)
+        for int_addr, removals in by_int.items():
+            ch.do_cmd("interface gpon-olt_%s" % int_addr, "%s(config-if)#" % prompt)
+            for rm in removals:
+                ch.do_cmd("no onu %d" % rm.onu_num, "%s(config-if)#" % prompt)
+                rm.result.ok = True
+                rm.result.text = _("Deleted")
+            ch.do_cmd("exit", "%s(config)#" % prompt)
+
+    def _register(self, ch: expect_util.MySpawn, reg: _Registration) -> None:
+        config_type = reg.config_type
+        config_type.ch = ch
+        try:
+            config_type.configure_onu(
+                prompt=self.prompt,
+                int_addr=reg.int_addr,
+                free_onu_number=reg.onu_num,
+                serial=reg.serial,
+                onu_mac=reg.onu_mac,
+                user_vid=reg.user_vid,
+                all_vids=reg.all_vids,
+                config=reg.config,
+            )
+        finally:
+            # session belongs to cli_sessions, it must not be closed in __del__
+            config_type.ch = None
+        reg.result.ok = True
+        reg.result.snmp_extra = zte_utils.zte_onu_conv_to_num(
+            rack_num=reg.rack_num, fiber_num=reg.fiber_num, port_num=reg.onu_num
+        )
+        reg.result.text = _("Success")
+
+    def apply(self) -> list[ZteOnuOperationResult]:
+        """
+        Apply all queued operations. Onu, that is not found or has no free
+        place on fiber, is skipped. Failure while configuring fails all
+        unfinished operations. Registered onu devices are saved with new snmp_extra.
+        """
+        if not self._registrations and not self._removals:
+            return self.results
+        try:
+            with ZteOnuDeviceConfigType.olt_session(self.hostname, self.login, self.password, self.prompt) as ch:
+                ready = self._find_registration_places(ch) if self._registrations else []
+                with expect_util.config_mode(ch, self.prompt):
+                    self._remove(ch)
+                    for reg in ready:
+                        self._register(ch, reg)
+        except (DeviceImplementationError, ExceptionPexpect) as err:
+            for res in self.results:
+                if not res.ok and not res.text:
+                    res.text = str(err)
+        finally:
+            self._registrations, registrations = [], self._registrations
+            self._removals = []
+        for reg in registrations:
+            if reg.result.ok:
+                reg.device.snmp_extra = reg.result.snmp_extra
+                reg.device.save(update_fields=("snmp_extra",))
+        return self.results
@@ -63,6 +63,22 @@ def get_free_registered_onu_number(lines):
     return onu_olt_num + 1
 
 
+def get_free_registered_onu_numbers(lines, count: int, max_onu_number: int = 127) -> list[int]:
+    """
+    Like get_free_registered_onu_number, but for several onu on one fiber,
+    from output of one "show run int gpon-olt_x/x/x".
+    """
+    onu_type_regexp = re.compile(r"^\s{1,5}onu \d{1,3} type [-\w\d]{4,64} sn \w{4,64}$")
+    used = {int(line.split()[1]) for line in lines if onu_type_regexp.match(line)}
+    free = []
+    num = 1
+    while len(free) < count and num <= max_onu_number:
+        if num not in used:
+            free.append(num)
+        num += 1
+    return free
+
+
 def sn_to_mac(sn: str, prefix='45:47:'):
     if not sn:
         return
@@ -0,0 +1,179 @@
+"""
+Per process pool of snmp sessions.
+
+Creation of net-snmp session allocates socket and parses session options,
+and one page of device details requests device by several strategy methods.
+So sessions are kept between requests, keyed by (host, community, version).
+Session is used only by one thread at a time, broken sessions are dropped.
+"""
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import monotonic
+from typing import Any, Callable, Generator
+
+from django.conf import settings
+from easysnmp import EasySNMPError
+
+from devices.device_config.base import DeviceConnectionError
+
+
+# Sessions, that are idle longer, are closed
+SNMP_POOL_IDLE_TIMEOUT = getattr(settings, "SNMP_POOL_IDLE_TIMEOUT", 120)
+# Session, that is idle longer, is checked by request of sysUpTime before reuse
+SNMP_POOL_CHECK_INTERVAL = getattr(settings, "SNMP_POOL_CHECK_INTERVAL", 30)
+# Max idle sessions for each (host, community, version)
+SNMP_POOL_MAX_IDLE = getattr(settings, "SNMP_POOL_MAX_IDLE", 4)
+
+_HEALTH_CHECK_OID = ".1.3.6.1.2.1.1.3.0"
+
+SessionKey = tuple[str, str, int]
+
+
+@dataclass
+class SNMPPoolStats:
+    created: int = 0
+    reused: int = 0
+    # closed by idle timeout, or dropped after errors
+    discarded: int = 0
+    idle: int = 0
+
+
+class _Idle:
+    __slots__ = ("worker", "last_used")
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.last_used = monotonic()
+
+
+class SNMPSessionPool:
+    def __init__(self, create: Callable[..., Any],
+                 idle_timeout: float = SNMP_POOL_IDLE_TIMEOUT,
+                 check_interval: float = SNMP_POOL_CHECK_INTERVAL,
+                 max_idle: int = SNMP_POOL_MAX_IDLE):
+        """
+        :param create: Makes new session from hostname, community, version,
+                       and extra session options.
+        :param idle_timeout: Seconds after that idle session is closed.
+        :param check_interval: Seconds after that idle session is checked before reuse.
+        :param max_idle: Max idle sessions count for each key.
+        """
+        self._create = create
+        self.idle_timeout = float(idle_timeout)
+        self.check_interval = float(check_interval)
+        self.max_idle = max(1, int(max_idle))
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget all sessions without closing them.
+        Called in forked child, sessions sockets belongs to parent process.
+        """
+        self._lock = threading.Lock()
+        self._idle: dict[SessionKey, list[_Idle]] = {}
+        self._stats = SNMPPoolStats()
+
+    @property
+    def stats(self) -> SNMPPoolStats:
+        with self._lock:
+            return SNMPPoolStats(
+                created=self._stats.created,
+                reused=self._stats.reused,
+                discarded=self._stats.discarded,
+                idle=sum(len(i) for i in self._idle.values()),
+            )
+
+    @staticmethod
+    def _close(worker) -> None:
+        worker.close()
+
+    def _remove_expired(self, now: float) -> list:
+        """Must be called under lock, returns expired sessions to close"""
+        expired = []
+        for key in tuple(self._idle):
+            idle = self._idle[key]
+            alive = [i for i in idle if now - i.last_used < self.idle_timeout]
+            if len(alive) != len(idle):
+                expired.extend(i.worker for i in idle if now - i.last_used >= self.idle_timeout)
+            if alive:
+                self._idle[key] = alive
+            else:
+                del self._idle[key]
+        self._stats.discarded += len(expired)
+        return expired
+
+    def _healthy(self, idle: _Idle, now: float) -> bool:
+        if now - idle.last_used < self.check_interval:
+            return True
+        try:
+            idle.worker.get(_HEALTH_CHECK_OID)
+        except EasySNMPError:
+            return False
+        return True
+
+    def _acquire(self, key: SessionKey, **session_kwargs):
+        while True:
+            now = monotonic()
+            with self._lock:
+                expired = self._remove_expired(now)
+                idle_list = self._idle.get(key)
+                idle = idle_list.pop() if idle_list else None
+            for worker in expired:
+                self._close(worker)
+            if idle is None:
+                break
+            if self._healthy(idle, now):
+                with self._lock:
+                    self._stats.reused += 1
+                return idle.worker
+            with self._lock:
+                self._stats.discarded += 1
+            self._close(idle.worker)
+
+        host, community, version = key
+        worker = self._create(hostname=host, community=community, version=version, **session_kwargs)
+        with self._lock:
+            self._stats.created += 1
+        return worker
+
+    def _release(self, key: SessionKey, worker) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(_Idle(worker))
+                return
+            self._stats.discarded += 1
+        self._close(worker)
+
+    @contextmanager
+    def session(self, host: str, community: str, version: int = 2, **session_kwargs) -> Generator:
+        """
+        Lease snmp session for host. Session is returned to pool after block,
+        or closed when block failed by snmp or connection error.
+
+        :param session_kwargs: Extra easysnmp Session options, used only
+                               when new session is created.
+        """
+        key = (str(host), str(community), int(version))
+        worker = self._acquire(key, **session_kwargs)
+        try:
+            yield worker
+        except (EasySNMPError, DeviceConnectionError, OSError):
+            with self._lock:
+                self._stats.discarded += 1
+            self._close(worker)
+            raise
+        except BaseException:
+            # i.e. GeneratorExit of strategy generator, session is fine
+            self._release(key, worker)
+            raise
+        self._release(key, worker)
+
+    def close(self) -> None:
+        with self._lock:
+            workers = [i.worker for idle in self._idle.values() for i in idle]
+            self._idle = {}
+        for worker in workers:
+            self._close(worker)
+
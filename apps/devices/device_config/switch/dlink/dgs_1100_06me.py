@@ -2,7 +2,6 @@ from devices.device_config.base import Vlans, Vlan
 from djing2.lib import safe_int
 from .dgs_3120_24sc import DlinkDGS_3120_24SCSwitchInterface
 from ..switch_device_strategy import SwitchDeviceStrategyContext
-from ...base_device_strategy import SNMPWorker
 
 _DEVICE_UNIQUE_CODE = 10
 
@@ -14,9 +13,8 @@ class DlinkDGS_1100_06MESwitchInterface(DlinkDGS_3120_24SCSwitchInterface):
     ports_len = 6
 
     def read_all_vlan_info(self) -> Vlans:
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
-            vids = snmp.get_list_keyval(".1.3.6.1.4.1.171.10.134.1.1.7.6.1.1")
+        with self.snmp_session() as snmp:
+            vids = tuple(snmp.get_list_keyval(".1.3.6.1.4.1.171.10.134.1.1.7.6.1.1"))
         for vid_name, vid in vids:
             vid = safe_int(vid)
             if vid in (0, 1):
@@ -26,8 +24,7 @@ class DlinkDGS_1100_06MESwitchInterface(DlinkDGS_3120_24SCSwitchInterface):
     def read_port_vlan_info(self, port: int) -> Vlans:
         if port > self.ports_len or port < 1:
             raise ValueError("Port must be in range 1-%d" % self.ports_len)
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             vids = snmp.get_list_keyval(".1.3.6.1.4.1.171.10.134.1.1.7.6.1.1")
             native_vid = snmp.get_item(".1.3.6.1.4.1.171.10.134.1.1.7.7.1.1.%d" % port)
             if not native_vid:
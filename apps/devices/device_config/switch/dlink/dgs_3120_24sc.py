@@ -2,11 +2,11 @@ from typing import AnyStr, Generator
 import struct
 
 from djing2.lib import safe_int, RuTimedelta, process_lock_decorator
-from devices.device_config.base_device_strategy import SNMPWorker
 from devices.device_config.switch.switch_device_strategy import (
     SwitchDeviceStrategyContext, SwitchDeviceStrategy,
     PortType
 )
+from devices.device_config.switch.vlan_matrix import VlanMatrix, read_dot1q_vlan_matrix
 from devices.device_config.base import (
     Vlans,
     Vlan,
@@ -31,25 +31,12 @@ class DlinkDGS_3120_24SCSwitchInterface(SwitchDeviceStrategy):
     def read_port_vlan_info(self, port: int) -> Vlans:
         if port > self.ports_len or port < 1:
             raise DeviceImplementationError("Port must be in range 1-%d" % self.ports_len)
-        vid = 1
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        while True:
-            member_ports, vid = snmp.get_next_keyval(".1.3.6.1.2.1.17.7.1.4.3.1.2.%d" % vid)
-            if not member_ports:
-                break
-            if isinstance(member_ports, str):
-                member_ports = member_ports.encode()
-            vid = safe_int(vid)
-            if vid in (0, 1):
-                break
-            member_ports = self._make_ports_map(member_ports[:4])
-            if not member_ports[port - 1]:
-                continue
-            untagged_members = snmp.get_item("1.3.6.1.2.1.17.7.1.4.3.1.4.%d" % vid)
-            untagged_members = self._make_ports_map(untagged_members[:4])
-            name = self.get_vid_name(vid)
-            yield Vlan(vid=vid, title=name, native=untagged_members[port - 1])
+        return self.read_vlan_matrix().port_vlans(port)
+
+    def read_vlan_matrix(self) -> VlanMatrix:
+        with self.snmp_session() as snmp:
+            # default vlan is not shown on ports
+            return read_dot1q_vlan_matrix(snmp, ports_len=self.ports_len, skip_vids=(1,))
 
     @staticmethod
     def _make_ports_map(data: AnyStr) -> list[bool]:
@@ -66,9 +53,8 @@ class DlinkDGS_3120_24SCSwitchInterface(SwitchDeviceStrategy):
         return struct.pack("!I", i)
 
     def read_all_vlan_info(self) -> Vlans:
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
-            vids = snmp.get_list_keyval(".1.3.6.1.2.1.17.7.1.4.3.1.1")
+        with self.snmp_session() as snmp:
+            vids = tuple(snmp.get_list_keyval(".1.3.6.1.2.1.17.7.1.4.3.1.1"))
         for vid_name, vid in vids:
             vid = safe_int(vid)
             if vid in (0, 1):
@@ -79,8 +65,7 @@ class DlinkDGS_3120_24SCSwitchInterface(SwitchDeviceStrategy):
     def read_mac_address_port(self, port_num: int) -> Macs:
         if port_num > self.ports_len or port_num < 1:
             raise DeviceImplementationError("Port must be in range 1-%d" % self.ports_len)
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             fdb = snmp.get_list_with_oid(".1.3.6.1.2.1.17.7.1.2.2.1.2")
             for fdb_port, oid in fdb:
                 if port_num != int(fdb_port):
@@ -94,8 +79,7 @@ class DlinkDGS_3120_24SCSwitchInterface(SwitchDeviceStrategy):
         vid = safe_int(vid)
         if vid > 4095 or vid < 1:
             raise DeviceImplementationError("VID must be in range 1-%d" % 4095)
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             fdb = snmp.get_list_with_oid(".1.3.6.1.2.1.17.7.1.2.2.1.2.%d" % vid)
             vid_name = self.get_vid_name(vid)
             for port_num, oid in fdb:
@@ -108,8 +92,7 @@ class DlinkDGS_3120_24SCSwitchInterface(SwitchDeviceStrategy):
         :param vlan: vlan for check
         :return: True if vlan created
         """
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             snmp_vlan = snmp.get_item(".1.3.6.1.2.1.17.7.1.4.3.1.5.%d" % vlan.vid)
             if snmp_vlan is None:
                 return self.create_vlan(vlan=vlan)
@@ -122,36 +105,33 @@ class DlinkDGS_3120_24SCSwitchInterface(SwitchDeviceStrategy):
         # if vlan does not exsists on device, then create it
         self._add_vlan_if_not_exists(vlan)
 
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-
-        port_member_tagged = snmp.get_item(".1.3.6.1.2.1.17.7.1.4.3.1.2.%d" % vlan.vid)
-        port_member_untag = snmp.get_item(".1.3.6.1.2.1.17.7.1.4.3.1.4.%d" % vlan.vid)
-        if not port_member_tagged or not port_member_untag:
-            return False
-
-        port_member_tagged_map = self._make_ports_map(port_member_tagged)
-        port_member_untag_map = self._make_ports_map(port_member_untag)
-        if member:
-            port_member_untag_map[port - 1] = vlan.native
-            port_member_tagged_map[port - 1] = True
-        else:
-            port_member_untag_map[port - 1] = False
-            port_member_tagged_map[port - 1] = False
-
-        port_member_tagged = self._make_buf_from_ports_map(port_member_tagged_map)
-        port_member_untag = self._make_buf_from_ports_map(port_member_untag_map)
-
-        return snmp.set_multiple(
-            oid_values=[
-                (".1.3.6.1.2.1.17.7.1.4.3.1.2.%d" % vlan.vid, port_member_tagged, "OCTETSTR"),
-                (".1.3.6.1.2.1.17.7.1.4.3.1.4.%d" % vlan.vid, port_member_untag, "OCTETSTR"),
-            ]
-        )
+        with self.snmp_session() as snmp:
+            port_member_tagged = snmp.get_item(".1.3.6.1.2.1.17.7.1.4.3.1.2.%d" % vlan.vid)
+            port_member_untag = snmp.get_item(".1.3.6.1.2.1.17.7.1.4.3.1.4.%d" % vlan.vid)
+            if not port_member_tagged or not port_member_untag:
+                return False
+
+            port_member_tagged_map = self._make_ports_map(port_member_tagged)
+            port_member_untag_map = self._make_ports_map(port_member_untag)
+            if member:
+                port_member_untag_map[port - 1] = vlan.native
+                port_member_tagged_map[port - 1] = True
+            else:
+                port_member_untag_map[port - 1] = False
+                port_member_tagged_map[port - 1] = False
+
+            port_member_tagged = self._make_buf_from_ports_map(port_member_tagged_map)
+            port_member_untag = self._make_buf_from_ports_map(port_member_untag_map)
+
+            return snmp.set_multiple(
+                oid_values=[
+                    (".1.3.6.1.2.1.17.7.1.4.3.1.2.%d" % vlan.vid, port_member_tagged, "OCTETSTR"),
+                    (".1.3.6.1.2.1.17.7.1.4.3.1.4.%d" % vlan.vid, port_member_untag, "OCTETSTR"),
+                ]
+            )
 
     def get_ports(self) -> Generator:
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             ifs_ids = snmp.get_list(".1.3.6.1.2.1.10.7.2.1.1")
             for num, if_id in enumerate(ifs_ids, 1):
                 if num > self.ports_len:
@@ -160,8 +140,7 @@ class DlinkDGS_3120_24SCSwitchInterface(SwitchDeviceStrategy):
 
     def get_port(self, snmp_num: int):
         snmp_num = safe_int(snmp_num)
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             status = snmp.get_item(".1.3.6.1.2.1.2.2.1.7.%d" % snmp_num)
             status = status and int(status) == 1
             return PortType(
@@ -175,8 +154,7 @@ class DlinkDGS_3120_24SCSwitchInterface(SwitchDeviceStrategy):
 
     def port_toggle(self, port_num: int, state: int):
         oid = "%s.%d" % (".1.3.6.1.2.1.2.2.1.7", port_num)
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             snmp.set_int_value(oid, state)
 
     def port_disable(self, port_num: int):
@@ -186,13 +164,11 @@ class DlinkDGS_3120_24SCSwitchInterface(SwitchDeviceStrategy):
         self.port_toggle(port_num, 1)
 
     def get_device_name(self):
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             return snmp.get_item(".1.3.6.1.2.1.1.1.0")
 
     def get_uptime(self) -> str:
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             uptimestamp = safe_int(snmp.get_item(".1.3.6.1.2.1.1.8.0"))
         tm = RuTimedelta(seconds=uptimestamp / 100)
         return str(tm)
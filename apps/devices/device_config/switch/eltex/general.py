@@ -1,5 +1,5 @@
 import math
-from typing import Generator, Iterable
+from typing import Generator, Iterable, Optional
 
 from django.utils.translation import gettext_lazy as _
 
@@ -14,7 +14,7 @@ from devices.device_config.base import (
 from ..switch_device_strategy import SwitchDeviceStrategyContext
 from ..dlink.dgs_1100_10me import DlinkDGS1100_10ME
 from ..switch_device_strategy import PortType
-from ...base_device_strategy import SNMPWorker
+from ..vlan_matrix import VlanMatrix, bitmap_positions, octets, read_dot1q_vlan_names
 
 _DEVICE_UNIQUE_CODE = 4
 
@@ -39,25 +39,21 @@ class EltexSwitch(DlinkDGS1100_10ME):
         )
 
     def get_ports(self) -> tuple:
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        return tuple(self.build_port(snmp, i, n) for i, n in enumerate(range(49, self.ports_len + 49), 1))
+        with self.snmp_session() as snmp:
+            return tuple(self.build_port(snmp, i, n) for i, n in enumerate(range(49, self.ports_len + 49), 1))
 
     def get_device_name(self):
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             return snmp.get_item(".1.3.6.1.2.1.1.5.0")
 
     def get_uptime(self):
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             uptimestamp = safe_int(snmp.get_item(".1.3.6.1.2.1.1.3.0"))
         tm = RuTimedelta(seconds=uptimestamp / 100)
         return tm
 
     def save_config(self) -> bool:
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             return snmp.set_multiple([
                 ("1.3.6.1.4.1.89.87.2.1.3.1", 1, "i"),
                 ("1.3.6.1.4.1.89.87.2.1.7.1", 2, "i"),
@@ -67,130 +63,108 @@ class EltexSwitch(DlinkDGS1100_10ME):
             ])
 
     def reboot(self, save_before_reboot=False) -> bool:
-        dev = self.model_instance
         if save_before_reboot:
             if not self.save_config():
                 return False
-            with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+            with self.snmp_session() as snmp:
                 if not snmp.set("1.3.6.1.4.1.89.1.10.0", 8, snmp_type="t"):
                     return False
         else:
-            with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+            with self.snmp_session() as snmp:
                 if not snmp.set("1.3.6.1.4.1.89.1.10.0", 0, snmp_type="t"):
                     return False
         return True
 
     def port_disable(self, port_num: int):
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             snmp.set_int_value("%s.%d" % (".1.3.6.1.2.1.2.2.1.7", port_num + 48), 2)
 
     def port_enable(self, port_num: int):
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             snmp.set_int_value("%s.%d" % (".1.3.6.1.2.1.2.2.1.7", port_num + 48), 1)
 
     def read_port_vlan_info(self, port: int) -> Vlans:
-        def _calc_ret(vlan_untagged_egress_oid, vlan_egress_bitmap, table_no) -> Vlans:
-            vlan_untagged_egress = snmp.get_item(vlan_untagged_egress_oid)
-            vlan_untagged_egress = list(self.parse_eltex_vlan_map(vlan_untagged_egress, table=table_no))
-            is_native = next((v == 1 for i, v in enumerate(vlan_untagged_egress, 1) if i >= port), False)
-            return (
-                Vlan(vid=vid, title=self.get_vid_name(vid=vid), native=is_native)
-                for vid in self.parse_eltex_vlan_map(vlan_egress_bitmap, table=table_no)
-            )
-
         if port > self.ports_len or port < 1:
             raise DeviceImplementationError("Port must be in range 1-%d" % self.ports_len)
-        port = port + 48
-
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-
-        # rldot1qPortVlanStaticEgressList1to1024
-        vlan_egress = snmp.get_item("1.3.6.1.4.1.89.48.68.1.1.%d" % port)
-        if vlan_egress:
-            return _calc_ret(
-                # rldot1qPortVlanStaticUntaggedEgressList1to1024
-                vlan_untagged_egress_oid="1.3.6.1.4.1.89.48.68.1.5.%d" % port,
-                vlan_egress_bitmap=vlan_egress,
-                table_no=0,
-            )
-
-        # rldot1qPortVlanStaticEgressList1025to2048
-        vlan_egress = snmp.get_item("1.3.6.1.4.1.89.48.68.1.2.%d" % port)
-        if vlan_egress:
-            return _calc_ret(
-                # rldot1qPortVlanStaticUntaggedEgressList1025to2048
-                vlan_untagged_egress_oid="1.3.6.1.4.1.89.48.68.1.6.%d" % port,
-                vlan_egress_bitmap=vlan_egress,
-                table_no=1,
-            )
-        # rldot1qPortVlanStaticEgressList2049to3072
-        vlan_egress = snmp.get_item("1.3.6.1.4.1.89.48.68.1.3.%d" % port)
-        if vlan_egress:
-            return _calc_ret(
-                # rldot1qPortVlanStaticUntaggedEgressList2049to3072
-                vlan_untagged_egress_oid="1.3.6.1.4.1.89.48.68.1.7.%d" % port,
-                vlan_egress_bitmap=vlan_egress,
-                table_no=2,
-            )
-        # rldot1qPortVlanStaticEgressList3073to4094
-        vlan_egress = snmp.get_item("1.3.6.1.4.1.89.48.68.1.4.%d" % port)
-        if vlan_egress:
-            return _calc_ret(
-                # rldot1qPortVlanStaticUntaggedEgressList3073to4094
-                vlan_untagged_egress_oid="1.3.6.1.4.1.89.48.68.1.8.%d" % port,
-                vlan_egress_bitmap=vlan_egress,
-                table_no=3,
-            )
+        return self.read_vlan_matrix().port_vlans(port)
+
+    def read_vlan_matrix(self) -> VlanMatrix:
+        # Port rows of rldot1qPortVlanStaticTable are indexed by ifIndex,
+        # each of 4 vlan bitmaps covers 1024 vlans
+        columns = {}
+        for table_no in range(4):
+            # rldot1qPortVlanStaticEgressList1to1024 ... 3073to4094
+            columns["egress%d" % table_no] = ".1.3.6.1.4.1.89.48.68.1.%d" % (table_no + 1)
+            # rldot1qPortVlanStaticUntaggedEgressList1to1024 ... 3073to4094
+            columns["untagged%d" % table_no] = ".1.3.6.1.4.1.89.48.68.1.%d" % (table_no + 5)
+
+        with self.snmp_session() as snmp:
+            rows = snmp.get_table(columns)
+            matrix = VlanMatrix(names=read_dot1q_vlan_names(snmp))
+
+        for index, row in rows.items():
+            port = safe_int(index) - 48
+            if port < 1 or port > self.ports_len:
+                continue
+            for table_no in range(4):
+                offset = table_no * 1024
+                matrix.add_port(
+                    port,
+                    vids=bitmap_positions(octets(row.get("egress%d" % table_no)), offset=offset),
+                    untagged=bitmap_positions(octets(row.get("untagged%d" % table_no)), offset=offset),
+                )
+        return matrix
 
     def read_all_vlan_info(self) -> Vlans:
         snmp_vid = 100000
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        while True:
-            res = snmp.get_next(".1.3.6.1.2.1.2.2.1.1.%d" % snmp_vid)
-            if res.snmp_type != "INTEGER":
-                break
-            vid = snmp_vid = safe_int(res.value)
-            if vid < 100000 or vid > 104095:
-                break
-            vid = (vid - 100000) + 1
-            name = self.get_vid_name(vid=vid)
-            yield Vlan(vid=vid, title=name)
+        with self.snmp_session() as snmp:
+            while True:
+                res = snmp.get_next(".1.3.6.1.2.1.2.2.1.1.%d" % snmp_vid)
+                if res.snmp_type != "INTEGER":
+                    break
+                vid = snmp_vid = safe_int(res.value)
+                if vid < 100000 or vid > 104095:
+                    break
+                vid = (vid - 100000) + 1
+                name = self.get_vid_name(vid=vid)
+                yield Vlan(vid=vid, title=name)
+
+    def get_fdb_ports_map(self, snmp) -> Optional[dict[int, int]]:
+        try:
+            return {int(i): n + 1 for n, i in enumerate(snmp.get_list(".1.3.6.1.2.1.2.2.1.1")) if int(i) > 0}
+        except ValueError as err:
+            # Without ports map whole fdb would look as disappeared
+            raise DeviceImplementationError("Failed to read ports map: %s" % err) from err
 
     @process_lock_decorator()
     def read_mac_address_port(self, port_num: int) -> Macs:
         if port_num > self.ports_len or port_num < 1:
             raise DeviceImplementationError("Port must be in range 1-%d" % self.ports_len)
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        try:
-            ports_map = {int(i): n + 1 for n, i in enumerate(snmp.get_list(".1.3.6.1.2.1.2.2.1.1")) if int(i) > 0}
-        except ValueError:
-            return
-        for fdb_port, oid in snmp.get_list_with_oid(".1.3.6.1.2.1.17.7.1.2.2.1.2"):
-            real_fdb_port_num = ports_map.get(int(fdb_port))
-            if port_num != real_fdb_port_num:
-                continue
-            vid = safe_int(oid[-7:-6][0])
-            fdb_mac = ":".join("%.2x" % int(i) for i in oid[-6:])
-            vid_name = self.get_vid_name(vid)
-            yield MacItem(vid=vid, name=vid_name, mac=fdb_mac, port=real_fdb_port_num)
+        with self.snmp_session() as snmp:
+            try:
+                ports_map = {int(i): n + 1 for n, i in enumerate(snmp.get_list(".1.3.6.1.2.1.2.2.1.1")) if int(i) > 0}
+            except ValueError:
+                return
+            for fdb_port, oid in snmp.get_list_with_oid(".1.3.6.1.2.1.17.7.1.2.2.1.2"):
+                real_fdb_port_num = ports_map.get(int(fdb_port))
+                if port_num != real_fdb_port_num:
+                    continue
+                vid = safe_int(oid[-7:-6][0])
+                fdb_mac = ":".join("%.2x" % int(i) for i in oid[-6:])
+                vid_name = self.get_vid_name(vid)
+                yield MacItem(vid=vid, name=vid_name, mac=fdb_mac, port=real_fdb_port_num)
 
     def read_mac_address_vlan(self, vid: int) -> Macs:
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        try:
-            ports_map = {int(i): n + 1 for n, i in enumerate(snmp.get_list(".1.3.6.1.2.1.2.2.1.1")) if int(i) > 0}
-        except ValueError:
-            return
-        for fdb_port, oid in snmp.get_list_with_oid(".1.3.6.1.2.1.17.7.1.2.2.1.2.%d" % vid):
-            real_fdb_port_num = ports_map.get(int(fdb_port))
-            fdb_mac = ":".join("%.2x" % int(i) for i in oid[-6:])
-            vid_name = self.get_vid_name(vid)
-            yield MacItem(vid=vid, name=vid_name, mac=fdb_mac, port=real_fdb_port_num)
+        with self.snmp_session() as snmp:
+            try:
+                ports_map = {int(i): n + 1 for n, i in enumerate(snmp.get_list(".1.3.6.1.2.1.2.2.1.1")) if int(i) > 0}
+            except ValueError:
+                return
+            for fdb_port, oid in snmp.get_list_with_oid(".1.3.6.1.2.1.17.7.1.2.2.1.2.%d" % vid):
+                real_fdb_port_num = ports_map.get(int(fdb_port))
+                fdb_mac = ":".join("%.2x" % int(i) for i in oid[-6:])
+                vid_name = self.get_vid_name(vid)
+                yield MacItem(vid=vid, name=vid_name, mac=fdb_mac, port=real_fdb_port_num)
 
     @staticmethod
     def make_eltex_map_vlan(vids: Iterable[int]) -> dict[int, bytes]:
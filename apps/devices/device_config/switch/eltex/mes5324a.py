@@ -1,5 +1,4 @@
 from django.utils.translation import gettext_lazy as _
-from devices.device_config.base_device_strategy import SNMPWorker
 from devices.device_config.switch.eltex.general import EltexSwitch
 from devices.device_config.switch.switch_device_strategy import SwitchDeviceStrategyContext, PortType
 from djing2.lib import safe_int
@@ -26,9 +25,8 @@ class EltexMes5324A(EltexSwitch):
         )
 
     def get_ports(self) -> tuple:
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        return tuple(self.build_port(snmp, i, i) for i in range(1, self.ports_len+1))
+        with self.snmp_session() as snmp:
+            return tuple(self.build_port(snmp, i, i) for i in range(1, self.ports_len+1))
 
 
 SwitchDeviceStrategyContext.add_device_type(_DEVICE_UNIQUE_CODE, EltexMes5324A)
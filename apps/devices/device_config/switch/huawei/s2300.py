@@ -5,7 +5,6 @@ from ..switch_device_strategy import SwitchDeviceStrategyContext
 from ..eltex.general import EltexSwitch
 from devices.device_config.base import DeviceImplementationError, Vlan, Vlans, Macs, MacItem
 from ..switch_device_strategy import PortType
-from ...base_device_strategy import SNMPWorker
 
 
 class HuaweiS2300(EltexSwitch):
@@ -19,43 +18,40 @@ class HuaweiS2300(EltexSwitch):
         # interfaces count
         # yield safe_int(self.get_item('.1.3.6.1.2.1.17.1.2.0'))
 
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
+        with self.snmp_session() as snmp:
+            interfaces_ids = snmp.get_list(".1.3.6.1.2.1.17.1.4.1.2")
+            if interfaces_ids is None:
+                raise DeviceImplementationError("Switch returned null")
+            interfaces_ids = tuple(next(interfaces_ids) for _ in range(self.ports_len))
 
-        interfaces_ids = snmp.get_list(".1.3.6.1.2.1.17.1.4.1.2")
-        if interfaces_ids is None:
-            raise DeviceImplementationError("Switch returned null")
-        interfaces_ids = tuple(next(interfaces_ids) for _ in range(self.ports_len))
+            def build_port(i: int, n: int):
+                speed = snmp.get_item(".1.3.6.1.2.1.2.2.1.5.%d" % n)
+                oper_status = safe_int(snmp.get_item(".1.3.6.1.2.1.2.2.1.7.%d" % n)) == 1
+                link_status = safe_int(snmp.get_item(".1.3.6.1.2.1.2.2.1.8.%d" % n)) == 1
+                ep = PortType(
+                    num=i + 1,
+                    snmp_num=n,
+                    name=snmp.get_item(".1.3.6.1.2.1.2.2.1.2.%d" % n),  # name
+                    status=oper_status,  # status
+                    mac=b"",  # self.get_item('.1.3.6.1.2.1.2.2.1.6.%d' % n),    # mac
+                    speed=0 if not link_status else safe_int(speed),  # speed
+                    uptime=snmp.get_item(".1.3.6.1.2.1.2.2.1.9.%d" % n),  # UpTime
+                )
+                return ep
 
-        def build_port(i: int, n: int):
-            speed = snmp.get_item(".1.3.6.1.2.1.2.2.1.5.%d" % n)
-            oper_status = safe_int(snmp.get_item(".1.3.6.1.2.1.2.2.1.7.%d" % n)) == 1
-            link_status = safe_int(snmp.get_item(".1.3.6.1.2.1.2.2.1.8.%d" % n)) == 1
-            ep = PortType(
-                num=i + 1,
-                snmp_num=n,
-                name=snmp.get_item(".1.3.6.1.2.1.2.2.1.2.%d" % n),  # name
-                status=oper_status,  # status
-                mac=b"",  # self.get_item('.1.3.6.1.2.1.2.2.1.6.%d' % n),    # mac
-                speed=0 if not link_status else safe_int(speed),  # speed
-                uptime=snmp.get_item(".1.3.6.1.2.1.2.2.1.9.%d" % n),  # UpTime
-            )
-            return ep
-
-        return tuple(build_port(i, int(n)) for i, n in enumerate(interfaces_ids))
+            return tuple(build_port(i, int(n)) for i, n in enumerate(interfaces_ids))
 
     def read_all_vlan_info(self) -> Vlans:
         vid = 1
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        while True:
-            res = snmp.get_next(".1.3.6.1.2.1.17.7.1.4.3.1.1.%d" % vid)
-            vid = safe_int(res.value[5:])
-            if vid == 1:
-                continue
-            if vid == 0:
-                return
-            yield Vlan(vid=vid, title=res.value)
+        with self.snmp_session() as snmp:
+            while True:
+                res = snmp.get_next(".1.3.6.1.2.1.17.7.1.4.3.1.1.%d" % vid)
+                vid = safe_int(res.value[5:])
+                if vid == 1:
+                    continue
+                if vid == 0:
+                    return
+                yield Vlan(vid=vid, title=res.value)
 
     def read_mac_address_port(self, port_num: int) -> Macs:
         yield MacItem(vid=None, name="", mac="0:0:0:0:0:0", port=0)
@@ -84,22 +80,21 @@ class HuaweiS2300(EltexSwitch):
     def read_port_vlan_info(self, port: int) -> Vlans:
         if port > self.ports_len or port < 1:
             raise ValueError("Port must be in range 1-%d" % self.ports_len)
-        dev = self.model_instance
-        snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
-        vids = snmp.get_list_keyval(".1.3.6.1.2.1.17.7.1.4.3.1.1")
-        for vid_name, vid in vids:
-            vid = safe_int(vid)
-            if vid in (0, 1):
-                continue
-            member_ports = snmp.get_item(".1.3.6.1.2.1.17.7.1.4.3.1.2.%d" % vid)
-            if not member_ports:
-                return
-            member_ports = self._make_ports_map(member_ports[:4])
-            if not member_ports[port]:
-                # if port num is not <port>
-                continue
-            name = self.get_vid_name(vid)
-            yield Vlan(vid=vid, title=name)
+        with self.snmp_session() as snmp:
+            vids = snmp.get_list_keyval(".1.3.6.1.2.1.17.7.1.4.3.1.1")
+            for vid_name, vid in vids:
+                vid = safe_int(vid)
+                if vid in (0, 1):
+                    continue
+                member_ports = snmp.get_item(".1.3.6.1.2.1.17.7.1.4.3.1.2.%d" % vid)
+                if not member_ports:
+                    return
+                member_ports = self._make_ports_map(member_ports[:4])
+                if not member_ports[port]:
+                    # if port num is not <port>
+                    continue
+                name = self.get_vid_name(vid)
+                yield Vlan(vid=vid, title=name)
 
 
 class HuaweiS5300_10P_LI_AC(HuaweiS2300):
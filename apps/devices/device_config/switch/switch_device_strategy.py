@@ -4,12 +4,13 @@ from typing import Optional, AnyStr
 from transliterate import translit
 from django.conf import settings
 from django.utils.translation import gettext
-from devices.device_config.base import Vlans, Macs
+from devices.device_config.base import Vlans, Macs, MacItem, UnsupportedReadingVlan
 from devices.device_config.base_device_strategy import (
     BaseDeviceStrategyContext, BaseDeviceStrategy,
-    SNMPWorker, ListDeviceConfigType
+    ListDeviceConfigType
 )
-from djing2.lib import macbin2str, RuTimedelta
+from djing2.lib import macbin2str, RuTimedelta, safe_int
+from .vlan_matrix import VlanMatrix
 
 
 class PortType(object):
@@ -109,6 +110,13 @@ class SwitchDeviceStrategy(BaseDeviceStrategy):
         """
         raise NotImplementedError
 
+    def read_vlan_matrix(self) -> VlanMatrix:
+        """
+        Read vlans of all ports at once
+        :return: Port to vlan membership matrix
+        """
+        raise UnsupportedReadingVlan
+
     @abstractmethod
     def read_mac_address_port(self, port_num: int) -> Macs:
         """
@@ -118,9 +126,42 @@ class SwitchDeviceStrategy(BaseDeviceStrategy):
         """
         raise NotImplementedError
 
+    def read_fdb(self) -> tuple[MacItem, ...]:
+        """
+        Read whole FDB of all ports and vlans by one walk of dot1qTpFdbPort
+        :return: Mac list, without vlan names
+        """
+        with self.snmp_session() as snmp:
+            ports_map = self.get_fdb_ports_map(snmp)
+            fdb = tuple(snmp.bulk_walk_column(".1.3.6.1.2.1.17.7.1.2.2.1.2"))
+        res = []
+        for index, fdb_port in fdb:
+            # index is vid and 6 octets of mac
+            index = index.split(".")
+            if len(index) != 7:
+                continue
+            port = safe_int(fdb_port)
+            if ports_map is not None:
+                port = ports_map.get(port)
+                if port is None:
+                    continue
+            res.append(MacItem(
+                vid=safe_int(index[0]),
+                name="",
+                mac=":".join("%.2x" % int(i) for i in index[1:]),
+                port=port,
+            ))
+        return tuple(res)
+
+    def get_fdb_ports_map(self, snmp) -> Optional[dict[int, int]]:
+        """
+        :return: Bridge port number to device port number,
+                 None when they are equal
+        """
+        return None
+
     def get_vid_name(self, vid: int) -> str:
-        dev = self.model_instance
-        with SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw)) as snmp:
+        with self.snmp_session() as snmp:
             return snmp.get_item(".1.3.6.1.2.1.17.7.1.4.3.1.1.%d" % vid)
 
     @abstractmethod
@@ -178,6 +219,20 @@ class SwitchDeviceStrategyContext(BaseDeviceStrategyContext):
         """
         return self._current_dev_manager.read_port_vlan_info(port=port)
 
+    def read_vlan_matrix(self) -> VlanMatrix:
+        """
+        Read vlans of all ports at once
+        :return: Port to vlan membership matrix
+        """
+        return self._current_dev_manager.read_vlan_matrix()
+
+    def read_fdb(self) -> tuple[MacItem, ...]:
+        """
+        Read whole FDB of all ports and vlans
+        :return: Mac list, without vlan names
+        """
+        return self._current_dev_manager.read_fdb()
+
     def read_mac_address_port(self, port_num: int) -> Macs:
         """
         Read FDB on port
@@ -0,0 +1,149 @@
+"""
+Port to vlan membership matrix.
+
+Vlan tables are read from switch once, by GETBULK, and all membership
+bitmaps are decoded in one pass. Vlans of each port are then taken
+from matrix instead of requesting switch for each vlan.
+"""
+from typing import Any, Iterable, Iterator, Optional
+
+from djing2.lib import safe_int
+from devices.device_config.base import Vlan
+
+# Q-BRIDGE-MIB dot1qVlanStaticTable, indexed by vid
+DOT1Q_VLAN_STATIC_NAME = ".1.3.6.1.2.1.17.7.1.4.3.1.1"
+DOT1Q_VLAN_STATIC_EGRESS_PORTS = ".1.3.6.1.2.1.17.7.1.4.3.1.2"
+DOT1Q_VLAN_STATIC_UNTAGGED_PORTS = ".1.3.6.1.2.1.17.7.1.4.3.1.4"
+
+
+def octets(v: Any) -> bytes:
+    """Octet string value as bytes, easysnmp returns it as str"""
+    if v is None:
+        return b""
+    if isinstance(v, str):
+        return v.encode("utf-8", "surrogateescape")
+    return bytes(v)
+
+
+def bitmap_positions(bitmap: bytes, offset: int = 0) -> Iterator[int]:
+    """
+    1-based positions of set bits, most significant bit of first
+    octet is position 1, as in PortList of Q-BRIDGE-MIB.
+    Only set bits are visited.
+
+    >>> tuple(bitmap_positions(b"\\x80\\x01"))
+    (1, 16)
+    """
+    bits_len = len(bitmap) * 8
+    v = int.from_bytes(bitmap, "big")
+    positions = []
+    while v:
+        bit = v & -v
+        positions.append(bits_len - bit.bit_length() + 1 + offset)
+        v ^= bit
+    return reversed(positions)
+
+
+class VlanMatrix:
+    """Membership of ports in vlans, port -> vid -> is untagged"""
+
+    def __init__(self, names: Optional[dict[int, str]] = None):
+        self._ports: dict[int, dict[int, bool]] = {}
+        self.names: dict[int, str] = names or {}
+
+    def add(self, port: int, vid: int, untagged: bool = False) -> None:
+        self._ports.setdefault(port, {})[vid] = untagged
+
+    def add_vlan(self, vid: int, egress: Iterable[int], untagged: Iterable[int]) -> None:
+        """Add ports of vlan, untagged ports are members even if they are not in egress"""
+        untagged = set(untagged)
+        for port in egress:
+            self.add(port, vid, port in untagged)
+        for port in untagged:
+            self.add(port, vid, True)
+
+    def add_port(self, port: int, vids: Iterable[int], untagged: Iterable[int]) -> None:
+        """Add vlans of port, untagged vlans are added even if they are not in vids"""
+        untagged = set(untagged)
+        for vid in vids:
+            self.add(port, vid, vid in untagged)
+        for vid in untagged:
+            self.add(port, vid, True)
+
+    @property
+    def ports(self) -> list[int]:
+        return sorted(self._ports)
+
+    @property
+    def vids(self) -> list[int]:
+        return sorted({vid for vlans in self._ports.values() for vid in vlans})
+
+    def is_member(self, port: int, vid: int) -> bool:
+        return vid in self._ports.get(port, ())
+
+    def vlan_ports(self, vid: int) -> list[int]:
+        return [port for port in self.ports if vid in self._ports[port]]
+
+    def port_vlans(self, port: int) -> list[Vlan]:
+        vlans = self._ports.get(port, {})
+        return [
+            Vlan(vid=vid, title=self.names.get(vid), native=vlans[vid])
+            for vid in sorted(vlans)
+        ]
+
+    def as_dict(self) -> dict:
+        """Json serializable representation, i.e. for device state cache"""
+        return {
+            "names": {str(vid): name for vid, name in self.names.items()},
+            "ports": {
+                str(port): {str(vid): untagged for vid, untagged in vlans.items()}
+                for port, vlans in self._ports.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "VlanMatrix":
+        matrix = cls(names={int(vid): name for vid, name in data.get("names", {}).items()})
+        for port, vlans in data.get("ports", {}).items():
+            for vid, untagged in vlans.items():
+                matrix.add(int(port), int(vid), bool(untagged))
+        return matrix
+
+
+def read_dot1q_vlan_matrix(snmp, ports_len: int, skip_vids: Iterable[int] = ()) -> VlanMatrix:
+    """
+    Read dot1qVlanStaticTable once, and decode egress and untagged
+    port lists of all vlans.
+
+    :param snmp: SNMPWorker.
+    :param ports_len: Ports over it, i.e. uplinks of stack, are ignored.
+    :param skip_vids: Vlans that are not shown on ports, i.e. default vlan.
+    """
+    rows = snmp.get_table({
+        "name": DOT1Q_VLAN_STATIC_NAME,
+        "egress": DOT1Q_VLAN_STATIC_EGRESS_PORTS,
+        "untagged": DOT1Q_VLAN_STATIC_UNTAGGED_PORTS,
+    })
+    skip_vids = set(skip_vids)
+    matrix = VlanMatrix()
+    for index, row in rows.items():
+        vid = safe_int(index)
+        if vid < 1 or vid in skip_vids:
+            continue
+        name = row.get("name")
+        if name:
+            matrix.names[vid] = name
+        matrix.add_vlan(
+            vid,
+            egress=(p for p in bitmap_positions(octets(row.get("egress"))) if p <= ports_len),
+            untagged=(p for p in bitmap_positions(octets(row.get("untagged"))) if p <= ports_len),
+        )
+    return matrix
+
+
+def read_dot1q_vlan_names(snmp) -> dict[int, str]:
+    return {
+        safe_int(vid): name
+        for vid, name in snmp.bulk_walk_column(DOT1Q_VLAN_STATIC_NAME)
+        if name
+    }
@@ -0,0 +1,219 @@
+"""
+FDB collector.
+
+Reads whole FDB of all switches periodically, keeps last snapshot of
+each switch, and changes between snapshots. Mac addresses are stored
+as integers, so search of mac over whole network is one index lookup
+instead of walking FDB of each switch.
+"""
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Any
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Count
+from easysnmp import EasySNMPError
+
+from devices.device_config.base import DeviceImplementationError, DeviceConnectionError
+from devices.device_config.device_type_collection import DEVICE_SWITCH_TYPE_CODES
+from devices.models import Device, DeviceFdbEntry, DeviceFdbChange
+
+
+# Seconds between collections by celery beat, 0 - periodic collection disabled
+FDB_COLLECTOR_INTERVAL = getattr(settings, "FDB_COLLECTOR_INTERVAL", 1800)
+FDB_COLLECTOR_WORKERS = getattr(settings, "FDB_COLLECTOR_WORKERS", 16)
+# FDB changes are removed after this days
+FDB_CHANGES_RETENTION_DAYS = getattr(settings, "FDB_CHANGES_RETENTION_DAYS", 30)
+
+_SAVE_BATCH_SIZE = 1000
+_mac_hex_chars = re.compile(r"[^0-9a-fA-F]")
+
+# (mac, vid) -> port
+FdbSnapshot = dict[tuple[int, int], int]
+
+
+def mac2int(mac: Any) -> int:
+    """
+    >>> mac2int("00:1a:2B:3c:4d:5e")
+    112394521950
+    >>> mac2int("001a.2b3c.4d5e")
+    112394521950
+    """
+    digits = _mac_hex_chars.sub("", str(mac))
+    if len(digits) != 12:
+        raise ValueError("Invalid mac address: %s" % mac)
+    return int(digits, 16)
+
+
+def int2mac(mac: int) -> str:
+    """
+    >>> int2mac(112394521950)
+    '00:1a:2b:3c:4d:5e'
+    """
+    return ":".join("%.2x" % b for b in int(mac).to_bytes(6, "big"))
+
+
+@dataclass
+class FdbChange:
+    mac: int
+    vid: int
+    # None when mac disappeared
+    port: Optional[int]
+    # None when mac appeared
+    old_port: Optional[int]
+
+
+def diff_fdb(old: FdbSnapshot, new: FdbSnapshot) -> list[FdbChange]:
+    changes = [
+        FdbChange(mac=mac, vid=vid, port=port, old_port=old.get((mac, vid)))
+        for (mac, vid), port in new.items()
+        if old.get((mac, vid)) != port
+    ]
+    changes.extend(
+        FdbChange(mac=mac, vid=vid, port=None, old_port=port)
+        for (mac, vid), port in old.items()
+        if (mac, vid) not in new
+    )
+    return changes
+
+
+@dataclass
+class FdbReadResult:
+    device_id: int
+    fdb: Optional[FdbSnapshot] = None
+    error: Optional[str] = None
+
+
+def read_device_fdb(device: Device) -> FdbReadResult:
+    res = FdbReadResult(device_id=device.pk)
+    try:
+        mng = device.get_switch_device_manager()
+        res.fdb = {(mac2int(i.mac), int(i.vid)): int(i.port) for i in mng.read_fdb()}
+    except (DeviceConnectionError, DeviceImplementationError, EasySNMPError, OSError, ValueError) as err:
+        res.error = str(err) or type(err).__name__
+    return res
+
+
+def store_fdb_snapshot(device_id: int, fdb: FdbSnapshot, now: Optional[datetime] = None) -> list[FdbChange]:
+    """
+    Replace stored snapshot of device with new one, and save changes.
+    Nothing is saved as change for the first snapshot of device.
+    """
+    if now is None:
+        now = datetime.now()
+    with transaction.atomic():
+        stored = {
+            (mac, vid): (pk, port)
+            for pk, mac, vid, port in DeviceFdbEntry.objects.filter(
+                device_id=device_id
+            ).values_list("pk", "mac", "vid", "port").iterator()
+        }
+        changes = diff_fdb({k: port for k, (pk, port) in stored.items()}, fdb)
+        if not changes:
+            DeviceFdbEntry.objects.filter(device_id=device_id).update(last_seen=now)
+            return changes
+
+        removed = [stored[(c.mac, c.vid)][0] for c in changes if c.port is None]
+        moved = [
+            DeviceFdbEntry(pk=stored[(c.mac, c.vid)][0], port=c.port)
+            for c in changes if c.port is not None and c.old_port is not None
+        ]
+        appeared = [
+            DeviceFdbEntry(device_id=device_id, mac=c.mac, vid=c.vid, port=c.port, first_seen=now, last_seen=now)
+            for c in changes if c.old_port is None
+        ]
+        if removed:
+            DeviceFdbEntry.objects.filter(pk__in=removed).delete()
+        if moved:
+            DeviceFdbEntry.objects.bulk_update(moved, ["port"], batch_size=_SAVE_BATCH_SIZE)
+        DeviceFdbEntry.objects.filter(device_id=device_id).update(last_seen=now)
+        if appeared:
+            DeviceFdbEntry.objects.bulk_create(appeared, batch_size=_SAVE_BATCH_SIZE)
+        if stored:
+            DeviceFdbChange.objects.bulk_create((
+                DeviceFdbChange(
+                    device_id=device_id, mac=c.mac, vid=c.vid,
+                    port=c.port, old_port=c.old_port, change_time=now
+                ) for c in changes
+            ), batch_size=_SAVE_BATCH_SIZE)
+    return changes
+
+
+def get_fdb_devices():
+    return Device.objects.filter(dev_type__in=DEVICE_SWITCH_TYPE_CODES).exclude(
+        ip_address=None
+    ).exclude(man_passw=None).exclude(man_passw='')
+
+
+def collect_fdb(devices=None, workers: int = FDB_COLLECTOR_WORKERS) -> tuple[int, int]:
+    """
+    Read FDB of switches concurrently, and store snapshots as they come.
+
+    :return: collected devices count, and count of failed devices.
+    """
+    if devices is None:
+        devices = get_fdb_devices()
+    devices = list(devices)
+    if not devices:
+        return 0, 0
+    collected = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(devices))),
+                            thread_name_prefix="fdb-collector") as executor:
+        futures = [executor.submit(read_device_fdb, device) for device in devices]
+        for future in as_completed(futures):
+            res = future.result()
+            collected += 1
+            if res.fdb is None:
+                failed += 1
+                continue
+            store_fdb_snapshot(res.device_id, res.fdb)
+    return collected, failed
+
+
+def remove_old_fdb_changes(now: Optional[datetime] = None) -> None:
+    if now is None:
+        now = datetime.now()
+    DeviceFdbChange.objects.filter(
+        change_time__lt=now - timedelta(days=FDB_CHANGES_RETENTION_DAYS)
+    ).delete()
+
+
+def collect_all_fdb(workers: int = FDB_COLLECTOR_WORKERS) -> tuple[int, int]:
+    res = collect_fdb(workers=workers)
+    remove_old_fdb_changes()
+    return res
+
+
+def find_mac(mac: Any, devices=None) -> list[DeviceFdbEntry]:
+    """
+    Find where mac is seen, over all switches.
+
+    Mac is learned on each switch on the path to it, so entries are ordered
+    by count of macs on their port, and customer port, with fewest macs,
+    comes first. Count is set to `port_mac_count` attribute of each entry.
+
+    :param devices: Device queryset to search in, all devices by default.
+    """
+    entries = DeviceFdbEntry.objects.filter(mac=mac2int(mac)).select_related("device")
+    if devices is not None:
+        entries = entries.filter(device__in=devices)
+    entries = list(entries)
+    if not entries:
+        return entries
+    ports_filter = Q()
+    for entry in {(e.device_id, e.port) for e in entries}:
+        ports_filter |= Q(device_id=entry[0], port=entry[1])
+    counts = Counter({
+        (r["device_id"], r["port"]): r["mac_count"]
+        for r in DeviceFdbEntry.objects.filter(ports_filter).values(
+            "device_id", "port"
+        ).annotate(mac_count=Count("pk")).order_by()
+    })
+    for e in entries:
+        e.port_mac_count = counts[(e.device_id, e.port)]
+    entries.sort(key=lambda e: (e.port_mac_count, -e.last_seen.timestamp()))
+    return entries
@@ -0,0 +1,111 @@
+from time import perf_counter
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError, no_translations
+
+from devices.device_config.base_device_strategy import SNMPWorker
+from devices.device_config.pon.epon.bdcom_p3310c import BDCOM_P3310C, ONUdevPort
+from djing2.lib import safe_int, safe_float, macbin2str
+
+
+def _scan_onu_list_by_items(dev):
+    """scan_onu_list as it was before bulk table reading, request for each onu cell"""
+    snmp = SNMPWorker(hostname=dev.ip_address, community=str(dev.man_passw))
+    for fiber_onu_num, fiber_id in snmp.get_list_keyval(".1.3.6.1.4.1.3320.101.6.1.1.23"):
+        for onu_num in fiber_onu_num.split(b","):
+            onu_num = safe_int(onu_num)
+            if onu_num == 0:
+                continue
+            status = safe_int(snmp.get_item(".1.3.6.1.4.1.3320.101.10.1.1.26.%d" % onu_num))
+            signal = safe_float(snmp.get_item(".1.3.6.1.4.1.3320.101.10.5.1.5.%d" % onu_num))
+            mac = snmp.get(".1.3.6.1.4.1.3320.101.10.1.1.3.%d" % onu_num)
+            yield ONUdevPort(
+                num=onu_num,
+                name=snmp.get_item(".1.3.6.1.2.1.2.2.1.2.%d" % onu_num),
+                status=status == 3,
+                mac=macbin2str(mac.value),
+                signal=signal / 10 if signal else "—",
+                uptime=safe_int(snmp.get_item(".1.3.6.1.2.1.2.2.1.9.%d" % onu_num)),
+                fiberid=safe_int(fiber_id),
+            )
+
+
+def _scan_onu_list_bulk(dev):
+    onu_list = BDCOM_P3310C(model_instance=dev).scan_onu_list()
+    # skip onu count and chunk size
+    next(onu_list)
+    next(onu_list)
+    return onu_list
+
+
+def make_bdcom_recording(fname: str, fibers: int, onus: int) -> None:
+    """
+    Make snmpsim recording (.snmprec) of BDCOM OLT with `onus` onu on each fiber.
+    snmpsim serves it with community equal to file name without extension.
+    """
+    records = []
+    onu_if = 100
+    for fiber_num in range(1, fibers + 1):
+        fiber_id = fiber_num + 5
+        onu_ifs = []
+        records.append(("1.3.6.1.2.1.2.2.1.2.%d" % fiber_id, 4, "EPON0/%d" % fiber_num))
+        records.append(("1.3.6.1.2.1.2.2.1.9.%d" % fiber_id, 67, 100))
+        for onu_num in range(1, onus + 1):
+            onu_if += 1
+            onu_ifs.append(str(onu_if))
+            records.extend((
+                ("1.3.6.1.2.1.2.2.1.2.%d" % onu_if, 4, "EPON0/%d:%d" % (fiber_num, onu_num)),
+                ("1.3.6.1.2.1.2.2.1.9.%d" % onu_if, 67, 1000 + onu_if),
+                ("1.3.6.1.4.1.3320.101.10.1.1.3.%d" % onu_if, "4x", "e0672a%06x" % onu_if),
+                ("1.3.6.1.4.1.3320.101.10.1.1.26.%d" % onu_if, 2, 3 if onu_if % 7 else 2),
+                ("1.3.6.1.4.1.3320.101.10.5.1.5.%d" % onu_if, 2, -200 - onu_if % 80),
+            ))
+        records.append(("1.3.6.1.4.1.3320.101.6.1.1.2.%d" % fiber_id, 2, onus))
+        records.append(("1.3.6.1.4.1.3320.101.6.1.1.23.%d" % fiber_id, 4, ",".join(onu_ifs) + ","))
+    records.sort(key=lambda r: tuple(int(i) for i in r[0].split(".")))
+    with open(fname, "w") as f:
+        for oid, tag, value in records:
+            f.write("%s|%s|%s\n" % (oid, tag, value))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-onu and bulk table scan_onu_list of BDCOM OLT. "
+        "Use snmpsim with recording from --make-recording as OLT stand-in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="OLT or snmpsim address")
+        parser.add_argument("--port", default=161, type=int)
+        parser.add_argument("--community", default="public",
+                            help="snmp community, for snmpsim it is recording name")
+        parser.add_argument("--repeat", default=3, type=int)
+        parser.add_argument("--make-recording", default=None, metavar="FNAME",
+                            help="Only make snmpsim recording into file and exit")
+        parser.add_argument("--fibers", default=4, type=int, help="Fibers count in recording")
+        parser.add_argument("--onus", default=64, type=int, help="Onu count for each fiber in recording")
+
+    @no_translations
+    def handle(self, host: str, port: int, community: str, repeat: int,
+               make_recording: str, fibers: int, onus: int, *args, **options):
+        if make_recording:
+            make_bdcom_recording(fname=make_recording, fibers=fibers, onus=onus)
+            self.stdout.write("Recording with %d onu saved to %s" % (fibers * onus, make_recording))
+            return
+
+        dev = SimpleNamespace(ip_address="%s:%d" % (host, port), man_passw=community)
+        results = {}
+        for name, scan in (("per-onu", _scan_onu_list_by_items), ("bulk", _scan_onu_list_bulk)):
+            times = []
+            for _ in range(repeat):
+                start_time = perf_counter()
+                results[name] = list(scan(dev))
+                times.append(perf_counter() - start_time)
+            best = min(times)
+            count = len(results[name])
+            self.stdout.write("%s: %d onu, best of %d %.3f s, %.1f onu/s" % (
+                name, count, repeat, best, count / best if best else 0
+            ))
+        if results["per-onu"] != results["bulk"]:
+            raise CommandError("Results differs")
+        self.stdout.write(self.style.SUCCESS("Results are identical"))
@@ -0,0 +1,28 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, no_translations
+
+from devices.models import Device
+from devices.poller import poll_devices, get_poll_targets, remove_old_poll_results, DEVICE_POLLER_WORKERS
+
+
+class Command(BaseCommand):
+    help = "Poll devices by snmp concurrently, and save results for UI and alerting"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=DEVICE_POLLER_WORKERS,
+                            help="How many devices are polled at the same time")
+        parser.add_argument("--device", type=int, action="append", default=None,
+                            help="Device id, may be specified several times. All devices by default")
+
+    @no_translations
+    def handle(self, workers: int, device: list, *args, **options):
+        devices = Device.objects.all()
+        if device:
+            devices = devices.filter(pk__in=device)
+        targets = get_poll_targets(devices)
+        start_time = perf_counter()
+        polled, failed = poll_devices(targets, workers=workers)
+        run_time = perf_counter() - start_time
+        remove_old_poll_results()
+        self.stdout.write("Polled %d devices, %d unavailable, %.3f s" % (polled, failed, run_time))
@@ -0,0 +1,41 @@
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0011_new_device_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DevicePollResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('poll_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='Poll time')),
+                ('ok', models.BooleanField(default=False, verbose_name='Device is available')),
+                ('uptime', models.BigIntegerField(blank=True, default=None, null=True, verbose_name='Uptime')),
+                ('data', models.JSONField(blank=True, default=dict, verbose_name='Polled data')),
+                ('error', models.CharField(blank=True, default=None, max_length=256, null=True, verbose_name='Error')),
+                ('device', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE, to='devices.device', verbose_name='Device'
+                )),
+            ],
+            options={
+                'verbose_name': 'Device poll result',
+                'verbose_name_plural': 'Device poll results',
+                'db_table': 'device_poll_result',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='devicepollresult',
+            index=models.Index(fields=['device', '-poll_time'], name='device_poll_result_dev_time'),
+        ),
+        migrations.AddIndex(
+            model_name='devicepollresult',
+            index=models.Index(fields=['poll_time'], name='device_poll_result_time'),
+        ),
+    ]
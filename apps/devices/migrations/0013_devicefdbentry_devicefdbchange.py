@@ -0,0 +1,71 @@
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0012_devicepollresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceFdbEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mac', models.BigIntegerField(verbose_name='Mac address')),
+                ('vid', models.PositiveSmallIntegerField(verbose_name='VID')),
+                ('port', models.PositiveSmallIntegerField(verbose_name='Port')),
+                ('first_seen', models.DateTimeField(default=datetime.datetime.now, verbose_name='First seen')),
+                ('last_seen', models.DateTimeField(default=datetime.datetime.now, verbose_name='Last seen')),
+                ('device', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE, to='devices.device', verbose_name='Device'
+                )),
+            ],
+            options={
+                'verbose_name': 'FDB entry',
+                'verbose_name_plural': 'FDB entries',
+                'db_table': 'device_fdb_entry',
+                'unique_together': {('device', 'mac', 'vid')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='devicefdbentry',
+            index=models.Index(fields=['mac'], name='device_fdb_entry_mac'),
+        ),
+        migrations.CreateModel(
+            name='DeviceFdbChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mac', models.BigIntegerField(verbose_name='Mac address')),
+                ('vid', models.PositiveSmallIntegerField(verbose_name='VID')),
+                ('port', models.PositiveSmallIntegerField(blank=True, default=None, null=True, verbose_name='Port')),
+                ('old_port', models.PositiveSmallIntegerField(
+                    blank=True, default=None, null=True, verbose_name='Old port'
+                )),
+                ('change_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='Change time')),
+                ('device', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE, to='devices.device', verbose_name='Device'
+                )),
+            ],
+            options={
+                'verbose_name': 'FDB change',
+                'verbose_name_plural': 'FDB changes',
+                'db_table': 'device_fdb_change',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='devicefdbchange',
+            index=models.Index(fields=['mac', '-change_time'], name='device_fdb_change_mac_time'),
+        ),
+        migrations.AddIndex(
+            model_name='devicefdbchange',
+            index=models.Index(fields=['device', '-change_time'], name='device_fdb_change_dev_time'),
+        ),
+        migrations.AddIndex(
+            model_name='devicefdbchange',
+            index=models.Index(fields=['change_time'], name='device_fdb_change_time'),
+        ),
+    ]
@@ -22,7 +22,7 @@ from devices.device_config.switch.switch_device_strategy import SwitchDeviceStra
 from groupapp.models import Group
 from networks.models import VlanIf
 from addresses.interfaces import IAddressContaining
-from addresses.models import AddressModel, AddressModelTypes
+from addresses.models import AddressModel, AddressModelTypes, AddressClosure
 
 
 class DeviceModelQuerySet(RemoveFilterQuerySetMixin, models.QuerySet):
@@ -30,26 +30,15 @@ class DeviceModelQuerySet(RemoveFilterQuerySetMixin, models.QuerySet):
         # Получить все устройства для населённого пункта.
         # Get all devices in specified location by their address_id.
 
-        # get locality from addr
-        addr_locality = AddressModel.objects.get_address_by_type(
-            addr_id=addr_id,
-            addr_type=AddressModelTypes.LOCALITY
-        ).first()
-
-        if addr_locality is None:
-            addr_query = AddressModel.objects.get_address_by_type(
-                addr_id=addr_id,
-                addr_type=AddressModelTypes.LOCALITY
-            )
-        else:
-            addr_query = AddressModel.objects.get_address_by_type(
-                addr_id=addr_locality.pk,
-                addr_type=AddressModelTypes.LOCALITY
-            )
-        if not addr_query.exists():
+        # nearest locality of addr, or addr itself
+        locality_id = AddressClosure.objects.filter(
+            descendant_id=addr_id,
+            ancestor__address_type=AddressModelTypes.LOCALITY
+        ).order_by('depth').values_list('ancestor_id', flat=True).first()
+        if locality_id is None:
             return self
         return self.remove_filter('address_id').filter(
-            address__in=AddressModel.objects.get_address_recursive_ids(addr_query.first().pk)
+            address__ancestor_links__ancestor_id=locality_id
         )
 
 
@@ -197,15 +186,18 @@ class Device(IAddressContaining, BaseAbstractModel):
         mng = self.get_pon_onu_device_manager()
         return mng.get_config_types()
 
+    def get_onu_config_type(self, code: str):
+        """Instance of onu config type with short_code, or None"""
+        dtypes = (dtype for dtype in self.get_config_types() if dtype.short_code == str(code))
+        dtype_for_run = next(dtypes, None)
+        if dtype_for_run is not None:
+            return dtype_for_run(title=dtype_for_run.title, code=dtype_for_run.short_code)
+
     def apply_onu_config(self, config: dict) -> OptionalScriptCallResult:
         self.code = config.get("configTypeCode")
         self.save(update_fields=["code"])
-        all_device_types = self.get_config_types()
-        self_device_type_code = str(self.code)
-        dtypes = (dtype for dtype in all_device_types if dtype.short_code == self_device_type_code)
-        dtype_for_run = next(dtypes, None)
-        if dtype_for_run is not None:
-            device_manager = dtype_for_run(title=dtype_for_run.title, code=dtype_for_run.short_code)
+        device_manager = self.get_onu_config_type(self.code)
+        if device_manager is not None:
             return device_manager.entry_point(config=config, device=self)
 
     #############################
@@ -311,3 +303,73 @@ class Port(BaseAbstractModel):
         ]
         verbose_name = _("Port")
         verbose_name_plural = _("Ports")
+
+
+class DevicePollResult(models.Model):
+    """
+    Device state, polled by snmp poller. UI and alerting read it
+    instead of requesting devices.
+    """
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, verbose_name=_("Device"))
+    poll_time = models.DateTimeField(_("Poll time"), default=datetime.now)
+    ok = models.BooleanField(_("Device is available"), default=False)
+    # sysUpTime, in hundredths of seconds
+    uptime = models.BigIntegerField(_("Uptime"), null=True, blank=True, default=None)
+    # Polled columns, {column name: {row index: value}}
+    data = models.JSONField(_("Polled data"), default=dict, blank=True)
+    error = models.CharField(_("Error"), max_length=256, null=True, blank=True, default=None)
+
+    class Meta:
+        db_table = "device_poll_result"
+        indexes = [
+            models.Index(fields=["device", "-poll_time"], name="device_poll_result_dev_time"),
+            models.Index(fields=["poll_time"], name="device_poll_result_time"),
+        ]
+        verbose_name = _("Device poll result")
+        verbose_name_plural = _("Device poll results")
+
+
+class DeviceFdbEntry(models.Model):
+    """
+    Last FDB snapshot of switch, one row for each mac in vlan.
+    Mac is stored as integer, see devices.fdb.mac2int.
+    """
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, verbose_name=_("Device"))
+    mac = models.BigIntegerField(_("Mac address"))
+    vid = models.PositiveSmallIntegerField(_("VID"))
+    port = models.PositiveSmallIntegerField(_("Port"))
+    first_seen = models.DateTimeField(_("First seen"), default=datetime.now)
+    last_seen = models.DateTimeField(_("Last seen"), default=datetime.now)
+
+    class Meta:
+        db_table = "device_fdb_entry"
+        unique_together = ("device", "mac", "vid")
+        indexes = [
+            models.Index(fields=["mac"], name="device_fdb_entry_mac"),
+        ]
+        verbose_name = _("FDB entry")
+        verbose_name_plural = _("FDB entries")
+
+
+class DeviceFdbChange(models.Model):
+    """
+    Difference between two FDB snapshots of switch.
+    Mac appeared when old_port is null, disappeared when port is null,
+    and moved to other port otherwise.
+    """
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, verbose_name=_("Device"))
+    mac = models.BigIntegerField(_("Mac address"))
+    vid = models.PositiveSmallIntegerField(_("VID"))
+    port = models.PositiveSmallIntegerField(_("Port"), null=True, blank=True, default=None)
+    old_port = models.PositiveSmallIntegerField(_("Old port"), null=True, blank=True, default=None)
+    change_time = models.DateTimeField(_("Change time"), default=datetime.now)
+
+    class Meta:
+        db_table = "device_fdb_change"
+        indexes = [
+            models.Index(fields=["mac", "-change_time"], name="device_fdb_change_mac_time"),
+            models.Index(fields=["device", "-change_time"], name="device_fdb_change_dev_time"),
+            models.Index(fields=["change_time"], name="device_fdb_change_time"),
+        ]
+        verbose_name = _("FDB change")
+        verbose_name_plural = _("FDB changes")
@@ -0,0 +1,176 @@
+"""
+Bulk onu provisioning.
+
+Onu devices are grouped by parent OLT. Groups are configured in parallel
+by celery workers, onu of one OLT are configured one after another,
+because OLT cli accepts only one config session at a time. ZTE onu of one
+OLT are registered together, by one cli session and one "conf t" block,
+see ZteOltBatch. Progress of each onu is sent by websocket.
+"""
+from dataclasses import dataclass, asdict
+from typing import Iterable, Optional
+
+from easysnmp import EasySNMPError
+from pexpect import ExceptionPexpect
+
+from devices.device_config.base import DeviceImplementationError, DeviceConnectionError, DeviceTimeoutError
+from devices.device_config.expect_util import ExpectValidationError
+from devices.device_config.pon.gpon.onu_config.zte_onu import ZteOnuDeviceConfigType
+from devices.device_config.pon.gpon.zte_olt_batch import ZteOltBatch, ZteOnuOperationResult
+from devices.models import Device
+from devices.state_cache import drop_device_state
+from djing2.lib.logger import logger
+from djing2.lib.ws_connector import WsEventTypeEnum, WebSocketSender
+
+
+class OnuConfigStatus:
+    STARTED = "started"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass
+class OnuConfigProgress:
+    batch_id: str
+    device_id: int
+    status: str
+    # index of onu in its OLT group, and size of the group
+    num: int
+    total: int
+    olt_id: Optional[int] = None
+    text: str = ""
+
+
+def group_by_olt(items: Iterable[tuple[int, Optional[int], dict]]) -> list[tuple[Optional[int], list[dict]]]:
+    """
+    Group (device_id, parent_dev_id, config) by parent OLT, keeping order.
+    Onu without parent has no shared OLT session, so it makes own group.
+
+    :return: list of (olt_id, [{'device_id', 'config'}, ...])
+    """
+    groups: dict[int, list[dict]] = {}
+    orphans = []
+    for device_id, parent_dev_id, config in items:
+        item = {"device_id": device_id, "config": config}
+        if parent_dev_id is None:
+            orphans.append((None, [item]))
+        else:
+            groups.setdefault(parent_dev_id, []).append(item)
+    return list(groups.items()) + orphans
+
+
+def _send_progress(s2ws, progress: OnuConfigProgress, recipients: list[int]) -> None:
+    try:
+        s2ws({
+            "eventType": WsEventTypeEnum.ONU_CONFIG_PROGRESS.value,
+            "recipients": recipients,
+            "data": asdict(progress),
+        })
+    except OSError as err:
+        # Progress is informational, it must not stop configuring
+        logger.warning("Onu config progress is not sent: %s" % err)
+
+
+def _apply_one(device_id: int, config: dict) -> tuple[bool, str]:
+    device = Device.objects.select_related("parent_dev").filter(pk=device_id).first()
+    if device is None:
+        return False, "Device not found"
+    try:
+        res = device.apply_onu_config(config=config)
+    except (DeviceConnectionError, DeviceTimeoutError, EasySNMPError, ExceptionPexpect, OSError) as err:
+        return False, str(err) or type(err).__name__
+    except (DeviceImplementationError, ExpectValidationError) as err:
+        return False, str(err)
+    finally:
+        drop_device_state(device_id, "pon_details")
+    if res is None:
+        return False, "Config type not found for device"
+    return res.get("status", 1) == 1, str(res.get("text", ""))
+
+
+def _make_zte_batch(olt_id: Optional[int],
+                    items: list[dict]) -> tuple[Optional[ZteOltBatch], dict[int, ZteOnuOperationResult]]:
+    """
+    Queue registrations of ZTE onu of OLT to one batch.
+
+    :return: batch, and results of queued items by their index in items.
+    """
+    if olt_id is None:
+        return None, {}
+    devices = Device.objects.select_related("parent_dev").filter(
+        pk__in=[item["device_id"] for item in items], parent_dev_id=olt_id
+    ).in_bulk()
+    batch = None
+    queued = {}
+    for idx, item in enumerate(items):
+        device = devices.get(item["device_id"])
+        if device is None:
+            continue
+        code = item["config"].get("configTypeCode")
+        try:
+            config_type = device.get_onu_config_type(code)
+        except DeviceImplementationError:
+            continue
+        if not isinstance(config_type, ZteOnuDeviceConfigType):
+            continue
+        if batch is None:
+            try:
+                batch = ZteOltBatch(device.parent_dev)
+            except DeviceImplementationError:
+                # Each onu reports the problem itself
+                return None, {}
+        # The same as Device.apply_onu_config
+        device.code = code
+        device.save(update_fields=["code"])
+        queued[idx] = batch.add_registration(device, config_type, item["config"])
+    return batch, queued
+
+
+def _apply_batch(batch: ZteOltBatch, queued: dict[int, ZteOnuOperationResult]) -> None:
+    try:
+        batch.apply()
+    except (DeviceImplementationError, ExceptionPexpect, OSError) as err:
+        for res in queued.values():
+            if not res.ok and not res.text:
+                res.text = str(err) or type(err).__name__
+    finally:
+        for res in queued.values():
+            drop_device_state(res.device_id, "pon_details")
+
+
+def apply_onu_config_group(batch_id: str, olt_id: Optional[int], items: list[dict],
+                           recipients: list[int]) -> list[dict]:
+    """
+    Configure onu devices of one OLT sequentially, failure of one onu
+    does not stop others.
+
+    :param items: list of {'device_id', 'config'}, config is
+                  validated data of DeviceOnuConfigTemplate.
+    :return: progress of each onu, as it was sent to websocket.
+    """
+    total = len(items)
+    progress_list = [
+        OnuConfigProgress(
+            batch_id=batch_id, device_id=item["device_id"], olt_id=olt_id,
+            status=OnuConfigStatus.STARTED, num=num, total=total,
+        ) for num, item in enumerate(items, 1)
+    ]
+    zte_batch, queued = _make_zte_batch(olt_id, items)
+    with WebSocketSender() as s2ws:
+        if queued:
+            for idx in queued:
+                _send_progress(s2ws, progress_list[idx], recipients)
+            _apply_batch(zte_batch, queued)
+            for idx, res in queued.items():
+                progress = progress_list[idx]
+                progress.status = OnuConfigStatus.DONE if res.ok else OnuConfigStatus.FAILED
+                progress.text = res.text
+                _send_progress(s2ws, progress, recipients)
+        for idx, (item, progress) in enumerate(zip(items, progress_list)):
+            if idx in queued:
+                continue
+            _send_progress(s2ws, progress, recipients)
+            ok, progress.text = _apply_one(item["device_id"], item["config"])
+            progress.status = OnuConfigStatus.DONE if ok else OnuConfigStatus.FAILED
+            _send_progress(s2ws, progress, recipients)
+    return [asdict(progress) for progress in progress_list]
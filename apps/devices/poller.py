@@ -0,0 +1,173 @@
+"""
+Concurrent snmp poller.
+
+Polls configured oids of all devices with ip address by bounded thread pool,
+and stores results into DevicePollResult table, so UI and alerting read
+cached state instead of requesting equipment inside http handlers.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Optional, Iterable
+
+from django.conf import settings
+from easysnmp import EasySNMPError
+
+from devices.device_config.base import DeviceImplementationError, DeviceConnectionError
+from devices.device_config.base_device_strategy import SNMPWorker, global_device_types_map
+from devices.models import Device, DevicePollResult
+from djing2.lib import safe_int
+
+
+SYS_UPTIME_OID = ".1.3.6.1.2.1.1.3.0"
+
+# Columns, that are polled for every device, column name to oid
+DEVICE_POLLER_COLUMNS = getattr(settings, "DEVICE_POLLER_COLUMNS", {
+    # ifOperStatus
+    "port_status": ".1.3.6.1.2.1.2.2.1.8",
+})
+# Seconds between polls by celery beat, 0 - periodic poll disabled
+DEVICE_POLLER_INTERVAL = getattr(settings, "DEVICE_POLLER_INTERVAL", 300)
+DEVICE_POLLER_WORKERS = getattr(settings, "DEVICE_POLLER_WORKERS", 32)
+# Seconds to wait reply from device, for each retry
+DEVICE_POLLER_TIMEOUT = getattr(settings, "DEVICE_POLLER_TIMEOUT", 2)
+DEVICE_POLLER_RETRIES = getattr(settings, "DEVICE_POLLER_RETRIES", 1)
+# Poll results are removed after this days
+DEVICE_POLLER_RETENTION_DAYS = getattr(settings, "DEVICE_POLLER_RETENTION_DAYS", 7)
+
+_SAVE_BATCH_SIZE = 500
+
+
+@dataclass
+class PollTarget:
+    device_id: int
+    host: str
+    community: str
+    columns: dict[str, str]
+
+
+@dataclass
+class PollDeviceResult:
+    device_id: int
+    poll_time: datetime
+    ok: bool = False
+    uptime: Optional[int] = None
+    data: dict = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def to_model(self) -> DevicePollResult:
+        return DevicePollResult(
+            device_id=self.device_id,
+            poll_time=self.poll_time,
+            ok=self.ok,
+            uptime=self.uptime,
+            data=self.data,
+            error=self.error[:256] if self.error else None,
+        )
+
+
+def get_poll_columns(dev_type: int) -> dict[str, str]:
+    """Common columns, and extra columns of device type"""
+    columns = dict(DEVICE_POLLER_COLUMNS)
+    klass = global_device_types_map.get(dev_type)
+    if klass is not None:
+        columns.update(klass.poll_columns)
+    return columns
+
+
+def compact_value(v: Any) -> Any:
+    """Make snmp value json serializable, and store numbers as numbers"""
+    if isinstance(v, (bytes, bytearray)):
+        try:
+            v = v.decode("ascii")
+        except UnicodeDecodeError:
+            return v.hex()
+    if isinstance(v, str):
+        try:
+            return int(v)
+        except ValueError:
+            pass
+        try:
+            return float(v)
+        except ValueError:
+            return v
+    return v
+
+
+def poll_device(target: PollTarget, timeout: float = DEVICE_POLLER_TIMEOUT,
+                retries: int = DEVICE_POLLER_RETRIES) -> PollDeviceResult:
+    res = PollDeviceResult(device_id=target.device_id, poll_time=datetime.now())
+    try:
+        with SNMPWorker(
+            hostname=target.host, community=target.community,
+            timeout=timeout, retries=retries
+        ) as snmp:
+            res.uptime = safe_int(snmp.get_item(SYS_UPTIME_OID))
+            res.data = {
+                name: {index: compact_value(v) for index, v in snmp.bulk_walk_column(oid)}
+                for name, oid in target.columns.items()
+            }
+        res.ok = True
+    except (DeviceConnectionError, DeviceImplementationError, EasySNMPError, OSError) as err:
+        res.error = str(err) or type(err).__name__
+    return res
+
+
+def get_poll_targets(devices=None) -> list[PollTarget]:
+    if devices is None:
+        devices = Device.objects.all()
+    devices = devices.exclude(ip_address=None).exclude(man_passw=None).exclude(man_passw='')
+    return [
+        PollTarget(
+            device_id=device_id,
+            host=str(ip_address),
+            community=str(community),
+            columns=get_poll_columns(dev_type),
+        )
+        for device_id, ip_address, community, dev_type in devices.values_list(
+            "pk", "ip_address", "man_passw", "dev_type"
+        ).iterator()
+    ]
+
+
+def poll_devices(targets: Iterable[PollTarget], workers: int = DEVICE_POLLER_WORKERS) -> tuple[int, int]:
+    """
+    Poll devices concurrently, by no more than `workers` at once,
+    and save results by batches as they come.
+
+    :return: polled devices count, and count of unavailable devices.
+    """
+    targets = list(targets)
+    if not targets:
+        return 0, 0
+    polled = failed = 0
+    batch = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(targets))),
+                            thread_name_prefix="device-poller") as executor:
+        futures = [executor.submit(poll_device, target) for target in targets]
+        for future in as_completed(futures):
+            res = future.result()
+            polled += 1
+            if not res.ok:
+                failed += 1
+            batch.append(res.to_model())
+            if len(batch) >= _SAVE_BATCH_SIZE:
+                DevicePollResult.objects.bulk_create(batch)
+                batch = []
+    if batch:
+        DevicePollResult.objects.bulk_create(batch)
+    return polled, failed
+
+
+def remove_old_poll_results(now: Optional[datetime] = None) -> None:
+    if now is None:
+        now = datetime.now()
+    DevicePollResult.objects.filter(
+        poll_time__lt=now - timedelta(days=DEVICE_POLLER_RETENTION_DAYS)
+    ).delete()
+
+
+def poll_all_devices(workers: int = DEVICE_POLLER_WORKERS) -> tuple[int, int]:
+    res = poll_devices(get_poll_targets(), workers=workers)
+    remove_old_poll_results()
+    return res
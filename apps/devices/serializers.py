@@ -4,7 +4,8 @@ from rest_framework import serializers
 from django.utils.translation import gettext_lazy as _
 
 from djing2.lib.mixins import BaseCustomModelSerializer
-from devices.models import Device, Port, PortVlanMemberModel
+from devices.models import Device, Port, PortVlanMemberModel, DevicePollResult, DeviceFdbEntry, DeviceFdbChange
+from devices.fdb import int2mac
 from groupapp.models import Group
 
 
@@ -81,9 +82,57 @@ class DeviceOnuConfigTemplate(serializers.Serializer):
         return data
 
 
+class DeviceOnuBulkConfigItem(serializers.Serializer):
+    device_id = serializers.IntegerField(label=_("Device"))
+    config = DeviceOnuConfigTemplate()
+
+
+class DeviceOnuBulkConfigTemplate(serializers.Serializer):
+    items = DeviceOnuBulkConfigItem(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        device_ids = [i.get("device_id") for i in items]
+        if len(set(device_ids)) != len(device_ids):
+            raise serializers.ValidationError(_("Each device may be configured only once in batch"))
+        return items
+
+
 class GroupsWithDevicesSerializer(serializers.ModelSerializer):
     device_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Group
         fields = ("id", "title", "device_count")
+
+
+class DevicePollResultModelSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DevicePollResult
+        fields = '__all__'
+
+
+class DeviceFdbEntryModelSerializer(serializers.ModelSerializer):
+    mac = serializers.SerializerMethodField()
+    device_comment = serializers.CharField(source="device.comment", read_only=True)
+    device_ip = serializers.CharField(source="device.ip_address", read_only=True)
+    port_mac_count = serializers.IntegerField(read_only=True)
+
+    @staticmethod
+    def get_mac(obj) -> str:
+        return int2mac(obj.mac)
+
+    class Meta:
+        model = DeviceFdbEntry
+        fields = '__all__'
+
+
+class DeviceFdbChangeModelSerializer(serializers.ModelSerializer):
+    mac = serializers.SerializerMethodField()
+
+    @staticmethod
+    def get_mac(obj) -> str:
+        return int2mac(obj.mac)
+
+    class Meta:
+        model = DeviceFdbChange
+        fields = '__all__'
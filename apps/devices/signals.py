@@ -1,10 +1,25 @@
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save
 from django.dispatch.dispatcher import receiver
 
 from .models import Device
 from .tasks import unregister_device_task
+from .topology import device_topology
 
 
 @receiver(post_delete, sender=Device)
 def post_delete_device(sender, instance, **kwargs):
     unregister_device_task.delay(instance.pk)
+    device_topology.device_removed(instance.pk)
+
+
+@receiver(post_save, sender=Device)
+def post_save_device(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"parent_dev", "parent_dev_id"} & set(update_fields):
+        return
+    device_topology.device_saved(instance.pk, instance.parent_dev_id)
+
+
+@receiver(post_save, sender="customers.Customer")
+@receiver(post_delete, sender="customers.Customer")
+def customer_changed(sender, **kwargs):
+    device_topology.customers_changed()
@@ -0,0 +1,144 @@
+"""
+Short living cache of device state, that is read from equipment
+inside http handlers (port list, onu details, fibers).
+
+Cache is kept in redis, so it is shared between web workers. Concurrent
+requests of the same (device, operation) are coalesced: only one of them
+requests the device, others wait for its result.
+"""
+import json
+import threading
+from uuid import uuid4
+from dataclasses import dataclass, is_dataclass, asdict
+from time import time, sleep
+from typing import Any, Callable
+
+from django.conf import settings
+from redis import RedisError
+from rest_framework.utils.encoders import JSONEncoder
+
+from djing2.lib.logger import logger
+from djing2.lib.redis import redis_proxy
+
+
+# Seconds, while read device state is returned from cache
+DEVICE_STATE_CACHE_TTL = getattr(settings, "DEVICE_STATE_CACHE_TTL", 30)
+# Max seconds to wait result of device reading, made by another worker
+DEVICE_STATE_READ_TIMEOUT = getattr(settings, "DEVICE_STATE_READ_TIMEOUT", 60)
+
+DEVICE_STATE_CACHE_KEY = "device_state_%d_%s"
+DEVICE_STATE_LOCK_KEY = "device_state_lock_%d_%s"
+
+_WAIT_POLL_INTERVAL = 0.1
+
+_local_locks: dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+
+@dataclass
+class CachedDeviceState:
+    data: Any
+    # seconds since device state was read
+    age: float
+    from_cache: bool
+
+
+class _StateEncoder(JSONEncoder):
+    def default(self, obj):
+        if is_dataclass(obj) and not isinstance(obj, type):
+            return asdict(obj)
+        return super().default(obj)
+
+
+def _local_lock(key: str) -> threading.Lock:
+    with _local_locks_guard:
+        lock = _local_locks.get(key)
+        if lock is None:
+            lock = _local_locks[key] = threading.Lock()
+        return lock
+
+
+def _load(key: str):
+    raw = redis_proxy.get(key)
+    if not raw:
+        return None
+    cached = json.loads(raw)
+    return cached["data"], float(cached["time"])
+
+
+def _store(key: str, data: Any, read_time: float, ttl: int) -> Any:
+    raw = json.dumps({"data": data, "time": read_time}, cls=_StateEncoder)
+    redis_proxy.set(key, raw, ex=max(1, int(ttl)))
+    # returns data as it will be read from cache by other workers
+    return json.loads(raw)["data"]
+
+
+def _fresh(cached, not_before: float, ttl: int):
+    if cached is None:
+        return None
+    data, read_time = cached
+    if read_time < not_before or time() - read_time > ttl:
+        return None
+    return CachedDeviceState(data=data, age=max(time() - read_time, 0.0), from_cache=True)
+
+
+def _read_device(key: str, lock_key: str, read_fn: Callable[[], Any], ttl: int, request_time: float):
+    # Only one worker reads device, others wait result from cache
+    lock_token = uuid4().hex
+    while not redis_proxy.set(lock_key, lock_token, ex=DEVICE_STATE_READ_TIMEOUT, nx=True):
+        state = _fresh(_load(key), not_before=request_time, ttl=ttl)
+        if state is not None:
+            return state
+        if time() - request_time > DEVICE_STATE_READ_TIMEOUT:
+            break
+        sleep(_WAIT_POLL_INTERVAL)
+    try:
+        read_time = time()
+        data = _store(key, read_fn(), read_time=read_time, ttl=ttl)
+        return CachedDeviceState(data=data, age=0.0, from_cache=False)
+    finally:
+        # Lock may be expired and taken by another worker, don't release it
+        redis_proxy.delete_if_equal(lock_key, lock_token)
+
+
+def get_device_state(device_id: int, operation: str, read_fn: Callable[[], Any],
+                     refresh: bool = False, ttl: int = DEVICE_STATE_CACHE_TTL) -> CachedDeviceState:
+    """
+    Returns device state, read by read_fn not more than ttl seconds ago.
+
+    :param refresh: Don't return cached state, but it may be result of reading,
+                    that started after this call, by concurrent request.
+    """
+    key = DEVICE_STATE_CACHE_KEY % (device_id, operation)
+    request_time = time()
+    try:
+        if ttl <= 0:
+            return CachedDeviceState(data=read_fn(), age=0.0, from_cache=False)
+        if not refresh:
+            state = _fresh(_load(key), not_before=0, ttl=ttl)
+            if state is not None:
+                return state
+        with _local_lock(key):
+            state = _fresh(_load(key), not_before=request_time if refresh else 0, ttl=ttl)
+            if state is not None:
+                return state
+            return _read_device(
+                key=key,
+                lock_key=DEVICE_STATE_LOCK_KEY % (device_id, operation),
+                read_fn=read_fn,
+                ttl=ttl,
+                request_time=request_time,
+            )
+    except RedisError as err:
+        logger.error("Device state cache is unavailable: %s" % err)
+        return CachedDeviceState(data=read_fn(), age=0.0, from_cache=False)
+
+
+def drop_device_state(device_id: int, *operations: str) -> None:
+    """Forget cached state, i.e. after device config changed"""
+    if not operations:
+        return
+    try:
+        redis_proxy.delete(*(DEVICE_STATE_CACHE_KEY % (device_id, op) for op in operations))
+    except RedisError as err:
+        logger.error("Device state cache is unavailable: %s" % err)
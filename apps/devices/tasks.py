@@ -1,6 +1,17 @@
+from typing import Optional
+
+from celery.signals import worker_process_shutdown
+
 from djing2 import celery_app
+from djing2.lib.process_lock import process_lock_cm, process_try_lock_cm
+from djing2.lib.logger import logger
 from devices.models import Device
+from devices.device_config.expect_util import cli_sessions
 from devices.device_config.device_type_collection import DEVICE_ONU_TYPES
+from devices.poller import poll_all_devices, DEVICE_POLLER_INTERVAL
+from devices.onu_bulk_config import apply_onu_config_group
+from devices.fdb import collect_all_fdb, FDB_COLLECTOR_INTERVAL
+from devices import zbx_events
 
 
 @celery_app.task
@@ -14,3 +25,64 @@ def unregister_device_task(device_id: int) -> None:
         return None
     if device.dev_type in DEVICE_ONU_TYPES:
         device.remove_from_olt()
+
+
+@celery_app.task
+def apply_onu_config_group_task(batch_id: str, olt_id: Optional[int], items: list[dict],
+                                recipients: list[int]) -> list[dict]:
+    """
+    Configure onu devices of one OLT, one after another.
+    Groups of different OLT are run by this task in parallel.
+    """
+    return apply_onu_config_group(batch_id=batch_id, olt_id=olt_id, items=items, recipients=recipients)
+
+
+@worker_process_shutdown.connect
+def close_cli_sessions_on_shutdown(**kwargs):
+    # Pool processes leave by os._exit, without atexit handlers
+    cli_sessions.close()
+
+
+@celery_app.task
+def process_zbx_events_task() -> None:
+    """Consume zabbix events, collected for ZBX_EVENTS_WINDOW seconds"""
+    with process_lock_cm(lock_name='zbx_events', wait=True):
+        events = zbx_events.take_events()
+        updated = zbx_events.process_events(events)
+    logger.info('Zabbix events: %d, devices updated: %d' % (len(events), updated))
+
+
+@celery_app.task
+def poll_devices_task() -> None:
+    with process_try_lock_cm(lock_name='device_poller') as locked:
+        if not locked:
+            # Previous poll is still in progress
+            return
+        polled, failed = poll_all_devices()
+    logger.info('Devices polled: %d, unavailable: %d' % (polled, failed))
+
+
+if DEVICE_POLLER_INTERVAL > 0:
+    celery_app.add_periodic_task(
+        DEVICE_POLLER_INTERVAL,
+        poll_devices_task.s(),
+        name='Poll devices by snmp'
+    )
+
+
+@celery_app.task
+def collect_fdb_task() -> None:
+    with process_try_lock_cm(lock_name='fdb_collector') as locked:
+        if not locked:
+            # Previous collection is still in progress
+            return
+        collected, failed = collect_all_fdb()
+    logger.info('FDB collected from switches: %d, unavailable: %d' % (collected, failed))
+
+
+if FDB_COLLECTOR_INTERVAL > 0:
+    celery_app.add_periodic_task(
+        FDB_COLLECTOR_INTERVAL,
+        collect_fdb_task.s(),
+        name='Collect FDB of switches'
+    )
@@ -1,9 +1,35 @@
-from django.test import SimpleTestCase, TestCase
+import json
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from easysnmp import EasySNMPTimeoutError
 
 from devices.device_config.pon.gpon.onu_zte_f601 import DEVICE_UNIQUE_CODE as OnuZTE_F601_code
+from devices.device_config.pon.gpon.olt_ztec320 import _DEVICE_UNIQUE_CODE as ZTE_C320_code
 from devices.device_config.switch.dlink.dgs_1100_10me import DEVICE_UNIQUE_CODE as Dlink_dgs1100_10me_code
-from devices.models import Device, Port
+from devices.models import Device, Port, DevicePollResult, DeviceFdbEntry, DeviceFdbChange
+from devices import poller
+from devices import state_cache
+from devices import onu_bulk_config
+from devices import fdb
+from devices import zbx_events
+from devices import topology
+from devices.topology import device_topology
 from devices.device_config.switch.eltex.general import EltexSwitch
+from devices.device_config.base_device_strategy import snmp_oid_index, join_snmp_columns
+from devices.device_config.snmp_pool import SNMPSessionPool
+from devices.device_config.switch import vlan_matrix
+from devices.device_config.base import DeviceConsoleError, DeviceTimeoutError, Vlan
+from devices.device_config.expect_util import CliSessionManager, cli_sessions
+from devices.device_config.pon.gpon import zte_utils
+from devices.device_config.pon.gpon.zte_olt_batch import ZteOltBatch
+from devices.device_config.pon.gpon.onu_config.zte_f601_bridge_config import ZteF601BridgeScriptModule
+from djing2.lib.custom_signals import notification_signal
+from djing2.lib.redis import redis_proxy
+from groupapp.models import Group
+from profiles.models import UserProfile
 
 
 def device_test_case_set_up(self):
@@ -107,3 +133,677 @@ class DeviceSwitchConfigEltexMethodsTestCase(SimpleTestCase):
         )
         r = tuple(EltexSwitch.parse_eltex_vlan_map(bitmap, table=0))
         self.assertTupleEqual(r, (5, 143, 152))
+
+
+class _VlanTableSnmp:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_table(self, columns):
+        return self.rows
+
+
+class VlanMatrixTestCase(SimpleTestCase):
+    def test_bitmap_positions(self):
+        self.assertTupleEqual(tuple(vlan_matrix.bitmap_positions(b"\x80\x01\x00")), (1, 16))
+        self.assertTupleEqual(tuple(vlan_matrix.bitmap_positions(b"\x40", offset=1024)), (1026,))
+        self.assertTupleEqual(tuple(vlan_matrix.bitmap_positions(b"\x00\x00")), ())
+
+    def test_octets(self):
+        self.assertEqual(vlan_matrix.octets(b"\xff"), b"\xff")
+        self.assertEqual(vlan_matrix.octets("\udcff\x01"), b"\xff\x01")
+        self.assertEqual(vlan_matrix.octets(None), b"")
+
+    def test_read_dot1q_vlan_matrix(self):
+        snmp = _VlanTableSnmp({
+            "1": {"name": "default", "egress": b"\xff\xff\xff\x00", "untagged": b"\xff\xff\xff\x00"},
+            "143": {"name": "users", "egress": b"\xc0\x00\x01\x80", "untagged": b"\x40\x00\x00\x00"},
+            "152": {"name": "mgmt", "egress": b"\x80\x00\x00\x00", "untagged": b"\x00\x00\x00\x00"},
+        })
+        matrix = vlan_matrix.read_dot1q_vlan_matrix(snmp, ports_len=24, skip_vids=(1,))
+        self.assertListEqual(matrix.ports, [1, 2, 24])
+        self.assertListEqual(matrix.vids, [143, 152])
+        self.assertListEqual(matrix.port_vlans(1), [
+            Vlan(vid=143, title="users", native=False),
+            Vlan(vid=152, title="mgmt", native=False),
+        ])
+        self.assertListEqual(matrix.port_vlans(2), [Vlan(vid=143, title="users", native=True)])
+        self.assertListEqual(matrix.port_vlans(3), [])
+        self.assertListEqual(matrix.vlan_ports(143), [1, 2, 24])
+        # port 25 is over ports_len
+        self.assertFalse(matrix.is_member(25, 143))
+
+    def test_dict_roundtrip(self):
+        matrix = vlan_matrix.VlanMatrix(names={5: "v5"})
+        matrix.add_port(3, vids=(5, 1030), untagged=(5,))
+        restored = vlan_matrix.VlanMatrix.from_dict(json.loads(json.dumps(matrix.as_dict())))
+        self.assertListEqual(restored.port_vlans(3), matrix.port_vlans(3))
+        self.assertDictEqual(restored.names, {5: "v5"})
+
+
+class SNMPTableJoinTestCase(SimpleTestCase):
+    def test_oid_index(self):
+        self.assertEqual(snmp_oid_index(".1.3.6.1.2.1.2.2.1.2", ".1.3.6.1.2.1.2.2.1.2.5"), "5")
+        self.assertEqual(snmp_oid_index("1.3.6.1.2.1.2.2.1.2", "iso.3.6.1.2.1.2.2.1.2.5.1"), "5.1")
+        # next column
+        self.assertIsNone(snmp_oid_index(".1.3.6.1.2.1.2.2.1.2", ".1.3.6.1.2.1.2.2.1.3.1"))
+        # column 2 is not a prefix of column 21
+        self.assertIsNone(snmp_oid_index(".1.3.6.1.2.1.2.2.1.2", ".1.3.6.1.2.1.2.2.1.21.1"))
+
+    def test_join_columns(self):
+        rows = join_snmp_columns({
+            "name": [("1", b"onu1"), ("2", b"onu2")],
+            "status": [("2", 3), ("3", 2)],
+        })
+        self.assertEqual(rows, {
+            "1": {"name": b"onu1"},
+            "2": {"name": b"onu2", "status": 3},
+            "3": {"status": 2},
+        })
+
+    def test_join_columns_index_parts(self):
+        rows = join_snmp_columns({
+            "sn": [("268501248.1", b"sn1")],
+            "signal": [("268501248.1.1", 1000), ("268501248.1.2", 2000)],
+        }, index_parts=2)
+        self.assertEqual(rows, {"268501248.1": {"sn": b"sn1", "signal": 1000}})
+
+
+class DevicePollerTestCase(TestCase):
+    def setUp(self):
+        device_test_case_set_up(self)
+        self.device_switch.man_passw = "public"
+        self.device_switch.save(update_fields=["man_passw"])
+
+    def test_compact_value(self):
+        self.assertEqual(poller.compact_value("3"), 3)
+        self.assertEqual(poller.compact_value(b"-21.5"), -21.5)
+        self.assertEqual(poller.compact_value(b"\xe0\x67"), "e067")
+        self.assertEqual(poller.compact_value("up"), "up")
+
+    def test_poll_columns(self):
+        columns = poller.get_poll_columns(Dlink_dgs1100_10me_code)
+        self.assertEqual(columns, poller.DEVICE_POLLER_COLUMNS)
+
+    def test_targets(self):
+        targets = poller.get_poll_targets()
+        # onu has no ip address
+        self.assertEqual([t.device_id for t in targets], [self.device_switch.pk])
+        self.assertEqual(targets[0].host, "192.168.2.3")
+
+    def test_unavailable_device_result_saved(self):
+        target = poller.PollTarget(device_id=self.device_switch.pk, host="", community="public", columns={})
+        polled, failed = poller.poll_devices([target], workers=2)
+        self.assertEqual((polled, failed), (1, 1))
+        res = DevicePollResult.objects.get(device=self.device_switch)
+        self.assertFalse(res.ok)
+        self.assertTrue(res.error)
+
+
+class DeviceStateCacheTestCase(SimpleTestCase):
+    device_id = 987654
+
+    def setUp(self):
+        self.reads = 0
+        state_cache.drop_device_state(self.device_id, "ports")
+
+    def tearDown(self):
+        state_cache.drop_device_state(self.device_id, "ports")
+
+    def _read(self):
+        self.reads += 1
+        sleep(0.2)
+        return [{"num": 1, "name": "port%d" % self.reads}]
+
+    def test_cached(self):
+        first = state_cache.get_device_state(self.device_id, "ports", self._read)
+        second = state_cache.get_device_state(self.device_id, "ports", self._read)
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(self.reads, 1)
+
+    def test_refresh(self):
+        state_cache.get_device_state(self.device_id, "ports", self._read)
+        state = state_cache.get_device_state(self.device_id, "ports", self._read, refresh=True)
+        self.assertFalse(state.from_cache)
+        self.assertEqual(state.data, [{"num": 1, "name": "port2"}])
+
+    def test_ttl(self):
+        state_cache.get_device_state(self.device_id, "ports", self._read, ttl=1)
+        sleep(1.1)
+        state = state_cache.get_device_state(self.device_id, "ports", self._read, ttl=1)
+        self.assertFalse(state.from_cache)
+        self.assertEqual(self.reads, 2)
+
+    def test_concurrent_requests_coalesced(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            states = list(executor.map(
+                lambda _: state_cache.get_device_state(self.device_id, "ports", self._read),
+                range(8)
+            ))
+        self.assertEqual(self.reads, 1)
+        self.assertEqual(sum(not s.from_cache for s in states), 1)
+
+    def test_foreign_lock_not_released(self):
+        lock_key = state_cache.DEVICE_STATE_LOCK_KEY % (self.device_id, "ports")
+        redis_proxy.set(lock_key, "other", ex=5)
+        try:
+            self.assertEqual(redis_proxy.delete_if_equal(lock_key, "mine"), 0)
+            self.assertEqual(redis_proxy.get(lock_key), b"other")
+            self.assertEqual(redis_proxy.delete_if_equal(lock_key, "other"), 1)
+        finally:
+            redis_proxy.delete(lock_key)
+
+
+class _PoolTestSession:
+    def __init__(self, hostname, community, version, **kwargs):
+        self.hostname = hostname
+        self.closed = False
+        self.fail = False
+
+    def get(self, oid):
+        if self.fail:
+            raise EasySNMPTimeoutError("timed out")
+
+    def close(self):
+        self.closed = True
+
+
+class SNMPSessionPoolTestCase(SimpleTestCase):
+    def setUp(self):
+        self.pool = SNMPSessionPool(create=_PoolTestSession, idle_timeout=60, check_interval=30)
+
+    def test_reused(self):
+        with self.pool.session("10.0.0.1", "public") as first:
+            pass
+        with self.pool.session("10.0.0.1", "public") as second:
+            pass
+        self.assertIs(first, second)
+        stats = self.pool.stats
+        self.assertEqual((stats.created, stats.reused, stats.idle), (1, 1, 1))
+
+    def test_keyed_by_host_and_community(self):
+        with self.pool.session("10.0.0.1", "public") as first:
+            # session in use is not given to another caller
+            with self.pool.session("10.0.0.1", "public") as second:
+                self.assertIsNot(first, second)
+        with self.pool.session("10.0.0.1", "private") as other:
+            self.assertNotIn(other, (first, second))
+        with self.pool.session("10.0.0.2", "public") as other:
+            self.assertNotIn(other, (first, second))
+        self.assertEqual(self.pool.stats.created, 4)
+
+    def test_broken_session_dropped(self):
+        with self.assertRaises(EasySNMPTimeoutError):
+            with self.pool.session("10.0.0.1", "public") as first:
+                raise EasySNMPTimeoutError("timed out")
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.stats.idle, 0)
+
+    def test_idle_timeout(self):
+        with self.pool.session("10.0.0.1", "public") as first:
+            pass
+        self.pool._idle[("10.0.0.1", "public", 2)][0].last_used -= 61
+        with self.pool.session("10.0.0.1", "public") as second:
+            pass
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.stats.discarded, 1)
+
+    def test_health_check(self):
+        with self.pool.session("10.0.0.1", "public") as first:
+            pass
+        idle = self.pool._idle[("10.0.0.1", "public", 2)][0]
+        idle.last_used -= 31
+        first.fail = True
+        with self.pool.session("10.0.0.1", "public") as second:
+            pass
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+
+
+class _CliTestSpawn:
+    def __init__(self):
+        self.closed = False
+        self.sent = []
+
+    def isalive(self):
+        return not self.closed
+
+    def sendline(self, line):
+        self.sent.append(line)
+
+    def expect_exact(self, pattern, timeout=None):
+        return 0
+
+    def close(self):
+        self.closed = True
+
+
+class CliSessionManagerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.manager = CliSessionManager(idle_timeout=60, check_interval=30)
+        self.logins = []
+
+    def tearDown(self):
+        self.manager.close()
+
+    def _login(self):
+        ch = _CliTestSpawn()
+        self.logins.append(ch)
+        return ch
+
+    def test_session_kept(self):
+        for _ in range(3):
+            with self.manager.session("10.0.0.1", login=self._login, prompt="olt") as ch:
+                ch.sendline("show run")
+        self.assertEqual(len(self.logins), 1)
+        self.assertFalse(self.logins[0].closed)
+        with self.manager.session("10.0.0.2", login=self._login, prompt="olt2"):
+            pass
+        self.assertEqual(len(self.logins), 2)
+
+    def test_closed_after_timeout(self):
+        with self.assertRaises(DeviceTimeoutError):
+            with self.manager.session("10.0.0.1", login=self._login, prompt="olt"):
+                raise DeviceTimeoutError
+        self.assertTrue(self.logins[0].closed)
+        with self.manager.session("10.0.0.1", login=self._login, prompt="olt"):
+            pass
+        self.assertEqual(len(self.logins), 2)
+
+    def test_kept_after_console_error(self):
+        with self.assertRaises(DeviceConsoleError):
+            with self.manager.session("10.0.0.1", login=self._login, prompt="olt"):
+                raise DeviceConsoleError("onu not found")
+        with self.manager.session("10.0.0.1", login=self._login, prompt="olt"):
+            pass
+        self.assertEqual(len(self.logins), 1)
+
+    def test_idle_session_closed(self):
+        with self.manager.session("10.0.0.1", login=self._login, prompt="olt"):
+            pass
+        with self.manager.session("10.0.0.2", login=self._login, prompt="olt"):
+            pass
+        self.manager._sessions["10.0.0.1"].last_used -= 61
+        self.manager.close_idle()
+        self.assertTrue(self.logins[0].closed)
+        self.assertFalse(self.logins[1].closed)
+
+    def test_idle_session_reaped(self):
+        manager = CliSessionManager(idle_timeout=0.05, check_interval=0.02)
+        try:
+            with manager.session("10.0.0.1", login=self._login, prompt="olt"):
+                pass
+            self.assertIsNotNone(manager._reaper)
+            sleep(0.3)
+            self.assertTrue(self.logins[0].closed)
+            # reaper stops without open sessions
+            self.assertIsNone(manager._reaper)
+        finally:
+            manager.close()
+
+    def test_close(self):
+        with self.manager.session("10.0.0.1", login=self._login, prompt="olt"):
+            pass
+        self.manager.close()
+        self.assertTrue(self.logins[0].closed)
+        self.assertEqual(self.logins[0].sent, ["exit"])
+
+
+class ZteFreeOnuNumbersTestCase(SimpleTestCase):
+    lines = [
+        "interface gpon-olt_1/2/3",
+        "  onu 1 type ZTE-F660 sn ZTEGC0FFEE01",
+        "  onu 2 type ZTE-F660 sn ZTEGC0FFEE02",
+        "  onu 4 type ZTE-F601 sn ZTEGC0FFEE04",
+        "!",
+    ]
+
+    def test_free_numbers(self):
+        self.assertEqual(zte_utils.get_free_registered_onu_numbers(self.lines, count=3), [3, 5, 6])
+        self.assertEqual(
+            zte_utils.get_free_registered_onu_numbers(self.lines, count=1),
+            [zte_utils.get_free_registered_onu_number(self.lines)]
+        )
+
+    def test_fiber_full(self):
+        self.assertEqual(zte_utils.get_free_registered_onu_numbers(self.lines, count=5, max_onu_number=6), [3, 5, 6])
+
+
+class _ZteTestSpawn(_CliTestSpawn):
+    """Answers of ZTE OLT cli, for onu on fiber 1/2/3"""
+
+    uncfg_lines = (
+        "OnuIndex                 Sn                  State",
+        "---------------------------------------------------",
+        "gpon-onu_1/2/3:1         ZTEG14151618        unknown",
+        "gpon-onu_1/2/3:2         ZTEG14151619        unknown",
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.before = ""
+
+    def do_cmd(self, c, prompt):
+        self.sent.append(c)
+        if c == "show gpon onu uncfg":
+            self.before = "\r\n".join(self.uncfg_lines)
+            return 1
+        if c.startswith("show run int gpon-olt_"):
+            self.before = "\r\n".join(ZteFreeOnuNumbersTestCase.lines)
+        else:
+            self.before = ""
+        return 0
+
+    def get_lines_before(self):
+        return self.before.split("\r\n")
+
+
+class ZteOltBatchTestCase(TestCase):
+    def setUp(self):
+        device_test_case_set_up(self)
+        self.olt = Device.objects.create(
+            ip_address="10.0.0.5",
+            mac_addr="12:13:14:15:16:20",
+            comment="olt",
+            dev_type=ZTE_C320_code,
+            extra_data={"telnet": {"login": "admin", "password": "admin", "prompt": "olt"}},
+        )
+        self.onus = [self.device_onu, Device.objects.create(
+            mac_addr="11:13:14:15:16:19", comment="test3", dev_type=OnuZTE_F601_code
+        )]
+        for onu in self.onus:
+            onu.parent_dev = self.olt
+            onu.save(update_fields=["parent_dev"])
+        self.config = {
+            "configTypeCode": ZteF601BridgeScriptModule.short_code,
+            "vlanConfig": [{"port": 1, "vids": [{"vid": 151, "native": True}]}],
+        }
+        # Logged in session of OLT is reused by batch
+        self.ch = _ZteTestSpawn()
+        with cli_sessions.session("10.0.0.5", login=lambda: self.ch, prompt="olt"):
+            pass
+
+    def tearDown(self):
+        cli_sessions.close()
+
+    def _config_type(self):
+        return ZteF601BridgeScriptModule(
+            title=ZteF601BridgeScriptModule.title, code=ZteF601BridgeScriptModule.short_code
+        )
+
+    def test_registrations_in_one_config_block(self):
+        batch = ZteOltBatch(self.olt)
+        for onu in self.onus:
+            batch.add_registration(onu, self._config_type(), self.config)
+        batch.add_removal(zte_utils.zte_onu_conv_to_num(rack_num=2, fiber_num=3, port_num=1))
+        results = batch.apply()
+
+        self.assertEqual([r.ok for r in results], [True, True, True], msg=results)
+        self.assertEqual(self.ch.sent.count("show gpon onu uncfg"), 1)
+        self.assertEqual(self.ch.sent.count("show run int gpon-olt_1/2/3"), 1)
+        self.assertEqual(self.ch.sent.count("conf t"), 1)
+        self.assertIn("no onu 1", self.ch.sent)
+        self.assertIn("onu 3 type ZTE-F601 sn ZTEG14151618", self.ch.sent)
+        self.assertIn("onu 5 type ZTE-F601 sn ZTEG14151619", self.ch.sent)
+        for onu, onu_num in zip(self.onus, (3, 5)):
+            onu.refresh_from_db()
+            self.assertEqual(onu.snmp_extra, zte_utils.zte_onu_conv_to_num(rack_num=2, fiber_num=3, port_num=onu_num))
+        self.assertFalse(self.ch.closed)
+
+    def test_bulk_config_by_batch(self):
+        results = onu_bulk_config.apply_onu_config_group(
+            batch_id="b2", olt_id=self.olt.pk, recipients=[],
+            items=[{"device_id": onu.pk, "config": self.config} for onu in self.onus],
+        )
+        self.assertListEqual([r["num"] for r in results], [1, 2])
+        for r in results:
+            self.assertEqual(r["status"], onu_bulk_config.OnuConfigStatus.DONE, msg=r)
+        self.assertEqual(self.ch.sent.count("conf t"), 1)
+
+    def test_not_found_onu_skipped(self):
+        onu = Device.objects.create(mac_addr="11:13:14:15:16:30", comment="test4", dev_type=OnuZTE_F601_code)
+        batch = ZteOltBatch(self.olt)
+        missed = batch.add_registration(onu, self._config_type(), self.config)
+        found = batch.add_registration(self.device_onu, self._config_type(), self.config)
+        batch.apply()
+        self.assertFalse(missed.ok)
+        self.assertIn("ZTEG14151630", missed.text)
+        self.assertTrue(found.ok)
+
+
+class OnuBulkConfigTestCase(TestCase):
+    def setUp(self):
+        device_test_case_set_up(self)
+        self.config = {
+            "configTypeCode": "unknown",
+            "vlanConfig": [{"port": 1, "vids": [{"vid": 151, "native": True}]}],
+        }
+
+    def test_group_by_olt(self):
+        groups = onu_bulk_config.group_by_olt((
+            (1, 10, {"n": 1}),
+            (2, None, {"n": 2}),
+            (3, 11, {"n": 3}),
+            (4, 10, {"n": 4}),
+        ))
+        self.assertListEqual(groups, [
+            (10, [{"device_id": 1, "config": {"n": 1}}, {"device_id": 4, "config": {"n": 4}}]),
+            (11, [{"device_id": 3, "config": {"n": 3}}]),
+            (None, [{"device_id": 2, "config": {"n": 2}}]),
+        ])
+
+    def test_failed_onu_not_stops_group(self):
+        missing_id = self.device_onu.pk + 1000
+        results = onu_bulk_config.apply_onu_config_group(
+            batch_id="b1", olt_id=None, recipients=[],
+            items=[
+                {"device_id": missing_id, "config": self.config},
+                {"device_id": self.device_onu.pk, "config": self.config},
+            ],
+        )
+        self.assertEqual(len(results), 2)
+        self.assertListEqual([r["device_id"] for r in results], [missing_id, self.device_onu.pk])
+        self.assertListEqual([r["num"] for r in results], [1, 2])
+        for r in results:
+            self.assertEqual(r["status"], onu_bulk_config.OnuConfigStatus.FAILED)
+            self.assertEqual(r["total"], 2)
+            self.assertEqual(r["batch_id"], "b1")
+
+
+class FdbDiffTestCase(SimpleTestCase):
+    def test_mac_conversion(self):
+        self.assertEqual(fdb.mac2int("00:1a:2b:3c:4d:5e"), 0x001a2b3c4d5e)
+        self.assertEqual(fdb.mac2int("001A.2B3C.4D5E"), 0x001a2b3c4d5e)
+        self.assertEqual(fdb.int2mac(0x001a2b3c4d5e), "00:1a:2b:3c:4d:5e")
+        with self.assertRaises(ValueError):
+            fdb.mac2int("00:1a:2b")
+
+    def test_diff(self):
+        changes = fdb.diff_fdb(
+            old={(1, 10): 1, (2, 10): 2, (3, 10): 3},
+            new={(1, 10): 1, (2, 10): 5, (4, 10): 4},
+        )
+        self.assertListEqual(changes, [
+            fdb.FdbChange(mac=2, vid=10, port=5, old_port=2),
+            fdb.FdbChange(mac=4, vid=10, port=4, old_port=None),
+            fdb.FdbChange(mac=3, vid=10, port=None, old_port=3),
+        ])
+
+
+class FdbSnapshotTestCase(TestCase):
+    def setUp(self):
+        device_test_case_set_up(self)
+        self.device_switch2 = Device.objects.create(
+            ip_address="192.168.2.4",
+            mac_addr="12:13:14:15:16:19",
+            comment="test3",
+            dev_type=Dlink_dgs1100_10me_code,
+        )
+
+    def test_first_snapshot_has_no_changes(self):
+        fdb.store_fdb_snapshot(self.device_switch.pk, {(1, 10): 1, (2, 10): 2})
+        self.assertEqual(DeviceFdbEntry.objects.filter(device=self.device_switch).count(), 2)
+        self.assertFalse(DeviceFdbChange.objects.exists())
+
+    def test_snapshot_changes(self):
+        fdb.store_fdb_snapshot(self.device_switch.pk, {(1, 10): 1, (2, 10): 2, (3, 10): 3})
+        changes = fdb.store_fdb_snapshot(self.device_switch.pk, {(1, 10): 1, (2, 10): 5, (4, 10): 4})
+        self.assertEqual(len(changes), 3)
+        entries = dict(DeviceFdbEntry.objects.filter(
+            device=self.device_switch
+        ).values_list("mac", "port"))
+        self.assertDictEqual(entries, {1: 1, 2: 5, 4: 4})
+        self.assertEqual(DeviceFdbChange.objects.filter(device=self.device_switch).count(), 3)
+        self.assertTrue(DeviceFdbChange.objects.filter(mac=3, port=None, old_port=3).exists())
+
+    def test_find_mac_customer_port_first(self):
+        mac = fdb.mac2int("00:1a:2b:3c:4d:5e")
+        # uplink of switch2 learned macs of whole switch
+        fdb.store_fdb_snapshot(self.device_switch2.pk, {(mac, 10): 24, (1, 10): 24, (2, 10): 24})
+        fdb.store_fdb_snapshot(self.device_switch.pk, {(mac, 10): 3, (1, 10): 1})
+        entries = fdb.find_mac("00:1a:2b:3c:4d:5e")
+        self.assertListEqual([(e.device_id, e.port) for e in entries], [
+            (self.device_switch.pk, 3),
+            (self.device_switch2.pk, 24),
+        ])
+        self.assertListEqual([e.port_mac_count for e in entries], [1, 3])
+
+
+class ZbxEventsTestCase(TestCase):
+    def setUp(self):
+        device_test_case_set_up(self)
+
+    def test_coalesce_last_event_wins(self):
+        events = [
+            zbx_events.ZbxEvent(dev_ip="192.168.2.3", status=1, event_time=2),
+            zbx_events.ZbxEvent(dev_ip="192.168.2.3", status=0, event_time=3),
+            zbx_events.ZbxEvent(dev_ip="192.168.2.4", status=1, event_time=1),
+        ]
+        last = zbx_events.coalesce_events(reversed(events))
+        self.assertEqual(last["192.168.2.3"].status, 0)
+        self.assertEqual(last["192.168.2.4"].status, 1)
+
+    def test_json_roundtrip(self):
+        event = zbx_events.ZbxEvent(dev_ip="192.168.2.3", status=1, message="ping")
+        self.assertEqual(zbx_events.ZbxEvent.from_json(event.to_json()), event)
+
+    def test_process_events(self):
+        updated = zbx_events.process_events([
+            zbx_events.ZbxEvent(dev_ip="192.168.2.3", status=0, event_time=1),
+            zbx_events.ZbxEvent(dev_ip="192.168.2.3", status=1, event_time=2),
+            zbx_events.ZbxEvent(dev_ip="10.0.0.1", status=1, event_time=2),
+        ])
+        self.assertEqual(updated, 1)
+        self.device_switch.refresh_from_db()
+        self.assertEqual(self.device_switch.status, Device.NETWORK_STATE_DOWN)
+
+    def test_event_from_other_groups_skipped(self):
+        group = Group.objects.create(title="zbx group", code="zbx")
+        self.device_switch.group = group
+        self.device_switch.save(update_fields=["group"])
+        updated = zbx_events.process_events([
+            zbx_events.ZbxEvent(dev_ip="192.168.2.3", status=1, group_ids=[group.pk + 1]),
+        ])
+        self.assertEqual(updated, 0)
+        self.device_switch.refresh_from_db()
+        self.assertNotEqual(self.device_switch.status, Device.NETWORK_STATE_DOWN)
+        updated = zbx_events.process_events([
+            zbx_events.ZbxEvent(dev_ip="192.168.2.3", status=1, group_ids=[group.pk]),
+        ])
+        self.assertEqual(updated, 1)
+
+    def test_notify_one_message_for_recipient(self):
+        group = Group.objects.create(title="zbx group", code="zbx")
+        admin = UserProfile.objects.create_superuser(
+            username="zbxadmin", password="admin", telephone="+797812345670", is_active=True
+        )
+        admin.responsibility_groups.add(group)
+        device2 = Device.objects.create(
+            ip_address="192.168.2.4", comment="test3", dev_type=Dlink_dgs1100_10me_code,
+            group=group, is_noticeable=True
+        )
+        self.device_switch.group = group
+        self.device_switch.is_noticeable = True
+        self.device_switch.save(update_fields=["group", "is_noticeable"])
+        sent = []
+
+        def _receiver(sender, recipients, text, **kwargs):
+            sent.append((recipients, text))
+
+        notification_signal.connect(_receiver)
+        try:
+            count = zbx_events.notify([(self.device_switch, "sw down"), (device2, "sw2 down")])
+        finally:
+            notification_signal.disconnect(_receiver)
+        self.assertEqual(count, 1)
+        self.assertListEqual(sent, [([admin.pk], "sw down\n\nsw2 down")])
+
+
+# Topology is updated on commit
+class DeviceTopologyTestCase(TransactionTestCase):
+    def setUp(self):
+        device_topology.reset()
+        self.olt = Device.objects.create(ip_address="10.0.0.1", comment="olt", dev_type=Dlink_dgs1100_10me_code)
+        self.sw = Device.objects.create(
+            ip_address="10.0.0.2", comment="sw", dev_type=Dlink_dgs1100_10me_code, parent_dev=self.olt
+        )
+        self.onu1 = Device.objects.create(comment="onu1", dev_type=OnuZTE_F601_code, parent_dev=self.sw)
+        self.onu2 = Device.objects.create(comment="onu2", dev_type=OnuZTE_F601_code, parent_dev=self.sw)
+
+    def tearDown(self):
+        device_topology.reset()
+
+    def test_tree(self):
+        self.assertListEqual(device_topology.ancestors(self.onu1.pk), [self.sw.pk, self.olt.pk])
+        self.assertSetEqual(device_topology.descendants(self.olt.pk), {self.sw.pk, self.onu1.pk, self.onu2.pk})
+        self.assertSetEqual(device_topology.descendants(self.onu1.pk), set())
+
+    def test_incremental_update(self):
+        device_topology.ancestors(self.onu1.pk)
+        self.onu2.parent_dev = self.olt
+        self.onu2.save(update_fields=["parent_dev"])
+        self.assertListEqual(device_topology.ancestors(self.onu2.pk), [self.olt.pk])
+        self.assertSetEqual(device_topology.descendants(self.sw.pk), {self.onu1.pk})
+        self.sw.delete()
+        self.assertListEqual(device_topology.ancestors(self.onu1.pk), [])
+        self.assertSetEqual(device_topology.descendants(self.olt.pk), {self.onu2.pk})
+
+    def test_rolled_back_change_not_applied(self):
+        device_topology.ancestors(self.onu1.pk)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.onu1.parent_dev = self.olt
+                self.onu1.save(update_fields=["parent_dev"])
+                raise RuntimeError("rollback")
+        self.assertListEqual(device_topology.ancestors(self.onu1.pk), [self.sw.pk, self.olt.pk])
+
+    def test_customers_reloaded_after_remote_change(self):
+        device_topology.customers_count([self.sw.pk])
+        with self.assertNumQueries(0):
+            device_topology.customers_count([self.sw.pk])
+        # customer changed by other process
+        redis_proxy.incr(topology.DEVICE_TOPOLOGY_CUSTOMERS_VERSION_KEY)
+        with self.assertNumQueries(0):
+            device_topology.customers_count([self.sw.pk])
+        device_topology._checked_at -= topology.DEVICE_TOPOLOGY_CHECK_INTERVAL
+        with self.assertNumQueries(1):
+            device_topology.customers_count([self.sw.pk])
+
+    def test_only_highest_failed_device_reported(self):
+        down = Device.NETWORK_STATE_DOWN
+        for dev in (self.sw, self.onu1, self.onu2):
+            dev.status = down
+        events = [
+            (dev, zbx_events.ZbxEvent(dev_ip=str(dev.ip_address), status=1))
+            for dev in (self.sw, self.onu1, self.onu2)
+        ]
+        reported = zbx_events.correlate_outages(events)
+        self.assertListEqual([d.pk for d, text in reported], [self.sw.pk])
+        self.assertIn("unavailable: 2", reported[0][1])
+
+        # Parent failed earlier, and it was reported already
+        Device.objects.filter(pk=self.olt.pk).update(status=down)
+        self.assertListEqual(zbx_events.correlate_outages(events), [])
@@ -0,0 +1,193 @@
+"""
+In-memory index of device tree, built by Device.parent_dev.
+
+Index is loaded once in each process, and updated incrementally from
+Device save and delete signals, after commit. Other processes see that tree changed by
+version number in redis, and reload it on next use. Customer counts are
+reloaded by one aggregate query after customer is changed, also by version
+number in redis. Versions are checked not more often than
+DEVICE_TOPOLOGY_CHECK_INTERVAL seconds.
+"""
+import os
+import threading
+from time import monotonic
+from typing import Iterable, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from redis import RedisError
+
+from djing2.lib.logger import logger
+from djing2.lib.redis import redis_proxy
+
+
+DEVICE_TOPOLOGY_VERSION_KEY = "device_topology_version"
+DEVICE_TOPOLOGY_CUSTOMERS_VERSION_KEY = "device_topology_customers_version"
+# Seconds, while changes made by other processes may be not seen
+DEVICE_TOPOLOGY_CHECK_INTERVAL = getattr(settings, "DEVICE_TOPOLOGY_CHECK_INTERVAL", 5)
+
+
+class DeviceTopology:
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget loaded tree, it is loaded again on next use"""
+        self._lock = threading.RLock()
+        self._parents: Optional[dict[int, Optional[int]]] = None
+        self._children: dict[int, set[int]] = {}
+        self._customers: Optional[dict[int, int]] = None
+        self._version: Optional[int] = None
+        self._customers_version: Optional[int] = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _remote_version() -> Optional[int]:
+        try:
+            v = redis_proxy.get(DEVICE_TOPOLOGY_VERSION_KEY)
+        except RedisError as err:
+            logger.error("Device topology version is unavailable: %s" % err)
+            return None
+        return int(v) if v else 0
+
+    @staticmethod
+    def _remote_versions() -> tuple[Optional[int], Optional[int]]:
+        """Versions of tree and of customer counts"""
+        try:
+            tree_v, customers_v = redis_proxy.mget(DEVICE_TOPOLOGY_VERSION_KEY, DEVICE_TOPOLOGY_CUSTOMERS_VERSION_KEY)
+        except RedisError as err:
+            logger.error("Device topology version is unavailable: %s" % err)
+            return None, None
+        return int(tree_v) if tree_v else 0, int(customers_v) if customers_v else 0
+
+    @staticmethod
+    def _bump_version(key: str = DEVICE_TOPOLOGY_VERSION_KEY) -> Optional[int]:
+        try:
+            return redis_proxy.incr(key)
+        except RedisError as err:
+            logger.error("Device topology version is unavailable: %s" % err)
+            return None
+
+    def _load_tree(self, version: Optional[int]) -> None:
+        Device = apps.get_model("devices", "Device")
+        self._parents = dict(Device.objects.values_list("pk", "parent_dev_id").iterator())
+        self._children = {}
+        for device_id, parent_id in self._parents.items():
+            if parent_id is not None:
+                self._children.setdefault(parent_id, set()).add(device_id)
+        self._version = version
+
+    def _load_customers(self, version: Optional[int]) -> None:
+        Customer = apps.get_model("customers", "Customer")
+        self._customers = dict(
+            Customer.objects.filter(device__isnull=False, is_active=True).values(
+                "device_id"
+            ).annotate(cnt=Count("pk")).order_by().values_list("device_id", "cnt")
+        )
+        self._customers_version = version
+
+    def _ensure_loaded(self) -> None:
+        """Must be called under lock"""
+        now = monotonic()
+        loaded = self._parents is not None and self._customers is not None
+        if loaded and now - self._checked_at < DEVICE_TOPOLOGY_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        version, customers_version = self._remote_versions()
+        if self._parents is None or version is None or version != self._version:
+            self._load_tree(version)
+        if self._customers is None or customers_version is None or customers_version != self._customers_version:
+            self._load_customers(customers_version)
+
+    def _set_parent(self, device_id: int, parent_id: Optional[int]) -> None:
+        old_parent = self._parents.get(device_id)
+        if old_parent is not None:
+            self._children.get(old_parent, set()).discard(device_id)
+        self._parents[device_id] = parent_id
+        if parent_id is not None:
+            self._children.setdefault(parent_id, set()).add(device_id)
+
+    def _update(self, fn) -> None:
+        # Other processes, and this one, must see change when it is committed,
+        # and must not see it at all when it is rolled back
+        transaction.on_commit(lambda: self._apply_update(fn))
+
+    def _apply_update(self, fn) -> None:
+        with self._lock:
+            up_to_date = self._parents is not None and self._version == self._remote_version()
+            version = self._bump_version()
+            if up_to_date and version is not None and self._version is not None and version == self._version + 1:
+                fn()
+                self._version = version
+            else:
+                # Changed by other process too, or never loaded
+                self._parents = None
+
+    def device_saved(self, device_id: int, parent_id: Optional[int]) -> None:
+        self._update(lambda: self._set_parent(device_id, parent_id))
+
+    def device_removed(self, device_id: int) -> None:
+        def _remove():
+            self._set_parent(device_id, None)
+            del self._parents[device_id]
+            # children parent_dev is set to null by db
+            for child_id in self._children.pop(device_id, ()):
+                self._parents[child_id] = None
+            if self._customers is not None:
+                self._customers.pop(device_id, None)
+        self._update(_remove)
+
+    def customers_changed(self) -> None:
+        with self._lock:
+            self._customers = None
+        # Other processes must reload counts, when change is visible to them
+        transaction.on_commit(lambda: self._bump_version(DEVICE_TOPOLOGY_CUSTOMERS_VERSION_KEY))
+
+    def parent(self, device_id: int) -> Optional[int]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._parents.get(device_id)
+
+    def ancestors(self, device_id: int) -> list[int]:
+        """Parents up to the root, nearest first"""
+        with self._lock:
+            self._ensure_loaded()
+            res = []
+            seen = {device_id}
+            parent_id = self._parents.get(device_id)
+            # seen protects from loop in parent_dev
+            while parent_id is not None and parent_id not in seen:
+                res.append(parent_id)
+                seen.add(parent_id)
+                parent_id = self._parents.get(parent_id)
+            return res
+
+    def descendants(self, device_id: int) -> set[int]:
+        with self._lock:
+            self._ensure_loaded()
+            res = set()
+            stack = list(self._children.get(device_id, ()))
+            while stack:
+                child_id = stack.pop()
+                if child_id in res or child_id == device_id:
+                    continue
+                res.add(child_id)
+                stack.extend(self._children.get(child_id, ()))
+            return res
+
+    def customers_count(self, device_ids: Iterable[int]) -> int:
+        """Count of active customers, attached to devices"""
+        with self._lock:
+            self._ensure_loaded()
+            return sum(self._customers.get(device_id, 0) for device_id in device_ids)
+
+    def subtree_customers_count(self, device_id: int) -> int:
+        """Count of active customers, attached to device and devices below it"""
+        return self.customers_count(self.descendants(device_id) | {device_id})
+
+
+device_topology = DeviceTopology()
+# Loaded tree of parent process may be outdated in forked workers
+os.register_at_fork(after_in_child=device_topology.reset)
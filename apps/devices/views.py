@@ -1,13 +1,16 @@
 import re
+from uuid import uuid4
 from functools import wraps
 from json import dumps as json_dumps
 from dataclasses import asdict
 
+from celery import group as celery_group
 from django.db.models import Count
 from django.http.response import StreamingHttpResponse
-from django.utils.translation import gettext_lazy as _, gettext
+from django.utils.translation import gettext_lazy as _
 from django_filters.rest_framework import DjangoFilterBackend
 from easysnmp.exceptions import EasySNMPTimeoutError, EasySNMPError
+from redis import RedisError
 from guardian.shortcuts import get_objects_for_user
 from rest_framework import status
 from rest_framework.decorators import action, api_view
@@ -18,20 +21,26 @@ from djing2.lib.filters import CustomSearchFilter
 from devices import serializers as dev_serializers
 from devices.device_config.pon.pon_device_strategy import PonOLTDeviceStrategyContext
 from devices.device_config.switch.switch_device_strategy import SwitchDeviceStrategyContext
-from devices.models import Device, Port, PortVlanMemberModel, DeviceModelQuerySet
+from devices.device_config.switch.vlan_matrix import VlanMatrix
+from devices.models import Device, Port, PortVlanMemberModel, DeviceModelQuerySet, DevicePollResult, DeviceFdbChange
+from devices import fdb
 from devices.device_config.base import (
     DeviceImplementationError,
     DeviceConnectionError,
     UnsupportedReadingVlan,
 )
 from devices.device_config.expect_util import ExpectValidationError
+from devices.state_cache import get_device_state, drop_device_state
+from devices.onu_bulk_config import group_by_olt
+from devices.tasks import apply_onu_config_group_task, process_zbx_events_task
+from devices import zbx_events
 from djing2 import IP_ADDR_REGEX
 from djing2.lib import ProcessLocked, safe_int, RuTimedelta
-from djing2.lib.custom_signals import notification_signal
+from djing2.lib.logger import logger
 from djing2.lib.filters import CustomObjectPermissionsFilter
 from djing2.viewsets import DjingModelViewSet, DjingListAPIView
 from groupapp.models import Group
-from profiles.models import UserProfile, UserProfileLogActionType
+from profiles.models import UserProfileLogActionType
 
 
 def catch_dev_manager_err(fn):
@@ -57,14 +66,34 @@ def catch_dev_manager_err(fn):
     return _wrapper
 
 
+def _read_device_state(request, device, operation: str, read_fn):
+    """Read device state through cache, ?refresh=1 requests device anyway"""
+    return get_device_state(
+        device_id=device.pk,
+        operation=operation,
+        read_fn=read_fn,
+        refresh=safe_int(request.query_params.get("refresh")) > 0,
+    )
+
+
+def _state_response(state, data=None) -> Response:
+    r = Response(state.data if data is None else data)
+    r["Age"] = str(int(state.age))
+    r["X-Cache"] = "HIT" if state.from_cache else "MISS"
+    return r
+
+
+def _user_groups(user):
+    # TODO: May optimize
+    return get_objects_for_user(user=user, perms="groupapp.view_group", klass=Group).order_by("title")
+
+
 class FilterQuerySetMixin:
     def get_queryset(self):
         qs = super().get_queryset()
         if self.request.user.is_superuser:
             return qs
-        # TODO: May optimize
-        grps = get_objects_for_user(user=self.request.user, perms="groupapp.view_group", klass=Group).order_by("title")
-        return qs.filter(group__in=grps)
+        return qs.filter(group__in=_user_groups(self.request.user))
 
     def filter_queryset(self, queryset: DeviceModelQuerySet):
         queryset = super().filter_queryset(queryset=queryset)
@@ -161,8 +190,11 @@ class DevicePONViewSet(FilterQuerySetMixin, DjingModelViewSet):
         device = self.get_object()
         manager = device.get_pon_olt_device_manager()
         if hasattr(manager, "get_fibers"):
-            fb = manager.get_fibers()
-            return Response(tuple(fb))
+            state = _read_device_state(
+                request, device, "olt_fibers",
+                read_fn=lambda: tuple(manager.get_fibers())
+            )
+            return _state_response(state)
         else:
             return Response({"Error": {"text": "Manager has not get_fibers attribute"}})
 
@@ -189,6 +221,7 @@ class DevicePONViewSet(FilterQuerySetMixin, DjingModelViewSet):
         self.check_permission_code(request, "devices.can_fix_onu")
         onu = self.get_object()
         fix_status, text = onu.fix_onu()
+        drop_device_state(onu.pk, "pon_details")
         onu_serializer = self.get_serializer(onu)
         return Response({"text": text, "status": 1 if fix_status else 2, "device": onu_serializer.data})
 
@@ -227,8 +260,47 @@ class DevicePONViewSet(FilterQuerySetMixin, DjingModelViewSet):
 
         device = self.get_object()
         res = device.apply_onu_config(config=device_config_serializer.data)
+        drop_device_state(device.pk, "pon_details")
         return Response(res)
 
+    @action(detail=False, methods=["post"])
+    def bulk_apply_onu_config_template(self, request):
+        """
+        Apply config templates to many onu devices in background.
+        Onu of one OLT are configured sequentially, different OLT in parallel.
+        Progress of each onu is sent by websocket with batch_id from response.
+        """
+        self.check_permission_code(request, "devices.can_apply_onu_config")
+
+        serializer = dev_serializers.DeviceOnuBulkConfigTemplate(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        configs = {i["device_id"]: i["config"] for i in serializer.data["items"]}
+
+        devices = self.get_queryset().filter(pk__in=configs.keys())
+        for device in devices:
+            self.check_object_permissions(request, device)
+        parents = dict(devices.values_list("pk", "parent_dev_id"))
+        not_found = [device_id for device_id in configs if device_id not in parents]
+        if not_found:
+            return Response({
+                "text": _("Devices not found: %s") % ", ".join(str(i) for i in not_found),
+                "status": 2
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        batch_id = uuid4().hex
+        groups = group_by_olt(
+            (device_id, parents[device_id], config) for device_id, config in configs.items()
+        )
+        celery_group(
+            apply_onu_config_group_task.s(
+                batch_id=batch_id, olt_id=olt_id, items=items, recipients=[request.user.pk]
+            ) for olt_id, items in groups
+        ).apply_async()
+        return Response({
+            "batch_id": batch_id,
+            "groups": [{"olt_id": olt_id, "device_ids": [i["device_id"] for i in items]} for olt_id, items in groups],
+        }, status=status.HTTP_202_ACCEPTED)
+
     @action(detail=True, methods=['get'])
     @catch_dev_manager_err
     def remove_from_olt(self, request, pk=None):
@@ -244,8 +316,8 @@ class DevicePONViewSet(FilterQuerySetMixin, DjingModelViewSet):
     def scan_pon_details(self, request, pk=None):
         device = self.get_object()
         pon_manager = device.get_pon_onu_device_manager()
-        data = pon_manager.get_details()
-        return Response(data)
+        state = _read_device_state(request, device, "pon_details", read_fn=pon_manager.get_details)
+        return _state_response(state)
 
     @action(detail=True)
     def get_onu_config_options(self, request, pk=None):
@@ -312,8 +384,11 @@ class DeviceModelViewSet(FilterQuerySetMixin, DjingModelViewSet):
         if not isinstance(manager, SwitchDeviceStrategyContext):
             raise DeviceImplementationError("Expected SwitchDeviceStrategyContext instance")
         try:
-            ports = [p.as_dict() for p in manager.get_ports()]
-            return Response({"text": '', "status": 1, "ports": ports})
+            state = _read_device_state(
+                request, device, "ports",
+                read_fn=lambda: [p.as_dict() for p in manager.get_ports()]
+            )
+            return _state_response(state, {"text": '', "status": 1, "ports": state.data})
         except StopIteration:
             return Response({"text": _("Device port count error"), "status": 2})
 
@@ -344,65 +419,20 @@ class DeviceModelViewSet(FilterQuerySetMixin, DjingModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        device = self.get_queryset().filter(ip_address=dev_ip).defer("extra_data").first()
-        if device is None:
-            return Response(
-                {"text": "Devices with ip %s does not exist" % dev_ip},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-        status_map = {
-            0: Device.NETWORK_STATE_UP,
-            1: Device.NETWORK_STATE_DOWN,
-        }
-        status_text_map = {
-            0: "Device %(device_name)s is ok",
-            1: "Device %(device_name)s has problem",
-        }
-        device.status = status_map.get(dev_status, Device.NETWORK_STATE_UNDEFINED)
-
-        device.save(update_fields=("status",))
-
-        if not device.is_noticeable:
-            # print("Notification for %s is unnecessary" % device.ip_address or device.comment)
-            return Response({
-                "text": "Notification for %s is unnecessary" % device.ip_address or device.comment
-            })
-
-        if not device.group:
-            # print('Device has not have a group')
-            return Response({"text": "Device has not have a group"})
-
-        recipients = UserProfile.objects.get_profiles_by_group(
-            group_id=device.group.pk
-        )
-        # TODO: make editable UserProfile.flags
-        # ).filter(
-        #     flags=UserProfile.flags.notify_mon
-        # )
-        user_ids = tuple(recipient.pk for recipient in recipients.only("pk").iterator())
-
-        notify_text = status_text_map.get(
-            dev_status,
-            "Device %(device_name)s getting undefined status code"
-        )
-        text = "%s\n\n%s" % (gettext(notify_text) % {
-            "device_name": "{}({}) {}".format(device.ip_address or "", device.mac_addr, device.comment)
-        }, message)
-        # FIXME: make it done
-        # ws_connector.send_data2ws({
-        #     "eventType": "monitoring_event",
-        #     "recipients": user_ids,
-        #     "text": text
-        # })
-        notification_signal.send(
-            sender=device.__class__,
-            instance=device,
-            recipients=user_ids,
-            text=text
-        )
+        # Events are processed in background, coalesced with other
+        # events of the same time, see devices.zbx_events
+        group_ids = None
+        if not request.user.is_superuser:
+            group_ids = list(_user_groups(request.user).values_list("pk", flat=True))
+        event = zbx_events.ZbxEvent(dev_ip=dev_ip, status=dev_status, message=message, group_ids=group_ids)
+        try:
+            if zbx_events.enqueue_event(event):
+                process_zbx_events_task.apply_async(countdown=zbx_events.ZBX_EVENTS_WINDOW)
+        except RedisError as err:
+            logger.error("Zabbix events queue is unavailable: %s" % err)
+            zbx_events.process_events([event])
         return Response({
-            "text": "notification successfully sent"
+            "text": "event accepted"
         })
 
     @action(detail=True)
@@ -423,6 +453,34 @@ class DeviceModelViewSet(FilterQuerySetMixin, DjingModelViewSet):
         res = (asdict(i) for i in vlan_list)
         return Response(res)
 
+    @action(detail=True)
+    def poll_state(self, request, pk=None):
+        """Last state of device from snmp poller, without requesting device"""
+        dev = self.get_object()
+        res = DevicePollResult.objects.filter(device=dev).order_by('-poll_time').first()
+        if res is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(dev_serializers.DevicePollResultModelSerializer(res).data)
+
+    @action(detail=False)
+    def find_mac(self, request):
+        """
+        Where mac is seen over all switches, from FDB snapshots,
+        customer port first. And last changes of its place.
+        """
+        mac = request.query_params.get("mac")
+        try:
+            entries = fdb.find_mac(mac, devices=self.get_queryset())
+            changes = DeviceFdbChange.objects.filter(
+                mac=fdb.mac2int(mac), device__in=self.get_queryset()
+            ).order_by("-change_time")[:50]
+        except ValueError as err:
+            return Response(str(err), status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "entries": dev_serializers.DeviceFdbEntryModelSerializer(entries, many=True).data,
+            "changes": dev_serializers.DeviceFdbChangeModelSerializer(changes, many=True).data,
+        })
+
     @action(methods=['get'], detail=False)
     def device_types(self, request):
         dev_types = SwitchDeviceStrategyContext.get_device_types()
@@ -465,6 +523,7 @@ class PortModelViewSet(DjingModelViewSet):
             manager.port_disable(port_num=port_num)
         else:
             return Response(_("Parameter port_state is bad"), status=status.HTTP_400_BAD_REQUEST)
+        drop_device_state(port.device_id, "ports")
         return Response(status=status.HTTP_200_OK)
 
     # @action(detail=True)
@@ -493,8 +552,21 @@ class PortModelViewSet(DjingModelViewSet):
     @catch_dev_manager_err
     def scan_vlan(self, request, pk=None):
         port = self.get_object()
-        port_vlans = port.get_port_vlan_list()
-        return Response(asdict(p) for p in port_vlans)
+        dev = port.device
+        if dev is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        mng = dev.get_switch_device_manager()
+        try:
+            # Vlans of all ports are read once, and other ports are served from cache
+            state = _read_device_state(
+                request, dev, "vlan_matrix",
+                read_fn=lambda: mng.read_vlan_matrix().as_dict()
+            )
+        except UnsupportedReadingVlan:
+            port_vlans = port.get_port_vlan_list()
+            return Response(asdict(p) for p in port_vlans)
+        port_vlans = VlanMatrix.from_dict(state.data).port_vlans(int(port.num))
+        return _state_response(state, data=[asdict(p) for p in port_vlans])
 
 
 class PortVlanMemberModelViewSet(DjingModelViewSet):
@@ -0,0 +1,212 @@
+"""
+Queue of zabbix monitoring events.
+
+Webhook handler only puts event into redis list, and returns. Events are
+consumed by celery task, that is started once for window of
+ZBX_EVENTS_WINDOW seconds. So events of network outage are coalesced:
+last status of each device is saved by bulk update, only the highest
+failed device of device tree is reported, and each recipient gets one
+notification about all of its devices.
+"""
+import json
+from dataclasses import dataclass, field, asdict
+from time import time
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import gettext
+
+from devices.models import Device
+from devices.topology import device_topology
+from djing2.lib.custom_signals import notification_signal
+from djing2.lib.logger import logger
+from djing2.lib.redis import redis_proxy
+from profiles.models import UserProfile
+
+
+# Seconds to collect events before they are processed
+ZBX_EVENTS_WINDOW = getattr(settings, "ZBX_EVENTS_WINDOW", 5)
+
+ZBX_EVENTS_KEY = "zbx_events"
+ZBX_EVENTS_SCHEDULED_KEY = "zbx_events_scheduled"
+
+ZBX_STATUS_MAP = {
+    0: Device.NETWORK_STATE_UP,
+    1: Device.NETWORK_STATE_DOWN,
+}
+ZBX_STATUS_TEXT_MAP = {
+    0: "Device %(device_name)s is ok",
+    1: "Device %(device_name)s has problem",
+}
+_UNDEFINED_STATUS_TEXT = "Device %(device_name)s getting undefined status code"
+
+
+@dataclass
+class ZbxEvent:
+    dev_ip: str
+    status: int
+    message: Optional[str] = None
+    event_time: float = field(default_factory=time)
+    # Groups of devices, that sender of event may change, None - all groups
+    group_ids: Optional[list[int]] = None
+
+    def allows(self, device: Device) -> bool:
+        return self.group_ids is None or device.group_id in self.group_ids
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, raw) -> "ZbxEvent":
+        return cls(**json.loads(raw))
+
+
+def enqueue_event(event: ZbxEvent) -> bool:
+    """
+    Put event into queue.
+
+    :return: True when consumer must be scheduled, it is True only for
+             first event after previous consumer started.
+    """
+    redis_proxy.rpush(ZBX_EVENTS_KEY, event.to_json())
+    # Key lives longer than window, so lost consumer does not stop the queue forever
+    return bool(redis_proxy.set(ZBX_EVENTS_SCHEDULED_KEY, 1, ex=ZBX_EVENTS_WINDOW + 60, nx=True))
+
+
+def take_events() -> list[ZbxEvent]:
+    # Events, pushed after this, schedule next consumer
+    redis_proxy.delete(ZBX_EVENTS_SCHEDULED_KEY)
+    events = []
+    for raw in redis_proxy.pop_all(ZBX_EVENTS_KEY):
+        try:
+            events.append(ZbxEvent.from_json(raw))
+        except (ValueError, TypeError) as err:
+            logger.error("Bad zabbix event in queue: %s" % err)
+    return events
+
+
+def coalesce_events(events: Iterable[ZbxEvent]) -> dict[str, ZbxEvent]:
+    """Last event of each device ip, by event time"""
+    last = {}
+    for event in sorted(events, key=lambda e: e.event_time):
+        last[event.dev_ip] = event
+    return last
+
+
+def event_text(device: Device, event: ZbxEvent) -> str:
+    notify_text = ZBX_STATUS_TEXT_MAP.get(event.status, _UNDEFINED_STATUS_TEXT)
+    return "%s\n\n%s" % (gettext(notify_text) % {
+        "device_name": "{}({}) {}".format(device.ip_address or "", device.mac_addr, device.comment)
+    }, event.message)
+
+
+def _group_recipients(group_ids: Iterable[int]) -> dict[int, list[int]]:
+    """Group id to recipient profile ids, as UserProfile.objects.get_profiles_by_group, by one query"""
+    res = {}
+    for profile_id, group_id in UserProfile.objects.filter(
+        responsibility_groups__id__in=group_ids, is_admin=True, is_active=True
+    ).values_list("pk", "responsibility_groups__id").iterator():
+        res.setdefault(group_id, []).append(profile_id)
+    return res
+
+
+def correlate_outages(devices_events: list[tuple[Device, ZbxEvent]]) -> list[tuple[Device, str]]:
+    """
+    Down events of devices below other failed device are dropped, it was
+    reported by the highest failed device. Outage size, counted by
+    device topology, is added to notification text of that device.
+
+    :return: Devices with notification texts.
+    """
+    down_ids = {d.pk for d, e in devices_events if d.status == Device.NETWORK_STATE_DOWN}
+    ancestors = {device_id: device_topology.ancestors(device_id) for device_id in down_ids}
+    other_ancestors = {a for device_ancestors in ancestors.values() for a in device_ancestors} - down_ids
+    failed = set(down_ids)
+    if other_ancestors:
+        # Devices, that are failed earlier, are reported by previous events
+        failed.update(Device.objects.filter(
+            pk__in=other_ancestors, status=Device.NETWORK_STATE_DOWN
+        ).values_list("pk", flat=True))
+
+    res = []
+    for device, event in devices_events:
+        text = event_text(device, event)
+        if device.pk in down_ids:
+            if any(a in failed for a in ancestors[device.pk]):
+                continue
+            below = device_topology.descendants(device.pk)
+            text = "%s\n\n%s" % (text, gettext(
+                "Devices below: %(below)d, unavailable: %(down)d. Affected customers: %(customers)d"
+            ) % {
+                "below": len(below),
+                "down": len(below & down_ids),
+                "customers": device_topology.customers_count(below | {device.pk}),
+            })
+        res.append((device, text))
+    return res
+
+
+def notify(devices_texts: list[tuple[Device, str]]) -> int:
+    """
+    Send one notification to each recipient about all its devices.
+    Recipients with the same devices get it by one signal.
+
+    :return: signals count
+    """
+    devices_texts = [(d, t) for d, t in devices_texts if d.is_noticeable and d.group_id]
+    if not devices_texts:
+        return 0
+    recipients = _group_recipients({d.group_id for d, t in devices_texts})
+    recipient_texts: dict[int, list[str]] = {}
+    for device, text in devices_texts:
+        for profile_id in recipients.get(device.group_id, ()):
+            recipient_texts.setdefault(profile_id, []).append(text)
+
+    by_text: dict[str, list[int]] = {}
+    for profile_id, texts in recipient_texts.items():
+        by_text.setdefault("\n\n".join(texts), []).append(profile_id)
+    for text, profile_ids in by_text.items():
+        notification_signal.send(
+            sender=Device,
+            instance=devices_texts[0][0] if len(devices_texts) == 1 else None,
+            recipients=profile_ids,
+            text=text
+        )
+    return len(by_text)
+
+
+def process_events(events: Iterable[ZbxEvent]) -> int:
+    """
+    Save last status of each device, and notify about them.
+
+    :return: Updated devices count
+    """
+    events = list(events)
+    if not events:
+        return 0
+    devices = list(Device.objects.filter(ip_address__in={e.dev_ip for e in events}).only(
+        "pk", "ip_address", "mac_addr", "comment", "is_noticeable", "group_id", "status"
+    ))
+    # Event changes only devices from groups of its sender
+    last = coalesce_events(
+        e for e in events if any(e.allows(d) for d in devices if str(d.ip_address) == e.dev_ip)
+    )
+    devices_events = [
+        (device, last[str(device.ip_address)]) for device in devices
+        if str(device.ip_address) in last and last[str(device.ip_address)].allows(device)
+    ]
+    unknown = {e.dev_ip for e in events} - {str(d.ip_address) for d, e in devices_events}
+    if unknown:
+        logger.warning("Zabbix events for unknown devices: %s" % ", ".join(sorted(unknown)))
+
+    by_status: dict[int, list[int]] = {}
+    for device, event in devices_events:
+        device.status = ZBX_STATUS_MAP.get(event.status, Device.NETWORK_STATE_UNDEFINED)
+        by_status.setdefault(device.status, []).append(device.pk)
+    with transaction.atomic():
+        for dev_status, device_ids in by_status.items():
+            Device.objects.filter(pk__in=device_ids).update(status=dev_status)
+
+    notify(correlate_outages(devices_events))
+    return len(devices_events)
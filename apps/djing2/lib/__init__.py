@@ -179,10 +179,25 @@ class IntEnumEx(IntEnum, metaclass=ChoicesMeta):
         return value in cls._value2member_map_
 
 
+class QueryCounter:
+    """
+    Counts db queries, as connection.execute_wrapper.
+    Unlike django.test.utils.CaptureQueriesContext it does not keep queries, and
+    does not switch on debug cursor, so it is not limited by size of
+    connection.queries_log, and does not slow down long benchmark runs.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
 __all__ = (
     'safe_float', 'safe_int', 'LogicError', 'DuplicateEntry',
     'MyChoicesAdapter', 'RuTimedelta', 'bytes2human', 'calc_hash',
     'check_sign', 'macbin2str', 'time2utctime', 'IntEnumEx',
     'process_lock_decorator', 'ProcessLocked', 'check_subnet',
-    'get_past_time', 'get_past_time_days'
+    'get_past_time', 'get_past_time_days', 'QueryCounter'
 )
@@ -1,6 +1,3 @@
-import pickle
-
-from django.conf import settings
 from fastapi import HTTPException, Depends
 from fastapi.security import APIKeyHeader
 from profiles.models import BaseAccount
@@ -8,24 +5,11 @@ from starlette import status
 from starlette.requests import Request
 from django.utils.translation import gettext as _
 from rest_framework.authtoken.models import Token
-from djing2.lib.auth_backends import get_right_user
-from djing2.lib.redis import redis_proxy
+from djing2.lib.fastapi.auth_cache import get_auth_entry, AuthUser
 from djing2.lib import check_subnet
 
 
 TOKEN_RESULT_TYPE = tuple[BaseAccount, str]
-REDIS_AUTH_CACHE_TTL = getattr(settings, 'REDIS_AUTH_CACHE_TTL', 3600)
-
-
-def get_token(token: str) -> Token:
-    cashe_key = f'redis_user_token_{token}'
-    data = redis_proxy.get(cashe_key)
-    if data is not None:
-        data = pickle.loads(data)
-        return data
-    token_instance = Token.objects.select_related("user").get(key=token)
-    redis_proxy.set(cashe_key, pickle.dumps(token_instance), ex=int(REDIS_AUTH_CACHE_TTL))
-    return token_instance
 
 
 class TokenAPIKeyHeader(APIKeyHeader):
@@ -58,27 +42,21 @@ class TokenAPIKeyHeader(APIKeyHeader):
         kw, token = divided_auth
 
         try:
-            token_instance = get_token(token)
+            auth_entry = get_auth_entry(token)
         except Token.DoesNotExist:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=_("Invalid token.")
             ) from None
 
-        if not token_instance.user.is_active:
+        if not auth_entry.is_active:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=_("User inactive or deleted.")
             )
 
-        # TODO: Cash it
-        user = get_right_user(token_instance.user)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail='Failed to get concrete profile'
-            )
-        return user, token
+        # Concrete profile is loaded from db only when handler needs it
+        return AuthUser(auth_entry), token
 
 
 token_auth_dep = TokenAPIKeyHeader(name='Authorization')
@@ -0,0 +1,298 @@
+"""
+Cache of authenticated users by token.
+
+Compact entry of user, without ORM objects, is kept in redis, and for a
+few seconds in memory of each process. So authenticated request needs no
+db queries before handler. Concrete profile is loaded from db only when
+handler uses attributes of user, that are not in entry.
+
+Entry keeps model permissions of user, with permissions version. Version is
+changed when permissions of any auth group are changed, so entries of all
+members are read again, without looking for them.
+
+Entries are removed from redis when account, its sites, or its token are
+changed. Memory of other processes keeps entry no longer than
+AUTH_LOCAL_CACHE_TTL seconds.
+
+Generation number is changed on each invalidation, and entry read from db
+is stored only when generation is the same as before it was read. So entry,
+that was read before account is changed, does not overwrite invalidation.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from time import monotonic
+from typing import Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.utils.functional import LazyObject, empty
+from fastapi import HTTPException
+from redis import RedisError
+from rest_framework.authtoken.models import Token
+from starlette import status
+
+from djing2.lib.logger import logger
+from djing2.lib.redis import redis_proxy
+
+
+AUTH_CACHE_GEN_KEY = 'auth_cache_gen'
+AUTH_PERMS_VERSION_KEY = 'auth_perms_version'
+REDIS_AUTH_CACHE_TTL = int(getattr(settings, 'REDIS_AUTH_CACHE_TTL', 3600))
+AUTH_LOCAL_CACHE_TTL = int(getattr(settings, 'AUTH_LOCAL_CACHE_TTL', 5))
+AUTH_LOCAL_CACHE_SIZE = int(getattr(settings, 'AUTH_LOCAL_CACHE_SIZE', 1024))
+
+
+def _token_key(token: str) -> str:
+    return f'auth_token_user_{token}'
+
+
+def _user_key(user_id: int) -> str:
+    return f'auth_user_{user_id}'
+
+
+@dataclass
+class AuthCacheEntry:
+    user_id: int
+    # model label of concrete profile, i.e. 'profiles.UserProfile'
+    user_type: str
+    is_active: bool
+    is_admin: bool
+    is_superuser: bool
+    site_ids: list[int]
+    # 'app_label.codename' of model permissions, empty for superuser
+    perms: list[str] = field(default_factory=list)
+    perms_version: int = 0
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, raw) -> 'AuthCacheEntry':
+        return cls(**json.loads(raw))
+
+
+class AuthUser(LazyObject):
+    """
+    Concrete profile of authenticated user. Fields of AuthCacheEntry are
+    read without db query, profile is loaded on first use of other attributes.
+    """
+
+    def __init__(self, entry: AuthCacheEntry):
+        self.__dict__['_entry'] = entry
+        super().__init__()
+
+    def _setup(self):
+        entry = self.__dict__['_entry']
+        model = apps.get_model(entry.user_type)
+        try:
+            self._wrapped = model._default_manager.get(pk=entry.user_id)
+        except model.DoesNotExist:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail='Failed to get concrete profile'
+            ) from None
+
+    @property
+    def pk(self) -> int:
+        return self.__dict__['_entry'].user_id
+
+    id = pk
+
+    @property
+    def is_active(self) -> bool:
+        return self.__dict__['_entry'].is_active
+
+    @property
+    def is_admin(self) -> bool:
+        return self.__dict__['_entry'].is_admin
+
+    @property
+    def is_staff(self) -> bool:
+        return self.__dict__['_entry'].is_admin
+
+    @property
+    def is_superuser(self) -> bool:
+        return self.__dict__['_entry'].is_superuser
+
+    @property
+    def site_ids(self) -> list[int]:
+        return self.__dict__['_entry'].site_ids
+
+    def has_perm(self, perm: str, obj=None) -> bool:
+        entry = self.__dict__['_entry']
+        if obj is not None:
+            # Object permissions are checked by guardian
+            if self._wrapped is empty:
+                self._setup()
+            return self._wrapped.has_perm(perm, obj)
+        # The same as PermissionsMixin.has_perm with model backend
+        return entry.is_active and (entry.is_superuser or perm in entry.perms)
+
+    def has_perms(self, perm_list, obj=None) -> bool:
+        return all(self.has_perm(perm, obj) for perm in perm_list)
+
+
+class _LocalAuthCache:
+    """Small per process LRU of entries by token, entries expire after ttl"""
+
+    def __init__(self, maxsize: int = AUTH_LOCAL_CACHE_SIZE, ttl: float = AUTH_LOCAL_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.reset()
+
+    def reset(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[AuthCacheEntry, float]] = OrderedDict()
+
+    def get(self, token: str) -> Optional[AuthCacheEntry]:
+        with self._lock:
+            item = self._entries.get(token)
+            if item is None:
+                return None
+            entry, expire_time = item
+            if expire_time < monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return entry
+
+    def set(self, token: str, entry: AuthCacheEntry) -> None:
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (entry, monotonic() + self.ttl)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def remove_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in [t for t, (entry, _) in self._entries.items() if entry.user_id == user_id]:
+                del self._entries[token]
+
+    def remove_token(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+local_auth_cache = _LocalAuthCache()
+# Entries of parent process may be outdated in forked workers
+os.register_at_fork(after_in_child=local_auth_cache.reset)
+
+
+def _load_entry(token: str, perms_version: int = 0) -> AuthCacheEntry:
+    """:raises Token.DoesNotExist"""
+    token_instance = Token.objects.select_related("user").get(key=token)
+    user = token_instance.user
+    # The same as djing2.lib.auth_backends.get_right_user
+    user_type = 'profiles.UserProfile' if user.is_staff else 'customers.Customer'
+    if user.is_active and not user.is_superuser:
+        perms = sorted(user.get_all_permissions())
+    else:
+        perms = []
+    return AuthCacheEntry(
+        user_id=int(user.pk),
+        user_type=user_type,
+        is_active=bool(user.is_active),
+        is_admin=bool(user.is_admin),
+        is_superuser=bool(user.is_superuser),
+        site_ids=list(user.sites.values_list('pk', flat=True)),
+        perms=perms,
+        perms_version=perms_version,
+    )
+
+
+def _get_cached_entry(token: str) -> Optional[AuthCacheEntry]:
+    user_id = redis_proxy.get(_token_key(token))
+    if user_id is None:
+        return None
+    raw = redis_proxy.get(_user_key(int(user_id)))
+    if raw is None:
+        return None
+    return AuthCacheEntry.from_json(raw)
+
+
+def _get_gen() -> int:
+    return int(redis_proxy.get(AUTH_CACHE_GEN_KEY) or 0)
+
+
+def _get_versions() -> tuple[int, int]:
+    """Generation, and permissions version"""
+    gen, perms_version = redis_proxy.mget(AUTH_CACHE_GEN_KEY, AUTH_PERMS_VERSION_KEY)
+    return int(gen or 0), int(perms_version or 0)
+
+
+def _store(token: str, entry: AuthCacheEntry, gen: int) -> bool:
+    """Store entry if generation was not changed"""
+    def _fn(pipe) -> bool:
+        if int(pipe.get(AUTH_CACHE_GEN_KEY) or 0) != gen:
+            return False
+        pipe.multi()
+        pipe.set(_user_key(entry.user_id), entry.to_json(), ex=REDIS_AUTH_CACHE_TTL)
+        pipe.set(_token_key(token), entry.user_id, ex=REDIS_AUTH_CACHE_TTL)
+        return True
+
+    return redis_proxy.transaction(_fn, AUTH_CACHE_GEN_KEY, value_from_callable=True)
+
+
+def get_auth_entry(token: str) -> AuthCacheEntry:
+    """:raises Token.DoesNotExist"""
+    entry = local_auth_cache.get(token)
+    if entry is not None:
+        return entry
+    try:
+        gen, perms_version = _get_versions()
+        entry = _get_cached_entry(token)
+    except RedisError as err:
+        logger.error("Auth cache is unavailable: %s" % err)
+        return _load_entry(token)
+    if entry is None or entry.perms_version != perms_version:
+        entry = _load_entry(token, perms_version)
+        try:
+            stored = _store(token, entry, gen)
+        except RedisError as err:
+            logger.error("Auth cache is unavailable: %s" % err)
+            stored = False
+        if not stored:
+            # Account may be changed while it was read, do not keep it
+            return entry
+    local_auth_cache.set(token, entry)
+    return entry
+
+
+def _invalidate(key: str) -> None:
+    def _fn(pipe):
+        pipe.multi()
+        pipe.delete(key)
+        pipe.incr(AUTH_CACHE_GEN_KEY)
+
+    try:
+        redis_proxy.transaction(_fn)
+    except RedisError as err:
+        logger.error("Auth cache is not invalidated: %s" % err)
+
+
+def invalidate_user(user_id: int) -> None:
+    local_auth_cache.remove_user(user_id)
+    _invalidate(_user_key(user_id))
+
+
+def invalidate_permissions() -> None:
+    """Permissions of any users are changed"""
+    local_auth_cache.clear()
+    try:
+        redis_proxy.incr(AUTH_PERMS_VERSION_KEY)
+    except RedisError as err:
+        logger.error("Auth cache is not invalidated: %s" % err)
+
+
+def invalidate_token(token: str) -> None:
+    local_auth_cache.remove_token(token)
+    _invalidate(_token_key(token))
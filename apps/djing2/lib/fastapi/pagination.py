@@ -1,20 +1,32 @@
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
 from functools import wraps
-from typing import Optional, Type
+from typing import Any, Callable, Optional, Type
 
-from fastapi import Request, Depends
-from django.db.models import QuerySet, Model
+from fastapi import Request, Depends, HTTPException
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import QuerySet, Model, Field, Q, F, Func, Value, BooleanField
+from starlette import status
 
 from ._fields_cache import build_model_and_schema_fields
 from .types import (
     Pagination,
     PYDANTIC_SCHEMA,
     IListResponse,
-    DEFAULT_LIMIT
+    DEFAULT_LIMIT,
+    CountMode,
 )
 from .utils import format_object
 
 
-def paginate_qs(qs: QuerySet[Model], page: Optional[int], page_size: Optional[int]) -> QuerySet[Model]:
+# Planner estimate less than this is replaced with exact count
+ESTIMATE_COUNT_THRESHOLD = 10000
+
+
+def paginate_qs(qs: QuerySet[Model], page: Optional[int], page_size: Optional[int],
+                extra: int = 0) -> QuerySet[Model]:
     if not page_size:
         page_size = DEFAULT_LIMIT
 
@@ -24,11 +36,12 @@ def paginate_qs(qs: QuerySet[Model], page: Optional[int], page_size: Optional[in
         if page > 0:
             skip = (page - 1) * page_size
 
-    return qs[skip:page_size + skip]
+    return qs[skip:page_size + skip + extra]
 
 
-def get_next_url(r: Request, current_page: int, all_count: int, limit: int) -> Optional[str]:
-    left = all_count - limit * current_page
+def get_next_url(r: Request, current_page: int, all_count: Optional[int], limit: int,
+                 has_more: bool = False) -> Optional[str]:
+    left = has_more if all_count is None else all_count - limit * current_page
     if left > 0:
         next_page = current_page + 1
         u = r.url
@@ -48,10 +61,195 @@ def apply_ordering(qs: QuerySet, field_name: str) -> QuerySet:
     return qs.order_by(field_name)
 
 
+def estimate_count(qs: QuerySet) -> int:
+    """
+    Rows count from postgres planner estimate, without scanning rows.
+    Exact count is returned for small results, where estimate is rough.
+    """
+    connection = connections[qs.db]
+    if connection.vendor != "postgresql":
+        return qs.count()
+    sql, params = qs.order_by().query.sql_with_params()
+    with connection.cursor() as cur:
+        cur.execute("EXPLAIN (FORMAT JSON) %s" % sql, params)
+        plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+    if estimate < ESTIMATE_COUNT_THRESHOLD:
+        return qs.count()
+    return estimate
+
+
+def get_count(qs: QuerySet, count_mode: CountMode, pagination: Pagination) -> Optional[int]:
+    if count_mode == CountMode.ESTIMATE:
+        return estimate_count(qs)
+    if count_mode == CountMode.ON_DEMAND and not pagination.with_count:
+        return None
+    return qs.count()
+
+
+_BAD_CURSOR = HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor")
+
+
+class _RowCompare(Func):
+    """
+    Row value comparison, i.e. (field, pk) > (value, pk value).
+    Postgres scans index on (field, pk) by it as one range.
+    """
+    output_field = BooleanField()
+
+    def __init__(self, lhs: tuple, op: str, rhs: tuple):
+        super().__init__(*lhs, *rhs)
+        self.op = op
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sqls, params = [], []
+        for arg in self.get_source_expressions():
+            arg_sql, arg_params = compiler.compile(arg)
+            sqls.append(arg_sql)
+            params.extend(arg_params)
+        half = len(sqls) // 2
+        sql = "(%s) %s (%s)" % (", ".join(sqls[:half]), self.op, ", ".join(sqls[half:]))
+        return sql, params
+
+
+class _CursorOrdering:
+    """
+    Keyset ordering by (field, pk). Nulls are last in ascending order,
+    and first in descending order, as postgres sorts them by default.
+    """
+
+    def __init__(self, name: str, desc: bool, field: Field, pk_field: Field):
+        self.name = name
+        self.desc = desc
+        self.field = field
+        self.pk_field = pk_field
+
+    @classmethod
+    def from_qs(cls, qs: QuerySet, db_model: Type[Model], ordering: Optional[str]) -> Optional["_CursorOrdering"]:
+        """:return: None when ordering can't be kept by cursor, i.e. by related or computed field"""
+        if not ordering:
+            ordering = next((o for o in qs.query.order_by if isinstance(o, str)), None) or "pk"
+        name = ordering.lstrip("-")
+        pk_field = db_model._meta.pk
+        if name in ("pk", pk_field.name):
+            field = pk_field
+        else:
+            try:
+                field = db_model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.many_to_many:
+                return None
+        return cls(name=name, desc=ordering.startswith("-"), field=field, pk_field=pk_field)
+
+    @property
+    def is_pk(self) -> bool:
+        return self.field is self.pk_field
+
+    def order(self, qs: QuerySet, reverse: bool = False) -> QuerySet:
+        desc = self.desc != reverse
+        pk_order = "-pk" if desc else "pk"
+        if self.is_pk:
+            return qs.order_by(pk_order)
+        if desc:
+            field_order = F(self.field.attname).desc(nulls_first=True)
+        else:
+            field_order = F(self.field.attname).asc(nulls_last=True)
+        return qs.order_by(field_order, pk_order)
+
+    def after(self, value: Any, pk: Any, reverse: bool = False) -> Q:
+        """Rows after (value, pk) in this ordering, or before it when reverse"""
+        desc = self.desc != reverse
+        op = "lt" if desc else "gt"
+        if self.is_pk:
+            return Q(**{"pk__%s" % op: pk})
+        attname = self.field.attname
+        if value is None:
+            q = Q(**{"%s__isnull" % attname: True, "pk__%s" % op: pk})
+            if desc:
+                q |= Q(**{"%s__isnull" % attname: False})
+            return q
+        q = Q(_RowCompare(
+            lhs=(F(attname), F("pk")),
+            op="<" if desc else ">",
+            rhs=(Value(value, output_field=self.field), Value(pk, output_field=self.pk_field)),
+        ))
+        if not desc and self.field.null:
+            q |= Q(**{"%s__isnull" % attname: True})
+        return q
+
+    def encode(self, obj: Model, reverse: bool = False) -> str:
+        value = None if self.is_pk else getattr(obj, self.field.attname)
+        raw = json.dumps([self.name, value, obj.pk, int(reverse)], cls=DjangoJSONEncoder)
+        return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode(self, cursor: str) -> tuple[Any, Any, bool]:
+        """:return: field value, pk, and is cursor for previous page"""
+        try:
+            raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            name, value, pk, reverse = json.loads(raw)
+            if name != self.name:
+                # Ordering was changed, cursor is from another list
+                raise _BAD_CURSOR
+            if value is not None:
+                value = self.field.to_python(value)
+            return value, self.pk_field.to_python(pk), bool(reverse)
+        except (ValueError, TypeError, ValidationError) as err:
+            raise _BAD_CURSOR from err
+
+
+def paginate_qs_cursor(r: Request, qs: QuerySet[Model], ordering: _CursorOrdering,
+                       pagination: Pagination) -> tuple[list[Model], Optional[str], Optional[str]]:
+    """
+    Page of rows after position from cursor, without OFFSET, so
+    each page costs the same, wherever it is in the list.
+
+    :return: rows, next url, previous url
+    """
+    page_size = pagination.page_size or DEFAULT_LIMIT
+    reverse = False
+    if pagination.cursor:
+        value, pk, reverse = ordering.decode(pagination.cursor)
+        qs = qs.filter(ordering.after(value, pk, reverse=reverse))
+    rows = list(ordering.order(qs, reverse=reverse)[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    def _url(obj: Model, to_previous: bool) -> str:
+        return str(r.url.remove_query_params("page").include_query_params(
+            cursor=ordering.encode(obj, reverse=to_previous)
+        ))
+
+    next_url = prev_url = None
+    if rows:
+        if has_more if not reverse else True:
+            next_url = _url(rows[-1], to_previous=False)
+        if has_more if reverse else bool(pagination.cursor):
+            prev_url = _url(rows[0], to_previous=True)
+    return rows, next_url, prev_url
+
+
 def paginate_qs_path_decorator(
     schema: Type[PYDANTIC_SCHEMA],
-    db_model: Type[Model]
+    db_model: Type[Model],
+    cursor_pagination: bool = False,
+    count_mode: CountMode = CountMode.EXACT,
+    prefetch_rows: Optional[Callable[[list[Model]], None]] = None,
 ):
+    """
+    :param cursor_pagination: Use 'cursor' from 'next' and 'previous'
+                              urls instead of page numbers. Page costs the
+                              same wherever it is, as OFFSET is not used.
+                              Requests with 'page' number, or with ordering
+                              by related field, are still paginated by pages.
+    :param count_mode: How 'count' of list is computed, see CountMode.
+    :param prefetch_rows: Fetches computed fields for all rows of page
+                          at once, before they are formatted.
+    """
     field_objects, computed_field_objects = build_model_and_schema_fields(schema, db_model)
 
     def _fwrap(fn):
@@ -62,39 +260,61 @@ def paginate_qs_path_decorator(
             *args, **kwargs
         ):
             qs = fn(request=request, pagination=pagination, *args, **kwargs)
-            all_count = qs.count()
+            all_count = get_count(qs=qs, count_mode=count_mode, pagination=pagination)
 
             fields_list = []
             if pagination.fields:
                 fields_list = pagination.fields.split(',')
 
-            if pagination.ordering:
-                qs = apply_ordering(qs=qs, field_name=pagination.ordering)
+            cursor_ordering = None
+            if cursor_pagination and (pagination.cursor or pagination.page <= 1):
+                cursor_ordering = _CursorOrdering.from_qs(qs=qs, db_model=db_model, ordering=pagination.ordering)
+                if cursor_ordering is None and pagination.cursor:
+                    raise _BAD_CURSOR
 
-            qs = paginate_qs(
-                qs=qs,
-                page=pagination.page,
-                page_size=pagination.page_size
-            )
+            if cursor_ordering is not None:
+                rows, next_url, prev_url = paginate_qs_cursor(
+                    r=request, qs=qs, ordering=cursor_ordering, pagination=pagination
+                )
+            else:
+                if pagination.ordering:
+                    qs = apply_ordering(qs=qs, field_name=pagination.ordering)
 
-            return IListResponse[schema](
-                count=all_count,
-                next=get_next_url(
+                page_size = pagination.page_size or DEFAULT_LIMIT
+                # When count is unknown, one more row tells that next page exists
+                rows = list(paginate_qs(
+                    qs=qs,
+                    page=pagination.page,
+                    page_size=page_size,
+                    extra=1 if all_count is None else 0
+                ))
+                has_more = len(rows) > page_size
+                rows = rows[:page_size]
+                next_url = get_next_url(
                     r=request,
                     current_page=pagination.page,
                     all_count=all_count,
-                    limit=pagination.page_size
-                ),
-                previous=get_prev_url(
+                    limit=pagination.page_size,
+                    has_more=has_more
+                )
+                prev_url = get_prev_url(
                     r=request,
                     current_page=pagination.page
-                ),
+                )
+
+            if prefetch_rows is not None and rows:
+                prefetch_rows(rows)
+
+            return IListResponse[schema](
+                count=all_count,
+                next=next_url,
+                previous=prev_url,
                 results=(format_object(
                     model_item=o,
                     field_objects=field_objects,
                     computed_field_objects=computed_field_objects,
                     fields_list=fields_list,
-                ) for o in qs.iterator())
+                ) for o in rows)
             )
 
         return _wrap
@@ -1,3 +1,4 @@
+from enum import Enum
 from typing import TypeVar, Optional, Sequence, Generic, OrderedDict as OrderedDictType
 
 from fastapi import Depends, HTTPException
@@ -16,18 +17,31 @@ DEPENDENCIES = Optional[Sequence[Depends]]
 
 
 class IListResponse(GenericModel, Generic[T]):
-    count: int
+    # null when count is not requested, see CountMode.ON_DEMAND
+    count: Optional[int]
     next: Optional[str]
     previous: Optional[str]
     results: list[T]
 
 
+class CountMode(str, Enum):
+    # COUNT(*) for each page
+    EXACT = "exact"
+    # Row count estimated by postgres planner, exact count for small results
+    ESTIMATE = "estimate"
+    # Exact count only when it is requested by 'with_count' param
+    ON_DEMAND = "on_demand"
+
+
 # TODO: split fields into separate code
 class Pagination(BaseModel):
     page: int = 1
     page_size: int = PydanticField(DEFAULT_LIMIT, lt=MAX_LIMIT+1, gt=0)
     fields: Optional[str] = None
     ordering: Optional[str] = PydanticField(None, regex=r'^-?\w{1,50}$')
+    # Opaque position, from 'next' or 'previous' url, for cursor paginated lists
+    cursor: Optional[str] = PydanticField(None, max_length=512)
+    with_count: bool = False
 
 
 FIELD_OBJECTS_TYPE = OrderedDictType[str, DjangoField]
@@ -1,6 +1,6 @@
 import socket
 from types import FunctionType
-from typing import Union, Optional
+from typing import Union, Optional, Generator
 from time import sleep
 from functools import wraps
 from contextlib import contextmanager
@@ -47,6 +47,26 @@ def process_lock_cm(lock_name: LOCK_FN_TYPE = None, wait=False):
             s.close()
 
 
+@contextmanager
+def process_try_lock_cm(lock_name: LOCK_FN_TYPE = None) -> Generator[bool, None, None]:
+    """
+    Like process_lock_cm without wait, but yields whether lock is acquired,
+    instead of raising ProcessLocked. Errors of block are raised as is, so
+    they are not confused with held lock.
+    """
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        really_lock_name = lock_name() if callable(lock_name) else str(lock_name)
+        try:
+            s.bind('\0djing2_lock_%s' % really_lock_name)
+        except OSError:
+            yield False
+        else:
+            yield True
+    finally:
+        s.close()
+
+
 def process_lock_decorator(lock_name: LOCK_FN_TYPE = None, wait=False):
     def process_lock_wrap(fn):
         @wraps(fn)
@@ -1,6 +1,7 @@
-from typing import Union
+from typing import Any, Callable, Iterable, Union
 
 import redis
+import redis.asyncio
 from django.conf import settings
 from redis.typing import KeyT, EncodableT, ExpiryT, AbsExpiryT
 
@@ -15,11 +16,20 @@ _redis_connection = redis.Redis(
 )
 
 
+_DELETE_IF_EQUAL_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
 class RedisProxy:
     _redis_connection: redis.Redis
 
     def __init__(self):
         self._redis_connection = _redis_connection
+        self._delete_if_equal = self._redis_connection.register_script(_DELETE_IF_EQUAL_SCRIPT)
 
     def get(self, name: KeyT):
         return self._redis_connection.get(
@@ -52,5 +62,70 @@ class RedisProxy:
             pxat=pxat
         )
 
+    def mget(self, *names: KeyT) -> list:
+        return self._redis_connection.mget(names)
+
+    def delete(self, *names: KeyT) -> int:
+        return self._redis_connection.delete(*names)
+
+    def delete_if_equal(self, name: KeyT, value: EncodableT) -> int:
+        """Delete key atomically, only when it still holds value"""
+        return self._delete_if_equal(keys=[name], args=[value])
+
+    def rpush(self, name: KeyT, *values: EncodableT) -> int:
+        return self._redis_connection.rpush(name, *values)
+
+    def pop_all(self, name: KeyT) -> list:
+        """Take all items of list atomically"""
+        with self._redis_connection.pipeline() as pipe:
+            pipe.lrange(name, 0, -1)
+            pipe.delete(name)
+            items, _ = pipe.execute()
+        return items
+
+    def hmget(self, name: KeyT, keys: Iterable[KeyT]) -> list:
+        return self._redis_connection.hmget(name, list(keys))
+
+    def hdel(self, name: KeyT, *keys: KeyT) -> int:
+        return self._redis_connection.hdel(name, *keys)
+
+    def transaction(self, func: Callable[[redis.client.Pipeline], Any], *watches: KeyT,
+                    value_from_callable: bool = False):
+        """
+        Call func with pipeline, watching keys. Func is called again,
+        when watched keys were changed before pipeline is executed.
+        """
+        return self._redis_connection.transaction(func, *watches, value_from_callable=value_from_callable)
+
+    def incr(self, name: KeyT, amount: int = 1) -> int:
+        return self._redis_connection.incr(
+            name=name,
+            amount=amount
+        )
+
 
 redis_proxy = RedisProxy()
+
+
+class AsyncRedisProxy:
+    """For async views, that must not block event loop"""
+    _redis_connection: redis.asyncio.Redis
+
+    def __init__(self):
+        self._redis_connection = redis.asyncio.Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=0,
+        )
+
+    async def get(self, name: KeyT):
+        return await self._redis_connection.get(name)
+
+    async def mget(self, *names: KeyT) -> list:
+        return await self._redis_connection.mget(names)
+
+    async def incr(self, name: KeyT, amount: int = 1) -> int:
+        return await self._redis_connection.incr(name=name, amount=amount)
+
+
+async_redis_proxy = AsyncRedisProxy()
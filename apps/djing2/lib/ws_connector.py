@@ -9,6 +9,7 @@ class WsEventTypeEnum(Enum):
     UPDATEPERMS = "updateperms"
     UPDATE_CUSTOMER_LEASES = "ucls"
     UPDATE_CUSTOMER = "update_customer"
+    ONU_CONFIG_PROGRESS = "onu_config_progress"
 
 
 class WebSocketSender:
@@ -5,6 +5,7 @@ from customer_comments.views import router as custocomm_rt
 from customer_contract.views import router as custocontr_rt
 from customers_duplicates.views import router as dup_rt
 from radiusapp.views import router as radius_rt
+from radiusapp.async_views import router as radius_async_rt
 from customers.views import router as customers_router
 from tasks.views import router as tasks_rt
 from djing2.views import router as root_rt
@@ -20,6 +21,7 @@ router.include_router(custocomm_rt)
 router.include_router(custocontr_rt)
 router.include_router(dup_rt)
 router.include_router(radius_rt)
+router.include_router(radius_async_rt)
 router.include_router(customers_router)
 router.include_router(tasks_rt)
 router.include_router(root_rt)
@@ -377,6 +377,23 @@ DHCP_DEFAULT_LEASE_TIME = 86400
 # Default radius session time
 RADIUS_SESSION_TIME = os.getenv("RADIUS_SESSION_TIME", 3600)
 
+# Billing run processes customers by shards, each shard in separate celery task
+BILLING_SHARDS = int(os.getenv("BILLING_SHARDS", 4))
+BILLING_CHUNK_SIZE = int(os.getenv("BILLING_CHUNK_SIZE", 1000))
+
+# Snmp poller of all devices, seconds between polls (0 - disabled), and concurrent requests count
+DEVICE_POLLER_INTERVAL = int(os.getenv("DEVICE_POLLER_INTERVAL", 300))
+DEVICE_POLLER_WORKERS = int(os.getenv("DEVICE_POLLER_WORKERS", 32))
+# Seconds, while device state read in web handlers (ports, onu details) is cached, 0 - disabled
+DEVICE_STATE_CACHE_TTL = int(os.getenv("DEVICE_STATE_CACHE_TTL", 30))
+# Idle snmp sessions are kept for reuse this seconds
+SNMP_POOL_IDLE_TIMEOUT = int(os.getenv("SNMP_POOL_IDLE_TIMEOUT", 120))
+# Seconds between FDB snapshots of all switches (0 - disabled), and days to keep FDB changes
+FDB_COLLECTOR_INTERVAL = int(os.getenv("FDB_COLLECTOR_INTERVAL", 1800))
+FDB_CHANGES_RETENTION_DAYS = int(os.getenv("FDB_CHANGES_RETENTION_DAYS", 30))
+# Zabbix monitoring events are collected this seconds, and processed together
+ZBX_EVENTS_WINDOW = int(os.getenv("ZBX_EVENTS_WINDOW", 5))
+
 # Address to websocket transmitter
 WS_ADDR = os.getenv("WS_ADDR", "127.0.0.1:3211")
 
@@ -404,9 +421,22 @@ DEFAULT_FTP_CREDENTIALS = {
     "disabled": os.getenv("SORM_EXPORT_FTP_DISABLE", default=False)
 }
 
+# Max logged in ftp sessions, kept between uploads, for each process
+SORM_EXPORT_FTP_POOL_SIZE = int(os.getenv("SORM_EXPORT_FTP_POOL_SIZE", 4))
+# Idle ftp session is checked by NOOP after this seconds
+SORM_EXPORT_FTP_KEEPALIVE = int(os.getenv("SORM_EXPORT_FTP_KEEPALIVE", 30))
+
 RADIUSAPP_OPTIONS = {
     'server_host': os.getenv("RADIUS_APP_HOST"),
-    'secret': get_secret("RADIUS_SECRET").encode()
+    'secret': get_secret("RADIUS_SECRET").encode(),
+    # Seconds to cache customer lookups in auth endpoint, 0 - disabled
+    'auth_cache_ttl': os.getenv("RADIUS_AUTH_CACHE_TTL", 30),
+    # Max count of buffered Interim-Update records, 0 - store each record immediately
+    'acct_batch_size': os.getenv("RADIUS_ACCT_BATCH_SIZE", 0),
+    'acct_batch_interval_ms': os.getenv("RADIUS_ACCT_BATCH_INTERVAL_MS", 1000),
+    # Db connection pool for async radius endpoints
+    'async_db_pool_min_size': os.getenv("RADIUS_ASYNC_DB_POOL_MIN_SIZE", 2),
+    'async_db_pool_max_size': os.getenv("RADIUS_ASYNC_DB_POOL_MAX_SIZE", 20),
 }
 
 SORM_REPORTING_EMAILS = []
@@ -426,3 +456,6 @@ CELERY_SERIALIZER = 'msgpack'
 REDIS_HOST = os.getenv('REDIS_HOST', 'djing2redis')
 REDIS_PORT = os.getenv('REDIS_PORT', 6379)
 REDIS_AUTH_CACHE_TTL = os.getenv('REDIS_AUTH_CACHE_TTL', 3600)
+# Auth cache entries are kept in memory of each process this seconds
+AUTH_LOCAL_CACHE_TTL = int(os.getenv('AUTH_LOCAL_CACHE_TTL', 5))
+AUTH_LOCAL_CACHE_SIZE = int(os.getenv('AUTH_LOCAL_CACHE_SIZE', 1024))
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('networks', '0018_auto_20220526_1347'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customeripleasemodel',
+            index=models.Index(
+                condition=models.Q(customer=None, mac_address=None, state=False),
+                fields=['pool', 'ip_address'],
+                name='networks_ip_leases_free_idx'
+            ),
+        ),
+    ]
@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from ipaddress import ip_address, ip_network
-from typing import Optional, Union, Generator
+from typing import Optional, Union, Generator, Sequence
 from netaddr import EUI
 
 from django.conf import settings
@@ -18,6 +18,7 @@ from djing2.models import BaseAbstractModel
 from groupapp.models import Group
 from customers.models import Customer
 from networks.radius_commands import finish_session
+from radiusapp.auth_cache import auth_cache
 
 
 DHCP_DEFAULT_LEASE_TIME = getattr(settings, "DHCP_DEFAULT_LEASE_TIME", 86400)
@@ -248,7 +249,7 @@ class CustomerIpLeaseModelQuerySet(models.QuerySet):
         """
         Free leases. Mark it free, for use it again.
         """
-        return self.update(
+        released_count = self.update(
             mac_address=None,
             customer=None,
             input_octets=0,
@@ -263,6 +264,10 @@ class CustomerIpLeaseModelQuerySet(models.QuerySet):
             session_id=None,
             radius_username=None
         )
+        # Queryset update does not send signals, so drop
+        # radius auth lookups that may contain these leases.
+        auth_cache.invalidate_on_commit()
+        return released_count
 
 
 class CustomerIpLeaseModel(models.Model):
@@ -356,6 +361,34 @@ class CustomerIpLeaseModel(models.Model):
             address_id=address_id,
         )
 
+    @staticmethod
+    def find_customer_ids_by_device_credentials(
+            credentials: Sequence[tuple[Union[EUI, str], int]]) -> list[Optional[int]]:
+        """Same as find_customer_by_device_credentials, but for many (device mac, port)
+           pairs by one query. Returns customer id, or None, for each pair."""
+        if not credentials:
+            return []
+        values_sql = ','.join('(%s::INTEGER, %s::MACADDR, %s::SMALLINT)' for _ in credentials)
+        sql = (
+            "SELECT DISTINCT ON (v.idx) v.idx, cs.baseaccount_ptr_id "
+            "FROM (VALUES %s) AS v(idx, dev_mac, dev_port) "
+            "JOIN device dv ON (dv.mac_addr = v.dev_mac) "
+            "JOIN customers cs ON (cs.device_id = dv.id) "
+            "LEFT JOIN device_port dp ON (cs.dev_port_id = dp.id) "
+            "LEFT JOIN device_dev_type_is_use_dev_port ddtiudptiu ON (ddtiudptiu.dev_type = dv.dev_type) "
+            "WHERE ((NOT ddtiudptiu.is_use_dev_port) OR dp.num = v.dev_port) "
+            "ORDER BY v.idx;"
+        ) % values_sql
+        params = []
+        for idx, (device_mac, device_port) in enumerate(credentials):
+            params.extend((idx, str(device_mac), device_port))
+        customer_ids: list[Optional[int]] = [None] * len(credentials)
+        with connection.cursor() as cur:
+            cur.execute(sql, params)
+            for idx, customer_id in cur.fetchall():
+                customer_ids[idx] = customer_id
+        return customer_ids
+
     @staticmethod
     def get_service_permit_by_ip(ip_addr: str) -> bool:
         """Checks if customer has service by passed ip address"""
@@ -448,6 +481,14 @@ class CustomerIpLeaseModel(models.Model):
         db_table = "networks_ip_leases"
         verbose_name = _("IP lease")
         verbose_name_plural = _("IP leases")
+        indexes = [
+            # For fast free lease lookup while radius auth
+            models.Index(
+                fields=["pool", "ip_address"],
+                name="networks_ip_leases_free_idx",
+                condition=models.Q(customer=None, mac_address=None, state=False),
+            ),
+        ]
 
 
 class CustomerIpLeaseLog(models.Model):
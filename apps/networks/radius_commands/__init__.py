@@ -8,8 +8,16 @@ from .radius_commands import (
     RadiusMissingAttributeException,
     RadiusBaseException
 )
+from .bulk import (
+    BulkCoADispatcher,
+    CoAAction,
+    CoARequest,
+    CoAResult,
+    bulk_coa
+)
 
 __all__ = ['change_session_guest2inet', 'change_session_inet2guest', 'finish_session',
            'finish_session', 'RadiusSessionNotFoundException', 'RadiusTimeoutException',
            'RadiusInvalidRequestException', 'RadiusMissingAttributeException',
-           'RadiusBaseException']
+           'RadiusBaseException', 'BulkCoADispatcher', 'CoAAction', 'CoARequest',
+           'CoAResult', 'bulk_coa']
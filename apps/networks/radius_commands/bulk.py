@@ -0,0 +1,227 @@
+"""
+Bulk CoA/Disconnect dispatcher.
+
+pyrad client sends one packet and waits for reply, so mass service change
+(i.e. after billing run) takes `sessions count * rtt` time, or much more when
+BRAS doesn't answer. Dispatcher keeps many requests in flight over one udp
+socket, matches replies by RADIUS identifier, and retransmits every request
+by its own timeout.
+"""
+import select
+import socket
+from collections import deque
+from dataclasses import dataclass, asdict, replace
+from enum import Enum
+from time import monotonic
+from typing import Iterable, Optional
+
+from pyrad import packet
+from pyrad.client import Client
+
+from .radius_commands import (
+    RadiusInteract,
+    RadiusBaseException,
+    RadiusTimeoutException,
+    guest2inet_attrs,
+    inet2guest_attrs,
+    parse_reply,
+    _filter_uname,
+)
+
+
+# RADIUS identifier is one byte
+MAX_IN_FLIGHT = 256
+
+
+class CoAAction(str, Enum):
+    INET2GUEST = 'inet2guest'
+    GUEST2INET = 'guest2inet'
+    DISCONNECT = 'disconnect'
+
+
+@dataclass
+class CoARequest:
+    uname: str
+    action: CoAAction
+    speed_in: int = 0
+    speed_out: int = 0
+    speed_in_burst: int = 0
+    speed_out_burst: int = 0
+
+    def as_dict(self) -> dict:
+        """Plain dict, suitable for celery task arguments."""
+        d = asdict(self)
+        d['action'] = self.action.value
+        return d
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'CoARequest':
+        data = dict(data)
+        data['action'] = CoAAction(data['action'])
+        return cls(**data)
+
+
+@dataclass
+class CoAResult:
+    request: CoARequest
+    ok: bool
+    text: Optional[str] = None
+    error: Optional[str] = None
+    # name of RadiusBaseException subclass, when request failed
+    error_type: Optional[str] = None
+    attempts: int = 1
+
+
+@dataclass
+class _InFlight:
+    index: int
+    request: CoARequest
+    pkt: packet.Packet
+    raw: bytes
+    deadline: float
+    attempts: int = 1
+
+
+class BulkCoADispatcher:
+    def __init__(self, client: Client, max_in_flight: int = 64,
+                 timeout: Optional[float] = None, retries: Optional[int] = None):
+        """
+        :param client: pyrad client, used for BRAS address, secret and dictionary.
+        :param max_in_flight: How many requests may wait for reply at the same time.
+        :param timeout: Seconds to wait reply for each attempt, client.timeout by default.
+        :param retries: Attempts count for each request, client.retries by default.
+        """
+        self.client = client
+        self.max_in_flight = max(1, min(int(max_in_flight), MAX_IN_FLIGHT))
+        self.timeout = float(client.timeout if timeout is None else timeout)
+        self.retries = max(1, int(client.retries if retries is None else retries))
+
+    def _make_packet(self, req: CoARequest) -> packet.Packet:
+        if req.action == CoAAction.DISCONNECT:
+            return self.client.CreateCoAPacket(
+                code=packet.DisconnectRequest,
+                **{'User-Name': req.uname}
+            )
+        if req.action == CoAAction.INET2GUEST:
+            attrs = inet2guest_attrs(uname=req.uname)
+        elif req.action == CoAAction.GUEST2INET:
+            attrs = guest2inet_attrs(
+                uname=req.uname,
+                speed_in=int(req.speed_in),
+                speed_out=int(req.speed_out),
+                speed_in_burst=int(req.speed_in_burst),
+                speed_out_burst=int(req.speed_out_burst),
+            )
+        else:
+            raise ValueError('Unknown CoA action: %s' % req.action)
+        return self.client.CreateCoAPacket(**attrs)
+
+    def send(self, requests: Iterable[CoARequest]) -> list[CoAResult]:
+        """
+        Send all requests and wait for replies.
+
+        :return: results in the same order as requests.
+        """
+        requests = list(requests)
+        results: list[Optional[CoAResult]] = [None] * len(requests)
+        if not requests:
+            return []
+
+        addr = (self.client.server, self.client.coaport)
+        queue = deque(enumerate(requests))
+        # Recently released identifiers goes to the end, so late reply
+        # for timed out request most likely finds nothing.
+        free_ids = deque(range(MAX_IN_FLIGHT))
+        in_flight: dict[int, _InFlight] = {}
+
+        family = socket.getaddrinfo(addr[0], addr[1], type=socket.SOCK_DGRAM)[0][0]
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            while queue or in_flight:
+                while queue and len(in_flight) < self.max_in_flight:
+                    index, req = queue.popleft()
+                    try:
+                        pkt = self._make_packet(req)
+                    except (ValueError, KeyError, TypeError) as err:
+                        # i.e. attribute missing in dictionary
+                        results[index] = CoAResult(
+                            request=req, ok=False, error=str(err),
+                            error_type=type(err).__name__
+                        )
+                        continue
+                    pkt.id = free_ids.popleft()
+                    raw = pkt.RequestPacket()
+                    sock.sendto(raw, addr)
+                    in_flight[pkt.id] = _InFlight(
+                        index=index, request=req, pkt=pkt, raw=raw,
+                        deadline=monotonic() + self.timeout
+                    )
+                if not in_flight:
+                    continue
+
+                wait = min(f.deadline for f in in_flight.values()) - monotonic()
+                readable, _, _ = select.select([sock], [], [], max(wait, 0))
+                if readable:
+                    self._read_replies(sock, in_flight, free_ids, results)
+
+                now = monotonic()
+                for pkt_id, f in list(in_flight.items()):
+                    if f.deadline > now:
+                        continue
+                    if f.attempts < self.retries:
+                        f.attempts += 1
+                        f.deadline = now + self.timeout
+                        sock.sendto(f.raw, addr)
+                        continue
+                    del in_flight[pkt_id]
+                    free_ids.append(pkt_id)
+                    results[f.index] = CoAResult(
+                        request=f.request, ok=False,
+                        error=str(RadiusTimeoutException.default_detail),
+                        error_type=RadiusTimeoutException.__name__,
+                        attempts=f.attempts
+                    )
+        return results
+
+    def _read_replies(self, sock: socket.socket, in_flight: dict[int, _InFlight],
+                      free_ids: deque, results: list) -> None:
+        while True:
+            try:
+                raw_reply = sock.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # i.e. ICMP port unreachable, request will be retransmitted by timeout
+                return
+            if len(raw_reply) < 20:
+                continue
+            f = in_flight.get(raw_reply[1])
+            if f is None:
+                continue
+            try:
+                reply = f.pkt.CreateReply(packet=raw_reply)
+                if not f.pkt.VerifyReply(reply, raw_reply):
+                    continue
+            except packet.PacketError:
+                continue
+            del in_flight[f.pkt.id]
+            free_ids.append(f.pkt.id)
+            req = f.request
+            try:
+                text = parse_reply(reply)
+                results[f.index] = CoAResult(
+                    request=req, ok=text == 'ok', text=text,
+                    attempts=f.attempts
+                )
+            except RadiusBaseException as err:
+                results[f.index] = CoAResult(
+                    request=req, ok=False, error=str(err.detail),
+                    error_type=type(err).__name__, attempts=f.attempts
+                )
+
+
+def bulk_coa(requests: Iterable[CoARequest], max_in_flight: int = 64) -> list[CoAResult]:
+    """Send CoA/Disconnect requests to BRAS, many at once."""
+    requests = [replace(r, uname=_filter_uname(r.uname)) for r in requests if r.uname]
+    dispatcher = BulkCoADispatcher(client=RadiusInteract.client, max_in_flight=max_in_flight)
+    return dispatcher.send(requests)
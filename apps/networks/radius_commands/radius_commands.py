@@ -51,29 +51,70 @@ class RadiusMissingAttributeException(RadiusBaseException):
     default_detail = _('Radius missing attibute')
 
 
+def inet2guest_attrs(uname: str) -> dict:
+    # FIXME: move params to radius config
+    return {
+        'User-Name': uname,
+        'ERX-Service-Deactivate': 'SERVICE-INET',
+        'ERX-Service-Activate:1': 'SERVICE-GUEST',
+        'ERX-Service-Acct-Interval:1': 14400,
+        'ERX-Service-Statistics:1': 2
+    }
+
+
+def guest2inet_attrs(uname: str, speed_in: int, speed_out: int, speed_in_burst: int, speed_out_burst: int) -> dict:
+    return {
+        'User-Name': uname,
+        'ERX-Service-Deactivate': 'SERVICE-GUEST',
+        'ERX-Service-Activate:1': f'SERVICE-INET({speed_in},{speed_in_burst},{speed_out},{speed_out_burst})',
+        'ERX-Service-Acct-Interval:1': 14400,
+        'ERX-Service-Statistics:1': 2
+    }
+
+
+def parse_reply(res) -> Optional[str]:
+    """
+    Returns 'ok' when BRAS acknowledged request, or reply text.
+    Raises RadiusBaseException subclass when reply contains known Error-Cause.
+    """
+    if res.code in (packet.CoAACK, packet.AccessAccept, packet.DisconnectACK):
+        # ok
+        return 'ok'
+    res_keys = res.keys()
+    exception = None
+    if 'Error-Cause' in res_keys:
+        errs = res.get('Error-Cause')
+        if 'Session-Context-Not-Found' in errs:
+            exception = RadiusSessionNotFoundException
+        elif 'Invalid-Request' in errs:
+            exception = RadiusInvalidRequestException
+        elif 'Missing-Attribute' in errs:
+            exception = RadiusMissingAttributeException
+
+        res_keys.remove('Error-Cause')
+    # get err text
+    res_text = b'\n\n'.join(b'\n'.join(res.get(i)) for i in res_keys)
+    res_text = res_text.decode()
+    if exception is not None:
+        raise exception(res_text)
+    return res_text
+
+
 class RadiusInteract:
     client = Client(server=ADDRESS, secret=SECRET, dict=dictionary.Dictionary(_abspath("dictionary")))
     # client.timeout = 30
 
     def coa_inet2guest(self, uname: str):
-        # FIXME: move params to radius config
-        attrs = {
-            'User-Name': uname,
-            'ERX-Service-Deactivate': 'SERVICE-INET',
-            'ERX-Service-Activate:1': 'SERVICE-GUEST',
-            'ERX-Service-Acct-Interval:1': 14400,
-            'ERX-Service-Statistics:1': 2
-        }
-        return self.coa(**attrs)
+        return self.coa(**inet2guest_attrs(uname=uname))
 
     def coa_guest2inet(self, uname: str, speed_in: int, speed_out: int, speed_in_burst: int, speed_out_burst: int):
-        attrs = {
-            'User-Name': uname,
-            'ERX-Service-Deactivate': 'SERVICE-GUEST',
-            'ERX-Service-Activate:1': f'SERVICE-INET({speed_in},{speed_in_burst},{speed_out},{speed_out_burst})',
-            'ERX-Service-Acct-Interval:1': 14400,
-            'ERX-Service-Statistics:1': 2
-        }
+        attrs = guest2inet_attrs(
+            uname=uname,
+            speed_in=speed_in,
+            speed_out=speed_out,
+            speed_in_burst=speed_in_burst,
+            speed_out_burst=speed_out_burst
+        )
         return self.coa(**attrs)
 
     def coa(self, **attrs):
@@ -92,27 +133,7 @@ class RadiusInteract:
     def _process_request(self, request) -> Optional[str]:
         try:
             res = self.client.SendPacket(request)
-            if res.code in (packet.CoAACK, packet.AccessAccept, packet.DisconnectACK):
-                # ok
-                return 'ok'
-            res_keys = res.keys()
-            exception = None
-            if 'Error-Cause' in res_keys:
-                errs = res.get('Error-Cause')
-                if 'Session-Context-Not-Found' in errs:
-                    exception = RadiusSessionNotFoundException
-                elif 'Invalid-Request' in errs:
-                    exception = RadiusInvalidRequestException
-                elif 'Missing-Attribute' in errs:
-                    exception = RadiusMissingAttributeException
-
-                res_keys.remove('Error-Cause')
-            # get err text
-            res_text = b'\n\n'.join(b'\n'.join(res.get(i)) for i in res_keys)
-            res_text = res_text.decode()
-            if exception is not None:
-                raise exception(res_text)
-            return res_text
+            return parse_reply(res)
         except Timeout as e:
             raise RadiusTimeoutException(e) from e
 
@@ -89,3 +89,24 @@ def check_if_lease_have_id_db_task(radius_uname: str):
     if not uleases.exists():
         logger.warning('ORPHAN lease drop uname="%s"' % radius_uname)
         rc.finish_session(radius_uname=radius_uname)
+
+
+@celery_app.task
+def async_bulk_coa_task(requests: list[dict]):
+    """
+    Send many CoA/Disconnect requests to BRAS at once.
+
+    :param requests: list of rc.CoARequest.as_dict() items
+    :return: nothing
+    """
+    results = rc.bulk_coa(rc.CoARequest.from_dict(r) for r in requests)
+    failed = 0
+    for res in results:
+        if res.ok:
+            continue
+        failed += 1
+        logger.error('Bulk CoA %s uname="%s": %s %s' % (
+            res.request.action.value, res.request.uname,
+            res.error_type or '', res.error or res.text
+        ))
+    logger.info('Bulk CoA: sent %d, failed %d' % (len(results), failed))
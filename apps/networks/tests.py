@@ -1,10 +1,19 @@
-from collections import OrderedDict
-from django.test import TestCase, override_settings
+import socket
+from collections import OrderedDict, Counter
+from threading import Thread, Timer, Event, Lock
+from time import monotonic
+
+from django.test import TestCase, SimpleTestCase, override_settings
+from pyrad import packet
+from pyrad.client import Client
+from pyrad.dictionary import Dictionary
 from djing2.lib import calc_hash
 from networks.models import NetworkIpPool, VlanIf, CustomerIpLeaseModel, NetworkIpPoolKind, CustomerIpLeaseLog
 from customers.models import Customer
 from customers.tests.customer import CustomAPITestCase
 from customers.tests.get_user_credentials_by_ip import BaseServiceTestCase
+from networks.radius_commands import BulkCoADispatcher, CoAAction, CoARequest
+from networks.radius_commands.radius_commands import _abspath
 
 
 @override_settings(API_AUTH_SUBNET="127.0.0.0/8")
@@ -222,3 +231,139 @@ class IpPoolTestCase(TestCase):
         free_ip = self.pool_small.get_free_ip()
         self.assertIsNone(free_ip)
 
+
+class FakeCoAServer(Thread):
+    """
+    Local BRAS stub, answers to CoA and Disconnect requests.
+    Behaviour for each User-Name sets by 'behaviour' dict:
+      ok - ack request
+      not_found - nak with Error-Cause Session-Context-Not-Found
+      drop - never answer
+      drop_first - skip first attempt, answer to retransmit
+    """
+    secret = b'fake-secret'
+
+    def __init__(self, behaviour: dict = None, reply_delay: float = 0.0):
+        super().__init__(daemon=True)
+        self.behaviour = behaviour or {}
+        self.reply_delay = reply_delay
+        self.dict = Dictionary(_abspath("dictionary"))
+        self.received = Counter()
+        self._received_lock = Lock()
+        self._stop_event = Event()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.05)
+        self.port = self.sock.getsockname()[1]
+
+    def make_client(self) -> Client:
+        return Client(server='127.0.0.1', coaport=self.port, secret=self.secret, dict=self.dict)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sock.close()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                raw, addr = self.sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            self._handle(raw, addr)
+
+    def _handle(self, raw: bytes, addr):
+        pkt = packet.CoAPacket(packet=raw, secret=self.secret, dict=self.dict)
+        uname = pkt['User-Name'][0]
+        with self._received_lock:
+            self.received[uname] += 1
+            attempt = self.received[uname]
+        behaviour = self.behaviour.get(uname, 'ok')
+        if behaviour == 'drop' or (behaviour == 'drop_first' and attempt == 1):
+            return
+        reply = pkt.CreateReply()
+        is_disconnect = pkt.code == packet.DisconnectRequest
+        if behaviour == 'not_found':
+            reply.code = packet.DisconnectNAK if is_disconnect else packet.CoANAK
+            reply['Error-Cause'] = 'Session-Context-Not-Found'
+        else:
+            reply.code = packet.DisconnectACK if is_disconnect else packet.CoAACK
+        raw_reply = reply.ReplyPacket()
+        if self.reply_delay > 0:
+            Timer(self.reply_delay, self.sock.sendto, args=(raw_reply, addr)).start()
+        else:
+            self.sock.sendto(raw_reply, addr)
+
+
+class BulkCoADispatcherTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.stop()
+
+    def _start_server(self, **kwargs) -> FakeCoAServer:
+        self.server = FakeCoAServer(**kwargs)
+        self.server.start()
+        return self.server
+
+    def test_all_ok(self):
+        server = self._start_server()
+        dispatcher = BulkCoADispatcher(client=server.make_client(), timeout=1, retries=1)
+        reqs = [
+            CoARequest(uname='u1', action=CoAAction.INET2GUEST),
+            CoARequest(uname='u2', action=CoAAction.GUEST2INET, speed_in=1000, speed_out=2000),
+            CoARequest(uname='u3', action=CoAAction.DISCONNECT),
+        ]
+        results = dispatcher.send(reqs)
+        self.assertEqual([r.request.uname for r in results], ['u1', 'u2', 'u3'])
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual([r.text for r in results], ['ok', 'ok', 'ok'])
+
+    def test_per_session_errors(self):
+        server = self._start_server(behaviour={
+            'lost': 'drop',
+            'gone': 'not_found',
+        })
+        dispatcher = BulkCoADispatcher(client=server.make_client(), timeout=0.2, retries=2)
+        results = dispatcher.send([
+            CoARequest(uname='alive', action=CoAAction.INET2GUEST),
+            CoARequest(uname='lost', action=CoAAction.INET2GUEST),
+            CoARequest(uname='gone', action=CoAAction.DISCONNECT),
+        ])
+        alive, lost, gone = results
+        self.assertTrue(alive.ok)
+        self.assertFalse(lost.ok)
+        self.assertEqual(lost.error_type, 'RadiusTimeoutException')
+        self.assertEqual(lost.attempts, 2)
+        self.assertEqual(server.received['lost'], 2)
+        self.assertFalse(gone.ok)
+        self.assertEqual(gone.error_type, 'RadiusSessionNotFoundException')
+
+    def test_retransmit(self):
+        server = self._start_server(behaviour={'u1': 'drop_first'})
+        dispatcher = BulkCoADispatcher(client=server.make_client(), timeout=0.2, retries=3)
+        res, = dispatcher.send([CoARequest(uname='u1', action=CoAAction.INET2GUEST)])
+        self.assertTrue(res.ok)
+        self.assertEqual(res.attempts, 2)
+
+    def test_requests_are_in_flight_concurrently(self):
+        server = self._start_server(reply_delay=0.2)
+        dispatcher = BulkCoADispatcher(client=server.make_client(), max_in_flight=64, timeout=2, retries=1)
+        reqs = [CoARequest(uname='u%d' % i, action=CoAAction.INET2GUEST) for i in range(300)]
+        start = monotonic()
+        results = dispatcher.send(reqs)
+        elapsed = monotonic() - start
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual([r.request.uname for r in results], [r.uname for r in reqs])
+        # one by one it would take 300 * 0.2 = 60 seconds
+        self.assertLess(elapsed, 10)
+
+    def test_empty(self):
+        dispatcher = BulkCoADispatcher(client=Client(server='127.0.0.1', secret=b'x'))
+        self.assertEqual(dispatcher.send([]), [])
+
+    def test_request_serialization(self):
+        req = CoARequest(uname='u1', action=CoAAction.GUEST2INET, speed_in=1, speed_out=2)
+        self.assertEqual(CoARequest.from_dict(req.as_dict()), req)
@@ -1,9 +1,15 @@
 import os
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import UserProfile
+from .models import UserProfile, BaseAccount
 from profiles.tasks import resize_profile_avatar
 from rest_framework.authtoken.models import Token
+from djing2.lib.fastapi import auth_cache
+
+# Fields of account, that are kept in auth cache
+AUTH_CACHE_FIELDS = frozenset(("is_active", "is_admin", "is_superuser"))
 
 
 @receiver(post_save, sender=UserProfile)
@@ -15,3 +21,54 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
     # TODO: not resize when it not changed
     if instance.avatar and os.path.isfile(instance.avatar.path):
         resize_profile_avatar.delay(instance.avatar.path)
+
+
+def _invalidate_auth_user(user_id: int) -> None:
+    transaction.on_commit(lambda: auth_cache.invalidate_user(user_id))
+
+
+# Without sender, because signal is sent with concrete subclass of account
+@receiver(post_save)
+def account_post_save(sender, instance=None, created=False, update_fields=None, **kwargs):
+    if created or not issubclass(sender, BaseAccount):
+        return
+    if update_fields is not None and not AUTH_CACHE_FIELDS.intersection(update_fields):
+        return
+    _invalidate_auth_user(instance.pk)
+
+
+@receiver(post_delete)
+def account_post_delete(sender, instance=None, **kwargs):
+    if issubclass(sender, BaseAccount):
+        _invalidate_auth_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=BaseAccount.sites.through)
+@receiver(m2m_changed, sender=BaseAccount.groups.through)
+@receiver(m2m_changed, sender=BaseAccount.user_permissions.through)
+def account_m2m_changed(sender, instance=None, action=None, reverse=False, pk_set=None, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        _invalidate_auth_user(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            _invalidate_auth_user(user_id)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def auth_group_permissions_changed(sender, action=None, **kwargs):
+    if action.startswith("post_"):
+        transaction.on_commit(auth_cache.invalidate_permissions)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def auth_group_post_delete(sender, **kwargs):
+    transaction.on_commit(auth_cache.invalidate_permissions)
+
+
+@receiver(post_delete, sender=Token)
+def auth_token_post_delete(sender, instance=None, **kwargs):
+    token = instance.key
+    transaction.on_commit(lambda: auth_cache.invalidate_token(token))
@@ -1,8 +1,15 @@
 import json
 
+from django.contrib.auth.models import Group, Permission
+from django.test import SimpleTestCase
+from fastapi import HTTPException
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
 
+from djing2.lib.fastapi import auth_cache
+from djing2.lib.fastapi.perms import permission_check_dependency
+from djing2.lib.fastapi.test import DjingTestCase
 from profiles.models import UserProfile
 
 
@@ -61,3 +68,114 @@ class ProfileApiTestCase(APITestCase):
             SERVER_NAME="example.com",
         )
         self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+
+class AuthCacheTestCase(DjingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = str(Token.objects.get(user=self.admin).key)
+
+    def test_cached_auth_without_queries(self):
+        auth_cache.get_auth_entry(self.token)
+        with self.assertNumQueries(0):
+            entry = auth_cache.get_auth_entry(self.token)
+            user = auth_cache.AuthUser(entry)
+            self.assertEqual(user.pk, self.admin.pk)
+            self.assertTrue(user.is_admin)
+            self.assertTrue(user.is_superuser)
+        self.assertEqual(user.username, "admin")
+        self.assertIsInstance(user, UserProfile)
+
+    def test_deactivated_user(self):
+        r = self.get("/api/customers/generate_password/")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.admin.is_active = False
+        self.admin.save(update_fields=["is_active"])
+        r = self.get("/api/customers/generate_password/")
+        self.assertEqual(r.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_removed_superuser_rights(self):
+        self.assertTrue(auth_cache.get_auth_entry(self.token).is_superuser)
+        self.admin.is_superuser = False
+        self.admin.save()
+        self.assertFalse(auth_cache.get_auth_entry(self.token).is_superuser)
+
+    def _check_perm(self, perm_codename: str):
+        user = auth_cache.AuthUser(auth_cache.get_auth_entry(self.token))
+        return permission_check_dependency(perm_codename)(is_auth=(user, self.token))
+
+    def test_permission_check_without_queries(self):
+        self.admin.is_superuser = False
+        self.admin.save(update_fields=["is_superuser"])
+        self.admin.user_permissions.add(
+            Permission.objects.get(content_type__app_label="customers", codename="view_customer")
+        )
+        auth_cache.get_auth_entry(self.token)
+        with self.assertNumQueries(0):
+            self._check_perm("customers.view_customer")
+            with self.assertRaises(HTTPException):
+                self._check_perm("customers.delete_customer")
+
+    def test_group_permissions_changed(self):
+        self.admin.is_superuser = False
+        self.admin.save(update_fields=["is_superuser"])
+        group = Group.objects.create(name="operators")
+        self.admin.groups.add(group)
+        with self.assertRaises(HTTPException):
+            self._check_perm("customers.view_customer")
+        group.permissions.add(
+            Permission.objects.get(content_type__app_label="customers", codename="view_customer")
+        )
+        self._check_perm("customers.view_customer")
+
+    def test_entry_read_before_change_not_stored(self):
+        gen = auth_cache._get_gen()
+        entry = auth_cache._load_entry(self.token)
+        auth_cache.invalidate_user(self.admin.pk)
+        self.assertFalse(auth_cache._store(self.token, entry, gen))
+        self.assertIsNone(auth_cache._get_cached_entry(self.token))
+
+    def test_removed_token(self):
+        r = self.get("/api/customers/generate_password/")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        Token.objects.filter(user=self.admin).delete()
+        r = self.get("/api/customers/generate_password/")
+        self.assertEqual(r.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class LocalAuthCacheTestCase(SimpleTestCase):
+    @staticmethod
+    def _entry(user_id: int) -> auth_cache.AuthCacheEntry:
+        return auth_cache.AuthCacheEntry(
+            user_id=user_id, user_type="customers.Customer", is_active=True,
+            is_admin=False, is_superuser=False, site_ids=[1]
+        )
+
+    def test_lru(self):
+        cache = auth_cache._LocalAuthCache(maxsize=2, ttl=60)
+        cache.set("a", self._entry(1))
+        cache.set("b", self._entry(2))
+        cache.get("a")
+        cache.set("c", self._entry(3))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a").user_id, 1)
+        self.assertEqual(cache.get("c").user_id, 3)
+
+    def test_remove_user(self):
+        cache = auth_cache._LocalAuthCache(maxsize=10, ttl=60)
+        cache.set("a", self._entry(1))
+        cache.set("b", self._entry(1))
+        cache.set("c", self._entry(2))
+        cache.remove_user(1)
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_expired(self):
+        cache = auth_cache._LocalAuthCache(maxsize=10, ttl=-1)
+        cache.set("a", self._entry(1))
+        self.assertIsNone(cache.get("a"))
+
+    def test_entry_json(self):
+        entry = self._entry(5)
+        self.assertEqual(auth_cache.AuthCacheEntry.from_json(entry.to_json().encode()), entry)
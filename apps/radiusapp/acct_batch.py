@@ -0,0 +1,164 @@
+"""
+Batched ingestion of RADIUS Interim-Update accounting.
+
+Interim-Update packets carries only cumulative counters, so only the last
+packet for each session matters. Acct endpoint just puts records to
+buffer and acks FreeRADIUS immediately, background thread flushes buffer
+into db with single multi-row UPDATE every `interval_ms` milliseconds, or
+when buffer contains `max_records` records.
+"""
+import atexit
+from dataclasses import dataclass
+from datetime import datetime
+from ipaddress import ip_address
+from threading import Lock, Thread, Event
+from typing import Any, Callable, Mapping, Optional, Sequence
+
+from django.conf import settings
+from django.db import connection, close_old_connections
+from netaddr import EUI
+
+from djing2.lib.logger import logger
+from radiusapp.vendor_base import RadiusCounters
+
+
+_options = getattr(settings, 'RADIUSAPP_OPTIONS', {})
+ACCT_BATCH_SIZE = int(_options.get('acct_batch_size') or 0)
+ACCT_BATCH_INTERVAL_MS = int(_options.get('acct_batch_interval_ms') or 1000)
+
+
+@dataclass
+class AcctUpdateRecord:
+    vendor_name: str
+    request_data: Mapping[str, Any]
+    ip_address: str
+    customer_mac: EUI
+    radius_username: str
+    radius_unique_id: str
+    counters: RadiusCounters
+    event_time: datetime
+    # Customer found by opt82, set before records are stored
+    customer_id: Optional[int] = None
+
+
+def bulk_update_lease_counters(records: Sequence[AcctUpdateRecord]) -> dict[str, int]:
+    """
+    Update counters for all leases from records by one query.
+    Lease matches record when it has the same ip and mac, and it
+    is assigned to customer of record. Records without customer are skipped.
+
+    :return: dict of updated lease ip addresses to customer ids.
+    """
+    records = [rec for rec in records if rec.customer_id is not None]
+    if not records:
+        return {}
+    values_sql = ','.join(
+        '(%s::inet, %s::macaddr, %s::integer, %s::bigint, %s::bigint, %s::bigint, %s::bigint, %s::timestamp)'
+        for _ in records
+    )
+    sql = (
+        "UPDATE networks_ip_leases nil "
+        "SET input_octets = v.input_octets, "
+            "output_octets = v.output_octets, "
+            "input_packets = v.input_packets, "
+            "output_packets = v.output_packets, "
+            "last_update = v.last_update "
+        "FROM (VALUES %s) AS v("
+            "ip_address, mac_address, customer_id, input_octets, output_octets, "
+            "input_packets, output_packets, last_update) "
+        "WHERE nil.ip_address = v.ip_address "
+        "AND nil.mac_address = v.mac_address "
+        "AND nil.customer_id = v.customer_id "
+        "RETURNING host(nil.ip_address), nil.customer_id;"
+    ) % values_sql
+    params = []
+    for rec in records:
+        params.extend((
+            rec.ip_address, str(rec.customer_mac), rec.customer_id,
+            rec.counters.input_octets, rec.counters.output_octets,
+            rec.counters.input_packets, rec.counters.output_packets,
+            rec.event_time
+        ))
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    return {str(ip_address(ip)): customer_id for ip, customer_id in rows}
+
+
+class AcctUpdateBatcher:
+    def __init__(self, flush_fn: Callable[[list[AcctUpdateRecord]], None],
+                 max_records: int = ACCT_BATCH_SIZE,
+                 interval_ms: int = ACCT_BATCH_INTERVAL_MS,
+                 background: bool = True):
+        """
+        :param flush_fn: Receives list of buffered records, stores them into db.
+        :param max_records: Max count of buffered records, zero disables batching.
+        :param interval_ms: How often background thread flushes buffer.
+        :param background: When False, buffer flushes only from 'push'
+                           when it is full, and by explicit 'flush' call.
+        """
+        self.flush_fn = flush_fn
+        self.max_records = max_records
+        self.interval = interval_ms / 1000.0
+        self.background = background
+        self._records: dict[str, AcctUpdateRecord] = {}
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._wakeup = Event()
+        self._thread: Optional[Thread] = None
+        self.flushed_records = 0
+        self.flushes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_records > 0
+
+    def push(self, record: AcctUpdateRecord) -> None:
+        with self._lock:
+            # counters are cumulative, so newer record replaces older one
+            self._records[record.ip_address] = record
+            is_full = len(self._records) >= self.max_records
+        if not self.background:
+            if is_full:
+                self.flush()
+            return
+        self._ensure_thread()
+        if is_full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                records = list(self._records.values())
+                self._records = {}
+            if not records:
+                return 0
+            try:
+                self.flush_fn(records)
+            except Exception as err:
+                logger.exception('Failed to flush %d acct records: %s' % (len(records), err))
+                return 0
+            self.flushed_records += len(records)
+            self.flushes += 1
+            return len(records)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = Thread(
+                target=self._run,
+                name='radius-acct-batcher',
+                daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
@@ -0,0 +1,78 @@
+"""
+Async connection pool to the same database, that django uses.
+Used by async radius endpoints, so they don't occupy thread
+per request with django connection.
+"""
+import asyncio
+from typing import Any, Optional, Sequence, Union, Mapping
+
+from django.conf import settings
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+
+
+_options = getattr(settings, 'RADIUSAPP_OPTIONS', {})
+ASYNC_DB_POOL_MIN_SIZE = int(_options.get('async_db_pool_min_size') or 2)
+ASYNC_DB_POOL_MAX_SIZE = int(_options.get('async_db_pool_max_size') or 20)
+
+QUERY_PARAMS_TYPE = Optional[Union[Sequence[Any], Mapping[str, Any]]]
+
+_pool: Optional[AsyncConnectionPool] = None
+_pool_lock = asyncio.Lock()
+
+
+def _build_conninfo() -> str:
+    db = settings.DATABASES['default']
+    # The same as django postgresql backend, other options are libpq parameters, i.e. sslmode
+    options = dict(db.get('OPTIONS') or {})
+    options.pop('isolation_level', None)
+    return make_conninfo(
+        dbname=db.get('NAME'),
+        user=db.get('USER'),
+        password=db.get('PASSWORD'),
+        host=db.get('HOST'),
+        port=db.get('PORT'),
+        **options
+    )
+
+
+async def get_pool() -> AsyncConnectionPool:
+    global _pool
+    if _pool is not None:
+        return _pool
+    async with _pool_lock:
+        if _pool is None:
+            pool = AsyncConnectionPool(
+                conninfo=_build_conninfo(),
+                min_size=ASYNC_DB_POOL_MIN_SIZE,
+                max_size=ASYNC_DB_POOL_MAX_SIZE,
+                kwargs={'autocommit': True},
+                open=False,
+            )
+            await pool.open()
+            _pool = pool
+    return _pool
+
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def fetchone(sql: str, params: QUERY_PARAMS_TYPE = None) -> Optional[tuple]:
+    pool = await get_pool()
+    async with pool.connection() as conn:
+        cur = await conn.execute(sql, params)
+        if cur.description is None:
+            return None
+        return await cur.fetchone()
+
+
+async def execute(sql: str, params: QUERY_PARAMS_TYPE = None) -> int:
+    """Returns affected rows count"""
+    pool = await get_pool()
+    async with pool.connection() as conn:
+        cur = await conn.execute(sql, params)
+        return cur.rowcount
@@ -0,0 +1,188 @@
+"""
+Async variant of radius auth and acct endpoints.
+
+Hot path queries runs over async connection pool, and auth cache
+generation is read by async redis client, so one worker can handle a lot
+of concurrent requests without exhausting thread pool. Accounting packets
+that deal with ORM and signals are still processed by sync handlers from
+radiusapp.views in thread pool.
+"""
+from datetime import datetime
+from typing import Optional, Mapping, Any, Awaitable, Callable
+
+from fastapi import APIRouter, Body
+from netaddr import EUI
+from starlette import status
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from networks.models import NetworkIpPoolKind
+from radiusapp import views, async_db
+from radiusapp.auth_cache import auth_cache
+from radiusapp.vendor_base import AcctStatusType, CustomerServiceLeaseResult
+from radiusapp.vendors import VendorManager
+
+router = APIRouter(
+    prefix='/radius/customer/async',
+    tags=['RADIUS']
+)
+
+
+@router.on_event('shutdown')
+async def _close_db_pool():
+    await async_db.close_pool()
+
+
+_ACCT_STOP_SQL = (
+    "UPDATE networks_ip_leases "
+    "SET state = false, "
+        "input_octets = %(input_octets)s::bigint, "
+        "output_octets = %(output_octets)s::bigint, "
+        "input_packets = %(input_packets)s::bigint, "
+        "output_packets = %(output_packets)s::bigint, "
+        "last_update = %(now)s::timestamp "
+    "WHERE ip_address = %(ip)s::inet;"
+)
+
+
+def _build_srv_result(row: Optional[tuple]) -> Optional[CustomerServiceLeaseResult]:
+    if not row:
+        return None
+    db_info = views._build_srv_result_from_db_result(row=row)
+    # psycopg3 returns ip addresses as ipaddress objects
+    if db_info.ip_address is not None:
+        db_info.ip_address = str(db_info.ip_address)
+    return db_info
+
+
+async def _get_customer_and_service_and_lease_by_device_credentials(
+    device_mac: EUI, customer_mac: EUI, device_port: int = 0
+) -> Optional[CustomerServiceLeaseResult]:
+    row = await async_db.fetchone(
+        views._DEVICE_CREDENTIALS_LOOKUP_SQL,
+        [str(customer_mac), str(device_mac), device_port]
+    )
+    return _build_srv_result(row)
+
+
+async def _get_customer_and_service_and_lease_by_mac(
+    customer_mac: EUI
+) -> Optional[CustomerServiceLeaseResult]:
+    row = await async_db.fetchone(views._MAC_LOOKUP_SQL, [str(customer_mac)])
+    return _build_srv_result(row)
+
+
+async def _find_and_assign_lease(customer_mac: EUI, pool_kind: NetworkIpPoolKind,
+                                 customer_id: int, vlan_id: int, service_vlan_id: int,
+                                 radius_unique_id: str, radius_username: str) -> Optional[str]:
+    r = await async_db.fetchone(views._FIND_AND_ASSIGN_LEASE_SQL, {
+        'mac_address': str(customer_mac),
+        'customer_id': customer_id,
+        'cvid': vlan_id,
+        'svid': service_vlan_id,
+        'session_id': radius_unique_id,
+        'pool_kind': pool_kind.value,
+        'radius_uname': radius_username
+    })
+    if r and r[0]:
+        return str(r[0])
+    return None
+
+
+async def _assign_global_guest_lease(customer_mac, vlan_id: Optional[int], svid: Optional[int],
+                                     now: datetime, session_id: Optional[str],
+                                     radius_username: Optional[str]) -> CustomerServiceLeaseResult:
+    """Create global guest lease without customer"""
+    r = await async_db.fetchone(views._ASSIGN_GLOBAL_GUEST_LEASE_SQL, {
+        'pool_kind': NetworkIpPoolKind.NETWORK_KIND_GUEST.value,
+        'mac_address': str(customer_mac),
+        'cvid': vlan_id,
+        'svid': svid,
+        'now': now,
+        'session_id': session_id,
+        'radius_uname': radius_username,
+    })
+    if r and r[0]:
+        return CustomerServiceLeaseResult(
+            ip_address=str(r[0])
+        )
+    raise views.BadRetException(
+        detail='Failed to assign guest address',
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+    )
+
+
+async def _update_lease_send_ws_signal(customer_id: int) -> None:
+    await run_in_threadpool(
+        views._update_lease_send_ws_signal,
+        customer_id=customer_id
+    )
+
+
+_AUTH_OPS: dict[views.AuthOp, Callable[..., Awaitable]] = {
+    views.AuthOp.CACHE_GET: auth_cache.aget,
+    views.AuthOp.GET_BY_DEVICE_CREDENTIALS: _get_customer_and_service_and_lease_by_device_credentials,
+    views.AuthOp.GET_BY_MAC: _get_customer_and_service_and_lease_by_mac,
+    views.AuthOp.ASSIGN_GLOBAL_GUEST_LEASE: _assign_global_guest_lease,
+    views.AuthOp.FIND_AND_ASSIGN_LEASE: _find_and_assign_lease,
+    views.AuthOp.UPDATE_LEASE_SEND_WS_SIGNAL: _update_lease_send_ws_signal,
+}
+
+
+@router.post('/auth/{vendor_name}/')
+async def auth(vendor_name: str, request_data: Mapping[str, Any] = Body(...)):
+    # Just find customer by credentials from request
+    vendor_manager = VendorManager(vendor_name=vendor_name)
+    flow = views.auth_flow(vendor_manager=vendor_manager, request_data=request_data)
+    try:
+        op, kwargs = next(flow)
+        while True:
+            try:
+                res = await _AUTH_OPS[op](**kwargs)
+            except Exception as err:
+                op, kwargs = flow.throw(err)
+            else:
+                op, kwargs = flow.send(res)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def _acct_stop(vendor_manager: VendorManager, request_data: Mapping[str, Any]) -> Response:
+    bras_service_name = vendor_manager.get_rad_val(request_data, "ERX-Service-Session", str)
+    if bras_service_name is not None:
+        # Signal receivers works with ORM
+        return await run_in_threadpool(
+            views._acct_stop,
+            vendor_manager=vendor_manager,
+            request_data=request_data
+        )
+
+    ip = vendor_manager.get_rad_val(request_data, "Framed-IP-Address", str)
+    counters = vendor_manager.get_counters(data=request_data)
+    await async_db.execute(_ACCT_STOP_SQL, {
+        'input_octets': counters.input_octets,
+        'output_octets': counters.output_octets,
+        'input_packets': counters.input_packets,
+        'output_packets': counters.output_packets,
+        'now': datetime.now(),
+        'ip': ip,
+    })
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post('/acct/{vendor_name}/')
+async def acct(vendor_name: str, request_data: Mapping[str, Any] = Body(...)):
+    if not vendor_name:
+        return views._bad_ret('Empty vendor name')
+
+    vendor_manager = VendorManager(vendor_name=vendor_name)
+
+    request_type = vendor_manager.get_acct_status_type(request_data)
+    if request_type == AcctStatusType.STOP:
+        return await _acct_stop(vendor_manager=vendor_manager, request_data=request_data)
+
+    return await run_in_threadpool(
+        views.acct,
+        vendor_name=vendor_name,
+        request_data=request_data
+    )
@@ -0,0 +1,257 @@
+"""
+In-process cache for subscriber lookups made by RADIUS auth endpoint.
+
+While reconnect storm (i.e. whole OLT reboots) the same customers comes
+with the same opt82 credentials every few seconds, so there is no need
+to run heavy multi-table query for each Access-Request.
+Each entry is tagged by customer, lease, device and mac, that it is built
+from, and model signals (see radiusapp.signals) drop only entries with tags
+of changed row. Because signals fires only in process that changed the
+model, each invalidation also increments shared generation counter in
+redis, and stores its tags by new generation. Every process drops entries
+with tags of all generations, that it has not seen yet.
+"""
+from dataclasses import replace
+from ipaddress import ip_address
+from threading import Lock
+from time import monotonic
+from typing import Optional, Hashable, Iterable
+
+from django.conf import settings
+from django.db import transaction
+from netaddr import EUI
+
+from djing2.lib.redis import redis_proxy, async_redis_proxy
+from radiusapp.vendor_base import CustomerServiceLeaseResult
+
+
+_options = getattr(settings, 'RADIUSAPP_OPTIONS', {})
+AUTH_CACHE_TTL = float(_options.get('auth_cache_ttl', 30))
+AUTH_CACHE_MAX_SIZE = int(_options.get('auth_cache_max_size', 65536))
+AUTH_CACHE_GENERATION_KEY = 'radius_auth_cache_generation'
+AUTH_CACHE_INVALIDATION_KEY = 'radius_auth_cache_invalidation_%d'
+# When process missed more invalidations, it drops all entries
+AUTH_CACHE_MAX_INVALIDATIONS = 256
+AUTH_CACHE_INVALIDATION_TTL = max(int(AUTH_CACHE_TTL) * 2, 60)
+# Invalidation tags, that drops all entries
+_ALL_TAGS = '*'
+
+
+class RadiusAuthCache:
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_size: int = AUTH_CACHE_MAX_SIZE,
+                 shared_storage=None, async_shared_storage=None):
+        """
+        :param ttl: Time to live of entry, in seconds. Zero disables cache.
+        :param max_size: Maximum entries count, all entries drops when it exceeded.
+        :param shared_storage: redis-like object with 'get', 'mget', 'set' and 'incr'
+                               methods, for synchronizing invalidations between processes.
+        :param async_shared_storage: The same storage with awaitable 'get' and 'mget', for 'aget'.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._shared_storage = shared_storage
+        self._async_shared_storage = async_shared_storage
+        self._entries: dict[Hashable, tuple[float, CustomerServiceLeaseResult, frozenset[str]]] = {}
+        self._tag_keys: dict[str, set[Hashable]] = {}
+        self._generation = None if shared_storage is None else 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def device_credentials_key(device_mac: EUI, device_port: int, customer_mac: EUI) -> tuple:
+        return 'dev', str(device_mac), int(device_port), str(customer_mac)
+
+    @staticmethod
+    def customer_mac_key(customer_mac: EUI) -> tuple:
+        return 'mac', str(customer_mac)
+
+    @staticmethod
+    def customer_tag(customer_id: int) -> str:
+        return 'customer:%d' % customer_id
+
+    @staticmethod
+    def customer_service_tag(customer_service_id: int) -> str:
+        return 'customer_service:%d' % customer_service_id
+
+    @staticmethod
+    def device_tag(device_id: int) -> str:
+        return 'device:%d' % device_id
+
+    @staticmethod
+    def device_mac_tag(device_mac) -> str:
+        return 'device_mac:%d' % EUI(device_mac).value
+
+    @staticmethod
+    def mac_tag(customer_mac) -> str:
+        return 'mac:%d' % EUI(customer_mac).value
+
+    @staticmethod
+    def ip_tag(ip_addr) -> str:
+        return 'ip:%s' % ip_address(str(ip_addr))
+
+    def _entry_tags(self, key: Hashable, value: CustomerServiceLeaseResult) -> frozenset[str]:
+        tags = {self.customer_tag(value.id), self.ip_tag(value.ip_address)}
+        if value.current_service_id:
+            tags.add(self.customer_service_tag(value.current_service_id))
+        if value.device_id:
+            tags.add(self.device_tag(value.device_id))
+        if isinstance(key, tuple):
+            if key[0] == 'dev':
+                tags.add(self.device_mac_tag(key[1]))
+                tags.add(self.mac_tag(key[3]))
+            elif key[0] == 'mac':
+                tags.add(self.mac_tag(key[1]))
+        return frozenset(tags)
+
+    def _fetch_generation(self):
+        if self._shared_storage is None:
+            return None
+        return int(self._shared_storage.get(AUTH_CACHE_GENERATION_KEY) or 0)
+
+    @staticmethod
+    def _invalidation_keys(seen, generation) -> Optional[list[str]]:
+        """Keys of invalidations, that are not seen yet, or None if they can't be replayed"""
+        if generation is None or seen is None:
+            return None
+        if not 0 < generation - seen <= AUTH_CACHE_MAX_INVALIDATIONS:
+            return None
+        return [AUTH_CACHE_INVALIDATION_KEY % g for g in range(seen + 1, generation + 1)]
+
+    def get(self, key: Hashable) -> Optional[CustomerServiceLeaseResult]:
+        if self.ttl <= 0:
+            return None
+        seen = self._generation
+        generation = self._fetch_generation()
+        invalidations = None
+        if generation != seen:
+            keys = self._invalidation_keys(seen, generation)
+            if keys:
+                invalidations = self._shared_storage.mget(*keys)
+        return self._get(key, generation, seen, invalidations)
+
+    async def aget(self, key: Hashable) -> Optional[CustomerServiceLeaseResult]:
+        """The same as 'get', for async views"""
+        if self.ttl <= 0:
+            return None
+        seen = self._generation
+        generation = None
+        invalidations = None
+        if self._async_shared_storage is not None:
+            generation = int(await self._async_shared_storage.get(AUTH_CACHE_GENERATION_KEY) or 0)
+            if generation != seen:
+                keys = self._invalidation_keys(seen, generation)
+                if keys:
+                    invalidations = await self._async_shared_storage.mget(*keys)
+        return self._get(key, generation, seen, invalidations)
+
+    def _get(self, key: Hashable, generation, seen,
+             invalidations: Optional[list]) -> Optional[CustomerServiceLeaseResult]:
+        with self._lock:
+            if generation != self._generation:
+                # Other thread has moved generation while invalidations were fetched
+                self._replay_invalidations(invalidations if seen == self._generation else None)
+                self._generation = generation
+            entry = self._entries.get(key)
+            if entry is not None:
+                expire_time, value, _ = entry
+                if expire_time > monotonic():
+                    self.hits += 1
+                    # caller may change result, so give him a copy
+                    return replace(value)
+                self._remove(key)
+            self.misses += 1
+        return None
+
+    def _replay_invalidations(self, invalidations: Optional[list]) -> None:
+        if not invalidations:
+            self._clear()
+            return
+        for tags in invalidations:
+            # Expired, or not stored yet
+            if tags is None:
+                self._clear()
+                return
+            if isinstance(tags, bytes):
+                tags = tags.decode()
+            if tags == _ALL_TAGS:
+                self._clear()
+                return
+            self._drop_tags(tags.split(','))
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._tag_keys.clear()
+
+    def _drop_tags(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            for key in tuple(self._tag_keys.get(tag, ())):
+                self._remove(key)
+
+    def set(self, key: Hashable, value: CustomerServiceLeaseResult) -> None:
+        # Results without ip address are changes while auth,
+        # when lease assigns, so they must be fetched from db again.
+        if self.ttl <= 0 or value is None or not value.ip_address:
+            return
+        tags = self._entry_tags(key, value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            elif len(self._entries) >= self.max_size:
+                self._clear()
+            self._entries[key] = (monotonic() + self.ttl, replace(value), tags)
+            for tag in tags:
+                self._tag_keys.setdefault(tag, set()).add(key)
+
+    def invalidate(self, tags: Optional[Iterable[str]] = None) -> None:
+        """
+        Drop entries with any of tags in all processes.
+        :param tags: Tags of changed rows, all entries drops when it is None.
+        """
+        if tags is not None:
+            tags = sorted(set(tags))
+            if not tags:
+                return
+        with self._lock:
+            self.invalidations += 1
+            if tags is None:
+                self._clear()
+            else:
+                self._drop_tags(tags)
+            if self._shared_storage is not None:
+                generation = self._shared_storage.incr(AUTH_CACHE_GENERATION_KEY)
+                self._shared_storage.set(
+                    AUTH_CACHE_INVALIDATION_KEY % generation,
+                    _ALL_TAGS if tags is None else ','.join(tags),
+                    ex=AUTH_CACHE_INVALIDATION_TTL
+                )
+
+    def invalidate_on_commit(self, tags: Optional[Iterable[str]] = None) -> None:
+        """
+        Invalidation runs after commit, else other process may cache
+        old data from db between invalidation and commit.
+        """
+        if tags is not None:
+            tags = tuple(tags)
+        transaction.on_commit(lambda: self.invalidate(tags))
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'size': len(self._entries),
+        }
+
+
+auth_cache = RadiusAuthCache(shared_storage=redis_proxy, async_shared_storage=async_redis_proxy)
@@ -40,3 +40,12 @@ radius_acct_stop_signal = Signal()
 #    ip_addr - customer ip address from radius request
 #    customer_mac: Optional[netaddr.EUI] instance -  customer device mac address from radius request
 radius_auth_update_signal = Signal()
+
+
+# Sends after batched acct-update records are stored, instead of
+# radius_auth_update_signal for each record
+# attrs:
+#    sender - CustomerIpLeaseModel
+#    records - list of radiusapp.acct_batch.AcctUpdateRecord, which leases are updated
+#    customers - dict of customer ids to customers.models.Customer instances of records
+radius_acct_update_batch_signal = Signal()
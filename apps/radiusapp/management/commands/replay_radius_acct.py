@@ -0,0 +1,60 @@
+import json
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError, no_translations
+from django.db import connection
+
+from djing2.lib import QueryCounter
+from radiusapp import views
+from radiusapp.acct_batch import AcctUpdateBatcher
+from radiusapp.vendors import VendorManager
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay recorded radius accounting stream, and measure how fast it ingests. "
+        "Stream file contains json objects line by line, it is request bodies that "
+        "FreeRADIUS sends to acct endpoint. It changes leases in db, "
+        "so do not run it on production database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("stream_file", help="recorded acct stream, json lines", type=str)
+        parser.add_argument("--vendor", help="vendor name", default="juniper", type=str)
+        parser.add_argument("--batch-size", help="Interim-Update batch size, 0 - without batching",
+                            default=0, type=int)
+
+    @no_translations
+    def handle(self, stream_file: str, vendor: str, batch_size: int, *args, **options):
+        try:
+            with open(stream_file) as f:
+                stream = [json.loads(ln) for ln in f if ln.strip()]
+        except (OSError, ValueError) as err:
+            raise CommandError(err) from err
+
+        vendor_manager = VendorManager(vendor_name=vendor)
+        batcher = AcctUpdateBatcher(
+            flush_fn=views._flush_acct_updates,
+            max_records=batch_size,
+            background=False
+        )
+        orig_batcher = views.acct_update_batcher
+        views.acct_update_batcher = batcher
+        query_counter = QueryCounter()
+        try:
+            with connection.execute_wrapper(query_counter):
+                start_time = perf_counter()
+                for request_data in stream:
+                    views.acct(vendor_name=vendor, request_data=request_data)
+                ack_time = perf_counter() - start_time
+                batcher.flush()
+                total_time = perf_counter() - start_time
+        finally:
+            views.acct_update_batcher = orig_batcher
+
+        count = len(stream)
+        self.stdout.write("Vendor: %s, batch size: %d" % (vendor_manager.vendor_class.vendor, batch_size))
+        self.stdout.write("Records: %d" % count)
+        self.stdout.write("Ack time: %.3f s, %.1f records/s" % (ack_time, count / ack_time if ack_time else 0))
+        self.stdout.write("Total time: %.3f s, %.1f records/s" % (total_time, count / total_time if total_time else 0))
+        self.stdout.write("Db queries: %d, batch flushes: %d" % (query_counter.count, batcher.flushes))
@@ -1,15 +1,133 @@
 """Radius application signals file."""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch.dispatcher import receiver
 from djing2.lib import LogicError
+from djing2.lib.logger import logger
 from rest_framework import status
 
 from networks import tasks
+from networks.radius_commands import CoAAction, CoARequest
 from networks.models import CustomerIpLeaseModel
 from customers import custom_signals as customer_custom_signals
-from customers.models import Customer
+from customers.models import Customer, CustomerService
+from devices.models import Device, Port
+from services.models import Service
+from radiusapp.auth_cache import auth_cache
 from radiusapp.vendor_base import SpeedInfoStruct, IVendorSpecific
 
 
+def _auth_fields_changed(update_fields, fields: frozenset) -> bool:
+    """Save without update_fields, and delete, may change any field"""
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
+
+# Fields, that radius auth lookups reads
+_CUSTOMER_AUTH_FIELDS = frozenset({
+    'username', 'is_active', 'balance', 'is_dynamic_ip', 'auto_renewal_service',
+    'current_service', 'current_service_id', 'dev_port', 'dev_port_id',
+    'device', 'device_id', 'gateway', 'gateway_id',
+})
+_CUSTOMER_SERVICE_AUTH_FIELDS = frozenset({'service', 'service_id'})
+_SERVICE_AUTH_FIELDS = frozenset({'speed_in', 'speed_out', 'speed_burst'})
+_DEVICE_AUTH_FIELDS = frozenset({'mac_addr', 'dev_type'})
+_PORT_AUTH_FIELDS = frozenset({'num', 'device', 'device_id'})
+_LEASE_AUTH_FIELDS = frozenset({
+    'ip_address', 'mac_address', 'customer', 'customer_id', 'is_dynamic',
+})
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_auth_cache_on_customer_change(sender, instance: Customer, update_fields=None, **kwargs):
+    if not _auth_fields_changed(update_fields, _CUSTOMER_AUTH_FIELDS):
+        return
+    tags = [auth_cache.customer_tag(instance.pk)]
+    if instance.device_id:
+        # Customer may take device port of other customer
+        tags.append(auth_cache.device_tag(instance.device_id))
+    auth_cache.invalidate_on_commit(tags)
+
+
+@receiver(post_save, sender=CustomerService)
+@receiver(post_delete, sender=CustomerService)
+def invalidate_auth_cache_on_customer_service_change(sender, instance: CustomerService,
+                                                     update_fields=None, **kwargs):
+    if _auth_fields_changed(update_fields, _CUSTOMER_SERVICE_AUTH_FIELDS):
+        auth_cache.invalidate_on_commit([auth_cache.customer_service_tag(instance.pk)])
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_auth_cache_on_service_change(sender, update_fields=None, **kwargs):
+    """Service speed is cached for all its customers, so all entries drops"""
+    if _auth_fields_changed(update_fields, _SERVICE_AUTH_FIELDS):
+        auth_cache.invalidate_on_commit()
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def invalidate_auth_cache_on_device_change(sender, instance: Device, update_fields=None, **kwargs):
+    if not _auth_fields_changed(update_fields, _DEVICE_AUTH_FIELDS):
+        return
+    tags = [auth_cache.device_tag(instance.pk)]
+    if instance.mac_addr:
+        tags.append(auth_cache.device_mac_tag(instance.mac_addr))
+    auth_cache.invalidate_on_commit(tags)
+
+
+@receiver(post_save, sender=Port)
+@receiver(post_delete, sender=Port)
+def invalidate_auth_cache_on_port_change(sender, instance: Port, update_fields=None, **kwargs):
+    if _auth_fields_changed(update_fields, _PORT_AUTH_FIELDS):
+        auth_cache.invalidate_on_commit([auth_cache.device_tag(instance.device_id)])
+
+
+@receiver(post_save, sender=CustomerIpLeaseModel)
+@receiver(post_delete, sender=CustomerIpLeaseModel)
+def invalidate_auth_cache_on_lease_change(sender, instance: CustomerIpLeaseModel, update_fields=None, **kwargs):
+    if not _auth_fields_changed(update_fields, _LEASE_AUTH_FIELDS):
+        return
+    tags = [auth_cache.ip_tag(instance.ip_address)]
+    if instance.mac_address:
+        tags.append(auth_cache.mac_tag(instance.mac_address))
+    if instance.customer_id:
+        tags.append(auth_cache.customer_tag(instance.customer_id))
+    auth_cache.invalidate_on_commit(tags)
+
+
+@receiver(customer_custom_signals.customer_services_batch_post_billing, sender=CustomerService)
+def invalidate_auth_cache_on_billing_batch(sender, continued, stopped, **kwargs):
+    """Billing run changes services by bulk queries, without model signals."""
+    auth_cache.invalidate_on_commit(
+        auth_cache.customer_tag(customer.pk) for _, customer in (*continued, *stopped)
+    )
+
+
+@receiver(customer_custom_signals.customer_services_batch_post_billing, sender=CustomerService)
+def stopped_services_to_guest_on_billing_batch(sender, stopped, **kwargs):
+    """When billing run finished services, then change sessions of their customers to guest,
+    by one bulk CoA task for whole chunk.
+    """
+    if not stopped:
+        return
+    unames = CustomerIpLeaseModel.objects.filter(
+        customer_id__in={customer.pk for _, customer in stopped},
+        state=True
+    ).exclude(radius_username=None).values_list('radius_username', flat=True)
+    coa_requests = []
+    for uname in unames:
+        logger.info("COA: inet->guest uname=%s" % uname)
+        coa_requests.append(CoARequest(
+            uname=str(uname),
+            action=CoAAction.INET2GUEST
+        ).as_dict())
+    if coa_requests:
+        transaction.on_commit(lambda: tasks.async_bulk_coa_task.delay(
+            requests=coa_requests
+        ))
+
+
 @receiver(customer_custom_signals.customer_service_post_pick, sender=Customer)
 def customer_post_pick_service_signal_handler(sender, instance: Customer, service, **kwargs):
     """When single customer picked a service, then change it session to inet.
@@ -1,9 +1,16 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Barrier
+from time import sleep
 from typing import Optional
 from dataclasses import dataclass
 from uuid import UUID
+from netaddr import EUI
 from django.contrib.sites.models import Site
+from django.db import connection
 from django.db.models import signals
-from django.test import SimpleTestCase, override_settings
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
 from starlette import status
 from djing2.lib.fastapi.test import DjingTestCase
 from djing2.lib.logger import logger
@@ -14,6 +21,11 @@ from groupapp.models import Group
 from services.models import Service
 from services.custom_logic import SERVICE_CHOICE_DEFAULT
 from radiusapp.vendors import VendorManager, parse_opt82
+from radiusapp.vendor_base import CustomerServiceLeaseResult
+from radiusapp.auth_cache import RadiusAuthCache, AUTH_CACHE_GENERATION_KEY, AUTH_CACHE_INVALIDATION_KEY
+from radiusapp.acct_batch import AcctUpdateBatcher, AcctUpdateRecord
+from radiusapp.vendor_base import RadiusCounters
+from radiusapp.views import _find_and_assign_lease, _flush_acct_updates
 from networks.models import (
     VlanIf, NetworkIpPool,
     NetworkIpPoolKind,
@@ -220,6 +232,135 @@ class VendorsBuildDevMacByOpt82TestCase(SimpleTestCase):
         self.assertEqual(port, 0)
 
 
+class _FakeSharedStorage(dict):
+    def incr(self, name, amount=1):
+        self[name] = self.get(name, 0) + amount
+        return self[name]
+
+    def set(self, name, value, ex=None):
+        self[name] = value
+
+    def mget(self, *names):
+        return [self.get(name) for name in names]
+
+
+class _FakeAsyncSharedStorage:
+    def __init__(self, storage: _FakeSharedStorage):
+        self.storage = storage
+
+    async def get(self, name):
+        return self.storage.get(name)
+
+    async def mget(self, *names):
+        return self.storage.mget(*names)
+
+
+class RadiusAuthCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.storage = _FakeSharedStorage()
+        self.cache = RadiusAuthCache(ttl=60, shared_storage=self.storage)
+        self.key = RadiusAuthCache.device_credentials_key(
+            device_mac='12:13:14:15:16:17',
+            device_port=2,
+            customer_mac='1c:c0:4d:95:d0:30'
+        )
+
+    def test_hit_returns_copy(self):
+        self.cache.set(self.key, CustomerServiceLeaseResult(id=1, ip_address='10.152.64.2'))
+        res = self.cache.get(self.key)
+        self.assertEqual(res.ip_address, '10.152.64.2')
+        res.ip_address = '10.152.64.3'
+        self.assertEqual(self.cache.get(self.key).ip_address, '10.152.64.2')
+        self.assertEqual(self.cache.stats()['hits'], 2)
+
+    def test_result_without_ip_not_cached(self):
+        self.cache.set(self.key, CustomerServiceLeaseResult(id=1))
+        self.cache.set(self.key, None)
+        self.assertIsNone(self.cache.get(self.key))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_invalidate_from_other_process(self):
+        other_process_cache = RadiusAuthCache(ttl=60, shared_storage=self.storage)
+        self.cache.set(self.key, CustomerServiceLeaseResult(id=1, ip_address='10.152.64.2'))
+        self.assertIsNotNone(self.cache.get(self.key))
+        other_process_cache.invalidate()
+        self.assertIsNone(self.cache.get(self.key))
+
+    def test_invalidate_tags_from_other_process(self):
+        other_key = RadiusAuthCache.customer_mac_key(customer_mac='1c:c0:4d:95:d0:31')
+        self.cache.set(self.key, CustomerServiceLeaseResult(id=1, ip_address='10.152.64.2', device_id=3))
+        self.cache.set(other_key, CustomerServiceLeaseResult(id=2, ip_address='10.152.64.3'))
+        self.assertIsNotNone(self.cache.get(self.key))
+        other_process_cache = RadiusAuthCache(ttl=60, shared_storage=self.storage)
+        other_process_cache.invalidate([RadiusAuthCache.device_tag(3)])
+        self.assertIsNone(self.cache.get(self.key))
+        self.assertIsNotNone(self.cache.get(other_key))
+        other_process_cache.invalidate([RadiusAuthCache.mac_tag('1c-c0-4d-95-d0-31')])
+        self.assertIsNone(self.cache.get(other_key))
+
+    def test_missed_invalidation_drops_all(self):
+        self.cache.set(self.key, CustomerServiceLeaseResult(id=1, ip_address='10.152.64.2'))
+        self.assertIsNotNone(self.cache.get(self.key))
+        RadiusAuthCache(ttl=60, shared_storage=self.storage).invalidate([RadiusAuthCache.customer_tag(2)])
+        # i.e. expired
+        self.storage.pop(AUTH_CACHE_INVALIDATION_KEY % self.storage[AUTH_CACHE_GENERATION_KEY])
+        self.assertIsNone(self.cache.get(self.key))
+
+    def test_async_get_invalidated_from_other_process(self):
+        cache = RadiusAuthCache(
+            ttl=60, shared_storage=self.storage,
+            async_shared_storage=_FakeAsyncSharedStorage(self.storage)
+        )
+        cache.set(self.key, CustomerServiceLeaseResult(id=1, ip_address='10.152.64.2'))
+        self.assertEqual(asyncio.run(cache.aget(self.key)).ip_address, '10.152.64.2')
+        RadiusAuthCache(ttl=60, shared_storage=self.storage).invalidate()
+        self.assertIsNone(asyncio.run(cache.aget(self.key)))
+
+    def test_expired(self):
+        cache = RadiusAuthCache(ttl=0.001)
+        cache.set(self.key, CustomerServiceLeaseResult(id=1, ip_address='10.152.64.2'))
+        sleep(0.01)
+        self.assertIsNone(cache.get(self.key))
+
+
+class AcctUpdateBatcherTestCase(SimpleTestCase):
+    def setUp(self):
+        self.flushed = []
+        self.batcher = AcctUpdateBatcher(
+            flush_fn=self.flushed.append,
+            max_records=3,
+            background=False
+        )
+
+    @staticmethod
+    def _make_record(ip: str, input_octets: int) -> AcctUpdateRecord:
+        return AcctUpdateRecord(
+            vendor_name='juniper',
+            request_data={},
+            ip_address=ip,
+            customer_mac='1c:c0:4d:95:d0:30',
+            radius_username='uname',
+            radius_unique_id='2ea5a1843334573bd11dc15417426f36',
+            counters=RadiusCounters(input_octets=input_octets),
+            event_time=datetime.now()
+        )
+
+    def test_flush_when_full(self):
+        self.batcher.push(self._make_record('10.152.64.2', 1))
+        self.batcher.push(self._make_record('10.152.64.3', 1))
+        self.assertEqual(len(self.flushed), 0)
+        self.batcher.push(self._make_record('10.152.64.4', 1))
+        self.assertEqual(len(self.flushed), 1)
+        self.assertEqual(len(self.flushed[0]), 3)
+
+    def test_last_counters_wins(self):
+        self.batcher.push(self._make_record('10.152.64.2', 1))
+        self.batcher.push(self._make_record('10.152.64.2', 2))
+        self.assertEqual(self.batcher.flush(), 1)
+        self.assertEqual(self.flushed[0][0].counters.input_octets, 2)
+        self.assertEqual(self.batcher.flush(), 0)
+
+
 @override_settings(API_AUTH_SUBNET="127.0.0.0/8")
 class CustomerAcctStartTestCase(DjingTestCase, ReqMixin):
     def setUp(self):
@@ -513,7 +654,7 @@ class CustomerAcctStartTestCase(DjingTestCase, ReqMixin):
         self.assertEqual(r.status_code, status.HTTP_200_OK, msg=r.text)
         self.assertDictEqual(r.json(), {
             "User-Password": "SERVICE-GUEST",
-            "Framed-IP-Address": "192.168.0.3"
+            "Framed-IP-Address": "192.168.0.2"
         })
 
         # Получаем все гостевые аренды
@@ -765,6 +906,44 @@ class CustomerAcctUpdateTestCase(DjingTestCase, ReqMixin):
         self.assertIsNotNone(lease['last_update'])
         self.assertEqual(lease['lease_time'], lease['last_update'])
 
+    def test_batched_acct_update_counters(self):
+        """Batched records are stored by constant count of queries"""
+        records = []
+        for ip, mac in (('10.152.64.18', '18:c0:4d:51:de:e2'), ('10.152.64.19', '18:c0:4d:51:de:e3')):
+            uname = f'{mac}-ae0:12-0004008B0002-0006121314151617'
+            CustomerIpLeaseModel.objects.filter(
+                ip_address=ip,
+            ).update(
+                mac_address=mac,
+                pool=self.pool,
+                customer=self.full_customer.customer,
+                is_dynamic=True,
+                state=True,
+                radius_username=uname
+            )
+            records.append(AcctUpdateRecord(
+                vendor_name='juniper',
+                request_data={
+                    "ADSL-Agent-Circuit-Id": {"value": ["0x0004008B0002"]},
+                    "ADSL-Agent-Remote-Id": {"value": ["0x0006121314151617"]},
+                },
+                ip_address=ip,
+                customer_mac=EUI(mac),
+                radius_username=uname,
+                radius_unique_id='12345678-1234-5678-1234-567812345678',
+                counters=RadiusCounters(input_octets=1374368169, output_octets=3403852035),
+                event_time=datetime.now()
+            ))
+
+        # find customers, update leases, fetch customers, find orphan sessions
+        with self.assertNumQueries(4):
+            _flush_acct_updates(records)
+
+        leases = CustomerIpLeaseModel.objects.filter(
+            customer=self.full_customer.customer
+        ).values_list('input_octets', 'output_octets')
+        self.assertEqual(list(leases), [(1374368169, 3403852035)] * 2)
+
     def test_sync_customer_session_guest2inet(self):
         """Проверяем синхронизацию абонентских сессий при Acct Interim-Update.
            Сценарий: у абонента есть услуга, и на брасе нету.
@@ -888,7 +1067,7 @@ class CustomerAuthTestCase(DjingTestCase, ReqMixin):
         self.assertEqual(r.status_code, status.HTTP_200_OK, msg=r.json())
         self.assertDictEqual(r.json(), {
             "User-Password": "SERVICE-GUEST",
-            "Framed-IP-Address": "192.168.0.3"
+            "Framed-IP-Address": "192.168.0.2"
         }, msg=r.json())
 
     def test_auth_radius_session(self):
@@ -959,6 +1138,108 @@ class CustomerAuthTestCase(DjingTestCase, ReqMixin):
             "Framed-IP-Address": "10.152.64.3"
         })
 
+    def _guest_auth(self, mac: str):
+        r = self.post(
+            "/api/radius/customer/auth/juniper/",
+            radius_api_request_auth(
+                vlan_id=14,
+                cid="0004008b000c",
+                arid="0006286ED47B1CA4",
+                mac=mac,
+            )
+        )
+        self.assertEqual(r.status_code, status.HTTP_200_OK, msg=r.text)
+        return r.json()
+
+    def test_stopped_guest_lease_reused(self):
+        """Остановленная гостевая аренда хранит мак до очистки
+           устаревших аренд, но должна выдаваться другому гостю.
+        """
+        # Only one address in guest pool
+        CustomerIpLeaseModel.objects.filter(
+            pool__kind=NetworkIpPoolKind.NETWORK_KIND_GUEST
+        ).exclude(ip_address="192.168.0.2").delete()
+
+        self.assertEqual(self._guest_auth("18c0.4d51.dee2")["Framed-IP-Address"], "192.168.0.2")
+        r = self.post(
+            "/api/radius/customer/acct/juniper/", {
+                "User-Name": {"value": ["18c0.4d51.dee2"]},
+                "Acct-Status-Type": {"value": ["Stop"]},
+                "Framed-IP-Address": {"value": ["192.168.0.2"]},
+                "ERX-Dhcp-Mac-Addr": {"value": ["18c0.4d51.dee2"]},
+                "Acct-Unique-Session-Id": {"value": ["2ea5a1843334573bd11dc15417426f36"]},
+            }
+        )
+        self.assertEqual(r.status_code, status.HTTP_204_NO_CONTENT, msg=r.text)
+
+        self.assertDictEqual(self._guest_auth("18c0.4d51.dee3"), {
+            "User-Password": "SERVICE-GUEST",
+            "Framed-IP-Address": "192.168.0.2"
+        })
+        lease = CustomerIpLeaseModel.objects.get(ip_address="192.168.0.2")
+        self.assertEqual(lease.mac_address, EUI("18:c0:4d:51:de:e3"))
+        self.assertTrue(lease.state)
+
+
+class LeaseAllocationConcurrencyTestCase(TransactionTestCase):
+    """Many concurrent auths must never get the same free lease."""
+
+    workers_count = 16
+
+    def setUp(self):
+        vlan = VlanIf.objects.create(title="Vlan15 for stress tests", vid=15)
+        NetworkIpPool.objects.create(
+            network="10.152.66.0/24",
+            kind=NetworkIpPoolKind.NETWORK_KIND_INTERNET,
+            description="Test stress pool",
+            ip_start="10.152.66.2",
+            ip_end="10.152.66.254",
+            vlan_if=vlan,
+            gateway="10.152.66.1",
+            is_dynamic=True,
+        )
+        self.customers = [Customer.objects.create_user(
+            telephone="+7978100%04d" % n,
+            username="stress%d" % n,
+            password="passw",
+            is_active=True
+        ) for n in range(self.workers_count * 2)]
+
+    def _assign(self, num: int, barrier: Barrier) -> Optional[str]:
+        customer = self.customers[num]
+        barrier.wait()
+        try:
+            return _find_and_assign_lease(
+                customer_mac="1c:c0:4d:95:%.2x:%.2x" % (num // 256, num % 256),
+                pool_kind=NetworkIpPoolKind.NETWORK_KIND_INTERNET,
+                customer_id=customer.pk,
+                vlan_id=15,
+                service_vlan_id=1011,
+                radius_unique_id=str(UUID(int=num)),
+                radius_username=customer.username
+            )
+        finally:
+            connection.close()
+
+    def test_no_double_assignment(self):
+        barrier = Barrier(self.workers_count)
+        with ThreadPoolExecutor(max_workers=self.workers_count) as executor:
+            ips = list(executor.map(
+                lambda n: self._assign(n, barrier),
+                range(len(self.customers))
+            ))
+        self.assertNotIn(None, ips)
+        self.assertEqual(len(set(ips)), len(self.customers), msg=ips)
+        assigned_count = CustomerIpLeaseModel.objects.filter(
+            pool__vlan_if__vid=15
+        ).exclude(customer=None).count()
+        self.assertEqual(assigned_count, len(self.customers))
+
+    def test_own_lease_is_reused(self):
+        barrier = Barrier(1)
+        first_ip = self._assign(0, barrier)
+        self.assertEqual(self._assign(0, barrier), first_ip)
+
 
 class Option82TestCase(SimpleTestCase):
     def test_parse_opt82_ok(self):
@@ -1,5 +1,6 @@
 from datetime import datetime
-from typing import Optional, Mapping, Any
+from enum import Enum
+from typing import Optional, Mapping, Any, Callable, Generator
 
 from django.db import connection
 from django.utils.translation import gettext_lazy as _
@@ -13,12 +14,20 @@ from djing2.lib import LogicError, safe_int
 from djing2.lib.logger import logger
 from djing2.lib.ws_connector import WsEventTypeEnum, send_data2ws
 from networks.models import CustomerIpLeaseModel, NetworkIpPoolKind
+from networks.radius_commands import CoAAction, CoARequest
 from networks.tasks import (
     async_change_session_inet2guest,
     async_change_session_guest2inet,
+    async_bulk_coa_task,
     check_if_lease_have_id_db_task
 )
 from radiusapp import custom_signals
+from radiusapp.acct_batch import (
+    AcctUpdateBatcher,
+    AcctUpdateRecord,
+    bulk_update_lease_counters
+)
+from radiusapp.auth_cache import auth_cache
 from radiusapp.schemas import CustomerServiceRequestSchema
 from radiusapp.vendor_base import (
     AcctStatusType,
@@ -34,67 +43,46 @@ router = APIRouter(
 )
 
 
-def _acct_unknown(_, tx=''):
-    logger.error('Unknown acct: %s' % tx)
-    return _bad_ret("Bad Acct-Status-Type: %s" % tx, custom_status=status.HTTP_200_OK)
-
-
-def _assign_global_guest_lease(customer_mac, vlan_id: Optional[int], svid: Optional[int],
-                               now: datetime, session_id: Optional[str], radius_username: Optional[str]):
-    """Create global guest lease without customer"""
-
-    leases_qs = CustomerIpLeaseModel.objects.filter(
-        pool__kind=NetworkIpPoolKind.NETWORK_KIND_GUEST.value,
-        state=False,
-    )[:1]
-    leases_qs = CustomerIpLeaseModel.objects.filter(pk__in=leases_qs)
-    updated_lease_count = leases_qs.update(
-        mac_address=customer_mac,
-        state=True,
-        input_octets=0,
-        output_octets=0,
-        input_packets=0,
-        output_packets=0,
-        cvid=vlan_id,
-        svid=svid,
-        lease_time=now,
-        last_update=now,
-        session_id=session_id,
-        radius_username=radius_username,
-    )
-    if updated_lease_count > 0:
-        ipaddr = leases_qs.first()
-        if ipaddr is not None:
-            db_info = CustomerServiceLeaseResult(
-                ip_address=ipaddr.ip_address
-            )
-            return db_info
-    raise BadRetException(
-        detail='Failed to assign guest address',
-        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
-    )
-
-
-def _find_and_assign_lease(customer_mac: EUI, pool_kind: NetworkIpPoolKind,
-                           customer_id: int, vlan_id: int, service_vlan_id: int,
-                           radius_unique_id: str, radius_username: str):
-    sql = """WITH lease(id, ip_address) AS (
-    SELECT nil.id, nil.ip_address
+# Customer's own lease is preferred, else free lease is claimed.
+# Rows are locked with SKIP LOCKED, so concurrent auths never get
+# the same lease, and free lease lookup uses partial index
+# 'networks_ip_leases_free_idx'.
+_FIND_AND_ASSIGN_LEASE_SQL = """WITH own_lease(id) AS (
+    SELECT nil.id
     FROM networks_ip_leases nil
-             LEFT JOIN networks_ip_pool nip ON (nil.pool_id = nip.id)
-             LEFT JOIN networks_vlan nv ON (nip.vlan_if_id = nv.id)
+             JOIN networks_ip_pool nip ON (nil.pool_id = nip.id)
+             JOIN networks_vlan nv ON (nip.vlan_if_id = nv.id)
     WHERE nv.vid = %(cvid)s::smallint
       AND nip.is_dynamic
       AND nip.kind = %(pool_kind)s::smallint
       AND nil.ip_address >= nip.ip_start
       AND nil.ip_address <= nip.ip_end
       AND nil.is_dynamic
-      AND (
-            (nil.customer_id = %(customer_id)s::integer AND nil.mac_address = %(mac_address)s::macaddr)
-                OR
-            (nil.customer_id IS NULL AND nil.mac_address IS NULL)
-        )
-      AND nil.state is false
+      AND nil.customer_id = %(customer_id)s::integer
+      AND nil.mac_address = %(mac_address)s::macaddr
+      AND nil.state = false
+    LIMIT 1
+    FOR UPDATE OF nil SKIP LOCKED
+), free_lease(id) AS (
+    SELECT nil.id
+    FROM networks_ip_leases nil
+             JOIN networks_ip_pool nip ON (nil.pool_id = nip.id)
+             JOIN networks_vlan nv ON (nip.vlan_if_id = nv.id)
+    WHERE nv.vid = %(cvid)s::smallint
+      AND nip.is_dynamic
+      AND nip.kind = %(pool_kind)s::smallint
+      AND nil.ip_address >= nip.ip_start
+      AND nil.ip_address <= nip.ip_end
+      AND nil.is_dynamic
+      AND nil.customer_id IS NULL
+      AND nil.mac_address IS NULL
+      AND nil.state = false
+    LIMIT 1
+    FOR UPDATE OF nil SKIP LOCKED
+), lease(id) AS (
+    SELECT id FROM own_lease
+    UNION ALL
+    SELECT id FROM free_lease
     LIMIT 1
 )
 UPDATE networks_ip_leases unil
@@ -111,10 +99,153 @@ SET mac_address     = %(mac_address)s::macaddr,
     session_id      = %(session_id)s::uuid,
     radius_username = %(radius_uname)s
 WHERE unil.id IN (SELECT id FROM lease)
-RETURNING (SELECT ip_address FROM lease);
+RETURNING unil.ip_address;
+"""
+
+# Guest lease of the same mac is preferred, else never used lease,
+# else lease stopped long ago. Stopped guest leases keep their mac
+# until 'periodically_checks_for_stale_leases' frees them, so they
+# must be reusable, or guest pool runs out.
+_ASSIGN_GLOBAL_GUEST_LEASE_SQL = """WITH own_lease(id) AS (
+    SELECT nil.id
+    FROM networks_ip_leases nil
+             JOIN networks_ip_pool nip ON (nil.pool_id = nip.id)
+    WHERE nip.kind = %(pool_kind)s::smallint
+      AND nil.customer_id IS NULL
+      AND nil.mac_address = %(mac_address)s::macaddr
+      AND nil.state = false
+    LIMIT 1
+    FOR UPDATE OF nil SKIP LOCKED
+), free_lease(id) AS (
+    SELECT nil.id
+    FROM networks_ip_leases nil
+             JOIN networks_ip_pool nip ON (nil.pool_id = nip.id)
+    WHERE nip.kind = %(pool_kind)s::smallint
+      AND nil.customer_id IS NULL
+      AND nil.state = false
+    ORDER BY nil.mac_address IS NOT NULL, nil.last_update NULLS FIRST
+    LIMIT 1
+    FOR UPDATE OF nil SKIP LOCKED
+), lease(id) AS (
+    SELECT id FROM own_lease
+    UNION ALL
+    SELECT id FROM free_lease
+    LIMIT 1
+)
+UPDATE networks_ip_leases unil
+SET mac_address     = %(mac_address)s::macaddr,
+    state           = true,
+    input_octets    = 0,
+    output_octets   = 0,
+    input_packets   = 0,
+    output_packets  = 0,
+    cvid            = %(cvid)s::smallint,
+    svid            = %(svid)s::smallint,
+    lease_time      = %(now)s::timestamp,
+    last_update     = %(now)s::timestamp,
+    session_id      = %(session_id)s::uuid,
+    radius_username = %(radius_uname)s
+WHERE unil.id IN (SELECT id FROM lease)
+RETURNING unil.ip_address;
 """
+
+_DEVICE_CREDENTIALS_LOOKUP_SQL = (
+    "SELECT ba.id, "
+      "ba.username, "
+      "ba.is_active, "
+      "cs.balance, "
+      "cs.is_dynamic_ip, "
+      "cs.auto_renewal_service, "
+      "cs.current_service_id, "
+      "cs.dev_port_id, "
+      "cs.device_id, "
+      "cs.gateway_id, "
+      "srv.speed_in, "
+      "srv.speed_out, "
+      "srv.speed_burst, "
+      "nip.ip_address, "
+      "nip.mac_address, "
+      "nip.is_dynamic "
+    "FROM customers cs "
+      "LEFT JOIN device dv ON (dv.id = cs.device_id) "
+      "LEFT JOIN device_port dp ON (cs.dev_port_id = dp.id) "
+      "LEFT JOIN device_dev_type_is_use_dev_port ddtiudptiu ON (ddtiudptiu.dev_type = dv.dev_type) "
+      "LEFT JOIN base_accounts ba ON cs.baseaccount_ptr_id = ba.id "
+      "LEFT JOIN customer_service custsrv ON custsrv.id = cs.current_service_id "
+      "LEFT JOIN services srv ON srv.id = custsrv.service_id "
+      "LEFT JOIN networks_ip_leases nip ON ( "
+        "nip.customer_id = cs.baseaccount_ptr_id AND ( "
+          "nip.mac_address = %s::MACADDR OR nip.mac_address IS NULL "
+        ") "
+      ") "
+    "WHERE dv.mac_addr = %s::MACADDR "
+    "AND ((NOT ddtiudptiu.is_use_dev_port) OR dp.num = %s::SMALLINT) "
+    "LIMIT 1;"
+)
+
+_MAC_LOOKUP_SQL = (
+    "SELECT ba.id, "
+      "ba.username, "
+      "ba.is_active, "
+      "cs.balance, "
+      "cs.is_dynamic_ip, "
+      "cs.auto_renewal_service, "
+      "cs.current_service_id, "
+      "cs.dev_port_id, "
+      "cs.device_id, "
+      "cs.gateway_id, "
+      "srv.speed_in, "
+      "srv.speed_out, "
+      "srv.speed_burst, "
+      "nip.ip_address, "
+      "nip.mac_address, "
+      "false "
+    "FROM customers cs "
+      "LEFT JOIN base_accounts ba ON cs.baseaccount_ptr_id = ba.id "
+      "LEFT JOIN customer_service custsrv ON custsrv.id = cs.current_service_id "
+      "LEFT JOIN services srv ON srv.id = custsrv.service_id "
+      "LEFT JOIN networks_ip_leases nip ON nip.customer_id = cs.baseaccount_ptr_id "
+    "WHERE "
+      "nip.mac_address = %s::MACADDR "
+    "LIMIT 1;"
+)
+
+
+def _acct_unknown(_, tx=''):
+    logger.error('Unknown acct: %s' % tx)
+    return _bad_ret("Bad Acct-Status-Type: %s" % tx, custom_status=status.HTTP_200_OK)
+
+
+def _assign_global_guest_lease(customer_mac, vlan_id: Optional[int], svid: Optional[int],
+                               now: datetime, session_id: Optional[str], radius_username: Optional[str]):
+    """Create global guest lease without customer"""
+
     with connection.cursor() as cur:
-        cur.execute(sql, {
+        cur.execute(_ASSIGN_GLOBAL_GUEST_LEASE_SQL, {
+            'pool_kind': NetworkIpPoolKind.NETWORK_KIND_GUEST.value,
+            'mac_address': str(customer_mac),
+            'cvid': vlan_id,
+            'svid': svid,
+            'now': now,
+            'session_id': session_id,
+            'radius_uname': radius_username,
+        })
+        r = cur.fetchone()
+    if r and r[0]:
+        return CustomerServiceLeaseResult(
+            ip_address=r[0]
+        )
+    raise BadRetException(
+        detail='Failed to assign guest address',
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+    )
+
+
+def _find_and_assign_lease(customer_mac: EUI, pool_kind: NetworkIpPoolKind,
+                           customer_id: int, vlan_id: int, service_vlan_id: int,
+                           radius_unique_id: str, radius_username: str):
+    with connection.cursor() as cur:
+        cur.execute(_FIND_AND_ASSIGN_LEASE_SQL, {
             'mac_address': str(customer_mac),
             'customer_id': customer_id,
             'cvid': vlan_id,
@@ -131,11 +262,26 @@ RETURNING (SELECT ip_address FROM lease);
     return None
 
 
-@router.post('/auth/{vendor_name}/')
-def auth(vendor_name: str, request_data: Mapping[str, Any] = Body(...)):
-    # Just find customer by credentials from request
-    vendor_manager = VendorManager(vendor_name=vendor_name)
+class AuthOp(str, Enum):
+    """Db and cache operations, that auth flow asks for"""
+    CACHE_GET = 'cache_get'
+    GET_BY_DEVICE_CREDENTIALS = 'get_by_device_credentials'
+    GET_BY_MAC = 'get_by_mac'
+    ASSIGN_GLOBAL_GUEST_LEASE = 'assign_global_guest_lease'
+    FIND_AND_ASSIGN_LEASE = 'find_and_assign_lease'
+    UPDATE_LEASE_SEND_WS_SIGNAL = 'update_lease_send_ws_signal'
+
+
+AuthFlow = Generator[tuple[AuthOp, dict], Any, Response]
 
+
+def auth_flow(vendor_manager: VendorManager, request_data: Mapping[str, Any]) -> AuthFlow:
+    """
+    Decision logic of radius auth, shared by sync and async auth endpoints.
+    Yields operation with its kwargs, and receives its result, so caller
+    decides how to run db queries. Exception of operation must be thrown
+    into generator. Returns auth response.
+    """
     opt82 = vendor_manager.get_opt82(data=request_data)
     if not opt82:
         return _bad_ret("Failed fetch opt82 info")
@@ -151,6 +297,15 @@ def auth(vendor_name: str, request_data: Mapping[str, Any] = Body(...)):
     radius_username = vendor_manager.get_radius_username(request_data)
     now = datetime.now()
 
+    guest_lease_kwargs = {
+        'customer_mac': customer_mac,
+        'vlan_id': vlan_id,
+        'svid': service_vlan_id,
+        'now': now,
+        'session_id': radius_unique_id,
+        'radius_username': radius_username
+    }
+
     if all([agent_remote_id, agent_circuit_id]):
         dev_mac, dev_port = vendor_manager.build_dev_mac_by_opt82(
             agent_remote_id=agent_remote_id,
@@ -159,63 +314,59 @@ def auth(vendor_name: str, request_data: Mapping[str, Any] = Body(...)):
         if not dev_mac:
             return _bad_ret("Failed to parse option82")
 
-        db_info = _get_customer_and_service_and_lease_by_device_credentials(
+        cache_key = auth_cache.device_credentials_key(
             device_mac=dev_mac,
-            customer_mac=customer_mac,
-            device_port=dev_port
+            device_port=dev_port,
+            customer_mac=customer_mac
         )
+        db_info = yield AuthOp.CACHE_GET, {'key': cache_key}
+        if db_info is None:
+            db_info = yield AuthOp.GET_BY_DEVICE_CREDENTIALS, {
+                'device_mac': dev_mac,
+                'customer_mac': customer_mac,
+                'device_port': dev_port
+            }
+            auth_cache.set(cache_key, db_info)
 
         if db_info is None:
-            db_info = _assign_global_guest_lease(
-                customer_mac=customer_mac,
-                vlan_id=vlan_id,
-                svid=service_vlan_id,
-                now=now,
-                session_id=radius_unique_id,
-                radius_username=radius_username
-            )
+            db_info = yield AuthOp.ASSIGN_GLOBAL_GUEST_LEASE, guest_lease_kwargs
         if not db_info.ip_address:
             # assign new lease
             #  with transaction.atomic():
             # find one free lease, and update it for customer
-            db_info.ip_address = _find_and_assign_lease(
-                customer_mac=customer_mac,
-                pool_kind=NetworkIpPoolKind.NETWORK_KIND_INTERNET,
-                customer_id=db_info.id,
-                vlan_id=vlan_id,
-                service_vlan_id=service_vlan_id,
-                radius_unique_id=radius_unique_id,
-                radius_username=radius_username
-            )
+            db_info.ip_address = yield AuthOp.FIND_AND_ASSIGN_LEASE, {
+                'customer_mac': customer_mac,
+                'pool_kind': NetworkIpPoolKind.NETWORK_KIND_INTERNET,
+                'customer_id': db_info.id,
+                'vlan_id': vlan_id,
+                'service_vlan_id': service_vlan_id,
+                'radius_unique_id': radius_unique_id,
+                'radius_username': radius_username
+            }
             db_info.mac_address = customer_mac
     else:
         # auth by mac. Find static lease.
-        db_info = _get_customer_and_service_and_lease_by_mac(
-            customer_mac=customer_mac
-        )
+        cache_key = auth_cache.customer_mac_key(customer_mac=customer_mac)
+        db_info = yield AuthOp.CACHE_GET, {'key': cache_key}
+        if db_info is None:
+            db_info = yield AuthOp.GET_BY_MAC, {'customer_mac': customer_mac}
+            auth_cache.set(cache_key, db_info)
         if db_info is None:
             #  Create global guest lease without customer
-            db_info = _assign_global_guest_lease(
-                customer_mac=customer_mac,
-                vlan_id=vlan_id,
-                svid=service_vlan_id,
-                now=now,
-                session_id=radius_unique_id,
-                radius_username=radius_username
-            )
+            db_info = yield AuthOp.ASSIGN_GLOBAL_GUEST_LEASE, guest_lease_kwargs
 
     # If ip does not exists, then assign guest lease
     if not db_info.ip_address:
         # assign new guest lease
-        db_info.ip_address = _find_and_assign_lease(
-            customer_mac=customer_mac,
-            pool_kind=NetworkIpPoolKind.NETWORK_KIND_GUEST,
-            customer_id=db_info.id,
-            vlan_id=vlan_id,
-            service_vlan_id=service_vlan_id,
-            radius_unique_id=radius_unique_id,
-            radius_username=radius_username,
-        )
+        db_info.ip_address = yield AuthOp.FIND_AND_ASSIGN_LEASE, {
+            'customer_mac': customer_mac,
+            'pool_kind': NetworkIpPoolKind.NETWORK_KIND_GUEST,
+            'customer_id': db_info.id,
+            'vlan_id': vlan_id,
+            'service_vlan_id': service_vlan_id,
+            'radius_unique_id': radius_unique_id,
+            'radius_username': radius_username,
+        }
         db_info.mac_address = customer_mac
 
     if not db_info.ip_address:
@@ -234,14 +385,35 @@ def auth(vendor_name: str, request_data: Mapping[str, Any] = Body(...)):
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         response, code = r
-        _update_lease_send_ws_signal(
-            customer_id=db_info.id
-        )
+        yield AuthOp.UPDATE_LEASE_SEND_WS_SIGNAL, {'customer_id': db_info.id}
         return JSONResponse(response, status_code=code)
     except (LogicError, BadRetException) as err:
         return _bad_ret(f'{str(err)}')
 
 
+@router.post('/auth/{vendor_name}/')
+def auth(vendor_name: str, request_data: Mapping[str, Any] = Body(...)):
+    # Just find customer by credentials from request
+    vendor_manager = VendorManager(vendor_name=vendor_name)
+    flow = auth_flow(vendor_manager=vendor_manager, request_data=request_data)
+    try:
+        op, kwargs = next(flow)
+        while True:
+            try:
+                res = _AUTH_OPS[op](**kwargs)
+            except Exception as err:
+                op, kwargs = flow.throw(err)
+            else:
+                op, kwargs = flow.send(res)
+    except StopIteration as stop:
+        return stop.value
+
+
+@router.get('/auth_cache_stats/')
+def auth_cache_stats():
+    return auth_cache.stats()
+
+
 @router.post('/get_service/')
 def get_service(data: CustomerServiceRequestSchema):
     customer_ip = data.customer_ip
@@ -348,41 +520,11 @@ def _build_srv_result_from_db_result(row: tuple) -> CustomerServiceLeaseResult:
 def _get_customer_and_service_and_lease_by_device_credentials(
     device_mac: EUI, customer_mac: EUI, device_port: int = 0
 ) -> Optional[CustomerServiceLeaseResult]:
-    sql = (
-        "SELECT ba.id, "
-          "ba.username, "
-          "ba.is_active, "
-          "cs.balance, "
-          "cs.is_dynamic_ip, "
-          "cs.auto_renewal_service, "
-          "cs.current_service_id, "
-          "cs.dev_port_id, "
-          "cs.device_id, "
-          "cs.gateway_id, "
-          "srv.speed_in, "
-          "srv.speed_out, "
-          "srv.speed_burst, "
-          "nip.ip_address, "
-          "nip.mac_address, "
-          "nip.is_dynamic "
-        "FROM customers cs "
-          "LEFT JOIN device dv ON (dv.id = cs.device_id) "
-          "LEFT JOIN device_port dp ON (cs.dev_port_id = dp.id) "
-          "LEFT JOIN device_dev_type_is_use_dev_port ddtiudptiu ON (ddtiudptiu.dev_type = dv.dev_type) "
-          "LEFT JOIN base_accounts ba ON cs.baseaccount_ptr_id = ba.id "
-          "LEFT JOIN customer_service custsrv ON custsrv.id = cs.current_service_id "
-          "LEFT JOIN services srv ON srv.id = custsrv.service_id "
-          "LEFT JOIN networks_ip_leases nip ON ( "
-            "nip.customer_id = cs.baseaccount_ptr_id AND ( "
-              "nip.mac_address = %s::MACADDR OR nip.mac_address IS NULL "
-            ") "
-          ") "
-        "WHERE dv.mac_addr = %s::MACADDR "
-        "AND ((NOT ddtiudptiu.is_use_dev_port) OR dp.num = %s::SMALLINT) "
-        "LIMIT 1;"
-    )
     with connection.cursor() as cur:
-        cur.execute(sql=sql, params=[str(customer_mac), str(device_mac), device_port])
+        cur.execute(
+            sql=_DEVICE_CREDENTIALS_LOOKUP_SQL,
+            params=[str(customer_mac), str(device_mac), device_port]
+        )
         row = cur.fetchone()
     if not row:
         return None
@@ -392,40 +534,24 @@ def _get_customer_and_service_and_lease_by_device_credentials(
 def _get_customer_and_service_and_lease_by_mac(
     customer_mac: EUI
 ) -> Optional[CustomerServiceLeaseResult]:
-    sql = (
-        "SELECT ba.id, "
-          "ba.username, "
-          "ba.is_active, "
-          "cs.balance, "
-          "cs.is_dynamic_ip, "
-          "cs.auto_renewal_service, "
-          "cs.current_service_id, "
-          "cs.dev_port_id, "
-          "cs.device_id, "
-          "cs.gateway_id, "
-          "srv.speed_in, "
-          "srv.speed_out, "
-          "srv.speed_burst, "
-          "nip.ip_address, "
-          "nip.mac_address, "
-          "false "
-        "FROM customers cs "
-          "LEFT JOIN base_accounts ba ON cs.baseaccount_ptr_id = ba.id "
-          "LEFT JOIN customer_service custsrv ON custsrv.id = cs.current_service_id "
-          "LEFT JOIN services srv ON srv.id = custsrv.service_id "
-          "LEFT JOIN networks_ip_leases nip ON nip.customer_id = cs.baseaccount_ptr_id "
-        "WHERE "
-          "nip.mac_address = %s::MACADDR "
-        "LIMIT 1;"
-    )
     with connection.cursor() as cur:
-        cur.execute(sql=sql, params=[str(customer_mac)])
+        cur.execute(sql=_MAC_LOOKUP_SQL, params=[str(customer_mac)])
         row = cur.fetchone()
     if not row:
         return None
     return _build_srv_result_from_db_result(row=row)
 
 
+_AUTH_OPS: dict[AuthOp, Callable] = {
+    AuthOp.CACHE_GET: auth_cache.get,
+    AuthOp.GET_BY_DEVICE_CREDENTIALS: _get_customer_and_service_and_lease_by_device_credentials,
+    AuthOp.GET_BY_MAC: _get_customer_and_service_and_lease_by_mac,
+    AuthOp.ASSIGN_GLOBAL_GUEST_LEASE: _assign_global_guest_lease,
+    AuthOp.FIND_AND_ASSIGN_LEASE: _find_and_assign_lease,
+    AuthOp.UPDATE_LEASE_SEND_WS_SIGNAL: _update_lease_send_ws_signal,
+}
+
+
 def _update_counters(leases, counters: RadiusCounters,
                      last_event_time=None, **update_kwargs):
     if last_event_time is None:
@@ -623,6 +749,39 @@ def _acct_update(vendor_manager: VendorManager, request_data: Mapping[str, Any])
         )
     ip = vendor_manager.get_rad_val(request_data, "Framed-IP-Address", str)
     now = datetime.now()
+
+    if ip and acct_update_batcher.enabled:
+        # Ack immediately, counters will be stored by batcher
+        acct_update_batcher.push(AcctUpdateRecord(
+            vendor_name=vendor_manager.vendor_class.vendor,
+            request_data=request_data,
+            ip_address=ip,
+            customer_mac=customer_mac,
+            radius_username=radius_username,
+            radius_unique_id=radius_unique_id,
+            counters=vendor_manager.get_counters(request_data),
+            event_time=now
+        ))
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    _acct_update_lease(
+        vendor_manager=vendor_manager,
+        request_data=request_data,
+        now=now
+    )
+    check_if_lease_have_id_db_task.delay(
+        radius_uname=radius_username
+    )
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+def _acct_update_lease(vendor_manager: VendorManager, request_data: Mapping[str, Any],
+                       now: datetime) -> None:
+    radius_unique_id = vendor_manager.get_radius_unique_id(request_data)
+    customer_mac = vendor_manager.get_customer_mac(request_data)
+    radius_username = vendor_manager.get_radius_username(request_data)
+    ip = vendor_manager.get_rad_val(request_data, "Framed-IP-Address", str)
     counters = vendor_manager.get_counters(request_data)
 
     customer = _find_customer(data=request_data, vendor_manager=vendor_manager)
@@ -660,30 +819,73 @@ def _acct_update(vendor_manager: VendorManager, request_data: Mapping[str, Any])
             cvid=safe_int(vlan_id)
         )
 
-    # Check for service synchronization
+    _sync_bras_session(
+        vendor_manager=vendor_manager,
+        request_data=request_data,
+        customer=customer,
+    )
+    custom_signals.radius_auth_update_signal.send(
+        sender=CustomerIpLeaseModel,
+        instance=None,
+        instance_queryset=leases,
+        data=request_data,
+        counters=counters,
+        radius_unique_id=radius_unique_id,
+        ip_addr=ip,
+        customer_mac=customer_mac
+    )
+
+
+def _sync_bras_session(vendor_manager: VendorManager, request_data: Mapping[str, Any],
+                       customer: Customer,
+                       coa_requests: Optional[list[CoARequest]] = None) -> None:
+    """
+    Check for service synchronization.
+
+    :param coa_requests: When passed, CoA requests appends to it instead
+                         of sending by separate task for each session.
+    """
     bras_service_name = vendor_manager.get_rad_val(request_data, "ERX-Service-Session", str)
-    if isinstance(bras_service_name, str):
-        if 'SERVICE-INET' in bras_service_name:
-            # bras contain inet session
-            if not customer.is_access():
-                logger.info("COA: inet->guest uname=%s" % radius_username)
+    if not isinstance(bras_service_name, str):
+        return
+    radius_username = vendor_manager.get_radius_username(request_data)
+    if 'SERVICE-INET' in bras_service_name:
+        # bras contain inet session
+        if not customer.is_access():
+            logger.info("COA: inet->guest uname=%s" % radius_username)
+            if coa_requests is not None:
+                coa_requests.append(CoARequest(
+                    uname=radius_username,
+                    action=CoAAction.INET2GUEST
+                ))
+            else:
                 async_change_session_inet2guest.delay(
                     radius_uname=radius_username
                 )
-        elif 'SERVICE-GUEST' in bras_service_name:
-            # bras contain guest session
-            # TODO: optimize
-            if customer.is_access():
-                logger.info("COA: guest->inet uname=%s" % radius_username)
-                customer_service = customer.active_service()
-                service = customer_service.service
-                speed = SpeedInfoStruct(
-                    speed_in=float(service.speed_in),
-                    speed_out=float(service.speed_out),
-                    burst_in=float(service.speed_burst),
-                    burst_out=float(service.speed_burst),
-                )
-                speed = vendor_manager.get_speed(speed=speed)
+    elif 'SERVICE-GUEST' in bras_service_name:
+        # bras contain guest session
+        # TODO: optimize
+        if customer.is_access():
+            logger.info("COA: guest->inet uname=%s" % radius_username)
+            customer_service = customer.active_service()
+            service = customer_service.service
+            speed = SpeedInfoStruct(
+                speed_in=float(service.speed_in),
+                speed_out=float(service.speed_out),
+                burst_in=float(service.speed_burst),
+                burst_out=float(service.speed_burst),
+            )
+            speed = vendor_manager.get_speed(speed=speed)
+            if coa_requests is not None:
+                coa_requests.append(CoARequest(
+                    uname=radius_username,
+                    action=CoAAction.GUEST2INET,
+                    speed_in=int(speed.speed_in),
+                    speed_out=int(speed.speed_out),
+                    speed_in_burst=int(speed.burst_in),
+                    speed_out_burst=int(speed.burst_out)
+                ))
+            else:
                 async_change_session_guest2inet.delay(
                     radius_uname=radius_username,
                     speed_in=speed.speed_in,
@@ -691,21 +893,95 @@ def _acct_update(vendor_manager: VendorManager, request_data: Mapping[str, Any])
                     speed_in_burst=speed.burst_in,
                     speed_out_burst=speed.burst_out
                 )
-        custom_signals.radius_auth_update_signal.send(
+
+
+def _set_records_customers(records: list[AcctUpdateRecord]) -> None:
+    """
+    Find customer of each record by opt82, as _find_customer does,
+    but for all records by one query.
+    """
+    credentials = []
+    credentials_records = []
+    for rec in records:
+        vendor_manager = VendorManager(vendor_name=rec.vendor_name)
+        opt82 = vendor_manager.get_opt82(data=rec.request_data)
+        if not opt82 or not all(opt82):
+            # record is processed as usual, and error is logged there
+            continue
+        agent_remote_id, agent_circuit_id = opt82
+        dev_mac, dev_port = vendor_manager.build_dev_mac_by_opt82(
+            agent_remote_id=agent_remote_id,
+            agent_circuit_id=agent_circuit_id
+        )
+        if not dev_mac:
+            continue
+        credentials.append((dev_mac, dev_port))
+        credentials_records.append(rec)
+    customer_ids = CustomerIpLeaseModel.find_customer_ids_by_device_credentials(credentials)
+    for rec, customer_id in zip(credentials_records, customer_ids):
+        rec.customer_id = customer_id
+
+
+def _flush_acct_updates(records: list[AcctUpdateRecord]) -> None:
+    """Store batched Interim-Update records."""
+    _set_records_customers(records)
+    updated_leases = bulk_update_lease_counters(records)
+
+    customers = Customer.objects.filter(
+        pk__in=set(updated_leases.values())
+    ).select_related('current_service__service')
+    customers = {c.pk: c for c in customers}
+
+    coa_requests: list[CoARequest] = []
+    updated_records: list[AcctUpdateRecord] = []
+    for rec in records:
+        vendor_manager = VendorManager(vendor_name=rec.vendor_name)
+        customer = customers.get(updated_leases.get(rec.ip_address))
+        try:
+            if customer is None:
+                # Lease not found by ip and mac, process record as usual
+                _acct_update_lease(
+                    vendor_manager=vendor_manager,
+                    request_data=rec.request_data,
+                    now=rec.event_time
+                )
+            else:
+                _sync_bras_session(
+                    vendor_manager=vendor_manager,
+                    request_data=rec.request_data,
+                    customer=customer,
+                    coa_requests=coa_requests,
+                )
+                updated_records.append(rec)
+        except BadRetException as err:
+            logger.error('Batched acct update: %s' % err)
+
+    if updated_records:
+        custom_signals.radius_acct_update_batch_signal.send(
             sender=CustomerIpLeaseModel,
-            instance=None,
-            instance_queryset=leases,
-            data=request_data,
-            counters=counters,
-            radius_unique_id=radius_unique_id,
-            ip_addr=ip,
-            customer_mac=customer_mac
+            records=updated_records,
+            customers=customers
         )
-    check_if_lease_have_id_db_task.delay(
-        radius_uname=radius_username
-    )
 
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
+    # Drop sessions that have no lease in db, as check_if_lease_have_id_db_task does
+    unames = {rec.radius_username for rec in records}
+    existing_unames = set(CustomerIpLeaseModel.objects.filter(
+        radius_username__in=unames
+    ).values_list('radius_username', flat=True))
+    for uname in unames - existing_unames:
+        logger.warning('ORPHAN lease drop uname="%s"' % uname)
+        coa_requests.append(CoARequest(
+            uname=uname,
+            action=CoAAction.DISCONNECT
+        ))
+
+    if coa_requests:
+        async_bulk_coa_task.delay(
+            requests=[r.as_dict() for r in coa_requests]
+        )
+
+
+acct_update_batcher = AcctUpdateBatcher(flush_fn=_flush_acct_updates)
 
 
 _acct_status_type_map = {
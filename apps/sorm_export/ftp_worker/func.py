@@ -1,9 +1,14 @@
+import os
 from io import TextIOWrapper
-from ftplib import FTP
+from ftplib import FTP, all_errors
+from time import monotonic
+from typing import Callable
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
-from sorm_export.models import ExportFailedStatus
+from sorm_export.ftp_worker.metrics import record_upload
+from sorm_export.ftp_worker.pool import FtpSessionPool
+from sorm_export.models import ExportFailedStatus, ExportStampTypeEnum
 
 
 def get_credentials():
@@ -19,56 +24,95 @@ def get_credentials():
     }
 
 
-def _ftp_credentials(fn):
-    def _wrapper(*args, **kwargs):
-        cred = get_credentials()
-        if cred['ftp_disable']:
-            return fn(ftp=None, *args, **kwargs)
-        ftp = FTP()
-        try:
-            ftp.connect(
-                host=cred['ftp_host'],
-                port=cred['ftp_port']
-            )
-            ftp.login(
-                user=cred['ftp_uname'],
-                passwd=cred['ftp_passw']
-            )
-            return fn(ftp=ftp, *args, **kwargs)
-        finally:
-            ftp.close()
-
-    return _wrapper
-
-
-@_ftp_credentials
-def _send_buffer_as_file(fp: TextIOWrapper, remote_fname: str, _bin_mode=True, ftp=None) -> None:
+def _ftp_connect() -> FTP:
     cred = get_credentials()
-    if cred['ftp_disable']:
-        return
-    if ftp is None:
+    ftp = FTP()
+    try:
+        ftp.connect(
+            host=cred['ftp_host'],
+            port=cred['ftp_port']
+        )
+        ftp.login(
+            user=cred['ftp_uname'],
+            passwd=cred['ftp_passw']
+        )
+    except all_errors:
+        ftp.close()
+        raise
+    return ftp
+
+
+ftp_pool = FtpSessionPool(
+    connect=_ftp_connect,
+    max_size=getattr(settings, 'SORM_EXPORT_FTP_POOL_SIZE', 4),
+    keepalive_interval=getattr(settings, 'SORM_EXPORT_FTP_KEEPALIVE', 30),
+)
+# Sessions of parent process must not be used in forked
+# processes, i.e. in celery workers or export_all jobs.
+os.register_at_fork(after_in_child=ftp_pool.reset)
+
+
+def _upload(store: Callable[[FTP, Callable[[bytes], None]], None], repeatable: bool,
+            export_type: ExportStampTypeEnum) -> None:
+    """
+    Upload by pooled ftp session, and record upload metrics.
+
+    :param store: Makes upload by ftp session, calls callback for each sent block.
+    :param repeatable: Can store be called once more, when reused session is broken.
+    """
+    if get_credentials()['ftp_disable']:
         return
-    if _bin_mode:
-        ftp.storbinary("STOR %s" % remote_fname, fp)
-    else:
-        ftp.storlines("STOR %s" % remote_fname, fp)
+    size = 0
+
+    def _count(block: bytes):
+        nonlocal size
+        size += len(block)
 
+    def _store(ftp: FTP):
+        nonlocal size
+        size = 0
+        store(ftp, _count)
 
-def send_bin_buf2ftp(fp: TextIOWrapper, remote_fname: str) -> None:
-    _send_buffer_as_file(fp=fp, remote_fname=remote_fname, _bin_mode=True)
+    start_time = monotonic()
+    try:
+        ftp_pool.run(_store, retry=repeatable)
+    except all_errors:
+        record_upload(export_type=export_type, latency=monotonic() - start_time, size=size, failed=True)
+        raise
+    record_upload(export_type=export_type, latency=monotonic() - start_time, size=size, failed=False)
 
 
-def send_text_buf2ftp(fp: TextIOWrapper, remote_fname: str) -> None:
-    _send_buffer_as_file(fp=fp, remote_fname=remote_fname, _bin_mode=False)
+def _send_buffer_as_file(fp: TextIOWrapper, remote_fname: str, _bin_mode=True,
+                         export_type: ExportStampTypeEnum = ExportStampTypeEnum.UNKNOWN_CHOICE) -> None:
+    start_pos = fp.tell() if fp.seekable() else None
 
+    def _store(ftp: FTP, callback):
+        if start_pos is not None:
+            fp.seek(start_pos)
+        if _bin_mode:
+            ftp.storbinary("STOR %s" % remote_fname, fp, callback=callback)
+        else:
+            ftp.storlines("STOR %s" % remote_fname, fp, callback=callback)
 
-@_ftp_credentials
-def send_file2ftp(fname: str, remote_fname: str, ftp=None) -> None:
-    cred = get_credentials()
-    if cred['ftp_disable']:
+    _upload(_store, repeatable=start_pos is not None, export_type=export_type)
+
+
+def send_bin_buf2ftp(fp: TextIOWrapper, remote_fname: str,
+                     export_type: ExportStampTypeEnum = ExportStampTypeEnum.UNKNOWN_CHOICE) -> None:
+    _send_buffer_as_file(fp=fp, remote_fname=remote_fname, _bin_mode=True, export_type=export_type)
+
+
+def send_text_buf2ftp(fp: TextIOWrapper, remote_fname: str,
+                      export_type: ExportStampTypeEnum = ExportStampTypeEnum.UNKNOWN_CHOICE) -> None:
+    _send_buffer_as_file(fp=fp, remote_fname=remote_fname, _bin_mode=False, export_type=export_type)
+
+
+def send_file2ftp(fname: str, remote_fname: str,
+                  export_type: ExportStampTypeEnum = ExportStampTypeEnum.UNKNOWN_CHOICE) -> None:
+    if get_credentials()['ftp_disable']:
         return
     try:
         with open(fname, "rb") as file:
-            ftp.storbinary("STOR %s" % remote_fname, file)
+            _send_buffer_as_file(fp=file, remote_fname=remote_fname, _bin_mode=True, export_type=export_type)
     except FileNotFoundError as err:
         raise ExportFailedStatus(err) from err
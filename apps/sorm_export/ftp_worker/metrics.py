@@ -0,0 +1,61 @@
+from dataclasses import dataclass
+from typing import Iterable
+
+from redis import RedisError
+
+from djing2.lib.logger import logger
+from djing2.lib.redis import redis_proxy
+from sorm_export.models import ExportStampTypeEnum
+
+
+FTP_UPLOAD_METRICS_KEY = 'sorm_export_ftp_%s_%d'
+
+
+@dataclass
+class FtpUploadMetrics:
+    export_type: int
+    uploads: int = 0
+    failures: int = 0
+    bytes: int = 0
+    # sum of all uploads durations
+    latency_ms: int = 0
+
+    @property
+    def avg_latency_ms(self) -> float:
+        if self.uploads > 0:
+            return self.latency_ms / self.uploads
+        return 0.0
+
+    @classmethod
+    def load(cls, export_type: ExportStampTypeEnum) -> 'FtpUploadMetrics':
+        return cls.load_all(export_types=(export_type,))[0]
+
+    @classmethod
+    def load_all(cls, export_types: Iterable[ExportStampTypeEnum] = ExportStampTypeEnum) -> list['FtpUploadMetrics']:
+        """Metrics of all export types, by one MGET"""
+        export_types = [int(t) for t in export_types]
+        names = ('uploads', 'failures', 'bytes', 'latency_ms')
+        values = iter(redis_proxy.mget(*(
+            FTP_UPLOAD_METRICS_KEY % (name, export_type) for export_type in export_types for name in names
+        )))
+        return [
+            cls(export_type=export_type, **{name: int(next(values) or 0) for name in names})
+            for export_type in export_types
+        ]
+
+
+def record_upload(export_type: ExportStampTypeEnum, latency: float, size: int, failed: bool) -> None:
+    """
+    Count upload for export type. Metrics must not break export,
+    so redis errors are only logged.
+    """
+    export_type = int(export_type)
+    try:
+        if failed:
+            redis_proxy.incr(FTP_UPLOAD_METRICS_KEY % ('failures', export_type))
+            return
+        redis_proxy.incr(FTP_UPLOAD_METRICS_KEY % ('uploads', export_type))
+        redis_proxy.incr(FTP_UPLOAD_METRICS_KEY % ('bytes', export_type), amount=int(size))
+        redis_proxy.incr(FTP_UPLOAD_METRICS_KEY % ('latency_ms', export_type), amount=int(latency * 1000))
+    except RedisError as err:
+        logger.error('Failed to record ftp upload metrics: %s' % err)
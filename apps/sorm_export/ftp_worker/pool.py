@@ -0,0 +1,198 @@
+"""
+Pool of logged in ftp sessions.
+
+Connect and login to ftp server takes several round trips, that is much
+longer than upload of small export file. So sessions are kept between
+uploads, idle sessions are kept alive by NOOP, and broken sessions are
+reconnected.
+"""
+import threading
+from contextlib import contextmanager
+from ftplib import FTP, all_errors
+from time import monotonic
+from typing import Callable, Optional, TypeVar
+
+from sorm_export.models import ExportFailedStatus
+
+
+T = TypeVar('T')
+
+
+class FtpPoolExhausted(ExportFailedStatus):
+    pass
+
+
+class _Session:
+    __slots__ = ('ftp', 'last_used')
+
+    def __init__(self, ftp: FTP):
+        self.ftp = ftp
+        self.last_used = monotonic()
+
+
+class FtpSessionPool:
+    def __init__(self, connect: Callable[[], FTP], max_size: int = 4,
+                 keepalive_interval: float = 30.0, acquire_timeout: float = 60.0):
+        """
+        :param connect: Returns new logged in ftp session.
+        :param max_size: Max sessions count, idle and in use.
+        :param keepalive_interval: Seconds after that idle session is checked by NOOP.
+        :param acquire_timeout: Seconds to wait free session, when all of them are in use.
+        """
+        self._connect = connect
+        self.max_size = max(1, int(max_size))
+        self.keepalive_interval = float(keepalive_interval)
+        self.acquire_timeout = float(acquire_timeout)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget all sessions without closing them.
+        Called in forked child, sessions sockets belongs to parent process.
+        """
+        self._cond = threading.Condition()
+        self._idle: list[_Session] = []
+        # idle sessions and sessions in use
+        self._size = 0
+        self._stop = threading.Event()
+        self._keepalive_thread: Optional[threading.Thread] = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    def _alive(self, session: _Session) -> bool:
+        if monotonic() - session.last_used < self.keepalive_interval:
+            return True
+        try:
+            session.ftp.voidcmd('NOOP')
+        except all_errors:
+            session.ftp.close()
+            return False
+        session.last_used = monotonic()
+        return True
+
+    def _discard(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _release(self, session: _Session) -> None:
+        session.last_used = monotonic()
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+        self._start_keepalive()
+
+    def _acquire(self) -> tuple[_Session, bool]:
+        """
+        :return: session, and is it reused from pool.
+        """
+        deadline = monotonic() + self.acquire_timeout
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise FtpPoolExhausted('All %d ftp sessions are busy' % self.max_size)
+            if self._idle:
+                # Most recently used session is most likely alive
+                session = self._idle.pop()
+            else:
+                session = None
+                self._size += 1
+
+        if session is not None:
+            if self._alive(session):
+                return session, True
+        try:
+            return _Session(self._connect()), False
+        except BaseException:
+            self._discard()
+            raise
+
+    @contextmanager
+    def session(self):
+        """Logged in ftp session, that returns to pool on success, and closes on any error."""
+        session, _reused = self._acquire()
+        try:
+            yield session.ftp
+        except BaseException:
+            # Session state is unknown, i.e. transfer may be in progress
+            session.ftp.close()
+            self._discard()
+            raise
+        self._release(session)
+
+    def run(self, fn: Callable[[FTP], T], retry: bool = True) -> T:
+        """
+        Call fn with pooled session.
+        When reused session fails, it may be closed by server while was idle,
+        so fn is called once more with new session. fn must be repeatable then.
+        """
+        session, reused = self._acquire()
+        try:
+            res = fn(session.ftp)
+        except all_errors:
+            session.ftp.close()
+            self._discard()
+            if not (retry and reused):
+                raise
+            with self.session() as ftp:
+                return fn(ftp)
+        except BaseException:
+            session.ftp.close()
+            self._discard()
+            raise
+        self._release(session)
+        return res
+
+    def keepalive(self) -> None:
+        """Check idle sessions by NOOP, and close broken ones."""
+        now = monotonic()
+        with self._cond:
+            stale = [s for s in self._idle if now - s.last_used >= self.keepalive_interval]
+            for session in stale:
+                self._idle.remove(session)
+        for session in stale:
+            if self._alive(session):
+                with self._cond:
+                    self._idle.append(session)
+                    self._cond.notify()
+            else:
+                self._discard()
+
+    def _keepalive_loop(self, stop: threading.Event) -> None:
+        while not stop.wait(self.keepalive_interval):
+            self.keepalive()
+
+    def _start_keepalive(self) -> None:
+        if self._keepalive_thread is not None or self.keepalive_interval <= 0:
+            return
+        with self._cond:
+            if self._keepalive_thread is not None:
+                return
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop,
+                args=(self._stop,),
+                name='ftp-pool-keepalive',
+                daemon=True
+            )
+        self._keepalive_thread.start()
+
+    def close(self) -> None:
+        """Stop keepalive and close all idle sessions."""
+        self._stop.set()
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._stop = threading.Event()
+            self._keepalive_thread = None
+        for session in idle:
+            try:
+                session.ftp.quit()
+            except all_errors:
+                session.ftp.close()
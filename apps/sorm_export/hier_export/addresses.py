@@ -3,7 +3,7 @@ from addresses.fias_socrbase import AddressFIASInfo
 from addresses.models import AddressModel
 from sorm_export.serializers import individual_entity_serializers
 from sorm_export.models import ExportFailedStatus, ExportStampTypeEnum
-from .base import format_fname, ExportTree, ContinueIteration
+from .base import format_fname, ExportTree, ContinueIteration, iterate_queryset
 
 
 class AddressExportTree(ExportTree[AddressModel]):
@@ -27,7 +27,7 @@ class AddressExportTree(ExportTree[AddressModel]):
         return ExportStampTypeEnum.CUSTOMER_ADDRESS
 
     def get_items(self, queryset):
-        for item in self.filter_queryset(queryset=queryset):
+        for item in iterate_queryset(self.filter_queryset(queryset=queryset)):
             try:
                 yield self.get_item(item)
             except ContinueIteration:
@@ -2,9 +2,11 @@ import abc
 from typing import Optional, TypeVar, Generic
 from datetime import datetime
 
+from django.conf import settings
 from django.db.models import QuerySet
 from djing2.lib.logger import logger
 from rest_framework.exceptions import ValidationError
+from sorm_export.hier_export.row_validator import get_row_validator
 from sorm_export.tasks.task_export import task_export
 from sorm_export.models import ExportStampTypeEnum
 
@@ -13,6 +15,8 @@ T = TypeVar('T')
 
 _fname_date_format = '%d%m%Y%H%M%S'
 
+EXPORT_QUERYSET_CHUNK_SIZE = getattr(settings, 'SORM_EXPORT_QUERYSET_CHUNK_SIZE', 2000)
+
 
 def format_fname(fname_timestamp: Optional[datetime] = None) -> str:
     if fname_timestamp is None:
@@ -20,6 +24,18 @@ def format_fname(fname_timestamp: Optional[datetime] = None) -> str:
     return fname_timestamp.strftime(_fname_date_format)
 
 
+def iterate_queryset(queryset):
+    """
+    Fetch rows from db by chunks, instead of loading whole queryset into memory.
+    Querysets with prefetch_related can't be iterated that way, so they
+    are iterated as usual.
+    """
+    if isinstance(queryset, QuerySet) and queryset._result_cache is None \
+            and not queryset._prefetch_related_lookups:
+        return queryset.iterator(chunk_size=EXPORT_QUERYSET_CHUNK_SIZE)
+    return queryset
+
+
 class ContinueIteration(Exception):
     pass
 
@@ -55,7 +71,7 @@ class ExportTree(Generic[T]):
         raise NotImplementedError
 
     def get_items(self, queryset: QuerySet):
-        for item in self.filter_queryset(queryset=queryset):
+        for item in iterate_queryset(self.filter_queryset(queryset=queryset)):
             try:
                 r = self.get_item(item)
                 # Добавляем или обновляем к результатам дополнительные данные.
@@ -71,13 +87,11 @@ class ExportTree(Generic[T]):
         raise NotImplementedError
 
     def export(self, queryset, *args, **kwargs):
-        serializer_class = self.get_export_format_serializer()
+        validator = get_row_validator(self.get_export_format_serializer())
 
         def _val_fn(dat):
             try:
-                ser = serializer_class(data=dat)
-                ser.is_valid(raise_exception=True)
-                return ser.data
+                return validator(dat)
             except ValidationError as e:
                 logger.error("%s | %s" % (e.detail, dat))
 
@@ -23,8 +23,9 @@ from sorm_export.checks.customer import (
 from .base import (
     format_fname,
     ExportTree, ContinueIteration,
-    SimpleExportTree
+    SimpleExportTree, iterate_queryset
 )
+from .row_validator import get_row_validator
 
 
 def general_customer_all_filter_queryset():
@@ -86,9 +87,9 @@ class CustomerRootExportTree(ExportTree[Customer]):
         #  Нужно сделать типы договоров, чтоб проверять только по 'основному'.
         #  Типы договоров, например: Основной, iptv, voip, доп оборудование, и.т.д.
 
-        for customer in queryset.annotate(
+        for customer in iterate_queryset(queryset.annotate(
             legal_id=Subquery(lgl_sb)
-        ):
+        )):
             try:
                 yield self.get_item(customer)
             except ContinueIteration:
@@ -397,7 +398,7 @@ class LegalCustomerExportTree(ExportTree[CustomerLegalModel]):
         return legals
 
     def get_items(self, queryset):
-        for legal in queryset:
+        for legal in iterate_queryset(queryset):
             yield from self._iter_customers(legal)
 
     def _iter_customers(self, legal):
@@ -497,9 +498,10 @@ class ContactSimpleExportTree(SimpleExportTree):
         return ExportStampTypeEnum.CUSTOMER_CONTACT
 
     def export(self, data, many: bool, *args, **kwargs):
-        ser = individual_entity_serializers.CustomerContactObjectFormat(data=data, many=many)
-        ser.is_valid(raise_exception=True)
-        return ser.data
+        validator = get_row_validator(individual_entity_serializers.CustomerContactObjectFormat)
+        if many:
+            return validator.validate_many(data)
+        return validator(data)
 
 
 class CustomerContractExportTree(ExportTree[CustomerContractModel]):
@@ -522,7 +524,7 @@ class CustomerContractExportTree(ExportTree[CustomerContractModel]):
 
     def get_items(self, queryset):
         # Выгрузить себя
-        for item in self.filter_queryset(queryset=queryset):
+        for item in iterate_queryset(self.filter_queryset(queryset=queryset)):
             try:
                 yield self.get_item(item)
             except ContinueIteration:
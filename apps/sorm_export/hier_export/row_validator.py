@@ -0,0 +1,79 @@
+"""
+Precompiled export row validator.
+
+Validating each row by new serializer instance is expensive, because
+serializer deep copies all its declared fields on every instantiation.
+Row validator binds fields once, and then just runs them for each row,
+result is the same as serializer(data=row).data after is_valid().
+"""
+from functools import lru_cache
+from typing import Iterable, Mapping, Type
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import empty, get_error_detail, SkipField
+
+
+class RowValidator:
+    def __init__(self, serializer_class: Type[serializers.Serializer]):
+        serializer = serializer_class()
+        self.serializer_class = serializer_class
+        # (field name, field, allow_null) for fields, that takes part in validation and output
+        self._fields = tuple(
+            (name, field, field.allow_null)
+            for name, field in serializer.fields.items()
+            if not field.read_only and not field.write_only
+        )
+
+    def __call__(self, data: Mapping) -> dict:
+        """
+        Validate one row.
+
+        :raises ValidationError: with dict of field errors, like serializer.
+        """
+        ret = {}
+        errors = {}
+        for name, field, allow_null in self._fields:
+            try:
+                value = field.run_validation(data.get(name, empty))
+            except SkipField:
+                # missing not required field without default
+                if allow_null:
+                    ret[name] = None
+                continue
+            except ValidationError as exc:
+                errors[name] = exc.detail
+                continue
+            except DjangoValidationError as exc:
+                errors[name] = get_error_detail(exc)
+                continue
+            ret[name] = None if value is None else field.to_representation(value)
+        if errors:
+            raise ValidationError(errors)
+        return ret
+
+    def validate_many(self, rows: Iterable[Mapping]) -> list[dict]:
+        """
+        Validate all rows, as serializer(data=rows, many=True).
+
+        :raises ValidationError: with list of errors for each row.
+        """
+        res = []
+        errors = []
+        has_errors = False
+        for row in rows:
+            try:
+                res.append(self(row))
+                errors.append({})
+            except ValidationError as exc:
+                errors.append(exc.detail)
+                has_errors = True
+        if has_errors:
+            raise ValidationError(errors)
+        return res
+
+
+@lru_cache(maxsize=None)
+def get_row_validator(serializer_class: Type[serializers.Serializer]) -> RowValidator:
+    return RowValidator(serializer_class)
@@ -2,6 +2,7 @@ from itertools import groupby
 
 from networks.models import CustomerIpLeaseModel
 from sorm_export.ftp_worker.func import send_text_buf2ftp
+from sorm_export.models import ExportStampTypeEnum
 from sorm_export.tasks.task_export import Conv2BinStringIO
 
 
@@ -21,4 +22,4 @@ def export_customer_lease_binds():
     for row_data in _exp():
         csv_buffer.write("%s\n" % row_data)
     csv_buffer.seek(0)
-    send_text_buf2ftp(csv_buffer, fname)
+    send_text_buf2ftp(csv_buffer, fname, export_type=ExportStampTypeEnum.CUSTOMER_IP_BINDS)
@@ -0,0 +1,91 @@
+import multiprocessing
+import resource
+from tempfile import SpooledTemporaryFile
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, no_translations
+from django.db import connections
+from rest_framework.exceptions import ValidationError
+
+from sorm_export.management.commands.export_all import QUERYSET_EXPORT_TREES
+from sorm_export.tasks.task_export import write_csv_rows, SORM_EXPORT_SPOOL_MAX_SIZE
+
+
+def _serializer_export(tree, queryset):
+    """Export rows as it was before row validator, by serializer instance for each row"""
+    serializer_class = tree.get_export_format_serializer()
+    for dat in tree.get_items(queryset=queryset):
+        if not dat:
+            continue
+        ser = serializer_class(data=dat)
+        try:
+            ser.is_valid(raise_exception=True)
+        except ValidationError:
+            continue
+        yield ser.data
+
+
+def _compiled_export(tree, queryset):
+    return tree.export(queryset=queryset)
+
+
+EXPORT_MODES = {
+    'serializer': _serializer_export,
+    'compiled': _compiled_export,
+}
+
+
+def _run_tree(tree_class, queryset_fn, mode: str, result_queue) -> None:
+    # It runs in forked process, so peak RSS is measured for this tree only
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tree = tree_class(recursive=False)
+    start_time = perf_counter()
+    with SpooledTemporaryFile(max_size=SORM_EXPORT_SPOOL_MAX_SIZE, mode='w+b') as fp:
+        rows = write_csv_rows(EXPORT_MODES[mode](tree, queryset_fn()), fp)
+        size = fp.tell()
+    run_time = perf_counter() - start_time
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result_queue.put((rows, size, run_time, peak_rss, peak_rss - start_rss))
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark sorm export trees without uploading to ftp. "
+        "Prints rows/s and peak RSS for each ExportTree subclass."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode", choices=tuple(EXPORT_MODES) + ('all',), default='all',
+            help="How rows are validated, 'all' runs every mode"
+        )
+        parser.add_argument(
+            "--tree", action="append", default=None,
+            help="ExportTree class name, may be specified several times. All trees by default"
+        )
+
+    @no_translations
+    def handle(self, mode: str, tree: list, *args, **options):
+        modes = tuple(EXPORT_MODES) if mode == 'all' else (mode,)
+        trees = [(tc, qf) for tc, qf in QUERYSET_EXPORT_TREES if not tree or tc.__name__ in tree]
+        ctx = multiprocessing.get_context('fork')
+        for tree_class, queryset_fn in trees:
+            for mode_name in modes:
+                # Db connection must not be shared with forked process
+                connections.close_all()
+                result_queue = ctx.SimpleQueue()
+                proc = ctx.Process(target=_run_tree, args=(tree_class, queryset_fn, mode_name, result_queue))
+                proc.start()
+                proc.join()
+                if proc.exitcode != 0 or result_queue.empty():
+                    self.stderr.write("%s [%s]: failed with exit code %s" % (
+                        tree_class.__name__, mode_name, proc.exitcode
+                    ))
+                    continue
+                rows, size, run_time, peak_rss, rss_growth = result_queue.get()
+                self.stdout.write(
+                    "%s [%s]: %d rows, %d bytes, %.3f s, %.1f rows/s, peak RSS %d KiB (+%d KiB)" % (
+                        tree_class.__name__, mode_name, rows, size, run_time,
+                        rows / run_time if run_time else 0, peak_rss, rss_growth
+                    )
+                )
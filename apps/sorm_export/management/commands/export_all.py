@@ -1,7 +1,10 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-from typing import Any
+from typing import Any, Optional
 
 from django.core.management.base import BaseCommand
+from django.db import connections
 from django.db.models import Count, Case, When, Value, BooleanField
 
 from rest_framework.exceptions import ValidationError
@@ -36,25 +39,113 @@ from sorm_export.management.commands._general_func import export_customer_lease_
 from sorm_export.models import ExportFailedStatus
 
 
-def export_all_root_customers():
+def root_customers_queryset():
     """Фильтр абонентов, юрики(которые прикреплены хотябы к 1й учётке юриков).
        Или физики, у которых есть хотябы один договор.
     """
+    return general_customer_all_filter_queryset()
+
+
+def customer_contracts_queryset():
+    return CustomerContractModel.objects.select_related(
+        'customer'
+    ).filter(
+        customer__is_active=True
+    )
+
+
+def address_objects_queryset():
+    return AddressModel.objects.filter(
+        fias_address_level__lt=6
+    ).order_by(
+        "fias_address_level",
+        "fias_address_type"
+    )
+
+
+def access_point_addresses_queryset():
+    # TODO: Выгружать так же и оборудование юриков. сейчас только физики.
+    return general_customer_filter_queryset()
+
+
+def individual_customers_queryset():
+    return Customer.objects.filter(
+        is_active=True
+    ).annotate(
+        legals=Count('customerlegalmodel')
+    ).annotate(
+        is_legal_filial=Case(
+            When(legals__gt=0, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField()
+        )
+    )
+
+
+def legal_customers_queryset():
+    return CustomerLegalModel.objects.all()
+
+
+def ip_leases_queryset():
+    customers_qs = general_customer_all_filter_queryset()
+    return CustomerIpLeaseModel.objects.filter(
+        customer__in=customers_qs,
+        is_dynamic=False,
+        state=True
+    ).exclude(lease_time=None)
+
+
+def customer_services_queryset():
+    customers_qs = general_customer_filter_queryset()
+    return CustomerService.objects.select_related("customer").filter(
+        customer__in=customers_qs
+    )
+
+
+def switches_queryset():
+    device_switch_type_ids = [uniq_num for uniq_num, dev_klass in DEVICE_TYPES if issubclass(
+        dev_klass, SwitchDeviceStrategy)]
+    return Device.objects.filter(
+        dev_type__in=device_switch_type_ids
+    ).exclude(address=None).select_related('address')
 
-    customers = general_customer_all_filter_queryset()
+
+def ip_numbering_queryset():
+    return NetworkIpPool.objects.all()
+
+
+def gateways_queryset():
+    from gateways.models import Gateway
+    return Gateway.objects.exclude(place=None)
+
+
+# Export trees, that exports querysets, and its querysets.
+# Used by export functions below, and by export benchmark.
+QUERYSET_EXPORT_TREES = (
+    (CustomerRootExportTree, root_customers_queryset),
+    (CustomerContractExportTree, customer_contracts_queryset),
+    (AddressExportTree, address_objects_queryset),
+    (AccessPointExportTree, access_point_addresses_queryset),
+    (IndividualCustomersExportTree, individual_customers_queryset),
+    (LegalCustomerExportTree, legal_customers_queryset),
+    (IpLeaseExportTree, ip_leases_queryset),
+    (CustomerServiceExportTree, customer_services_queryset),
+    (DeviceExportTree, switches_queryset),
+    (IpNumberingExportTree, ip_numbering_queryset),
+    (GatewayExportTree, gateways_queryset),
+)
+
+
+def export_all_root_customers():
     CustomerRootExportTree(
         recursive=False
     ).exportNupload(
-        queryset=customers
+        queryset=root_customers_queryset()
     )
 
 
 def export_all_customer_contracts():
-    contracts = CustomerContractModel.objects.select_related(
-        'customer'
-    ).filter(
-        customer__is_active=True
-    )
+    contracts = customer_contracts_queryset()
     CustomerContractExportTree(
         recursive=False
     ).exportNupload(
@@ -63,12 +154,7 @@ def export_all_customer_contracts():
 
 
 def export_all_address_objects():
-    addr_objects = AddressModel.objects.filter(
-        fias_address_level__lt=6
-    ).order_by(
-        "fias_address_level",
-        "fias_address_type"
-    )
+    addr_objects = address_objects_queryset()
     et = datetime.now()
 
     AddressExportTree(
@@ -79,8 +165,7 @@ def export_all_address_objects():
 
 
 def export_all_access_point_addresses():
-    # TODO: Выгружать так же и оборудование юриков. сейчас только физики.
-    customers = general_customer_filter_queryset()
+    customers = access_point_addresses_queryset()
     AccessPointExportTree(
         recursive=False
     ).exportNupload(
@@ -89,17 +174,7 @@ def export_all_access_point_addresses():
 
 
 def export_all_individual_customers():
-    customers = Customer.objects.filter(
-        is_active=True
-    ).annotate(
-        legals=Count('customerlegalmodel')
-    ).annotate(
-        is_legal_filial=Case(
-            When(legals__gt=0, then=Value(True)),
-            default=Value(False),
-            output_field=BooleanField()
-        )
-    )
+    customers = individual_customers_queryset()
     IndividualCustomersExportTree(
         recursive=False
     ).exportNupload(
@@ -108,7 +183,7 @@ def export_all_individual_customers():
 
 
 def export_all_legal_customers():
-    customers = CustomerLegalModel.objects.all()
+    customers = legal_customers_queryset()
     LegalCustomerExportTree(
         recursive=False
     ).exportNupload(
@@ -185,12 +260,7 @@ def export_all_service_nomenclature():
 
 
 def export_all_ip_leases():
-    customers_qs = general_customer_all_filter_queryset()
-    leases = CustomerIpLeaseModel.objects.filter(
-        customer__in=customers_qs,
-        is_dynamic=False,
-        state=True
-    ).exclude(lease_time=None)
+    leases = ip_leases_queryset()
     IpLeaseExportTree(
         recursive=False
     ).exportNupload(
@@ -199,10 +269,7 @@ def export_all_ip_leases():
 
 
 def export_all_customer_services():
-    customers_qs = general_customer_filter_queryset()
-    csrv = CustomerService.objects.select_related("customer").filter(
-        customer__in=customers_qs
-    )
+    csrv = customer_services_queryset()
     CustomerServiceExportTree(
         recursive=False
     ).exportNupload(
@@ -211,11 +278,7 @@ def export_all_customer_services():
 
 
 def export_all_switches():
-    device_switch_type_ids = [uniq_num for uniq_num, dev_klass in DEVICE_TYPES if issubclass(
-        dev_klass, SwitchDeviceStrategy)]
-    devs = Device.objects.filter(
-        dev_type__in=device_switch_type_ids
-    ).exclude(address=None).select_related('address')
+    devs = switches_queryset()
     if devs.exists():
         DeviceExportTree(
             recursive=True
@@ -226,39 +289,60 @@ def export_all_switches():
 
 def export_all_ip_numbering():
     IpNumberingExportTree(recursive=False).exportNupload(
-        queryset=NetworkIpPool.objects.all()
+        queryset=ip_numbering_queryset()
     )
 
 
 def export_all_gateways():
-    from gateways.models import Gateway
     GatewayExportTree(recursive=True).exportNupload(
-        queryset=Gateway.objects.exclude(place=None)
+        queryset=gateways_queryset()
     )
 
 
+EXPORT_FUNCS = (
+    (export_all_root_customers, "Customers root export"),
+    (export_customer_lease_binds, "Customer lease binds"),
+    (export_all_address_objects, "Address objects export"),
+    (export_all_customer_contracts, "Customer contracts export"),
+    (export_all_access_point_addresses, 'Customer ap export'),
+    (export_all_individual_customers, "Customer individual export"),
+    (export_all_legal_customers, 'Customer legal export'),
+    (export_all_customer_contacts, "Customer contacts export"),
+    (export_all_ip_leases, "Network static leases export"),
+    (export_all_service_nomenclature, "Services export status"),
+    (export_all_customer_services, "Customer services export status"),
+    (export_special_numbers, "Special numbers export status"),
+    (export_all_switches, "Switches export status"),
+    (export_all_ip_numbering, "Ip numbering export status"),
+    (export_all_gateways, "Gateways export status"),
+)
+
+
+def _run_export_func(index: int) -> Optional[str]:
+    """Runs in worker process, returns error text if export failed"""
+    fn, _msg = EXPORT_FUNCS[index]
+    try:
+        fn()
+    except ExportFailedStatus as err:
+        return str(err)
+    except ValidationError as e:
+        return str(e.detail)
+
+
 class Command(BaseCommand):
     help = "Exports all available data to 'СОРМ'"
 
-    def handle(self, *args: Any, **options: Any):
-        funcs = (
-            (export_all_root_customers, "Customers root export"),
-            (export_customer_lease_binds, "Customer lease binds"),
-            (export_all_address_objects, "Address objects export"),
-            (export_all_customer_contracts, "Customer contracts export"),
-            (export_all_access_point_addresses, 'Customer ap export'),
-            (export_all_individual_customers, "Customer individual export"),
-            (export_all_legal_customers, 'Customer legal export'),
-            (export_all_customer_contacts, "Customer contacts export"),
-            (export_all_ip_leases, "Network static leases export"),
-            (export_all_service_nomenclature, "Services export status"),
-            (export_all_customer_services, "Customer services export status"),
-            (export_special_numbers, "Special numbers export status"),
-            (export_all_switches, "Switches export status"),
-            (export_all_ip_numbering, "Ip numbering export status"),
-            (export_all_gateways, "Gateways export status"),
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--jobs", "-j", type=int, default=1,
+            help="How many export trees are exported at the same time, by separate processes"
         )
-        for fn, msg in funcs:
+
+    def handle(self, *args: Any, jobs: int = 1, **options: Any):
+        if jobs > 1:
+            self._export_parallel(jobs=jobs)
+            return
+        for fn, msg in EXPORT_FUNCS:
             try:
                 self.stdout.write(msg, ending=' ')
                 fn()
@@ -267,3 +351,26 @@ class Command(BaseCommand):
                 self.stderr.write(str(err))
             except ValidationError as e:
                 self.stderr.write(str(e.detail))
+
+    def _export_parallel(self, jobs: int):
+        # Parent connections are closed before fork, so each worker process
+        # opens its own db connection, and has its own pool of ftp sessions.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(EXPORT_FUNCS)),
+            mp_context=multiprocessing.get_context('fork')
+        ) as executor:
+            futures = {
+                executor.submit(_run_export_func, index): msg
+                for index, (_fn, msg) in enumerate(EXPORT_FUNCS)
+            }
+            for future in as_completed(futures):
+                msg = futures[future]
+                try:
+                    err = future.result()
+                except Exception as e:
+                    err = "%s: %s" % (type(e).__name__, e)
+                if err is None:
+                    self.stdout.write("%s %s" % (msg, self.style.SUCCESS("OK")))
+                else:
+                    self.stderr.write("%s %s" % (msg, err))
@@ -8,6 +8,7 @@ from networks.models import CustomerIpLeaseModel
 from sorm_export.serializers.aaa import AAAExportSerializer, AAAEventType
 from sorm_export.ftp_worker.func import send_file2ftp
 from sorm_export.hier_export.base import format_fname
+from sorm_export.models import ExportStampTypeEnum
 
 
 class Command(BaseCommand):
@@ -60,6 +61,10 @@ class Command(BaseCommand):
 
         if send2ftp:
             now = datetime.now()
-            send_file2ftp(fname=fname, remote_fname=f"ISP/aaa/aaa_v1_{format_fname(now)}.txt")
+            send_file2ftp(
+                fname=fname,
+                remote_fname=f"ISP/aaa/aaa_v1_{format_fname(now)}.txt",
+                export_type=ExportStampTypeEnum.AAA
+            )
             self.stdout.write('FTP Store ', ending='')
             self.stdout.write(self.style.SUCCESS('OK'))
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 13:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sorm_export', '0003_auto_20220822_1348'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportstampmodel',
+            name='export_type',
+            field=models.IntegerField(choices=[(0, 'Unknown Choice'), (1, 'Customer Root'), (2, 'Customer Contract'), (3, 'Customer Address'), (4, 'Customer Ap Address'), (5, 'Customer Individual'), (6, 'Customer Legal'), (7, 'Customer Contact'), (8, 'Network Static Ip'), (9, 'Payment Unknown'), (10, 'Service Nomenclature'), (11, 'Service Customer'), (12, 'Service Customer Manual'), (13, 'Device Switch'), (14, 'Ip Numbering'), (15, 'Gateways'), (16, 'Aaa'), (17, 'Special Numbers'), (18, 'Customer Ip Binds')], default=0, verbose_name='Export type'),
+        ),
+    ]
@@ -29,6 +29,9 @@ class ExportStampTypeEnum(models.IntegerChoices):
     DEVICE_SWITCH = 13
     IP_NUMBERING = 14
     GATEWAYS = 15
+    AAA = 16
+    SPECIAL_NUMBERS = 17
+    CUSTOMER_IP_BINDS = 18
 
 
 class ExportStampStatusEnum(models.IntegerChoices):
@@ -14,10 +14,10 @@ from radiusapp.vendors import IVendorSpecific
 from radiusapp.vendor_base import RadiusCounters
 from rest_framework.exceptions import ValidationError
 from sorm_export.serializers.aaa import AAAExportSerializer, AAAEventType
-from sorm_export.tasks.aaa import save_radius_acct
+from sorm_export.tasks.aaa import save_radius_acct, save_radius_acct_batch
 
 
-def _save_aaa_log(event_time: datetime, **serializer_keys):
+def _make_aaa_log(event_time: datetime, **serializer_keys) -> Optional[dict]:
     serializer_keys.update({
         "event_time": time2utctime(event_time),
     })
@@ -26,9 +26,7 @@ def _save_aaa_log(event_time: datetime, **serializer_keys):
             data=serializer_keys
         )
         ser.is_valid(raise_exception=True)
-        return save_radius_acct.delay(
-            data=ser.data
-        )
+        return ser.data
     except ValidationError as err:
         sorm_reporting_emails = getattr(settings, 'SORM_REPORTING_EMAILS', None)
         if sorm_reporting_emails is not None:
@@ -38,6 +36,15 @@ def _save_aaa_log(event_time: datetime, **serializer_keys):
                 getattr(settings, 'DEFAULT_FROM_EMAIL'),
                 sorm_reporting_emails
             )
+    return None
+
+
+def _save_aaa_log(event_time: datetime, **serializer_keys):
+    data = _make_aaa_log(event_time=event_time, **serializer_keys)
+    if data is not None:
+        return save_radius_acct.delay(
+            data=data
+        )
 
 
 @receiver(custom_signals.radius_acct_start_signal, sender=CustomerIpLeaseModel)
@@ -144,3 +151,28 @@ def signal_radius_acct_update(
         input_octets=counters.input_octets,
         output_octets=counters.output_octets,
     )
+
+
+@receiver(custom_signals.radius_acct_update_batch_signal, sender=CustomerIpLeaseModel)
+def signal_radius_acct_update_batch(sender, records: list, customers: dict, *args, **kwargs):
+    event_time = datetime.now()
+    data_list = []
+    for rec in records:
+        customer = customers.get(rec.customer_id)
+        if customer is None:
+            continue
+        data = _make_aaa_log(
+            event_time=event_time,
+            event_type=AAAEventType.RADIUS_AUTH_UPDATE,
+            session_id=rec.radius_unique_id,
+            customer_ip=rec.ip_address,
+            customer_db_username=customer.username,
+            nas_port=IVendorSpecific.get_rad_val(rec.request_data, "NAS-Port", int, 0),
+            customer_device_mac=rec.customer_mac.format(dialect=mac_unix_common) if rec.customer_mac else '',
+            input_octets=rec.counters.input_octets,
+            output_octets=rec.counters.output_octets,
+        )
+        if data is not None:
+            data_list.append(data)
+    if data_list:
+        save_radius_acct_batch.delay(data_list=data_list)
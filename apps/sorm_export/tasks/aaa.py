@@ -5,6 +5,7 @@ from djing2 import celery_app
 from sorm_export.serializers.aaa import AAA_EXPORT_FNAME
 from sorm_export.ftp_worker.func import send_file2ftp
 from sorm_export.hier_export.base import format_fname
+from sorm_export.models import ExportStampTypeEnum
 
 
 @celery_app.task
@@ -15,6 +16,13 @@ def save_radius_acct(data: dict) -> None:
         csv_writer.writerow(line)
 
 
+@celery_app.task
+def save_radius_acct_batch(data_list: list[dict]) -> None:
+    with open(AAA_EXPORT_FNAME, "a") as f:
+        csv_writer = csv.writer(f, dialect="unix", delimiter=";")
+        csv_writer.writerows([v for k, v in data.items()] for data in data_list)
+
+
 @celery_app.task
 def upload_aaa_2_ftp():
     try:
@@ -22,7 +30,8 @@ def upload_aaa_2_ftp():
             now = datetime.now()
             send_file2ftp(
                 fname=AAA_EXPORT_FNAME,
-                remote_fname=f"ISP/aaa/aaa_v1_{format_fname(now)}.txt"
+                remote_fname=f"ISP/aaa/aaa_v1_{format_fname(now)}.txt",
+                export_type=ExportStampTypeEnum.AAA
             )
     except FileNotFoundError:
         pass
@@ -2,6 +2,10 @@ import csv
 from ftplib import all_errors
 from io import StringIO
 from datetime import datetime
+from tempfile import SpooledTemporaryFile
+from typing import Iterable, BinaryIO
+
+from django.conf import settings
 from sorm_export.ftp_worker.func import send_text_buf2ftp
 from sorm_export.models import ExportStampTypeEnum, ExportStampModel, ExportStampStatusEnum
 
@@ -14,6 +18,36 @@ class Conv2BinStringIO(StringIO):
         return r
 
 
+# Export file stays in memory while it is smaller than this size,
+# and is rolled over to temporary file on disk otherwise.
+SORM_EXPORT_SPOOL_MAX_SIZE = getattr(settings, 'SORM_EXPORT_SPOOL_MAX_SIZE', 8 * 1024 * 1024)
+
+
+class _EncodeWriter:
+    """Text writer for csv, that writes encoded data into binary file."""
+    __slots__ = ('fp',)
+
+    def __init__(self, fp: BinaryIO):
+        self.fp = fp
+
+    def write(self, s: str) -> int:
+        return self.fp.write(s.encode())
+
+
+def write_csv_rows(data: Iterable[dict], fp: BinaryIO) -> int:
+    """
+    Write export rows into binary file by one, without collecting them.
+
+    :return: Written rows count.
+    """
+    csv_writer = csv.writer(_EncodeWriter(fp), dialect="unix", delimiter=";")
+    num = 0
+    for row_data in data:
+        csv_writer.writerow(row_data.values())
+        num += 1
+    return num
+
+
 # make export stamp for logging export
 # end send data to ftp
 def task_export(data, filename: str, export_type: ExportStampTypeEnum):
@@ -25,17 +59,13 @@ def task_export(data, filename: str, export_type: ExportStampTypeEnum):
        export_type=export_type
     )
     try:
-        csv_buffer = Conv2BinStringIO()
-        csv_writer = csv.writer(csv_buffer, dialect="unix", delimiter=";")
-        num = None
-        for num, row_data in enumerate(data):
-            row = (eld for _, eld in row_data.items())
-            csv_writer.writerow(row)
-        csv_buffer.seek(0)
-        if num is not None:
-            send_text_buf2ftp(csv_buffer, filename)
-        csv_buffer.close()
-        del csv_buffer
+        # Rows are streamed from generator into spooled file, and ftp
+        # reads it by lines, so whole export never stays in memory.
+        with SpooledTemporaryFile(max_size=SORM_EXPORT_SPOOL_MAX_SIZE, mode='w+b') as csv_buffer:
+            num = write_csv_rows(data, csv_buffer)
+            csv_buffer.seek(0)
+            if num > 0:
+                send_text_buf2ftp(csv_buffer, filename, export_type=export_type)
         em.attempts_count += 1
         em.last_attempt_time = datetime.now()
         em.export_status = ExportStampStatusEnum.SUCCESSFUL
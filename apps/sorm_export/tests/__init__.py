@@ -1,4 +1,6 @@
 from .payments import PaymentsExportAPITestCase
+from .row_validator import RowValidatorTestCase
+from .ftp_pool import FtpSessionPoolTestCase
 
 
-__all__ = ['PaymentsExportAPITestCase']
+__all__ = ['PaymentsExportAPITestCase', 'RowValidatorTestCase', 'FtpSessionPoolTestCase']
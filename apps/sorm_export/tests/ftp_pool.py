@@ -0,0 +1,106 @@
+import socket
+from io import BytesIO
+from time import sleep
+
+from django.test import SimpleTestCase, override_settings
+
+from sorm_export.ftp_worker import func
+from sorm_export.ftp_worker.metrics import FtpUploadMetrics
+from sorm_export.ftp_worker.pool import FtpSessionPool, FtpPoolExhausted
+from sorm_export.models import ExportStampTypeEnum
+from .test_ftp_server import FtpTest, FtpTestCaseMixin
+
+
+def _wait_ftp_server(timeout=5.0):
+    for _ in range(int(timeout / 0.1)):
+        try:
+            with socket.create_connection(('127.0.0.1', 2122), timeout=1):
+                return
+        except OSError:
+            sleep(0.1)
+
+
+def _break_session(ftp):
+    # as if server closed idle connection
+    ftp.sock.shutdown(socket.SHUT_RDWR)
+
+
+@override_settings(
+    DEFAULT_FTP_CREDENTIALS={
+        "host": '127.0.0.1',
+        "uname": 'testuname',
+        "password": 'testpassw',
+        "port": 2122
+    },
+)
+class FtpSessionPoolTestCase(SimpleTestCase, FtpTestCaseMixin):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.ftp_test = FtpTest().start()
+        _wait_ftp_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.ftp_test.release()
+
+    def setUp(self):
+        func.ftp_pool.close()
+
+    def tearDown(self):
+        func.ftp_pool.close()
+
+    def test_sessions_reused(self):
+        for i in range(3):
+            func.send_text_buf2ftp(BytesIO(b"a;%d\n" % i), "ftp_pool_test_%d.txt" % i)
+        self.assertEqual(func.ftp_pool.size, 1)
+        self.assertEqual(func.ftp_pool.idle_count, 1)
+        self.assertFtpFile('/tmp/ftp_pool_test_2.txt', 'a;2')
+
+    def test_send_bin_and_file(self):
+        func.send_bin_buf2ftp(BytesIO(b"bin data"), "ftp_pool_test_bin.txt")
+        self.assertFtpFile('/tmp/ftp_pool_test_bin.txt', 'bin data')
+        func.send_file2ftp('/tmp/ftp_pool_test_bin.txt', 'ftp_pool_test_file.txt')
+        self.assertFtpFile('/tmp/ftp_pool_test_file.txt', 'bin data')
+        self.assertEqual(func.ftp_pool.size, 1)
+
+    def test_reconnect_broken_session(self):
+        func.send_text_buf2ftp(BytesIO(b"first\n"), "ftp_pool_test_r.txt")
+        _break_session(func.ftp_pool._idle[0].ftp)
+        func.send_text_buf2ftp(BytesIO(b"second\n"), "ftp_pool_test_r.txt")
+        self.assertFtpFile('/tmp/ftp_pool_test_r.txt', 'second')
+        self.assertEqual(func.ftp_pool.size, 1)
+
+    def test_keepalive(self):
+        pool = FtpSessionPool(connect=func._ftp_connect, max_size=2, keepalive_interval=0)
+        with pool.session():
+            with pool.session() as ftp:
+                _break_session(ftp)
+        self.assertEqual(pool.size, 2)
+        pool.keepalive()
+        # broken session is closed, alive one is kept
+        self.assertEqual(pool.size, 1)
+        self.assertEqual(pool.idle_count, 1)
+        pool.close()
+        self.assertEqual(pool.size, 0)
+
+    def test_max_size(self):
+        pool = FtpSessionPool(connect=func._ftp_connect, max_size=1, acquire_timeout=0.1)
+        with pool.session():
+            with self.assertRaises(FtpPoolExhausted):
+                with pool.session():
+                    pass
+        with pool.session():
+            pass
+        self.assertEqual(pool.size, 1)
+        pool.close()
+
+    def test_upload_metrics(self):
+        export_type = ExportStampTypeEnum.CUSTOMER_ROOT
+        before = FtpUploadMetrics.load(export_type)
+        func.send_bin_buf2ftp(BytesIO(b"12345"), "ftp_pool_test_m.txt", export_type=export_type)
+        after = FtpUploadMetrics.load(export_type)
+        self.assertEqual(after.uploads, before.uploads + 1)
+        self.assertEqual(after.bytes, before.bytes + 5)
+        self.assertEqual(after.failures, before.failures)
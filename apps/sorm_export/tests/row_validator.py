@@ -0,0 +1,70 @@
+from datetime import date
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ValidationError
+
+from sorm_export.hier_export.row_validator import get_row_validator
+from sorm_export.serializers import individual_entity_serializers
+from sorm_export.tasks.task_export import write_csv_rows
+
+
+class RowValidatorTestCase(SimpleTestCase):
+    serializer_class = individual_entity_serializers.CustomerContractObjectFormat
+
+    def _serializer_data(self, row):
+        ser = self.serializer_class(data=row)
+        ser.is_valid(raise_exception=True)
+        return ser.data
+
+    def test_same_as_serializer(self):
+        rows = [{
+            "contract_id": 1,
+            "customer_id": 2,
+            "contract_start_date": date(2021, 1, 3),
+            "contract_end_date": None,
+            "contract_number": "num",
+            "contract_title": "title",
+        }, {
+            "contract_id": 3,
+            "customer_id": 4,
+            "contract_start_date": date(2021, 2, 3),
+            "contract_end_date": date(2022, 2, 3),
+            "contract_number": "num2",
+            "contract_title": "title2",
+        }]
+        validator = get_row_validator(self.serializer_class)
+        for row in rows:
+            res = validator(row)
+            expected = self._serializer_data(row)
+            self.assertEqual(res, dict(expected))
+            self.assertEqual(list(res), list(expected))
+
+    def test_errors_same_as_serializer(self):
+        row = {"contract_id": 1, "contract_start_date": "bad date"}
+        ser = self.serializer_class(data=row)
+        self.assertFalse(ser.is_valid())
+        with self.assertRaises(ValidationError) as err:
+            get_row_validator(self.serializer_class)(row)
+        self.assertEqual(err.exception.detail, ser.errors)
+
+    def test_validate_many(self):
+        row = {
+            "contract_id": 1,
+            "customer_id": 2,
+            "contract_start_date": date(2021, 1, 3),
+            "contract_number": "num",
+            "contract_title": "title",
+        }
+        validator = get_row_validator(self.serializer_class)
+        self.assertEqual(len(validator.validate_many([row, row])), 2)
+        with self.assertRaises(ValidationError) as err:
+            validator.validate_many([row, {}])
+        self.assertEqual(err.exception.detail[0], {})
+        self.assertIn("contract_id", err.exception.detail[1])
+
+    def test_write_csv_rows(self):
+        fp = BytesIO()
+        num = write_csv_rows(({"a": i, "b": "тест"} for i in range(3)), fp)
+        self.assertEqual(num, 3)
+        self.assertEqual(fp.getvalue().decode(), '"0";"тест"\n"1";"тест"\n"2";"тест"\n')
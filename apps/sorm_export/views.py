@@ -2,10 +2,13 @@ from datetime import datetime, timedelta
 from django.db.models import Count
 from djing2.lib.fastapi.pagination import Pagination, paginate_qs_path_decorator
 from fastapi import APIRouter, Depends, Request
-from djing2.lib.fastapi.auth import is_admin_auth_dependency
+from pydantic import BaseModel, Field
+from djing2.lib.fastapi.auth import is_admin_auth_dependency, is_superuser_auth_dependency
 from djing2.lib.fastapi.types import IListResponse
 from customers.models import Customer
 from customers import schemas as customers_schemas
+from sorm_export.ftp_worker.metrics import FtpUploadMetrics
+from sorm_export.models import ExportStampTypeEnum
 
 
 router = APIRouter(
@@ -82,3 +85,26 @@ def get_without_birth_day(request: Request, pagination: Pagination = Depends()):
         birth_day__lte=years_ago_110
     )
     return too_old_customers_qs
+
+
+class FtpUploadMetricsSchema(BaseModel):
+    export_type: int
+    export_type_name: str
+    uploads: int = Field(0, title='Successful uploads count')
+    failures: int = Field(0, title='Failed uploads count')
+    bytes: int = Field(0, title='Uploaded bytes')
+    avg_latency_ms: float = Field(0.0, title='Average upload duration in milliseconds')
+
+
+@router.get('/ftp_metrics/',
+            response_model=list[FtpUploadMetricsSchema],
+            dependencies=[Depends(is_superuser_auth_dependency)])
+def get_ftp_upload_metrics():
+    return [FtpUploadMetricsSchema(
+        export_type=m.export_type,
+        export_type_name=ExportStampTypeEnum(m.export_type).label,
+        uploads=m.uploads,
+        failures=m.failures,
+        bytes=m.bytes,
+        avg_latency_ms=m.avg_latency_ms,
+    ) for m in FtpUploadMetrics.load_all()]
@@ -215,7 +215,8 @@ def get_all_tasks_dependency(
             )
 @paginate_qs_path_decorator(
     schema=TaskModelSchemaResponseModelSchema,
-    db_model=models.Task
+    db_model=models.Task,
+    cursor_pagination=True,
 )
 def get_all_tasks(request: Request,
                   pagination: Pagination = Depends(),
@@ -229,7 +230,8 @@ def get_all_tasks(request: Request,
             response_model_exclude_none=True)
 @paginate_qs_path_decorator(
     schema=TaskModelSchemaResponseModelSchema,
-    db_model=models.Task
+    db_model=models.Task,
+    cursor_pagination=True,
 )
 def get_all_new_task_list(request: Request,
                           pagination: Pagination = Depends(),
@@ -243,7 +245,8 @@ def get_all_new_task_list(request: Request,
             response_model_exclude_none=True)
 @paginate_qs_path_decorator(
     schema=TaskModelSchemaResponseModelSchema,
-    db_model=models.Task
+    db_model=models.Task,
+    cursor_pagination=True,
 )
 def get_new_task_list(request: Request,
                       pagination: Pagination = Depends(),
@@ -266,7 +269,8 @@ def get_new_task_list(request: Request,
             response_model_exclude_none=True)
 @paginate_qs_path_decorator(
     schema=TaskModelSchemaResponseModelSchema,
-    db_model=models.Task
+    db_model=models.Task,
+    cursor_pagination=True,
 )
 def get_failed_task_list(request: Request,
                          pagination: Pagination = Depends(),
@@ -289,7 +293,8 @@ def get_failed_task_list(request: Request,
             response_model_exclude_none=True)
 @paginate_qs_path_decorator(
     schema=TaskModelSchemaResponseModelSchema,
-    db_model=models.Task
+    db_model=models.Task,
+    cursor_pagination=True,
 )
 def get_finished_task_list(request: Request,
                            pagination: Pagination = Depends(),
@@ -312,7 +317,8 @@ def get_finished_task_list(request: Request,
             response_model_exclude_none=True)
 @paginate_qs_path_decorator(
     schema=TaskModelSchemaResponseModelSchema,
-    db_model=models.Task
+    db_model=models.Task,
+    cursor_pagination=True,
 )
 def get_my_own_task_list(request: Request,
                          pagination: Pagination = Depends(),
@@ -336,7 +342,8 @@ def get_my_own_task_list(request: Request,
             response_model_exclude_none=True)
 @paginate_qs_path_decorator(
     schema=TaskModelSchemaResponseModelSchema,
-    db_model=models.Task
+    db_model=models.Task,
+    cursor_pagination=True,
 )
 def get_my_task_list(request: Request,
                      pagination: Pagination = Depends(),
@@ -763,7 +770,8 @@ def create_new_task(new_task_data: schemas.TaskBaseSchema,
             )
 @paginate_qs_path_decorator(
     schema=TaskModelSchemaResponseModelSchema,
-    db_model=models.Task
+    db_model=models.Task,
+    cursor_pagination=True,
 )
 def get_all_tasks(request: Request,
                   customer_id: int = Query(gt=0),